@@ -1,11 +1,21 @@
 # Copyright (c) Facebook, Inc. and its affiliates.
 from mmf.common.sample import SampleList
+from mmf.datasets.processors.processors import processor_stats
 
 
 class BatchCollator:
-    def __init__(self, dataset_name, dataset_type):
+    def __init__(
+        self, dataset_name, dataset_type, processors=None, sample_processors=None
+    ):
         self._dataset_name = dataset_name
         self._dataset_type = dataset_type
+        # Processors which work on the whole batch, e.g. batched_image_transforms
+        self._processors = processors if processors is not None else []
+        # Processors which work on the list of samples before it is collated,
+        # e.g. to pad images of different sizes
+        self._sample_processors = (
+            sample_processors if sample_processors is not None else []
+        )
 
     def __call__(self, batch):
         # Create and return sample list with proper name
@@ -21,6 +31,8 @@ class BatchCollator:
         ):
             sample_list = batch[0]
         elif not isinstance(batch, SampleList):
+            for processor in self._sample_processors:
+                batch = processor(batch)
             sample_list = SampleList(batch)
 
         if sample_list._get_tensor_field() is None:
@@ -28,4 +40,8 @@ class BatchCollator:
 
         sample_list.dataset_name = self._dataset_name
         sample_list.dataset_type = self._dataset_type
-        return sample_list
+
+        for processor in self._processors:
+            sample_list = processor(sample_list)
+        # Send the processor stats of this dataloader worker to the main process
+        return processor_stats.attach(sample_list)
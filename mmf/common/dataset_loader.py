@@ -3,6 +3,7 @@
 from mmf.common.sample import SampleList
 from mmf.common.test_reporter import TestReporter
 from mmf.datasets.multi_dataset_loader import MultiDatasetLoader
+from mmf.datasets.processors.processors import processor_stats
 
 
 class DatasetLoader:
@@ -49,6 +50,7 @@ class DatasetLoader:
 
     def prepare_batch(self, batch, *args, **kwargs):
         batch = SampleList(batch)
+        processor_stats.collect(batch)
         return self.mapping[batch.dataset_type].prepare_batch(batch)
 
     def verbose_dump(self, report, *args, **kwargs):
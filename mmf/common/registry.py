@@ -24,7 +24,7 @@ Various decorators for registry different kind of classes with unique keys
 - Register a decoder: ``@registry.register_decoder``
 - Register a transformer backend: ``@registry.register_transformer_backend``
 """
-from mmf.utils.env import setup_imports
+from mmf.utils.env import import_registered_module, setup_imports
 
 
 class Registry:
@@ -360,49 +360,58 @@ class Registry:
 
         current[path[-1]] = obj
 
+    @classmethod
+    def _get_class(cls, kind, name):
+        mapping = cls.mapping[f"{kind}_name_mapping"]
+        if name not in mapping:
+            # Import the module registering this name on demand, see
+            # `setup_imports(lazy=True)`
+            import_registered_module(kind, name)
+        return mapping.get(name, None)
+
     @classmethod
     def get_trainer_class(cls, name):
-        return cls.mapping["trainer_name_mapping"].get(name, None)
+        return cls._get_class("trainer", name)
 
     @classmethod
     def get_builder_class(cls, name):
-        return cls.mapping["builder_name_mapping"].get(name, None)
+        return cls._get_class("builder", name)
 
     @classmethod
     def get_model_class(cls, name):
-        return cls.mapping["model_name_mapping"].get(name, None)
+        return cls._get_class("model", name)
 
     @classmethod
     def get_processor_class(cls, name):
-        return cls.mapping["processor_name_mapping"].get(name, None)
+        return cls._get_class("processor", name)
 
     @classmethod
     def get_metric_class(cls, name):
-        return cls.mapping["metric_name_mapping"].get(name, None)
+        return cls._get_class("metric", name)
 
     @classmethod
     def get_loss_class(cls, name):
-        return cls.mapping["loss_name_mapping"].get(name, None)
+        return cls._get_class("loss", name)
 
     @classmethod
     def get_optimizer_class(cls, name):
-        return cls.mapping["optimizer_name_mapping"].get(name, None)
+        return cls._get_class("optimizer", name)
 
     @classmethod
     def get_scheduler_class(cls, name):
-        return cls.mapping["scheduler_name_mapping"].get(name, None)
+        return cls._get_class("scheduler", name)
 
     @classmethod
     def get_decoder_class(cls, name):
-        return cls.mapping["decoder_name_mapping"].get(name, None)
+        return cls._get_class("decoder", name)
 
     @classmethod
     def get_encoder_class(cls, name):
-        return cls.mapping["encoder_name_mapping"].get(name, None)
+        return cls._get_class("encoder", name)
 
     @classmethod
     def get_transformer_backend_class(cls, name):
-        return cls.mapping["transformer_backend_name_mapping"].get(name, None)
+        return cls._get_class("transformer_backend", name)
 
     @classmethod
     def get(cls, name, default=None, no_warning=False):
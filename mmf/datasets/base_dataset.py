@@ -1,6 +1,7 @@
 # Copyright (c) Facebook, Inc. and its affiliates.
 from mmf.common.registry import registry
 from mmf.common.sample import SampleList
+from mmf.utils.encoder_cache import build_encoder_output_loader
 from mmf.utils.general import get_current_device
 from torch.utils.data.dataset import Dataset
 
@@ -27,6 +28,17 @@ class BaseDataset(Dataset):
         self._global_config = registry.get("config")
         self._device = get_current_device()
         self.use_cuda = "cuda" in str(self._device)
+        self.collate_processors = []
+        self.device_processors = []
+        self.sample_processors = []
+
+        # Cached outputs of the frozen encoder of the model are read by the
+        # DataLoader workers at collate time
+        encoder_output_loader = build_encoder_output_loader(self._global_config)
+        # Datasets don't need to load the inputs of the cached encoder
+        self.use_encoder_cache = encoder_output_loader is not None
+        if self.use_encoder_cache:
+            self.collate_processors.append(encoder_output_loader)
 
     def load_item(self, idx):
         """
@@ -62,6 +74,21 @@ class BaseDataset(Dataset):
             setattr(self, processor_key, processor_instance)
             full_key = reg_key.format(processor_key)
             registry.register(full_key, processor_instance)
+            # Used as the name of the processor in processor_stats
+            processor_instance.name = full_key
+
+            # Batch level processors are applied by MMF on the collated batch
+            # instead of being called from __getitem__
+            batch_stage = getattr(processor_instance, "batch_stage", None)
+            if batch_stage == "collate":
+                self.collate_processors.append(processor_instance)
+            elif batch_stage == "device":
+                self.device_processors.append(processor_instance)
+            # They can also prepare the samples before these are collated
+            if batch_stage is not None and hasattr(
+                processor_instance, "collate_samples"
+            ):
+                self.sample_processors.append(processor_instance.collate_samples)
 
     def prepare_batch(self, batch):
         """
@@ -69,7 +96,7 @@ class BaseDataset(Dataset):
 
         Prepare batch for passing to model. Whatever returned from here will
         be directly passed to model's forward function. Currently moves the batch to
-        proper device.
+        proper device and applies processors with ``device`` batch stage.
 
         Args:
             batch (SampleList): sample list containing the currently loaded batch
@@ -83,6 +110,8 @@ class BaseDataset(Dataset):
             # Try converting to SampleList
             batch = SampleList(batch)
         batch = batch.to(self._device)
+        for processor in self.device_processors:
+            batch = processor(batch)
         return batch
 
     @property
@@ -40,7 +40,7 @@ class COCODataset(VQA2Dataset):
         if self._use_features:
             features = self.features_db[idx]
             current_sample.update(features)
-        else:
+        elif self._use_images:
             image_path = str(sample_info["image_name"]) + ".jpg"
             current_sample.image = self.image_db.from_path(image_path)["images"][0]
 
@@ -65,13 +65,14 @@ class HatefulMemesImageDataset(MMFDataset):
     def __init__(self, config, *args, dataset_name="hateful_memes", **kwargs):
         super().__init__(dataset_name, config, *args, **kwargs)
         assert (
-            self._use_images
+            self._use_images or self.use_encoder_cache
         ), "config's 'use_images' must be true to use image dataset"
 
     def init_processors(self):
         super().init_processors()
-        # Assign transforms to the image_db
-        self.image_db.transform = self.image_processor
+        if self._use_images:
+            # Assign transforms to the image_db
+            self.image_db.transform = self.image_processor
 
     def __getitem__(self, idx):
         sample_info = self.annotation_db[idx]
@@ -84,8 +85,13 @@ class HatefulMemesImageDataset(MMFDataset):
 
         current_sample.id = torch.tensor(int(sample_info["id"]), dtype=torch.int)
 
-        # Get the first image from the set of images returned from the image_db
-        current_sample.image = self.image_db[idx]["images"][0]
+        if self._use_images:
+            # Get the first image from the set of images returned from the image_db
+            images = self.image_db[idx]
+            current_sample.image = images["images"][0]
+            if "image_sizes" in images:
+                # Padded images from the decoded image cache
+                current_sample.image_size = images["image_sizes"][0]
 
         if "label" in sample_info:
             current_sample.targets = torch.tensor(
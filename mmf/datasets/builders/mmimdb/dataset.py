@@ -48,13 +48,14 @@ class MMIMDbImageDataset(MMFDataset):
             "mmimdb", config, dataset_type, imdb_file_index, *args, **kwargs
         )
         assert (
-            self._use_images
+            self._use_images or self.use_encoder_cache
         ), "config's 'use_images' must be true to use image dataset"
 
     def init_processors(self):
         super().init_processors()
-        # Assign transforms to the image_db
-        self.image_db.transform = self.image_processor
+        if self._use_images:
+            # Assign transforms to the image_db
+            self.image_db.transform = self.image_processor
 
     def __getitem__(self, idx):
         sample_info = self.annotation_db[idx]
@@ -34,7 +34,8 @@ class OKVQADataset(MMFDataset):
 
     def init_processors(self):
         super().init_processors()
-        self.image_db.transform = self.image_processor
+        if self._use_images:
+            self.image_db.transform = self.image_processor
 
     def __getitem__(self, idx: int) -> Type[Sample]:
         sample_info = self.annotation_db[idx]
@@ -45,9 +46,10 @@ class OKVQADataset(MMFDataset):
             int(sample_info["question_id"]), dtype=torch.int
         )
 
-        # Get the first image from the set of images returned from the image_db
-        image_path = self.get_image_path(sample_info["image_id"])
-        current_sample.image = self.image_db.from_path(image_path)["images"][0]
+        if self._use_images:
+            # Get the first image from the set of images returned from the image_db
+            image_path = self.get_image_path(sample_info["image_id"])
+            current_sample.image = self.image_db.from_path(image_path)["images"][0]
 
         if "answers" in sample_info:
             answers = self.answer_processor({"answers": sample_info["answers"]})
@@ -13,6 +13,21 @@ class TextVQADataset(MMFDataset):
         self.use_ocr = self.config.use_ocr
         self.use_ocr_info = self.config.use_ocr_info
 
+    def init_processors(self):
+        super().init_processors()
+        if getattr(self.answer_processor, "sparse_targets", False):
+            self.collate_processors.append(self.collate_sparse_targets)
+
+    def collate_sparse_targets(self, sample_list):
+        # Sparse targets of the samples have different lengths
+        if "sparse_targets_indices" in sample_list:
+            indices, values = self.answer_processor.pad_sparse_targets(
+                sample_list.sparse_targets_indices, sample_list.sparse_targets_values
+            )
+            sample_list.sparse_targets_indices = indices
+            sample_list.sparse_targets_values = values
+        return sample_list
+
     def preprocess_sample_info(self, sample_info):
         path = self._get_path_based_on_index(self.config, "annotations", self._index)
         # NOTE, TODO: Code duplication w.r.t to STVQA, revisit
@@ -216,6 +231,8 @@ class TextVQADataset(MMFDataset):
         answer_processor_arg = {"answers": answers}
 
         answer_processor_arg["tokens"] = sample.pop("ocr_tokens", [])
+        if "answer_table" in sample_info:
+            answer_processor_arg["answer_table"] = sample_info["answer_table"]
 
         processed_answers = self.answer_processor(answer_processor_arg)
 
@@ -229,5 +246,8 @@ class TextVQADataset(MMFDataset):
 
         if "answers_scores" in sample:
             sample.targets = sample.pop("answers_scores")
+        elif "answers_scores_indices" in sample:
+            sample.sparse_targets_indices = sample.pop("answers_scores_indices")
+            sample.sparse_targets_values = sample.pop("answers_scores_values")
 
         return sample
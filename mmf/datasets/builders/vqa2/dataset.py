@@ -27,7 +27,7 @@ class VQA2Dataset(MMFDataset):
 
     def init_processors(self):
         super().init_processors()
-        if not self._use_features:
+        if self._use_images:
             self.image_db.transform = self.image_processor
 
     def try_fast_read(self):
@@ -93,7 +93,7 @@ class VQA2Dataset(MMFDataset):
                     features["image_info_0"]
                 )
             current_sample.update(features)
-        else:
+        elif self._use_images:
             image_path = sample_info["image_name"] + ".jpg"
             current_sample.image = self.image_db.from_path(image_path)["images"][0]
 
@@ -137,13 +137,32 @@ class VQA2Dataset(MMFDataset):
 
             if self.use_ocr:
                 answer_processor_arg["tokens"] = sample_info["ocr_tokens"]
+            if "answer_targets" in sample_info:
+                answer_processor_arg["answer_targets"] = sample_info["answer_targets"]
             processed_soft_copy_answers = self.answer_processor(answer_processor_arg)
 
             # sample.answers = processed_soft_copy_answers["answers"]
-            sample.targets = processed_soft_copy_answers["answers_scores"]
+            if "answers_scores" in processed_soft_copy_answers:
+                sample.targets = processed_soft_copy_answers["answers_scores"]
+            else:
+                # Densified on device in prepare_batch
+                sample.sparse_targets_indices = processed_soft_copy_answers[
+                    "answers_scores_indices"
+                ]
+                sample.sparse_targets_values = processed_soft_copy_answers[
+                    "answers_scores_values"
+                ]
 
         return sample
 
+    def prepare_batch(self, batch):
+        batch = super().prepare_batch(batch)
+        if "sparse_targets_indices" in batch:
+            batch.targets = self.answer_processor.densify_targets(
+                batch.pop("sparse_targets_indices"), batch.pop("sparse_targets_values")
+            )
+        return batch
+
     def idx_to_answer(self, idx):
         return self.answer_processor.convert_idx_to_answer(idx)
 
@@ -37,7 +37,7 @@ class MaskedVQA2Dataset(VQA2Dataset):
                 )
 
             current_sample.update(features)
-        else:
+        elif self._use_images:
             image_path = str(sample_info["image_name"]) + ".jpg"
             current_sample.image = self.image_db.from_path(image_path)["images"][0]
 
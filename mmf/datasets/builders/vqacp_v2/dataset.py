@@ -54,10 +54,11 @@ class VQACPv2Dataset(OKVQADataset):
             int(sample_info["question_id"]), dtype=torch.int
         )
 
-        image_path = self.get_image_path(
-            sample_info["image_id"], sample_info["coco_split"]
-        )
-        current_sample.image = self.image_db.from_path(image_path)["images"][0]
+        if self._use_images:
+            image_path = self.get_image_path(
+                sample_info["image_id"], sample_info["coco_split"]
+            )
+            current_sample.image = self.image_db.from_path(image_path)["images"][0]
 
         if "answers" in sample_info:
             answers = self.answer_processor({"answers": sample_info["answers"]})
@@ -43,6 +43,10 @@ class FeaturesDatabase(ImageDatabase):
             logger.info("Hold tight, this may take a while...")
             self._threaded_read()
 
+    def _build_decoded_image_cache(self, cache_config):
+        # Features are not decoded images, the cache doesn't apply
+        return None
+
     def _threaded_read(self):
         elements = [idx for idx in range(1, len(self.annotation_db))]
         pool = ThreadPool(processes=4)
@@ -1,28 +1,280 @@
 # Copyright (c) Facebook, Inc. and its affiliates.
 import collections
+import hashlib
+import json
+import logging
 import os
+import time
 
+import numpy as np
 import torch
 import torchvision
 import torchvision.datasets.folder as tv_helpers
+import tqdm
+from mmf.utils.configuration import get_mmf_cache_dir
+from mmf.utils.distributed import is_master, synchronize
 from mmf.utils.file_io import PathManager
 from mmf.utils.general import get_absolute_path
 from PIL import Image
+from torchvision.transforms import functional as F
 
 
-def get_possible_image_paths(path):
+logger = logging.getLogger(__name__)
+
+
+def _strip_extension(path):
     image_path = path.split(".")
     # Image path might contain file extension (e.g. .jpg),
     # In this case, we want the path without the extension
     image_path = image_path if len(image_path) == 1 else image_path[:-1]
-    for ext in tv_helpers.IMG_EXTENSIONS:
-        image_ext = ".".join(image_path) + ext
+    return ".".join(image_path)
+
+
+def get_candidate_image_paths(path):
+    image_path = _strip_extension(path)
+    return [image_path + ext for ext in tv_helpers.IMG_EXTENSIONS]
+
+
+def get_possible_image_paths(path):
+    for image_ext in get_candidate_image_paths(path):
         if PathManager.isfile(image_ext):
             path = image_ext
             break
     return path
 
 
+class ImagePathIndex:
+    """Maps image paths without extension (relative to ``base_path``) to the
+    full path of the image on disk, so that resolving an image costs a dict
+    lookup instead of an ``isfile`` call per possible extension.
+
+    The index is built with a single walk over ``base_path`` and persisted
+    as JSON to ``cache_path``. It is rebuilt when the modification time of
+    any indexed directory changes, which happens when files are added to or
+    removed from it.
+    """
+
+    def __init__(self, base_path, cache_path=None):
+        self.base_path = base_path
+        self.cache_path = cache_path
+        self.index = None
+        self.dir_mtimes = None
+        self.fs_calls = 0
+
+    @staticmethod
+    def default_cache_path(base_path):
+        key = hashlib.md5(os.path.abspath(base_path).encode()).hexdigest()
+        return os.path.join(get_mmf_cache_dir(), "image_index", key + ".json")
+
+    def _load(self):
+        if self.cache_path is None or not os.path.isfile(self.cache_path):
+            return False
+
+        try:
+            with open(self.cache_path) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        if cached.get("base_path") != os.path.abspath(self.base_path):
+            return False
+
+        dir_mtimes = cached["dir_mtimes"]
+        for directory, mtime in dir_mtimes.items():
+            self.fs_calls += 1
+            try:
+                if os.stat(directory).st_mtime != mtime:
+                    return False
+            except OSError:
+                return False
+
+        self.index = cached["index"]
+        self.dir_mtimes = dir_mtimes
+        return True
+
+    def _save(self):
+        if self.cache_path is None:
+            return
+
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            # Write to a temporary file first, dataloader workers might be
+            # building the same index in parallel
+            tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(
+                    {
+                        "base_path": os.path.abspath(self.base_path),
+                        "dir_mtimes": self.dir_mtimes,
+                        "index": self.index,
+                    },
+                    f,
+                )
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"Couldn't save image index to {self.cache_path}: {e}")
+
+    def _scan(self):
+        extension_rank = {ext: idx for idx, ext in enumerate(tv_helpers.IMG_EXTENSIONS)}
+        index = {}
+        ranks = {}
+        dir_mtimes = {}
+
+        for root, _, files in os.walk(self.base_path):
+            self.fs_calls += 2
+            dir_mtimes[root] = os.stat(root).st_mtime
+            for file in files:
+                rank = extension_rank.get(os.path.splitext(file)[1])
+                if rank is None:
+                    continue
+
+                full_path = os.path.join(root, file)
+                key = _strip_extension(os.path.relpath(full_path, self.base_path))
+                # Same priority as get_possible_image_paths when multiple
+                # files only differ by their extension
+                if key not in ranks or rank < ranks[key]:
+                    index[key] = full_path
+                    ranks[key] = rank
+
+        self.index = index
+        self.dir_mtimes = dir_mtimes
+
+    def build(self):
+        if not self._load():
+            self._scan()
+            self._save()
+            logger.info(f"Indexed {len(self.index)} images in {self.base_path}")
+        return self
+
+    def get(self, path):
+        """Returns the full path for ``path`` or None if it is not indexed"""
+        if self.index is None:
+            self.build()
+        key = _strip_extension(os.path.relpath(path, self.base_path))
+        return self.index.get(key, None)
+
+
+class DecodedImageCache:
+    """Cache of decoded and resized images stored as uint8 in a single
+    memory-mapped file, so that datasets which train on raw images don't
+    decode the same JPEGs every epoch.
+
+    ``size`` follows torchvision's ``Resize``: an int resizes the shortest
+    side to ``size`` (with the longest side capped to ``max_size`` if passed)
+    and a ``[h, w]`` pair resizes to exactly that size. Images are returned
+    as uint8 tensors of shape ``(3, h, w)``.
+
+    If ``pad`` is True, images are returned zero padded to the largest size
+    in the cache along with their original size so that they can be batched
+    together. Batch image processors such as ``batched_image_transforms`` use
+    these sizes to only consider the valid part of the images.
+    """
+
+    DATA_FILE = "images.bin"
+    INDEX_FILE = "index.json"
+
+    def __init__(self, cache_dir, size, max_size=None, pad=False):
+        self.cache_dir = cache_dir
+        self.size = list(size) if isinstance(size, collections.abc.Sequence) else size
+        self.max_size = max_size
+        self.pad = pad
+        self.index = None
+        self._data = None
+        self._pad_size = None
+
+    @property
+    def data_path(self):
+        return os.path.join(self.cache_dir, self.DATA_FILE)
+
+    @property
+    def index_path(self):
+        return os.path.join(self.cache_dir, self.INDEX_FILE)
+
+    def _meta(self):
+        return {"size": self.size, "max_size": self.max_size}
+
+    def load(self):
+        if not os.path.isfile(self.index_path):
+            return False
+
+        with open(self.index_path) as f:
+            cached = json.load(f)
+        if cached["meta"] != self._meta():
+            logger.warning(
+                f"Decoded image cache at {self.cache_dir} was built with "
+                + f"{cached['meta']}, expected {self._meta()}. Rebuilding."
+            )
+            return False
+
+        self.index = cached["index"]
+        self._pad_size = cached["pad_size"]
+        return True
+
+    def resize(self, image):
+        if isinstance(self.size, list):
+            return F.resize(image, self.size)
+
+        w, h = image.size
+        size = self.size
+        if self.max_size is not None:
+            min_original_size = float(min((w, h)))
+            max_original_size = float(max((w, h)))
+            if max_original_size / min_original_size * size > self.max_size:
+                size = int(self.max_size * min_original_size / max_original_size)
+        return F.resize(image, size)
+
+    def build(self, paths, loader):
+        """Decodes and resizes images in ``paths``, a dict of cache key to
+        image path, and writes them to the cache.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        index = {}
+        offset = 0
+        pad_size = [0, 0]
+        tmp_data_path = self.data_path + ".tmp"
+
+        with open(tmp_data_path, "wb") as f:
+            for key, path in tqdm.tqdm(paths.items(), disable=not is_master()):
+                image = np.asarray(self.resize(loader(path)), dtype=np.uint8)
+                h, w, _ = image.shape
+                f.write(np.ascontiguousarray(image).tobytes())
+                index[key] = [offset, h, w]
+                offset += image.size
+                pad_size = [max(pad_size[0], h), max(pad_size[1], w)]
+
+        os.replace(tmp_data_path, self.data_path)
+        with open(self.index_path, "w") as f:
+            json.dump({"meta": self._meta(), "pad_size": pad_size, "index": index}, f)
+
+        self.index = index
+        self._pad_size = pad_size
+        self._data = None
+
+    def __contains__(self, key):
+        return self.index is not None and key in self.index
+
+    def __len__(self):
+        return len(self.index) if self.index is not None else 0
+
+    def get(self, key):
+        """Returns a tuple of the uint8 image tensor and its (h, w) size"""
+        if self._data is None:
+            # Open lazily so that each dataloader worker has its own mapping
+            self._data = np.memmap(self.data_path, dtype=np.uint8, mode="r")
+
+        offset, h, w = self.index[key]
+        image = self._data[offset : offset + h * w * 3].reshape(h, w, 3)
+        if self.pad:
+            padded = np.zeros((*self._pad_size, 3), dtype=np.uint8)
+            padded[:h, :w] = image
+            image = padded
+        else:
+            image = np.array(image)
+
+        image = torch.from_numpy(image).permute(2, 0, 1)
+        return image, torch.tensor([h, w], dtype=torch.long)
+
+
 def default_loader(path):
     with PathManager.open(path, "rb") as f:
         img = Image.open(f)
@@ -55,7 +307,7 @@ class ImageDatabase(torch.utils.data.Dataset):
         is_valid_file=None,
         image_key=None,
         *args,
-        **kwargs
+        **kwargs,
     ):
         """Initialize an instance of ImageDatabase
 
@@ -85,6 +337,14 @@ class ImageDatabase(torch.utils.data.Dataset):
         self.image_key = config.get("image_key", None)
         self.image_key = image_key if image_key else self.image_key
         self.is_valid_file = is_valid_file
+        self._use_image_index = config.get("use_image_index", True)
+        self._image_index = None
+        self._fs_calls = 0
+        self._images_since_log = 0
+        self._timings = collections.defaultdict(float)
+        self._decoded_image_cache = self._build_decoded_image_cache(
+            config.get("decoded_image_cache", None)
+        )
 
     @property
     def annotation_db(self):
@@ -120,6 +380,49 @@ class ImageDatabase(torch.utils.data.Dataset):
                 + " Use image_database.annotation_db to set it."
             )
 
+    def _build_decoded_image_cache(self, cache_config):
+        if not cache_config:
+            return None
+        assert (
+            "cache_dir" in cache_config and "size" in cache_config
+        ), "decoded_image_cache config must contain 'cache_dir' and 'size'"
+
+        cache = DecodedImageCache(
+            get_absolute_path(cache_config.cache_dir),
+            cache_config.size,
+            max_size=cache_config.get("max_size", None),
+            pad=cache_config.get("pad", False),
+        )
+        processors = self.config.get("processors", None) or {}
+        if any(
+            processor.get("type", None) == "batched_image_transforms"
+            for processor in processors.values()
+        ):
+            # Images resized by their shortest side have different sizes
+            assert cache.pad or isinstance(cache.size, list), (
+                "decoded_image_cache needs pad: true or a fixed [h, w] size "
+                + "for its images to be batched by batched_image_transforms"
+            )
+        if not cache.load():
+            self.build_decoded_image_cache(cache)
+        return cache
+
+    def build_decoded_image_cache(self, cache):
+        """Decodes all of the images under ``base_path`` into ``cache``. The
+        whole folder is cached, instead of only the images in the annotation
+        db, as image folders are usually shared across dataset splits.
+        """
+        if is_master():
+            logger.info(f"Building decoded image cache at {cache.cache_dir}")
+            image_index = ImagePathIndex(self.base_path).build()
+            cache.build(image_index.index, self.loader)
+        synchronize()
+        if not is_master():
+            cache.load()
+
+    def _get_cache_key(self, image):
+        return _strip_extension(os.path.normpath(str(image)))
+
     def get(self, item):
         possible_images = self._get_attrs(item)
         return self.from_path(possible_images)
@@ -133,9 +436,20 @@ class ImageDatabase(torch.utils.data.Dataset):
         ), "Path needs to a string or an iterable"
 
         loaded_images = []
+        image_sizes = []
         for image in paths:
+            cache = self._decoded_image_cache
+            cache_key = self._get_cache_key(image)
+            if cache is not None and cache_key in cache:
+                start = time.perf_counter()
+                image, image_size = cache.get(cache_key)
+                self._timings["cache_read"] += time.perf_counter() - start
+                image_sizes.append(image_size)
+                loaded_images.append(self._apply_transform(image, use_transforms))
+                continue
+
             image = os.path.join(self.base_path, image)
-            path = get_possible_image_paths(image)
+            path = self._resolve_image_path(image)
 
             valid = self.is_valid_file(path) if self.is_valid_file is not None else True
 
@@ -152,13 +466,74 @@ class ImageDatabase(torch.utils.data.Dataset):
                         possible_path
                     )
                 )
+            start = time.perf_counter()
             image = self.open_image(path)
-
-            if self.transform and use_transforms:
-                image = self.transform(image)
-            loaded_images.append(image)
-
-        return {"images": loaded_images}
+            self._timings["decode"] += time.perf_counter() - start
+            loaded_images.append(self._apply_transform(image, use_transforms))
+
+        self._log_stats(len(paths))
+        output = {"images": loaded_images}
+        if len(image_sizes) > 0 and self._decoded_image_cache.pad:
+            output["image_sizes"] = image_sizes
+        return output
+
+    def _apply_transform(self, image, use_transforms):
+        if self.transform and use_transforms:
+            start = time.perf_counter()
+            image = self.transform(image)
+            self._timings["transform"] += time.perf_counter() - start
+        return image
+
+    def _get_image_index(self):
+        if not self._use_image_index:
+            return None
+
+        if self._image_index is None:
+            if not os.path.isdir(self.base_path):
+                # Only local folders can be indexed, fall back to probing
+                self._use_image_index = False
+                return None
+            self._image_index = ImagePathIndex(
+                self.base_path, ImagePathIndex.default_cache_path(self.base_path)
+            ).build()
+            self._fs_calls += self._image_index.fs_calls
+
+        return self._image_index
+
+    def _resolve_image_path(self, image):
+        image_index = self._get_image_index()
+        if image_index is not None:
+            path = image_index.get(image)
+            if path is not None:
+                return path
+
+        for candidate in get_candidate_image_paths(image):
+            self._fs_calls += 1
+            if PathManager.isfile(candidate):
+                return candidate
+        return image
+
+    def _log_stats(self, num_images):
+        # Reports filesystem calls made to resolve image paths and time spent
+        # in each loading stage once every len(self) images, i.e. once per
+        # epoch per process
+        self._images_since_log += num_images
+        if (
+            not logger.isEnabledFor(logging.DEBUG)
+            or not self.annotation_db
+            or self._images_since_log < len(self.annotation_db)
+        ):
+            return
+
+        logger.debug(
+            f"ImageDatabase {self.base_path}: {self._fs_calls} filesystem calls "
+            + f"to resolve {self._images_since_log} images"
+        )
+        timings = ", ".join(f"{k}: {v:.2f}s" for k, v in self._timings.items())
+        logger.debug(f"ImageDatabase {self.base_path} stage timings: {timings}")
+        self._fs_calls = 0
+        self._images_since_log = 0
+        self._timings.clear()
 
     def open_image(self, path):
         return self.loader(path)
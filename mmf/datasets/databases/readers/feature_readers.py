@@ -188,6 +188,18 @@ class PaddedFasterRCNNFeatureReader:
         tmp_image_feat[0:image_loc,] = image_feature[: self.max_loc, :]  # noqa
         image_feature = torch.from_numpy(tmp_image_feat)
 
+        cls_prob = image_info.get("cls_prob", None)
+        if cls_prob is not None:
+            # Padded like the features so that the class probabilities, used as
+            # targets by ViLBERT and LXMERT, are batched by the dataloader
+            cls_prob = np.asarray(cls_prob, dtype=np.float32)
+            num_boxes = min(len(cls_prob), self.max_loc)
+            tmp_cls_prob = np.zeros(
+                (self.max_loc, cls_prob.shape[-1]), dtype=np.float32
+            )
+            tmp_cls_prob[:num_boxes] = cls_prob[:num_boxes]
+            image_info["cls_prob"] = torch.from_numpy(tmp_cls_prob)
+
         del image_info["features"]
         image_info["max_features"] = torch.tensor(image_loc, dtype=torch.long)
         return image_feature, image_info
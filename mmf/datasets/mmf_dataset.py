@@ -24,7 +24,11 @@ class MMFDataset(BaseDataset):
         self._index = index
         self.annotation_db = self.build_annotation_db()
 
-        self._use_images = self.config.get("use_images", False)
+        # Images are only the inputs of the image encoder, so they aren't
+        # loaded when its outputs are cached
+        self._use_images = (
+            self.config.get("use_images", False) and not self.use_encoder_cache
+        )
         if self._use_images:
             self.image_db = self.build_image_db()
 
@@ -125,7 +125,7 @@ class MultiDatasetLoader:
                     f"Dataset {dataset} is missing from " "dataset_config in config."
                 )
 
-            dataset_instance = build_dataset(dataset, dataset_config, self.dataset_type)
+            dataset_instance = self._build_dataset(dataset, dataset_config)
             if dataset_instance is None:
                 continue
             self.datasets.append(dataset_instance)
@@ -142,6 +142,9 @@ class MultiDatasetLoader:
 
         self._infer_dataset_probabilities()
 
+    def _build_dataset(self, dataset_key, dataset_config):
+        return build_dataset(dataset_key, dataset_config, self.dataset_type)
+
     def build_dataloaders(self):
         assert len(self._datasets) > 0, "Call build_datasets first"
 
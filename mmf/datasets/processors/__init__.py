@@ -1,7 +1,10 @@
 # Copyright (c) Facebook, Inc. and its affiliates.
 
 from mmf.datasets.processors.bert_processors import MaskedTokenProcessor
-from mmf.datasets.processors.image_processors import TorchvisionTransforms
+from mmf.datasets.processors.image_processors import (
+    BatchedImageTransforms,
+    TorchvisionTransforms,
+)
 from mmf.datasets.processors.processors import (
     BaseProcessor,
     BBoxProcessor,
@@ -33,4 +36,5 @@ __all__ = [
     "CaptionProcessor",
     "MaskedTokenProcessor",
     "TorchvisionTransforms",
+    "BatchedImageTransforms",
 ]
@@ -1,58 +1,258 @@
 # Copyright (c) Facebook, Inc. and its affiliates.
 
-import random
-
+import fnmatch
+import glob
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
 import torch
 from mmf.common.registry import registry
-from mmf.common.sample import Sample, SampleList
 from mmf.datasets.processors.processors import BaseProcessor
+from mmf.utils.file_io import PathManager
 from transformers.tokenization_auto import AutoTokenizer
 
 
+logger = logging.getLogger(__name__)
+
+
+def get_tokenizer_hash(tokenizer) -> str:
+    """Hash of the vocabulary and casing of ``tokenizer``, which is the same
+    for the Python and the fast versions of a tokenizer.
+    """
+    vocab = sorted(tokenizer.get_vocab().items(), key=lambda x: x[1])
+    do_lower_case = getattr(
+        tokenizer, "do_lower_case", tokenizer.init_kwargs.get("do_lower_case")
+    )
+    content = json.dumps([vocab, do_lower_case])
+    return hashlib.md5(content.encode("utf-8")).hexdigest()
+
+
+class TokenIdStore:
+    """Token ids (without special tokens) of texts tokenized offline, e.g.
+    all of the questions of an annotation file, so that processors can skip
+    tokenization. A store is only valid for the tokenizer and the
+    ``max_seq_length`` it was built with, which are part of its file name.
+
+    Args:
+        texts (List[str]): Tokenized texts.
+        ids (List[List[int]]): Token ids of each of the texts.
+    """
+
+    def __init__(self, texts: List[str], ids: List[List[int]]):
+        self.texts = {text: idx for idx, text in enumerate(texts)}
+        lengths = np.array([len(x) for x in ids], dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(lengths)])
+        self.ids = np.fromiter(
+            (i for x in ids for i in x), dtype=np.int32, count=int(lengths.sum())
+        )
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __contains__(self, text):
+        return text in self.texts
+
+    def get(self, text: str) -> Optional[List[int]]:
+        idx = self.texts.get(text, None)
+        if idx is None:
+            return None
+        return self.ids[self.offsets[idx] : self.offsets[idx + 1]].tolist()
+
+    def update(self, other: "TokenIdStore"):
+        texts = list(self.texts.keys())
+        ids = [self.get(text) for text in texts]
+        for text in other.texts.keys():
+            if text not in self.texts:
+                texts.append(text)
+                ids.append(other.get(text))
+        self.__init__(texts, ids)
+
+    @staticmethod
+    def get_file_name(name: str, tokenizer_hash: str, max_seq_length: int) -> str:
+        return f"{name}_{tokenizer_hash}_{max_seq_length}.pt"
+
+    def save(self, path: str):
+        texts = sorted(self.texts.keys(), key=self.texts.get)
+        with PathManager.open(path, "wb") as f:
+            torch.save({"texts": texts, "ids": self.ids, "offsets": self.offsets}, f)
+
+    @classmethod
+    def load(cls, path: str) -> "TokenIdStore":
+        with PathManager.open(path, "rb") as f:
+            state = torch.load(f)
+        store = cls.__new__(cls)
+        store.texts = {text: idx for idx, text in enumerate(state["texts"])}
+        store.ids = state["ids"]
+        store.offsets = state["offsets"]
+        return store
+
+
 @registry.register_processor("masked_token")
 class MaskedTokenProcessor(BaseProcessor):
+    """Tokenizes one or two texts with a HuggingFace tokenizer into BERT
+    inputs, and randomly masks ``mask_probability`` of the tokens.
+
+    Set ``use_fast_tokenizer`` to use the Rust based tokenizer when
+    ``tokenizers`` is installed, and ``token_id_store`` to a store (or a
+    folder of stores) created with ``tools/scripts/bert/tokenize_annotations.py``
+    to skip tokenization of the texts it contains. :meth:`encode_batch`
+    processes a list of texts at once.
+    """
+
     _CLS_TOKEN = "[CLS]"
     _SEP_TOKEN = "[SEP]"
+    _MASK_TOKEN = "[MASK]"
 
     def __init__(self, config, *args, **kwargs):
         tokenizer_config = config.tokenizer_config
-        self._tokenizer = AutoTokenizer.from_pretrained(
-            tokenizer_config.type, **tokenizer_config.params
+        self._tokenizer = self._build_tokenizer(
+            tokenizer_config, config.get("use_fast_tokenizer", False)
         )
 
         self._max_seq_length = config.max_seq_length
         self._probability = getattr(config, "mask_probability", 0.15)
 
-    def get_vocab_size(self):
-        return len(self._tokenizer)
-
-    def tokenize(self, tokens):
-        return self._tokenizer.tokenize(tokens)
+        self._cls_id = self._tokenizer.convert_tokens_to_ids(self._CLS_TOKEN)
+        self._sep_id = self._tokenizer.convert_tokens_to_ids(self._SEP_TOKEN)
+        self._mask_id = self._tokenizer.convert_tokens_to_ids(self._MASK_TOKEN)
+
+        self._token_id_store = None
+        store_path = config.get("token_id_store", None)
+        if store_path is not None:
+            self._token_id_store = self._load_token_id_store(store_path)
+
+    def _build_tokenizer(self, tokenizer_config, use_fast):
+        if use_fast:
+            try:
+                tokenizer = AutoTokenizer.from_pretrained(
+                    tokenizer_config.type, use_fast=True, **tokenizer_config.params
+                )
+                if getattr(tokenizer, "is_fast", False):
+                    return tokenizer
+            except (ImportError, ValueError) as e:
+                logger.warning(f"Fast tokenizer failed to load: {e}")
+            logger.warning(
+                f"No fast tokenizer for {tokenizer_config.type}, "
+                + "falling back to the Python tokenizer"
+            )
+        return AutoTokenizer.from_pretrained(
+            tokenizer_config.type, **tokenizer_config.params
+        )
 
-    def _random_word(self, tokens, probability=0.15):
-        labels = []
-        for idx, token in enumerate(tokens):
-            prob = random.random()
+    def _load_token_id_store(self, path):
+        tokenizer_hash = get_tokenizer_hash(self._tokenizer)
+        pattern = TokenIdStore.get_file_name("*", tokenizer_hash, self._max_seq_length)
+        if PathManager.isfile(path):
+            files = [path]
+            if not fnmatch.fnmatch(os.path.basename(path), pattern):
+                logger.warning(
+                    f"Token id store {path} was built with another tokenizer or "
+                    + "max_seq_length, ignoring it"
+                )
+                return None
+        else:
+            files = sorted(glob.glob(os.path.join(path, pattern)))
 
-            if prob < probability:
-                prob /= probability
+        store = None
+        for file in files:
+            if store is None:
+                store = TokenIdStore.load(file)
+            else:
+                store.update(TokenIdStore.load(file))
+        if store is None:
+            logger.warning(f"No token id store for this tokenizer found in {path}")
+        return store
+
+    def build_token_id_store(
+        self, texts: List[str], batch_size: int = 4096
+    ) -> TokenIdStore:
+        """Tokenizes ``texts`` in batches into a :class:`TokenIdStore` which
+        can be saved as :meth:`get_token_id_store_file_name` and passed as
+        ``token_id_store`` to this processor.
+        """
+        texts = list(dict.fromkeys(texts))
+        ids = []
+        for start in range(0, len(texts), batch_size):
+            batch = self.batch_tokenize_to_ids(texts[start : start + batch_size])
+            # Longer sequences are always truncated
+            ids.extend(x[: self._max_seq_length - 2] for x in batch)
+        return TokenIdStore(texts, ids)
+
+    def get_token_id_store_file_name(self, name: str) -> str:
+        return TokenIdStore.get_file_name(
+            name, get_tokenizer_hash(self._tokenizer), self._max_seq_length
+        )
 
-                # 80% randomly change token to mask token
-                if prob < 0.8:
-                    tokens[idx] = "[MASK]"
-                # 10% randomly change token to random token
-                elif prob < 0.9:
-                    tokens[idx] = self._tokenizer.convert_ids_to_tokens(
-                        torch.randint(len(self._tokenizer), (1,), dtype=torch.long)
-                    )[0]
+    @property
+    def deterministic(self):
+        return self._probability == 0
 
-                # rest 10% keep the original token as it is
+    def get_vocab_size(self):
+        return len(self._tokenizer)
 
-                labels.append(self._tokenizer.convert_tokens_to_ids(token))
-            else:
-                labels.append(-1)
+    def tokenize(self, tokens):
+        return self._tokenizer.tokenize(tokens)
 
-        return tokens, labels
+    def tokenize_to_ids(self, text: str) -> List[int]:
+        if self._token_id_store is not None:
+            ids = self._token_id_store.get(text)
+            if ids is not None:
+                return ids
+        return self._tokenizer.convert_tokens_to_ids(self.tokenize(text))
+
+    def batch_tokenize_to_ids(self, texts: List[str]) -> List[List[int]]:
+        """Returns token ids of each of ``texts``, from the token id store
+        when possible, with a single call to the tokenizer for the others.
+        """
+        ids = [None] * len(texts)
+        if self._token_id_store is not None:
+            ids = [self._token_id_store.get(text) for text in texts]
+
+        missing = [idx for idx, x in enumerate(ids) if x is None]
+        if len(missing) == 0:
+            return ids
+
+        missing_texts = [texts[idx] for idx in missing]
+        if getattr(self._tokenizer, "is_fast", False):
+            # Tokenized in parallel by the Rust tokenizer
+            encoded = self._tokenizer(
+                missing_texts, add_special_tokens=False, return_attention_mask=False
+            )["input_ids"]
+        else:
+            encoded = [
+                self._tokenizer.convert_tokens_to_ids(self.tokenize(text))
+                for text in missing_texts
+            ]
+        for idx, x in zip(missing, encoded):
+            ids[idx] = x
+        return ids
+
+    def _random_word(self, input_ids, maskable, probability=0.15):
+        """Masks ``probability`` of the ``maskable`` positions of
+        ``input_ids``: 80% are replaced with the mask token, 10% with a
+        random token and 10% are kept. Returns the masked ids and the labels,
+        which are the original ids at masked positions and -1 elsewhere.
+        """
+        lm_label_ids = torch.full_like(input_ids, -1)
+        if probability <= 0:
+            return input_ids, lm_label_ids
+
+        prob = torch.rand(input_ids.size())
+        masked = maskable & (prob < probability)
+        lm_label_ids[masked] = input_ids[masked]
+
+        prob /= probability
+        input_ids = input_ids.clone()
+        input_ids[masked & (prob < 0.8)] = self._mask_id
+        randomized = masked & (prob >= 0.8) & (prob < 0.9)
+        input_ids[randomized] = torch.randint(
+            len(self._tokenizer), (int(randomized.sum()),), dtype=torch.long
+        )
+        return input_ids, lm_label_ids
 
     def _truncate_seq_pair(self, tokens_a, tokens_b, max_length):
         """Truncates a sequence pair in place to the maximum length."""
@@ -71,48 +271,64 @@ class MaskedTokenProcessor(BaseProcessor):
                 + " and 3 in case of two sentences."
             )
 
-        while True:
-            total_length = len(tokens_a) + len(tokens_b)
-            if total_length <= max_length:
-                break
-            if len(tokens_a) > len(tokens_b):
-                tokens_a.pop()
-            else:
-                tokens_b.pop()
-
-    def _convert_to_indices(self, tokens_a, tokens_b=None, probability=0.15):
-        tokens_a, label_a = self._random_word(tokens_a, probability=probability)
-        tokens = [self._CLS_TOKEN] + tokens_a + [self._SEP_TOKEN]
-        segment_ids = [0] + [0] * len(tokens_a) + [0]
-
-        if tokens_b:
-            tokens_b, label_b = self._random_word(tokens_b, probability=probability)
-            lm_label_ids = [-1] + label_a + [-1] + label_b + [-1]
-            assert len(tokens_b) > 0
-            tokens += tokens_b + [self._SEP_TOKEN]
-            segment_ids += [1] * len(tokens_b) + [1]
+        len_a, len_b = len(tokens_a), len(tokens_b)
+        if len_a + len_b <= max_length:
+            return
+        # Same result as popping one token at a time from the longer sequence
+        # (from tokens_b on ties), without the loop
+        share_a = (max_length + 1) // 2
+        if len_a <= share_a:
+            len_b = max_length - len_a
+        elif len_b <= max_length - share_a:
+            len_a = max_length - len_b
         else:
-            lm_label_ids = [-1] + label_a + [-1]
-
-        input_ids = self._tokenizer.convert_tokens_to_ids(tokens)
-        input_mask = [1] * len(input_ids)
-
-        # Zero-pad up to the sequence length.
-        while len(input_ids) < self._max_seq_length:
-            input_ids.append(0)
-            input_mask.append(0)
-            segment_ids.append(0)
-            lm_label_ids.append(-1)
-
-        assert len(input_ids) == self._max_seq_length
-        assert len(input_mask) == self._max_seq_length
-        assert len(segment_ids) == self._max_seq_length
-        assert len(lm_label_ids) == self._max_seq_length
-
-        input_ids = torch.tensor(input_ids, dtype=torch.long)
-        input_mask = torch.tensor(input_mask, dtype=torch.long)
-        segment_ids = torch.tensor(segment_ids, dtype=torch.long)
-        lm_label_ids = torch.tensor(lm_label_ids, dtype=torch.long)
+            len_a, len_b = share_a, max_length - share_a
+        del tokens_a[len_a:]
+        del tokens_b[len_b:]
+
+    def _convert_ids_to_indices(self, ids_a, ids_b=None, probability=0.15):
+        """Builds padded BERT inputs of size ``(len(ids_a), max_seq_length)``
+        for lists of truncated token ids ``ids_a`` and optionally ``ids_b``,
+        as ``[CLS] ids_a [SEP] ids_b [SEP]``.
+        """
+        batch_size = len(ids_a)
+        if ids_b is None:
+            ids_b = [None] * batch_size
+
+        size = (batch_size, self._max_seq_length)
+        input_ids = torch.zeros(size, dtype=torch.long)
+        input_mask = torch.zeros(size, dtype=torch.long)
+        segment_ids = torch.zeros(size, dtype=torch.long)
+        maskable = torch.zeros(size, dtype=torch.bool)
+
+        lengths = []
+        for idx, (a, b) in enumerate(zip(ids_a, ids_b)):
+            end_a = len(a) + 1
+            input_ids[idx, 0] = self._cls_id
+            input_ids[idx, 1:end_a] = torch.tensor(a, dtype=torch.long)
+            input_ids[idx, end_a] = self._sep_id
+            maskable[idx, 1:end_a] = True
+            length = end_a + 1
+
+            if b:
+                end_b = length + len(b)
+                input_ids[idx, length:end_b] = torch.tensor(b, dtype=torch.long)
+                input_ids[idx, end_b] = self._sep_id
+                maskable[idx, length:end_b] = True
+                segment_ids[idx, length : end_b + 1] = 1
+                length = end_b + 1
+
+            assert length <= self._max_seq_length
+            input_mask[idx, :length] = 1
+            lengths.append(length)
+
+        input_ids, lm_label_ids = self._random_word(
+            input_ids, maskable, probability=probability
+        )
+        tokens = [
+            self._tokenizer.convert_ids_to_tokens(ids[:length])
+            for ids, length in zip(input_ids.tolist(), lengths)
+        ]
         return {
             "input_ids": input_ids,
             "input_mask": input_mask,
@@ -121,20 +337,56 @@ class MaskedTokenProcessor(BaseProcessor):
             "tokens": tokens,
         }
 
+    def _convert_to_indices(self, tokens_a, tokens_b=None, probability=0.15):
+        ids_a = self._tokenizer.convert_tokens_to_ids(tokens_a)
+        ids_b = None
+        if tokens_b:
+            ids_b = [self._tokenizer.convert_tokens_to_ids(tokens_b)]
+        output = self._convert_ids_to_indices([ids_a], ids_b, probability)
+        return {key: value[0] for key, value in output.items()}
+
+    def encode_batch(
+        self,
+        texts_a: List[str],
+        texts_b: Optional[List[Optional[str]]] = None,
+        probability: Optional[float] = None,
+    ) -> Dict[str, torch.Tensor]:
+        """Batched version of :meth:`__call__`: tokenizes all of the texts
+        with one call to the tokenizer, masks all of the ids at once and
+        returns tensors of size ``(len(texts_a), max_seq_length)``.
+        """
+        if probability is None:
+            probability = self._probability
+
+        ids_a = self.batch_tokenize_to_ids(texts_a)
+        ids_b = None
+        if texts_b is not None:
+            non_empty = [idx for idx, text in enumerate(texts_b) if text]
+            encoded = self.batch_tokenize_to_ids([texts_b[idx] for idx in non_empty])
+            ids_b = [None] * len(texts_a)
+            for idx, ids in zip(non_empty, encoded):
+                ids_b[idx] = ids
+
+        for idx in range(len(ids_a)):
+            ids_b_idx = ids_b[idx] if ids_b is not None else None
+            self._truncate_seq_pair(ids_a[idx], ids_b_idx, self._max_seq_length - 2)
+        return self._convert_ids_to_indices(ids_a, ids_b, probability)
+
     def __call__(self, item):
         text_a = item["text_a"]
         text_b = item.get("text_b", None)
 
-        tokens_a = self.tokenize(text_a)
-        tokens_b = None
+        ids_a = self.tokenize_to_ids(text_a)
+        ids_b = None
 
         if text_b:
-            tokens_b = self.tokenize(text_b)
+            ids_b = self.tokenize_to_ids(text_b)
 
-        self._truncate_seq_pair(tokens_a, tokens_b, self._max_seq_length - 2)
-        output = self._convert_to_indices(
-            tokens_a, tokens_b, probability=self._probability
+        self._truncate_seq_pair(ids_a, ids_b, self._max_seq_length - 2)
+        output = self._convert_ids_to_indices(
+            [ids_a], [ids_b], probability=self._probability
         )
+        output = {key: value[0] for key, value in output.items()}
         output["is_correct"] = torch.tensor(item["is_correct"], dtype=torch.long)
 
         return output
@@ -146,8 +398,7 @@ class BertTokenizer(MaskedTokenProcessor):
         super().__init__(config, *args, **kwargs)
         self._probability = 0
 
-    def __call__(self, item):
-
+    def _get_text(self, item):
         if "text" in item:
             text_a = item["text"]
         else:
@@ -155,20 +406,36 @@ class BertTokenizer(MaskedTokenProcessor):
 
         if isinstance(text_a, list):
             text_a = " ".join(text_a)
+        return text_a
 
-        tokens_a = self.tokenize(text_a)
+    def __call__(self, item):
+        text_a = self._get_text(item)
+        ids_a = self.tokenize_to_ids(text_a)
 
         # 'text_b' can be defined in the dataset preparation
-        tokens_b = None
+        ids_b = None
         if "text_b" in item:
             text_b = item["text_b"]
             if text_b:
-                tokens_b = self.tokenize(text_b)
+                ids_b = self.tokenize_to_ids(text_b)
 
-        self._truncate_seq_pair(tokens_a, tokens_b, self._max_seq_length - 2)
-        output = self._convert_to_indices(
-            tokens_a, tokens_b, probability=self._probability
+        self._truncate_seq_pair(ids_a, ids_b, self._max_seq_length - 2)
+        output = self._convert_ids_to_indices(
+            [ids_a], [ids_b], probability=self._probability
         )
+        output = {key: value[0] for key, value in output.items()}
+        output["text"] = output["tokens"]
+        return output
+
+    def process_batch(self, items: List[Dict]) -> Dict[str, torch.Tensor]:
+        """Processes a list of items at once, see :meth:`encode_batch`.
+        Outputs are stacked along the first dimension.
+        """
+        texts_a = [self._get_text(item) for item in items]
+        texts_b = None
+        if any("text_b" in item for item in items):
+            texts_b = [item.get("text_b", None) for item in items]
+        output = self.encode_batch(texts_a, texts_b)
         output["text"] = output["tokens"]
         return output
 
@@ -184,25 +451,22 @@ class MultiSentenceBertTokenizer(BertTokenizer):
     def __init__(self, config, *args, **kwargs):
         super().__init__(config, *args, **kwargs)
         self.fusion_strategy = config.get("fusion", "concat")
-        self.tokenizer = super().__call__
 
     def __call__(self, item):
         texts = item["text"]
         if not isinstance(texts, list):
             texts = [texts]
-
-        processed = []
-        for idx, text in enumerate(texts):
-            sample = Sample()
-            processed_text = self.tokenizer({"text": text})
-            sample.update(processed_text)
-            sample.segment_ids.fill_(idx)
-            processed.append(sample)
-        # Use SampleList to convert list of tensors to stacked tensors
-        processed = SampleList(processed)
+        texts = [" ".join(text) if isinstance(text, list) else text for text in texts]
+
+        # All of the sentences are tokenized as a batch
+        processed = self.encode_batch(texts)
+        processed["text"] = processed["tokens"]
+        processed["segment_ids"] = (
+            torch.arange(len(texts)).unsqueeze(1).expand_as(processed["input_ids"])
+        ).clone()
         if self.fusion_strategy == "concat":
-            processed.input_ids = processed.input_ids.view(-1)
-            processed.input_mask = processed.input_mask.view(-1)
-            processed.segment_ids = processed.segment_ids.view(-1)
-            processed.lm_label_ids = processed.lm_label_ids.view(-1)
-        return processed.to_dict()
+            processed["input_ids"] = processed["input_ids"].view(-1)
+            processed["input_mask"] = processed["input_mask"].view(-1)
+            processed["segment_ids"] = processed["segment_ids"].view(-1)
+            processed["lm_label_ids"] = processed["lm_label_ids"].view(-1)
+        return processed
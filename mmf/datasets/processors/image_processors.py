@@ -1,8 +1,10 @@
 # Copyright (c) Facebook, Inc. and its affiliates.
 
 import collections
+import logging
 import math
 import random
+import time
 import warnings
 
 import torch
@@ -12,6 +14,9 @@ from omegaconf import OmegaConf
 from torchvision import transforms
 
 
+logger = logging.getLogger(__name__)
+
+
 @registry.register_processor("torchvision_transforms")
 class TorchvisionTransforms(BaseProcessor):
     def __init__(self, config, *args, **kwargs):
@@ -154,3 +159,482 @@ class NormalizeBGR255(BaseProcessor):
 
             return padded_image
         return image
+
+
+class BatchImageTransform(BaseProcessor):
+    """Base class for transforms used inside ``batched_image_transforms``.
+    A batch transform takes a ``(B, C, H, W)`` tensor of images zero padded
+    to the same size and a ``(B, 2)`` long tensor with the (h, w) size of
+    the valid region of each image. It returns both after transformation.
+    ``sizes`` is None when all of the images fill the whole batch tensor.
+    """
+
+    def __call__(self, images, sizes):
+        raise NotImplementedError
+
+
+def get_batch_image_sizes(images, sizes=None):
+    if sizes is not None:
+        return sizes
+    batch_size, _, height, width = images.size()
+    sizes = torch.tensor([height, width], dtype=torch.long, device=images.device)
+    return sizes.unsqueeze(0).expand(batch_size, 2)
+
+
+def get_valid_mask(images, sizes):
+    """Returns a ``(B, 1, H, W)`` mask in the dtype of ``images`` which is one
+    on the valid region of each image and zero on its padding.
+    """
+    _, _, height, width = images.size()
+    rows = torch.arange(height, device=images.device).view(1, height, 1)
+    cols = torch.arange(width, device=images.device).view(1, 1, width)
+    mask = (rows < sizes[:, 0].view(-1, 1, 1)) & (cols < sizes[:, 1].view(-1, 1, 1))
+    return mask.unsqueeze(1).to(images.dtype)
+
+
+def pad_images(samples, image_key="image", size_key="image_size"):
+    """Zero pads the images of a list of samples to the largest height and
+    width among them so that they can be collated into a batch tensor. The
+    (h, w) size of the valid region of each image is set under ``size_key``
+    unless the sample already has one, e.g. from ``decoded_image_cache``.
+    Samples are returned as is if all of their images have the same size.
+    """
+    images = [sample[image_key] for sample in samples if image_key in sample]
+    if len({image.size() for image in images}) <= 1:
+        return samples
+
+    height = max(image.size(-2) for image in images)
+    width = max(image.size(-1) for image in images)
+    for sample in samples:
+        if image_key not in sample:
+            continue
+        image = sample[image_key]
+        padded = image.new_zeros(image.size()[:-2] + (height, width))
+        padded[..., : image.size(-2), : image.size(-1)] = image
+        sample[image_key] = padded
+        if size_key not in sample:
+            sample[size_key] = torch.tensor(image.size()[-2:], dtype=torch.long)
+    return samples
+
+
+def crop_batch(images, offsets, size, sizes):
+    """Crops a ``size`` (h, w) window at per image (top, left) ``offsets``
+    out of the valid region of each image, whose (h, w) are in ``sizes``.
+    Returns the crops and their valid sizes, which are smaller than ``size``
+    for the images that are smaller than the window. The rest of the crops
+    is zero padded.
+    """
+    batch_size, channels, max_height, max_width = images.size()
+    height, width = size
+    output_sizes = torch.min(sizes - offsets, sizes.new_tensor(size))
+    rows = torch.arange(height, device=images.device).unsqueeze(0)
+    cols = torch.arange(width, device=images.device).unsqueeze(0)
+    valid_rows = rows < output_sizes[:, 0:1]
+    valid_cols = cols < output_sizes[:, 1:2]
+    rows = (offsets[:, 0:1] + rows).clamp(max=max_height - 1)
+    cols = (offsets[:, 1:2] + cols).clamp(max=max_width - 1)
+
+    rows = rows.view(batch_size, 1, height, 1).expand(-1, channels, -1, max_width)
+    images = images.gather(2, rows)
+    cols = cols.view(batch_size, 1, 1, width).expand(-1, channels, height, -1)
+    images = images.gather(3, cols)
+
+    mask = valid_rows.view(batch_size, 1, height, 1) & valid_cols.view(
+        batch_size, 1, 1, width
+    )
+    return images * mask.to(images.dtype), output_sizes
+
+
+def _crops_are_full(images, sizes, size):
+    # Known without a device sync when the images fill the batch tensor
+    height, width = size
+    return sizes is None and images.size(2) >= height and images.size(3) >= width
+
+
+def _to_size_tuple(size):
+    if isinstance(size, collections.abc.Sequence):
+        return tuple(size)
+    return (size, size)
+
+
+@registry.register_processor("BatchCenterCrop")
+class BatchCenterCrop(BatchImageTransform):
+    def __init__(self, *args, **kwargs):
+        self.size = _to_size_tuple(kwargs["size"])
+
+    def __call__(self, images, sizes):
+        valid_sizes = get_batch_image_sizes(images, sizes)
+        crop_size = valid_sizes.new_tensor(self.size)
+        offsets = ((valid_sizes - crop_size) // 2).clamp(min=0)
+        full = _crops_are_full(images, sizes, self.size)
+        images, output_sizes = crop_batch(images, offsets, self.size, valid_sizes)
+        return images, None if full else output_sizes
+
+
+@registry.register_processor("BatchRandomCrop")
+class BatchRandomCrop(BatchImageTransform):
+    def __init__(self, *args, **kwargs):
+        self.size = _to_size_tuple(kwargs["size"])
+
+    def __call__(self, images, sizes):
+        valid_sizes = get_batch_image_sizes(images, sizes)
+        crop_size = valid_sizes.new_tensor(self.size)
+        max_offsets = (valid_sizes - crop_size).clamp(min=0) + 1
+        offsets = (
+            torch.rand(valid_sizes.size(), device=valid_sizes.device) * max_offsets
+        ).long()
+        full = _crops_are_full(images, sizes, self.size)
+        images, output_sizes = crop_batch(images, offsets, self.size, valid_sizes)
+        return images, None if full else output_sizes
+
+
+@registry.register_processor("BatchNormalize")
+class BatchNormalize(BatchImageTransform):
+    """Converts uint8 images to float in [0, 1] and normalizes them with
+    ``mean`` and ``std``, same as ``ToTensor`` followed by ``Normalize``.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.mean = kwargs["mean"]
+        self.std = kwargs["std"]
+
+    def __call__(self, images, sizes):
+        if not images.is_floating_point():
+            images = images.float().div_(255)
+        mean = images.new_tensor(self.mean).view(1, -1, 1, 1)
+        std = images.new_tensor(self.std).view(1, -1, 1, 1)
+        images = (images - mean) / std
+        if sizes is not None:
+            # Keep the padding at zero
+            images = images * get_valid_mask(images, sizes)
+        return images, sizes
+
+
+def _to_float(images):
+    """Returns float images and a function to cast results back to the input
+    dtype, so that uint8 images stay uint8 through geometric transforms.
+    """
+    if images.is_floating_point():
+        return images, lambda x: x
+    dtype = images.dtype
+    return images.float(), lambda x: x.round_().clamp_(0, 255).to(dtype)
+
+
+def _source_coords(output_length, sizes, output_sizes):
+    # Source pixel of each output pixel per image, same as interpolate with
+    # align_corners=False but clamped to the valid region of the image
+    coords = torch.arange(output_length, device=sizes.device, dtype=sizes.dtype)
+    coords = (coords.unsqueeze(0) + 0.5) * (sizes / output_sizes).unsqueeze(1) - 0.5
+    return torch.min(coords.clamp(min=0), (sizes - 1).unsqueeze(1))
+
+
+def _resize_each(images, sizes, output_sizes, size):
+    """Resizes the valid region of each image to its output size with
+    bilinear interpolation and pads the results into a new batch tensor of
+    (h, w) ``size``. All images are resized at once with ``grid_sample``, so
+    no sizes have to be read back from the device.
+    """
+    images, cast = _to_float(images)
+    batch_size, _, input_height, input_width = images.size()
+    height, width = size
+    sizes = sizes.to(images.dtype)
+    output_sizes = output_sizes.to(images.dtype)
+
+    rows = _source_coords(height, sizes[:, 0], output_sizes[:, 0])
+    cols = _source_coords(width, sizes[:, 1], output_sizes[:, 1])
+    # Normalize to [-1, 1] over the padded images, grid is (x, y)
+    rows = (2 * rows + 1) / input_height - 1
+    cols = (2 * cols + 1) / input_width - 1
+    grid = torch.stack(
+        [
+            cols.view(batch_size, 1, width).expand(-1, height, -1),
+            rows.view(batch_size, height, 1).expand(-1, -1, width),
+        ],
+        dim=3,
+    )
+    output = torch.nn.functional.grid_sample(
+        images, grid, mode="bilinear", padding_mode="border", align_corners=False
+    )
+    return cast(output * get_valid_mask(output, output_sizes))
+
+
+@registry.register_processor("BatchResize")
+class BatchResize(BatchImageTransform):
+    """Resizes all images to ``size`` (h, w) with bilinear interpolation"""
+
+    def __init__(self, *args, **kwargs):
+        self.size = _to_size_tuple(kwargs["size"])
+
+    def __call__(self, images, sizes):
+        if sizes is None:
+            images, cast = _to_float(images)
+            images = torch.nn.functional.interpolate(
+                images, size=self.size, mode="bilinear", align_corners=False
+            )
+            return cast(images), None
+
+        output_sizes = sizes.new_tensor(self.size).expand_as(sizes)
+        return _resize_each(images, sizes, output_sizes, self.size), None
+
+
+@registry.register_processor("BatchResizeShortest")
+class BatchResizeShortest(BatchImageTransform):
+    """Batched version of ``ResizeShortest``. A single ``min_size`` is picked
+    per batch. Images are padded to (``max_size``, ``max_size``), which bounds
+    both sides of every output, and their sizes are returned. Without a
+    ``max_size`` they are padded to the largest output size in the batch,
+    which has to be read back from the device.
+    """
+
+    def __init__(self, *args, **kwargs):
+        min_size = kwargs["min_size"]
+        if not isinstance(min_size, (list, tuple)):
+            min_size = (min_size,)
+        self.min_size = min_size
+        self.max_size = kwargs.get("max_size", None)
+
+    def get_sizes(self, sizes):
+        sizes = sizes.float()
+        size = float(random.choice(self.min_size))
+        min_original_size = sizes.min(dim=1)[0]
+        max_original_size = sizes.max(dim=1)[0]
+        size = torch.full_like(min_original_size, size)
+        if self.max_size is not None:
+            capped = torch.floor(self.max_size * min_original_size / max_original_size)
+            size = torch.where(
+                max_original_size / min_original_size * size > self.max_size,
+                capped,
+                size,
+            )
+        scale = size / min_original_size
+        output_sizes = (sizes * scale.unsqueeze(1)).long()
+        # Keep the shortest side exactly at size, same as ResizeShortest
+        shortest = sizes.argmin(dim=1, keepdim=True)
+        return output_sizes.scatter_(1, shortest, size.long().unsqueeze(1))
+
+    def __call__(self, images, sizes):
+        sizes = get_batch_image_sizes(images, sizes)
+        output_sizes = self.get_sizes(sizes)
+        if self.max_size is not None:
+            size = (self.max_size, self.max_size)
+        else:
+            size = tuple(output_sizes.max(dim=0)[0].tolist())
+        return _resize_each(images, sizes, output_sizes, size), output_sizes
+
+
+@registry.register_processor("BatchRandomHorizontalFlip")
+class BatchRandomHorizontalFlip(BatchImageTransform):
+    """Flips the valid region of each image horizontally with probability
+    ``p``, padding stays on the right.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.p = kwargs.get("p", 0.5)
+
+    def __call__(self, images, sizes):
+        batch_size, channels, height, width = images.size()
+        widths = get_batch_image_sizes(images, sizes)[:, 1:2]
+        flip = torch.rand(batch_size, 1, device=images.device) < self.p
+
+        cols = torch.arange(width, device=images.device).unsqueeze(0)
+        flipped_cols = torch.where(cols < widths, widths - 1 - cols, cols)
+        cols = torch.where(flip, flipped_cols, cols.expand(batch_size, -1))
+        cols = cols.view(batch_size, 1, 1, width).expand(-1, channels, height, -1)
+        return images.gather(3, cols), sizes
+
+
+@registry.register_processor("BatchColorJitter")
+class BatchColorJitter(BatchImageTransform):
+    """Batched version of torchvision's ``ColorJitter`` for brightness,
+    contrast and saturation, with factors sampled independently per image.
+    Adjustments are always applied in that order. Float images are expected
+    to be in [0, 1].
+    """
+
+    GRAY_WEIGHTS = [0.299, 0.587, 0.114]
+
+    def __init__(self, *args, **kwargs):
+        self.brightness = kwargs.get("brightness", 0)
+        self.contrast = kwargs.get("contrast", 0)
+        self.saturation = kwargs.get("saturation", 0)
+
+    def _factors(self, value, images):
+        low = max(0.0, 1 - value)
+        factors = torch.empty(images.size(0), 1, 1, 1, device=images.device)
+        return factors.uniform_(low, 1 + value)
+
+    def _grayscale(self, images):
+        weights = images.new_tensor(self.GRAY_WEIGHTS).view(1, 3, 1, 1)
+        return (images * weights).sum(dim=1, keepdim=True)
+
+    def __call__(self, images, sizes):
+        is_uint8 = not images.is_floating_point()
+        if is_uint8:
+            images = images.float().div_(255)
+
+        if self.brightness > 0:
+            images = images * self._factors(self.brightness, images)
+
+        if self.contrast > 0:
+            gray = self._grayscale(images)
+            if sizes is None:
+                mean = gray.mean(dim=(1, 2, 3), keepdim=True)
+            else:
+                mask = get_valid_mask(images, sizes)
+                mean = (gray * mask).sum(dim=(1, 2, 3), keepdim=True) / mask.sum(
+                    dim=(1, 2, 3), keepdim=True
+                )
+            factors = self._factors(self.contrast, images)
+            images = factors * images + (1 - factors) * mean
+
+        if self.saturation > 0:
+            factors = self._factors(self.saturation, images)
+            images = factors * images + (1 - factors) * self._grayscale(images)
+
+        images = images.clamp(0, 1)
+        if sizes is not None:
+            # Contrast and saturation shift the padding as well
+            images = images * get_valid_mask(images, sizes)
+        if is_uint8:
+            images = images.mul_(255).round_().to(torch.uint8)
+        return images, sizes
+
+
+@registry.register_processor("BatchGrayScaleTo3Channels")
+class BatchGrayScaleTo3Channels(BatchImageTransform):
+    def __init__(self, *args, **kwargs):
+        return
+
+    def __call__(self, images, sizes):
+        if images.size(1) == 1:
+            images = images.expand(-1, 3, -1, -1)
+        return images, sizes
+
+
+@registry.register_processor("BatchNormalizeBGR255")
+class BatchNormalizeBGR255(BatchImageTransform):
+    """Batched version of ``NormalizeBGR255``. Images don't need to be padded
+    with ``pad_size`` as the batch is already padded.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.mean = kwargs["mean"]
+        self.std = kwargs["std"]
+        self.to_bgr255 = kwargs["to_bgr255"]
+
+    def __call__(self, images, sizes):
+        if images.is_floating_point():
+            scale = 255
+        else:
+            # uint8 images are already in [0, 255]
+            images = images.float()
+            scale = 1
+        if self.to_bgr255:
+            images = images[:, [2, 1, 0]] * scale
+        mean = images.new_tensor(self.mean).view(1, -1, 1, 1)
+        std = images.new_tensor(self.std).view(1, -1, 1, 1)
+        images = (images - mean) / std
+        if sizes is not None:
+            images = images * get_valid_mask(images, sizes)
+        return images, sizes
+
+
+@registry.register_processor("batched_image_transforms")
+class BatchedImageTransforms(BaseProcessor):
+    """Applies image transforms to a whole batch of images at once instead
+    of per sample inside the dataset's ``__getitem__``. Samples are expected
+    to contain uint8 or float images, along with their valid (h, w) size
+    under ``size_key`` if they are padded, e.g. as returned by ImageDatabase's
+    ``decoded_image_cache``. Images of different sizes are zero padded to the
+    largest one of the batch by ``collate_samples`` before they are collated,
+    which sets their sizes. The transforms keep the padding at zero.
+
+    ``stage`` decides where the transforms are applied: ``collate`` runs them
+    in the dataloader's collate function right after the batch is created,
+    ``device`` runs them in the dataset's ``prepare_batch`` after the batch
+    has been moved to the device, which takes the work off the dataloader
+    workers when training with image encoders. Datasets pick up these
+    processors automatically in ``init_processors``, so they shouldn't be
+    called from ``__getitem__``.
+
+    Available transforms are BatchResize, BatchResizeShortest,
+    BatchCenterCrop, BatchRandomCrop, BatchRandomHorizontalFlip,
+    BatchColorJitter, BatchGrayScaleTo3Channels, BatchNormalize and
+    BatchNormalizeBGR255.
+
+    Example Config::
+
+        image_batch_processor:
+          type: batched_image_transforms
+          params:
+            stage: collate
+            transforms:
+              - type: BatchRandomCrop
+                params:
+                  size: [224, 224]
+              - type: BatchNormalize
+                params:
+                  mean: [0.46777044, 0.44531429, 0.40661017]
+                  std: [0.12221994, 0.12145835, 0.14380469]
+    """
+
+    STAGES = ("collate", "device")
+
+    def __init__(self, config, *args, **kwargs):
+        self.batch_stage = config.get("stage", "collate")
+        assert (
+            self.batch_stage in self.STAGES
+        ), f"stage must be one of {self.STAGES}, got {self.batch_stage}"
+        self.image_key = config.get("image_key", "image")
+        self.size_key = config.get("size_key", "image_size")
+        self.log_interval = config.get("log_interval", 100)
+
+        transforms_list = []
+        for param in config.transforms:
+            transform_type = param.type
+            transform_param = param.get("params", OmegaConf.create({}))
+            transform = registry.get_processor_class(transform_type)
+            assert transform is not None and issubclass(
+                transform, BatchImageTransform
+            ), f"{transform_type} is not a registered batch image transform"
+            transform_param = OmegaConf.to_container(transform_param)
+            transforms_list.append(transform(**transform_param))
+
+        self.transforms = transforms_list
+        self.timings = collections.defaultdict(float)
+        self._num_batches = 0
+
+    def collate_samples(self, samples):
+        # Runs in the collate function for both stages, as images of different
+        # sizes can't be collated
+        return pad_images(samples, self.image_key, self.size_key)
+
+    def __call__(self, sample_list):
+        if self.image_key not in sample_list:
+            return sample_list
+
+        images = sample_list[self.image_key]
+        sizes = sample_list.get(self.size_key, None)
+        for transform in self.transforms:
+            start = time.perf_counter()
+            images, sizes = transform(images, sizes)
+            self.timings[transform.__class__.__name__] += time.perf_counter() - start
+
+        sample_list[self.image_key] = images
+        if self.size_key in sample_list:
+            sample_list[self.size_key] = get_batch_image_sizes(images, sizes)
+
+        self._log_timings()
+        return sample_list
+
+    def _log_timings(self):
+        self._num_batches += 1
+        if self._num_batches % self.log_interval != 0:
+            return
+
+        timings = ", ".join(f"{k}: {v:.3f}s" for k, v in self.timings.items())
+        logger.debug(
+            f"batched_image_transforms ({self.batch_stage}) timings over "
+            + f"{self.log_interval} batches: {timings}"
+        )
+        self.timings.clear()
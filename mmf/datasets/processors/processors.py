@@ -68,10 +68,12 @@ Example::
 
 import collections
 import copy
+import hashlib
 import logging
 import os
 import random
 import re
+import time
 import warnings
 from collections import Counter, defaultdict
 from dataclasses import dataclass
@@ -100,12 +102,18 @@ class BaseProcessor:
     """Every processor in MMF needs to inherit this class for compatibility
     with MMF. End user mainly needs to implement ``__call__`` function.
 
+    Processors which always return the same output for the same input can set
+    ``deterministic`` to True, which allows their outputs to be cached by
+    :class:`Processor` when ``cache_size`` is set in their config.
+
     Args:
         config (DictConfig): Config for this processor, containing `type` and
                              `params` attributes if available.
 
     """
 
+    deterministic = False
+
     def __init__(self, config: Dict[str, Any], *args, **kwargs):
         return
 
@@ -123,6 +131,152 @@ class BaseProcessor:
         return item
 
 
+class ProcessorStats:
+    """Call counts, latencies and cache hits of :class:`Processor` calls,
+    kept per processor name and per dataloader worker. Disabled by default,
+    enable with ``training.profiler.processors``.
+
+    Inside of dataloader workers, the stats recorded since the previous batch
+    are attached to each batch by ``BatchCollator`` (see :meth:`attach`) and
+    merged back into the main process stats by ``DatasetLoader`` (see
+    :meth:`collect`), so that :meth:`summarize` covers all of the workers.
+
+    Args:
+        max_latencies (int): Number of most recent latencies kept per
+            processor and worker to compute percentiles.
+    """
+
+    FIELD = "processor_stats"
+
+    def __init__(self, max_latencies: int = 10000):
+        self.enabled = False
+        self.max_latencies = max_latencies
+        self.reset()
+
+    def reset(self):
+        # (name, worker) -> [calls, total_ms, cache_hits, latencies]
+        self._stats = {}
+        self._pending = {}
+
+    def record(self, name: str, duration_ms: float, cache_hit: bool = False):
+        worker_info = torch.utils.data.get_worker_info()
+        worker = "main" if worker_info is None else f"worker{worker_info.id}"
+        stats = self._stats if worker_info is None else self._pending
+        self._update(stats, name, worker, 1, duration_ms, int(cache_hit), [duration_ms])
+
+    def _update(self, stats, name, worker, calls, total_ms, cache_hits, latencies):
+        key = (name, worker)
+        if key not in stats:
+            stats[key] = [0, 0.0, 0, collections.deque(maxlen=self.max_latencies)]
+        entry = stats[key]
+        entry[0] += calls
+        entry[1] += total_ms
+        entry[2] += cache_hits
+        entry[3].extend(latencies)
+
+    def attach(self, sample_list):
+        """Moves the stats recorded in this dataloader worker since the
+        previous batch into ``sample_list``.
+        """
+        if not self.enabled or len(self._pending) == 0:
+            return sample_list
+        sample_list[self.FIELD] = [
+            (name, worker, calls, total_ms, cache_hits, list(latencies))
+            for (name, worker), (calls, total_ms, cache_hits, latencies) in (
+                self._pending.items()
+            )
+        ]
+        self._pending = {}
+        return sample_list
+
+    def collect(self, batch):
+        """Removes the stats attached to ``batch`` by a dataloader worker and
+        merges them into the stats of this process.
+        """
+        if self.FIELD not in batch:
+            return batch
+        for name, worker, calls, total_ms, cache_hits, latencies in batch.pop(
+            self.FIELD
+        ):
+            self._update(
+                self._stats, name, worker, calls, total_ms, cache_hits, latencies
+            )
+        return batch
+
+    def get_stats(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """Returns the stats per processor name and per worker."""
+        stats = defaultdict(dict)
+        for (name, worker), (calls, total_ms, cache_hits, _) in self._stats.items():
+            stats[name][worker] = {
+                "calls": calls,
+                "total_ms": total_ms,
+                "cache_hits": cache_hits,
+            }
+        return dict(stats)
+
+    def summarize(self, percentiles=(50, 90, 99)) -> Dict[str, float]:
+        """Returns call counts, cumulative and percentile latencies in
+        milliseconds and cache hits per processor, aggregated over the workers,
+        keyed as ``<name>/<stat>``.
+        """
+        merged = {}
+        for (name, _), (calls, total_ms, cache_hits, latencies) in self._stats.items():
+            entry = merged.setdefault(name, [0, 0.0, 0, []])
+            entry[0] += calls
+            entry[1] += total_ms
+            entry[2] += cache_hits
+            entry[3].extend(latencies)
+
+        summary = {}
+        for name, (calls, total_ms, cache_hits, latencies) in merged.items():
+            summary[f"{name}/calls"] = calls
+            summary[f"{name}/total_ms"] = total_ms
+            summary[f"{name}/cache_hits"] = cache_hits
+            if len(latencies) == 0:
+                continue
+            values = np.percentile(latencies, list(percentiles))
+            for percentile, value in zip(percentiles, values):
+                summary[f"{name}/p{percentile}_ms"] = float(value)
+        return summary
+
+
+processor_stats = ProcessorStats()
+
+
+def get_words_hash(words) -> str:
+    """Hash of a list of words, e.g. of a vocabulary, used to check that
+    precomputed processor outputs were built from the same words.
+    """
+    return hashlib.md5("\n".join(words).encode("utf-8")).hexdigest()
+
+
+def _make_cache_key(value):
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, collections.abc.Mapping):
+        return tuple((key, _make_cache_key(value[key])) for key in sorted(value.keys()))
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__,) + tuple(_make_cache_key(v) for v in value)
+    raise TypeError(f"{type(value)} can't be used as a cache key")
+
+
+def _copy_output(value):
+    # Datasets may modify the processed outputs in place, so the cached
+    # ones are never handed out directly
+    if isinstance(value, torch.Tensor):
+        return value.clone()
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    if isinstance(value, collections.abc.MutableMapping):
+        output = copy.copy(value)
+        for key in value.keys():
+            output[key] = _copy_output(value[key])
+        return output
+    if isinstance(value, list):
+        return [_copy_output(v) for v in value]
+    return value
+
+
 class Processor:
     """Wrapper class used by MMF to initialized processor based on their
     ``type`` as passed in configuration. It retrieves the processor class
@@ -130,6 +284,12 @@ class Processor:
     with ``params`` passed in configuration. All functions and attributes of
     the processor initialized are directly available via this class.
 
+    If ``cache_size`` is set in the configuration and the processor is
+    ``deterministic``, outputs of up to ``cache_size`` inputs are memoized
+    (least recently used ones are evicted). As each dataloader worker has its
+    own copy of the processor, the cache is per worker. Calls are recorded in
+    :data:`processor_stats` when it is enabled.
+
     Args:
         config (DictConfig): DictConfig containing ``type`` of the processor to
                              be initialized and ``params`` of that processor.
@@ -155,11 +315,50 @@ class Processor:
             params = config.params
 
         self.processor = processor_class(params, *args, **kwargs)
+        # Overridden by datasets with the key used to register the processor
+        self.name = config.type
+
+        self._cache = None
+        cache_size = config.get("cache_size", 0) or 0
+        if cache_size > 0:
+            if getattr(self.processor, "deterministic", False):
+                self._cache = collections.OrderedDict()
+                self._cache_size = cache_size
+            else:
+                logger.warning(
+                    f"Processor of type {config.type} isn't deterministic, "
+                    + "ignoring its cache_size"
+                )
 
         self._dir_representation = dir(self)
 
     def __call__(self, item, *args, **kwargs):
-        return self.processor(item, *args, **kwargs)
+        if self._cache is None and not processor_stats.enabled:
+            return self.processor(item, *args, **kwargs)
+
+        start = time.perf_counter()
+        key = None
+        if self._cache is not None:
+            try:
+                key = _make_cache_key((item, args, kwargs))
+            except TypeError:
+                key = None
+
+        cache_hit = key is not None and key in self._cache
+        if cache_hit:
+            self._cache.move_to_end(key)
+            output = _copy_output(self._cache[key])
+        else:
+            output = self.processor(item, *args, **kwargs)
+            if key is not None:
+                self._cache[key] = _copy_output(output)
+                if len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+
+        if processor_stats.enabled:
+            duration = (time.perf_counter() - start) * 1000
+            processor_stats.record(self.name, duration, cache_hit=cache_hit)
+        return output
 
     def __getattr__(self, name):
         if "_dir_representation" in self.__dict__ and name in self._dir_representation:
@@ -233,6 +432,8 @@ class VocabProcessor(BaseProcessor):
                        file passed.
     """
 
+    deterministic = True
+
     MAX_LENGTH_DEFAULT = 50
     PAD_TOKEN = "<pad>"
     PAD_INDEX = 0
@@ -535,6 +736,15 @@ class VQAAnswerProcessor(BaseProcessor):
     "answers" or "answers_tokens". "answers" are preprocessed to generate
     "answers_tokens" if passed.
 
+    With ``sparse_targets`` set in the config, the scores are returned as
+    ``answers_scores_indices`` and ``answers_scores_values`` of size
+    ``DEFAULT_NUM_ANSWERS`` instead of a dense ``answers_scores`` vector of
+    the size of the vocabulary. They are densified by :meth:`densify_targets`
+    once the batch is on device. Items can also carry ``answer_targets``
+    precomputed with :meth:`build_answer_targets` (see
+    ``tools/scripts/vqa2/precompute_answer_targets.py``), which are used
+    instead of processing the answers if they match the answer vocabulary.
+
     Args:
         config (DictConfig): Configuration for the processor
 
@@ -542,6 +752,8 @@ class VQAAnswerProcessor(BaseProcessor):
         answer_vocab (VocabDict): Class representing answer vocabulary
     """
 
+    deterministic = True
+
     DEFAULT_NUM_ANSWERS = 10
 
     def __init__(self, config, *args, **kwargs):
@@ -580,6 +792,9 @@ class VQAAnswerProcessor(BaseProcessor):
                 "Setting to default of {}".format(self.DEFAULT_NUM_ANSWERS)
             )
 
+        self.sparse_targets = config.get("sparse_targets", False)
+        self._vocab_hash = None
+
     def __call__(self, item):
         """Takes in dict with answers or answers_tokens, and returns back
         a dict with answers (processed), "answers_indices" which point to
@@ -593,11 +808,34 @@ class VQAAnswerProcessor(BaseProcessor):
             Dict: Processed answers, indices and scores.
 
         """
-        tokens = []
-
         if not isinstance(item, dict):
             raise TypeError("'item' passed to processor must be a dict")
 
+        targets = item.get("answer_targets", None)
+        if targets is not None and targets["vocab"] == self.get_vocab_hash():
+            answers_indices = torch.tensor(targets["answers_indices"], dtype=torch.long)
+            indices = torch.tensor(targets["indices"], dtype=torch.long)
+            values = torch.tensor(targets["values"], dtype=torch.float)
+            return self._get_output(
+                item.get("answers", []), answers_indices, indices, values
+            )
+
+        tokens, answers_indices = self._get_answers_indices(item)
+        indices, values = self.compute_sparse_answers_scores(answers_indices)
+        return self._get_output(tokens, answers_indices, indices, values)
+
+    def _get_output(self, answers, answers_indices, indices, values):
+        output = {"answers": answers, "answers_indices": answers_indices}
+        if self.sparse_targets:
+            output["answers_scores_indices"] = indices
+            output["answers_scores_values"] = values
+        else:
+            output["answers_scores"] = self.densify_targets(indices, values)
+        return output
+
+    def _get_answers_indices(self, item):
+        tokens = []
+
         if "answer_tokens" in item:
             tokens = item["answer_tokens"]
         elif "answers" in item and item["answers"] is not None:
@@ -626,14 +864,38 @@ class VQAAnswerProcessor(BaseProcessor):
         for idx, token in enumerate(tokens):
             answers_indices[idx] = self.answer_vocab.word2idx(token)
 
-        answers_scores = self.compute_answers_scores(answers_indices)
+        return tokens, answers_indices
+
+    def get_vocab_hash(self):
+        """Hash of the answer vocabulary, used to check that precomputed
+        ``answer_targets`` were built with the same vocabulary.
+        """
+        if self._vocab_hash is None:
+            self._vocab_hash = get_words_hash(self.answer_vocab.word_list)
+        return self._vocab_hash
 
+    def build_answer_targets(self, item):
+        """Returns ``answer_targets`` for ``item`` to be stored with the
+        annotations. See :meth:`__call__`.
+        """
+        _, answers_indices = self._get_answers_indices(item)
+        indices, values = self.compute_sparse_answers_scores(answers_indices)
         return {
-            "answers": tokens,
-            "answers_indices": answers_indices,
-            "answers_scores": answers_scores,
+            "vocab": self.get_vocab_hash(),
+            "answers_indices": answers_indices.tolist(),
+            "indices": indices.tolist(),
+            "values": values.tolist(),
         }
 
+    def densify_targets(self, indices, values):
+        """Scatters sparse scores of size ``(..., K)`` into dense scores of
+        size ``(..., vocab_size)``, on the device of ``values``.
+        """
+        size = values.size()[:-1] + (self.get_vocab_size(),)
+        scores = values.new_zeros(size)
+        # Padding entries have a value of 0 so adding them is a no-op
+        return scores.scatter_add_(-1, indices, values)
+
     def get_vocab_size(self):
         """Get vocab size of the answer vocabulary. Can also include
         soft copy dynamic answer space size.
@@ -688,24 +950,36 @@ class VQAAnswerProcessor(BaseProcessor):
             torch.FloatTensor: tensor containing scores.
 
         """
-        scores = torch.zeros(self.get_vocab_size(), dtype=torch.float)
-        gt_answers = list(enumerate(answers_indices))
-        unique_answers = set(answers_indices.tolist())
-
-        for answer in unique_answers:
-            accs = []
-            for gt_answer in gt_answers:
-                other_answers = [item for item in gt_answers if item != gt_answer]
-
-                matching_answers = [item for item in other_answers if item[1] == answer]
-                acc = min(1, float(len(matching_answers)) / 3)
-                accs.append(acc)
-            avg_acc = sum(accs) / len(accs)
-
-            if answer != self.answer_vocab.UNK_INDEX:
-                scores[answer] = avg_acc
-
-        return scores
+        indices, values = self.compute_sparse_answers_scores(answers_indices)
+        return self.densify_targets(indices, values)
+
+    def compute_sparse_answers_scores(self, answers_indices):
+        """Sparse version of :meth:`compute_answers_scores`. Returns the indices
+        of the unique answers and their scores, padded with zeros to
+        ``DEFAULT_NUM_ANSWERS``.
+
+        The VQA accuracy of an answer averages ``min(1, matches / 3)`` over the
+        ``n`` sets of ``n - 1`` human answers. For an answer given ``c`` times,
+        ``matches`` is ``c - 1`` for the ``c`` sets where it was left out and
+        ``c`` for the others.
+        """
+        unique, counts = torch.unique(answers_indices, return_counts=True)
+        num = answers_indices.numel()
+        counts = counts.double()
+        scores = (
+            counts * torch.clamp((counts - 1) / 3, max=1)
+            + (num - counts) * torch.clamp(counts / 3, max=1)
+        ) / num
+        scores[unique == self.answer_vocab.UNK_INDEX] = 0
+        return self._pad_sparse_scores(unique, scores.float())
+
+    def _pad_sparse_scores(self, unique, scores):
+        size = max(self.DEFAULT_NUM_ANSWERS, unique.numel())
+        indices = torch.zeros(size, dtype=torch.long)
+        values = torch.zeros(size, dtype=torch.float)
+        indices[: unique.numel()] = unique
+        values[: unique.numel()] = scores
+        return indices, values
 
     def _increase_to_ten(self, tokens):
         while len(tokens) < self.DEFAULT_NUM_ANSWERS:
@@ -719,11 +993,10 @@ class MultiHotAnswerFromVocabProcessor(VQAAnswerProcessor):
     def __init__(self, config, *args, **kwargs):
         super().__init__(config, *args, **kwargs)
 
-    def compute_answers_scores(self, answers_indices):
-        scores = torch.zeros(self.get_vocab_size(), dtype=torch.float)
-        scores[answers_indices] = 1
-        scores[self.answer_vocab.UNK_INDEX] = 0
-        return scores
+    def compute_sparse_answers_scores(self, answers_indices):
+        unique = torch.unique(answers_indices)
+        scores = (unique != self.answer_vocab.UNK_INDEX).float()
+        return self._pad_sparse_scores(unique, scores)
 
 
 @registry.register_processor("soft_copy_answer")
@@ -755,6 +1028,9 @@ class SoftCopyAnswerProcessor(VQAAnswerProcessor):
         if hasattr(config, "context_preprocessor"):
             self.context_preprocessor = Processor(config.context_preprocessor)
 
+        # Soft copy scores are added to the dense scores
+        self.sparse_targets = False
+
     def get_vocab_size(self):
         """Size of Vocab + Size of Dynamic soft-copy based answer space
 
@@ -829,6 +1105,8 @@ class SimpleWordProcessor(BaseProcessor):
 
     """
 
+    deterministic = True
+
     def __init__(self, *args, **kwargs):
         from mmf.utils.text import word_tokenize
 
@@ -847,6 +1125,8 @@ class SimpleSentenceProcessor(BaseProcessor):
 
     """
 
+    deterministic = True
+
     def __init__(self, *args, **kwargs):
         from mmf.utils.text import tokenize
 
@@ -917,6 +1197,8 @@ class CaptionProcessor(BaseProcessor):
 
     """
 
+    deterministic = True
+
     def __init__(self, config, *args, **kwargs):
         if not hasattr(config, "vocab"):
             raise AttributeError(
@@ -940,11 +1222,110 @@ class CaptionProcessor(BaseProcessor):
         return {"tokens": tokens, "caption": caption}
 
 
+@registry.register_processor("caption_batch")
+class CaptionBatchProcessor(BaseProcessor):
+    """Sorts a batch of captions by decreasing ``caption_len``, as needed by
+    ``pack_padded_sequence`` and the teacher forced decoding of BUTD, and adds
+    the ``decode_lengths`` of the captions and the ``decode_batch_sizes`` of
+    the decoding steps as lists. Like the other batch processors, it runs in
+    the collate function of the dataloader, so that the models don't copy the
+    lengths to the host in their forward.
+
+    Example Config::
+
+        caption_batch_processor:
+          type: caption_batch
+
+    """
+
+    batch_stage = "collate"
+
+    def __init__(self, config=None, *args, **kwargs):
+        return
+
+    def __call__(self, sample_list):
+        if "caption_len" not in sample_list:
+            return sample_list
+
+        caption_lengths, sort_ind = sample_list.caption_len.sort(dim=0, descending=True)
+        batch_size = caption_lengths.size(0)
+        self._sort(sample_list, sort_ind, batch_size)
+
+        decode_lengths = (caption_lengths - 1).tolist()
+        sample_list.decode_lengths = decode_lengths
+        # Number of captions which haven't ended at every decoding step
+        sample_list.decode_batch_sizes = [
+            sum(length > t for length in decode_lengths)
+            for t in range(max(decode_lengths))
+        ]
+        return sample_list
+
+    def _sort(self, sample_list, sort_ind, batch_size):
+        for field in sample_list.fields():
+            value = sample_list[field]
+            if isinstance(value, collections.abc.Mapping):
+                self._sort(value, sort_ind, batch_size)
+            elif isinstance(value, torch.Tensor):
+                if value.dim() > 0 and value.size(0) == batch_size:
+                    sample_list[field] = value[sort_ind]
+            elif isinstance(value, list) and len(value) == batch_size:
+                sample_list[field] = [value[idx] for idx in sort_ind.tolist()]
+
+
+@registry.register_processor("packing_plan")
+class PackingPlanProcessor(BaseProcessor):
+    """Plans the packing of the real tokens of the samples of a batch into
+    rows of ``row_length`` tokens for the ``packed_sequences`` of
+    MMFTransformer, and adds it to the batch as ``packing_plan``. It runs in
+    the collate function of the dataloader, so that the model doesn't copy
+    the lengths of the sequences to the host in its forward.
+
+    ``masks`` are the masks of the modalities of the model, in order, either
+    as keys of the batch or, for modalities without padding, as their number
+    of tokens. ``row_length`` has to be the ``packed_sequence_length`` of the
+    model. Batches which miss one of the masks are returned as is and the
+    model plans their packing itself.
+
+    Example Config::
+
+        packing_plan_processor:
+          type: packing_plan
+          params:
+            row_length: 256
+            masks: [input_mask, image_mask]
+
+    """
+
+    batch_stage = "collate"
+
+    def __init__(self, config, *args, **kwargs):
+        self.row_length = config.get("row_length", None)
+        self.masks = list(config.get("masks", ["input_mask"]))
+
+    def __call__(self, sample_list):
+        from mmf.models.transformers.packing import plan_packing
+
+        batch_size = sample_list.get_batch_size()
+        masks = []
+        for mask in self.masks:
+            if isinstance(mask, int):
+                masks.append(torch.ones(batch_size, mask, dtype=torch.long))
+            elif mask in sample_list:
+                masks.append((sample_list[mask] != 0).long())
+            else:
+                return sample_list
+
+        sample_list.packing_plan = plan_packing(
+            torch.cat(masks, dim=-1), self.row_length
+        )
+        return sample_list
+
+
 @registry.register_processor("evalai_answer")
 class EvalAIAnswerProcessor(BaseProcessor):
-    """Processes an answer similar to Eval AI
+    """Processes an answer similar to Eval AI"""
 
-    """
+    deterministic = True
 
     CONTRACTIONS = {
         "aint": "ain't",
@@ -1202,6 +1583,18 @@ class CopyProcessor(BaseProcessor):
 class M4CAnswerProcessor(BaseProcessor):
     """
     Process a TextVQA answer for iterative decoding in M4C
+
+    Matching the answers to the fixed vocabulary and the OCR tokens doesn't
+    depend on the epoch, so it can be precomputed offline in an answer table
+    with :meth:`build_answer_table` (see
+    ``tools/scripts/m4c/precompute_answer_tables.py``). Items carrying an
+    ``answer_table`` built with the same vocabulary and OCR tokens only
+    sample a decoding sequence and assemble the tensors.
+
+    With ``sparse_targets`` set in the config, the scores are returned as the
+    flattened indices and the values of their non-zeros in
+    ``answers_scores_indices`` and ``answers_scores_values``, which
+    ``m4c_decoding_bce_with_mask`` consumes without densifying them.
     """
 
     def __init__(self, config, *args, **kwargs):
@@ -1228,10 +1621,29 @@ class M4CAnswerProcessor(BaseProcessor):
         assert self.max_copy_steps >= 1
 
         self.match_answer_to_unk = False
+        self._vocab_hash = None
+        # Return the scores as the indices and values of their non-zeros
+        # instead of a dense (max_copy_steps, vocab_size) tensor
+        self.sparse_targets = config.get("sparse_targets", False)
 
     def tokenize(self, sentence):
         return sentence.split()
 
+    def get_vocab_hash(self):
+        """Hash of the answer vocabulary, used to check that a precomputed
+        ``answer_table`` was built with the same vocabulary.
+        """
+        if self._vocab_hash is None:
+            self._vocab_hash = get_words_hash(self.answer_vocab.word_list)
+        return self._vocab_hash
+
+    def get_tokens_hash(self, tokens):
+        # Padding added by the context processor can't be matched to answers
+        length = len(tokens)
+        while length > 0 and tokens[length - 1] == VocabProcessor.PAD_TOKEN:
+            length -= 1
+        return get_words_hash(tokens[:length])
+
     def match_answer_to_vocab_ocr_seq(
         self, answer, vocab2idx_dict, ocr2inds_dict, max_match_num=20
     ):
@@ -1283,62 +1695,45 @@ class M4CAnswerProcessor(BaseProcessor):
         return self.answer_vocab.num_vocab
 
     def compute_answer_scores(self, answers):
-        gt_answers = list(enumerate(answers))
-        unique_answers = sorted(set(answers))
-        unique_answer_scores = [0] * len(unique_answers)
-        for idx, unique_answer in enumerate(unique_answers):
-            accs = []
-            for gt_answer in gt_answers:
-                other_answers = [item for item in gt_answers if item != gt_answer]
-                matching_answers = [
-                    item for item in other_answers if item[1] == unique_answer
-                ]
-                acc = min(1, float(len(matching_answers)) / 3)
-                accs.append(acc)
-            unique_answer_scores[idx] = sum(accs) / len(accs)
-        unique_answer2score = {
-            a: s for a, s in zip(unique_answers, unique_answer_scores)
-        }
+        # VQA accuracy averaged over the sets of num_answers - 1 answers, in
+        # closed form from the number of times each answer was given
+        num = len(answers)
+        unique_answer2score = {}
+        for answer, count in Counter(answers).items():
+            unique_answer2score[answer] = (
+                count * min(1, (count - 1) / 3) + (num - count) * min(1, count / 3)
+            ) / num
         return unique_answer2score
 
-    def __call__(self, item):
-        answers = item["answers"]
-
-        if not answers:
-            return {
-                "sampled_idx_seq": None,
-                "train_prev_inds": torch.zeros(self.max_copy_steps, dtype=torch.long),
-            }
-
-        answers = [self.answer_preprocessor({"text": a})["text"] for a in answers]
+    def build_answer_table(self, item):
+        """Matches the answers of ``item`` to the fixed vocabulary and its OCR
+        ``tokens`` and returns the compact table used by :meth:`__call__`:
+        the first decoding step scores as sparse ``first_step_inds`` and
+        ``first_step_scores``, and all of the valid decoding sequences
+        concatenated in ``seq_inds`` with their bounds in ``seq_offsets``.
+        """
+        answers = [
+            self.answer_preprocessor({"text": a})["text"] for a in item["answers"]
+        ]
         assert len(answers) == self.num_answers
 
         # Step 1: calculate the soft score of ground-truth answers
         unique_answer2score = self.compute_answer_scores(answers)
 
-        # Step 2: fill the first step soft scores for tokens
-        scores = torch.zeros(
-            self.max_copy_steps, self.get_vocab_size(), dtype=torch.float
-        )
-
         # match answers to fixed vocabularies and OCR tokens.
         ocr2inds_dict = defaultdict(list)
         for idx, token in enumerate(item["tokens"]):
             ocr2inds_dict[token].append(idx)
-        answer_dec_inds = [
-            self.match_answer_to_vocab_ocr_seq(
-                a, self.answer_vocab.word2idx_dict, ocr2inds_dict
-            )
-            for a in answers
-        ]
 
-        # Collect all the valid decoding sequences for each answer.
-        # This part (idx_seq_list) was pre-computed in imdb (instead of online)
-        # to save time
+        # Step 2: collect all the valid decoding sequences for each answer and
+        # the first step soft scores for tokens
         all_idx_seq_list = []
-        for answer, idx_seq_list in zip(answers, answer_dec_inds):
+        first_step_scores = {}
+        for answer in answers:
+            idx_seq_list = self.match_answer_to_vocab_ocr_seq(
+                answer, self.answer_vocab.word2idx_dict, ocr2inds_dict
+            )
             all_idx_seq_list.extend(idx_seq_list)
-            # fill in the soft score for the first decoding step
             score = unique_answer2score[answer]
             for idx_seq in idx_seq_list:
                 score_idx = idx_seq[0]
@@ -1347,36 +1742,114 @@ class M4CAnswerProcessor(BaseProcessor):
                 # for example:
                 # if "red apple" has score 0.7 and "red flag" has score 0.8
                 # the score for "red" at Step 0 will be max(0.7, 0.8) = 0.8
-                scores[0, score_idx] = max(scores[0, score_idx], score)
+                first_step_scores[score_idx] = max(
+                    first_step_scores.get(score_idx, 0), score
+                )
+
+        seq_offsets = np.zeros(len(all_idx_seq_list) + 1, dtype=np.int32)
+        seq_offsets[1:] = np.cumsum([len(seq) for seq in all_idx_seq_list])
+        seq_inds = np.array(
+            [idx for seq in all_idx_seq_list for idx in seq], dtype=np.int32
+        )
+        return {
+            "vocab": self.get_vocab_hash(),
+            "tokens": self.get_tokens_hash(item["tokens"]),
+            "answers": answers,
+            "first_step_inds": np.array(list(first_step_scores.keys()), np.int32),
+            "first_step_scores": np.array(list(first_step_scores.values()), np.float32),
+            "seq_inds": seq_inds,
+            "seq_offsets": seq_offsets,
+        }
+
+    def _is_valid_table(self, table, tokens):
+        return table["vocab"] == self.get_vocab_hash() and table[
+            "tokens"
+        ] == self.get_tokens_hash(tokens)
+
+    def __call__(self, item):
+        answers = item["answers"]
+
+        if not answers:
+            return {
+                "sampled_idx_seq": None,
+                "train_prev_inds": torch.zeros(self.max_copy_steps, dtype=torch.long),
+            }
+
+        table = item.get("answer_table", None)
+        if table is None or not self._is_valid_table(table, item["tokens"]):
+            table = self.build_answer_table(item)
+
+        # Tables of annotations loaded from .jsonl or .json files hold lists
+        first_step_inds = np.asarray(table["first_step_inds"], dtype=np.int64)
+        first_step_scores = np.asarray(table["first_step_scores"], dtype=np.float32)
+        seq_inds = np.asarray(table["seq_inds"], dtype=np.int64)
+        seq_offsets = np.asarray(table["seq_offsets"], dtype=np.int64)
+
+        vocab_size = self.get_vocab_size()
+        # The scores are built as the indices of the non-zeros in the
+        # flattened (max_copy_steps, vocab_size) scores and their values
+        score_inds = [first_step_inds]
+        score_values = [first_step_scores]
 
         # train_prev_inds is the previous prediction indices in auto-regressive
         # decoding
         train_prev_inds = torch.zeros(self.max_copy_steps, dtype=torch.long)
         # train_loss_mask records the decoding steps where losses are applied
         train_loss_mask = torch.zeros(self.max_copy_steps, dtype=torch.float)
-        if len(all_idx_seq_list) > 0:
+        num_seqs = len(seq_offsets) - 1
+        if num_seqs > 0:
             # sample a random decoding answer sequence for teacher-forcing
-            idx_seq = all_idx_seq_list[np.random.choice(len(all_idx_seq_list))]
-            dec_step_num = min(1 + len(idx_seq), self.max_copy_steps)
+            seq_idx = np.random.choice(num_seqs)
+            seq = seq_inds[seq_offsets[seq_idx] : seq_offsets[seq_idx + 1]]
+            idx_seq = tuple(seq.tolist())
+            dec_step_num = min(1 + len(seq), self.max_copy_steps)
             train_loss_mask[:dec_step_num] = 1.0
 
             train_prev_inds[0] = self.BOS_IDX
-            for t in range(1, dec_step_num):
-                train_prev_inds[t] = idx_seq[t - 1]
-                score_idx = idx_seq[t] if t < len(idx_seq) else self.EOS_IDX
-                scores[t, score_idx] = 1.0
+            train_prev_inds[1:dec_step_num] = torch.from_numpy(seq[: dec_step_num - 1])
+            # the target of step t is the token t of the sequence, then EOS
+            steps = np.arange(1, dec_step_num)
+            next_inds = np.append(seq, self.EOS_IDX)[steps]
+            score_inds.append(steps * vocab_size + next_inds)
+            score_values.append(np.ones(len(steps), dtype=np.float32))
         else:
             idx_seq = ()
 
+        score_inds = np.concatenate(score_inds)
+        score_values = np.concatenate(score_values).astype(np.float32)
         answer_info = {
-            "answers": answers,
-            "answers_scores": scores,
+            "answers": table["answers"],
             "sampled_idx_seq": idx_seq,
             "train_prev_inds": train_prev_inds,
             "train_loss_mask": train_loss_mask,
         }
+        if self.sparse_targets:
+            # Ragged, padded to the longest in the batch by pad_sparse_targets
+            answer_info["answers_scores_indices"] = score_inds
+            answer_info["answers_scores_values"] = score_values
+        else:
+            scores = torch.zeros(self.max_copy_steps * vocab_size, dtype=torch.float)
+            scores[torch.from_numpy(score_inds)] = torch.from_numpy(score_values)
+            answer_info["answers_scores"] = scores.view(self.max_copy_steps, -1)
         return answer_info
 
+    @staticmethod
+    def pad_sparse_targets(indices_list, values_list):
+        """Collates the ragged sparse scores returned by :meth:`__call__` with
+        ``sparse_targets`` into ``(batch_size, max_num_targets)`` tensors of
+        indices and values. Padding has index and value 0 so that it doesn't
+        contribute to the loss.
+        """
+        max_len = max(len(indices) for indices in indices_list)
+        indices = torch.zeros(len(indices_list), max_len, dtype=torch.long)
+        values = torch.zeros(len(values_list), max_len, dtype=torch.float)
+        for idx, (sample_indices, sample_values) in enumerate(
+            zip(indices_list, values_list)
+        ):
+            indices[idx, : len(sample_indices)] = torch.from_numpy(sample_indices)
+            values[idx, : len(sample_values)] = torch.from_numpy(sample_values)
+        return indices, values
+
 
 @registry.register_processor("m4c_caption")
 class M4CCaptionProcessor(M4CAnswerProcessor):
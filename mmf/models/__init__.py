@@ -1,20 +1,49 @@
 # Copyright (c) Facebook, Inc. and its affiliates.
 # isort:skip_file
 
+import importlib
+import sys
+
 from .base_model import BaseModel
-from .pythia import Pythia
-from .ban import BAN
-from .lorra import LoRRA
-from .top_down_bottom_up import TopDownBottomUp
-from .butd import BUTD
-from .mmbt import MMBT, MMBTForClassification, MMBTForPreTraining
-from .cnn_lstm import CNNLSTM
-from .m4c import M4C
-from .m4c_captioner import M4CCaptioner
-from .fusions import FusionBase, ConcatBERT, ConcatBoW, LateFusion
-from .unimodal import UnimodalBase, UnimodalText, UnimodalModal
-from .visual_bert import VisualBERT
-from .vilbert import ViLBERT
+
+
+# Models are imported on first access so that importing mmf doesn't pull in
+# every model and its dependencies, see `setup_imports(lazy=True)`
+_LAZY_IMPORTS = {
+    "Pythia": "pythia",
+    "BAN": "ban",
+    "LoRRA": "lorra",
+    "TopDownBottomUp": "top_down_bottom_up",
+    "BUTD": "butd",
+    "MMBT": "mmbt",
+    "MMBTForClassification": "mmbt",
+    "MMBTForPreTraining": "mmbt",
+    "CNNLSTM": "cnn_lstm",
+    "M4C": "m4c",
+    "M4CCaptioner": "m4c_captioner",
+    "FusionBase": "fusions",
+    "ConcatBERT": "fusions",
+    "ConcatBoW": "fusions",
+    "LateFusion": "fusions",
+    "UnimodalBase": "unimodal",
+    "UnimodalText": "unimodal",
+    "UnimodalModal": "unimodal",
+    "VisualBERT": "visual_bert",
+    "ViLBERT": "vilbert",
+}
+
+
+def __getattr__(name):
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module(f".{_LAZY_IMPORTS[name]}", __name__)
+    return getattr(module, name)
+
+
+# Module level __getattr__ is only supported from python 3.7
+if sys.version_info < (3, 7):
+    for _name in _LAZY_IMPORTS:
+        globals()[_name] = __getattr__(_name)
 
 
 __all__ = [
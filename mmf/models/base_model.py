@@ -45,7 +45,7 @@ import logging
 import warnings
 from copy import deepcopy
 from dataclasses import dataclass
-from typing import Union
+from typing import Any, Dict, Optional, Union
 
 from mmf.common.registry import registry
 from mmf.common.sample import to_device
@@ -53,6 +53,7 @@ from mmf.modules.losses import Losses
 from mmf.utils.checkpoint import load_pretrained_model
 from mmf.utils.download import download_pretrained_model
 from mmf.utils.file_io import PathManager
+from mmf.utils.inference import optimize_for_inference
 from omegaconf import MISSING, DictConfig, OmegaConf
 from torch import nn
 
@@ -211,8 +212,51 @@ class BaseModel(nn.Module):
         """
         return results
 
+    def estimate_flops(self, num_samples: int, num_positions: int) -> float:
+        """Estimates the FLOPs of a training step (forward and backward) over
+        ``num_samples`` samples containing ``num_positions`` real (non-padded)
+        text tokens and image regions in total. Used for throughput reporting.
+
+        The default assumes every weight of the linear layers is used once per
+        position, which holds for transformer models: 2 FLOPs per weight for
+        the forward pass and 4 more for the backward pass of trainable weights.
+        The embeddings, which are lookups, and the convolutions of image
+        encoders, which run once per image, aren't counted. Override this in
+        models for which the approximation doesn't hold.
+        """
+        if not hasattr(self, "_num_parameters"):
+            # Tied weights are counted once
+            parameters = {
+                id(p): p
+                for module in self.modules()
+                if isinstance(module, nn.Linear)
+                for p in module.parameters()
+            }.values()
+            self._num_parameters = sum(p.numel() for p in parameters)
+            self._num_trainable_parameters = sum(
+                p.numel() for p in parameters if p.requires_grad
+            )
+        # Models without sequence inputs run once per sample
+        num_positions = num_positions if num_positions > 0 else num_samples
+        return num_positions * (
+            2 * self._num_parameters + 4 * self._num_trainable_parameters
+        )
+
     @classmethod
-    def from_pretrained(cls, model_name_or_path, *args, **kwargs):
+    def from_pretrained(
+        cls,
+        model_name_or_path,
+        *args,
+        inference_mode: Optional[str] = None,
+        inference_options: Optional[Dict[str, Any]] = None,
+        **kwargs,
+    ):
+        """Loads a model from the zoo or a checkpoint. With ``inference_mode``
+        (``cpu_fp32`` or ``cpu_int8``), the model is optimized for inference
+        on CPU by ``mmf.utils.inference.optimize_for_inference``, to which
+        ``inference_options`` (e.g. ``num_threads`` or held-out ``samples`` to
+        verify the accuracy drift on) are passed.
+        """
         if not PathManager.isfile(model_name_or_path):
             model_key = model_name_or_path.split(".")[0]
             model_cls = registry.get_model_class(model_key)
@@ -252,5 +296,9 @@ class BaseModel(nn.Module):
             )
 
         instance.eval()
+        if inference_mode is not None:
+            instance = optimize_for_inference(
+                instance, inference_mode, **(inference_options or {})
+            )
 
         return instance
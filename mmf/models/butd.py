@@ -2,6 +2,7 @@
 
 import torch
 from mmf.common.registry import registry
+from mmf.datasets.processors.processors import CaptionBatchProcessor
 from mmf.models.pythia import Pythia
 from mmf.modules.layers import ClassifierLayer
 
@@ -59,15 +60,13 @@ class BUTD(Pythia):
         )
         data = {}
         if self.teacher_forcing:
-            caption_lengths, sort_ind = sample_list.caption_len.sort(
-                dim=0, descending=True
-            )
-            data["decode_lengths"] = (caption_lengths - 1).tolist()
-            sample_list.text = sample_list.text[sort_ind]
-            sample_list.answers = sample_list.answers[sort_ind]
-            sample_list.image_feature_0 = sample_list.image_feature_0[sort_ind]
+            if "decode_batch_sizes" not in sample_list:
+                # The batch is sorted by the caption_batch processor of the
+                # dataset, otherwise it has to be sorted on the device here
+                sample_list = CaptionBatchProcessor()(sample_list)
+            data["decode_batch_sizes"] = sample_list.decode_batch_sizes
             data["texts"] = sample_list.text
-            timesteps = max(data["decode_lengths"])
+            timesteps = len(data["decode_batch_sizes"])
             sample_list.add_field("targets", sample_list.text[:, 1:])
         else:
             data["texts"] = sample_list.answers.new_full(
@@ -91,7 +90,7 @@ class BUTD(Pythia):
     def get_data_t(self, t, data, batch_size_t, prev_output):
         if self.teacher_forcing:
             # Modify batch_size for timestep t
-            batch_size_t = sum([l > t for l in data["decode_lengths"]])
+            batch_size_t = data["decode_batch_sizes"][t]
         elif prev_output is not None and self.config.inference.type == "greedy":
             # Adding t-1 output words to data["text"] for greedy decoding
             output_softmax = torch.log_softmax(prev_output, dim=1)
@@ -7,6 +7,7 @@ from mmf.common.registry import registry
 from mmf.models.base_model import BaseModel
 from mmf.modules.encoders import MultiModalEncoderBase
 from mmf.utils.build import build_classifier_layer
+from mmf.utils.encoder_cache import ENCODER_OUTPUT_KEY, is_encoder_cached
 from mmf.utils.modeling import get_bert_configured_parameters
 
 
@@ -23,6 +24,30 @@ class FusionBase(MultiModalEncoderBase):
         self._encoder_config = getattr(text_encoder, "config", None)
         self.text = text_encoder
         self.modal = modal_encoder
+        # Cached outputs of the frozen modal encoder, which are added to the
+        # batches by the datasets, are used instead of running it
+        self.use_encoder_cache = is_encoder_cached(
+            self.config,
+            self.config.get("freeze_modal", False)
+            or self.config.get("freeze_complete_base", False),
+        )
+        if self.use_encoder_cache:
+            # Not all of the fusion models freeze it themselves
+            for p in self.modal.parameters():
+                p.requires_grad = False
+
+    def get_modal_input(self, sample_list):
+        if self.use_encoder_cache:
+            assert (
+                ENCODER_OUTPUT_KEY in sample_list
+            ), "Cached encoder outputs are missing from the sample list"
+            return sample_list[ENCODER_OUTPUT_KEY]
+        if self._is_direct_features_input:
+            return sample_list.image_feature_0
+        return sample_list.image
+
+    def compute_modal_encoder_outputs(self, sample_list):
+        return self.modal(self.get_modal_input(sample_list))
 
     def forward(
         self,
@@ -48,7 +73,8 @@ class FusionBase(MultiModalEncoderBase):
         if isinstance(text, collections.abc.Sequence) and len(text) >= 2:
             text = text[1]
 
-        modal = self.modal(modal, *modal_args, **modal_kwargs)
+        if not self.use_encoder_cache:
+            modal = self.modal(modal, *modal_args, **modal_kwargs)
         modal = torch.flatten(modal, start_dim=1)
         text = torch.flatten(text, start_dim=1)
         return text, modal
@@ -96,16 +122,18 @@ class ConcatBERT(BaseModel):
         parameters += get_bert_configured_parameters(self.classifier, lr)
         return parameters
 
+    def compute_encoder_outputs(self, sample_list):
+        """Outputs of the modal encoder, which are cached by mmf_cache_encoder
+        when it is frozen.
+        """
+        return self.base.compute_modal_encoder_outputs(sample_list)
+
     def forward(self, sample_list):
         text = sample_list.input_ids
         mask = sample_list.input_mask
         segment = sample_list.segment_ids
 
-        if self._is_direct_features_input:
-            modal = sample_list.image_feature_0
-        else:
-            modal = sample_list.image
-
+        modal = self.base.get_modal_input(sample_list)
         text_embedding, modal_embedding = self.base(text, modal, [mask, segment])
         embedding = torch.cat([text_embedding, modal_embedding], dim=-1)
         output = {}
@@ -135,13 +163,15 @@ class ConcatBoW(BaseModel):
         classifier_config.params.in_dim += self.config.text_hidden_size
         self.classifier = build_classifier_layer(classifier_config)
 
+    def compute_encoder_outputs(self, sample_list):
+        """Outputs of the modal encoder, which are cached by mmf_cache_encoder
+        when it is frozen.
+        """
+        return self.base.compute_modal_encoder_outputs(sample_list)
+
     def forward(self, sample_list):
         text = sample_list.text
-        if self._is_direct_features_input:
-            modal = sample_list.image_feature_0
-        else:
-            modal = sample_list.image
-
+        modal = self.base.get_modal_input(sample_list)
         text_embedding, modal_embedding = self.base(text, modal)
         embedding = torch.cat([text_embedding, modal_embedding], dim=-1)
         output = {}
@@ -176,16 +206,18 @@ class LateFusion(BaseModel):
         text_classifier_config.params.in_dim = self.config.text_hidden_size
         self.text_classifier = build_classifier_layer(text_classifier_config)
 
+    def compute_encoder_outputs(self, sample_list):
+        """Outputs of the modal encoder, which are cached by mmf_cache_encoder
+        when it is frozen.
+        """
+        return self.base.compute_modal_encoder_outputs(sample_list)
+
     def forward(self, sample_list):
         text = sample_list.input_ids
         mask = sample_list.input_mask
         segment = sample_list.segment_ids
 
-        if self._is_direct_features_input:
-            modal = sample_list.image_feature_0
-        else:
-            modal = sample_list.image
-
+        modal = self.base.get_modal_input(sample_list)
         text_embedding, modal_embedding = self.base(text, modal, [mask, segment])
         text = self.text_classifier(text_embedding)
         modal = self.modal_classifier(modal_embedding)
@@ -20,8 +20,15 @@ import os
 import torch
 from mmf.common.registry import registry
 from mmf.models import BaseModel
+from mmf.modules.attention import set_sdpa_attention
+from mmf.modules.hf_layers import replace_with_jit
 from mmf.utils.configuration import get_mmf_cache_dir
-from mmf.utils.modeling import get_optimizer_parameters_for_bert
+from mmf.utils.modeling import (
+    checkpoint_forward,
+    get_checkpoint_interval,
+    get_optimizer_parameters_for_bert,
+    should_checkpoint_layer,
+)
 from omegaconf import OmegaConf
 from torch import nn
 from torch.nn import CrossEntropyLoss, SmoothL1Loss
@@ -293,6 +300,7 @@ class LXMERTEncoder(nn.Module):
         self.r_layers = nn.ModuleList(
             [BertLayer(config) for _ in range(self.num_r_layers)]
         )
+        self.checkpoint_interval = get_checkpoint_interval(config)
 
     def forward(
         self, lang_feats, lang_attention_mask, visn_feats, visn_attention_mask=None
@@ -303,18 +311,38 @@ class LXMERTEncoder(nn.Module):
         visn_feats = self.visn_fc(visn_feats)
 
         # Run language layers
-        for layer_module in self.layer:
-            lang_feats = layer_module(lang_feats, lang_attention_mask)[0]
+        for idx, layer_module in enumerate(self.layer):
+            if should_checkpoint_layer(idx, self.checkpoint_interval, self.training):
+                lang_feats = checkpoint_forward(
+                    layer_module, lang_feats, lang_attention_mask
+                )[0]
+            else:
+                lang_feats = layer_module(lang_feats, lang_attention_mask)[0]
 
         # Run relational layers
-        for layer_module in self.r_layers:
-            visn_feats = layer_module(visn_feats, visn_attention_mask)[0]
+        for idx, layer_module in enumerate(self.r_layers):
+            if should_checkpoint_layer(idx, self.checkpoint_interval, self.training):
+                visn_feats = checkpoint_forward(
+                    layer_module, visn_feats, visn_attention_mask
+                )[0]
+            else:
+                visn_feats = layer_module(visn_feats, visn_attention_mask)[0]
 
         # Run cross-modality layers
-        for layer_module in self.x_layers:
-            lang_feats, visn_feats = layer_module(
-                lang_feats, lang_attention_mask, visn_feats, visn_attention_mask
-            )
+        for idx, layer_module in enumerate(self.x_layers):
+            if should_checkpoint_layer(idx, self.checkpoint_interval, self.training):
+                lang_feats, visn_feats = checkpoint_forward(
+                    layer_module,
+                    lang_feats,
+                    lang_attention_mask,
+                    visn_feats,
+                    visn_attention_mask,
+                    num_outputs=2,
+                )
+            else:
+                lang_feats, visn_feats = layer_module(
+                    lang_feats, lang_attention_mask, visn_feats, visn_attention_mask
+                )
 
         return lang_feats, visn_feats
 
@@ -649,6 +677,12 @@ class LXMERT(BaseModel):
             for p in self.model.bert.parameters():
                 p.requires_grad = False
 
+        if self.config.get("use_sdpa_attention", False):
+            # The forward of the transformers attention layers computes the
+            # attention with scaled_dot_product_attention once replaced
+            replace_with_jit()
+            set_sdpa_attention(self.model)
+
     def get_image_and_text_features(self, sample_list, device):
         # bert input
         bert_input_ids = sample_list.input_ids
@@ -660,20 +694,20 @@ class LXMERT(BaseModel):
         image_info = getattr(sample_list, "image_info_0", {})
         image_dim_variable = getattr(image_info, "max_features", None)
         image_feature_variable = getattr(sample_list, "image_feature_0", None)
-        max_features = torch.tensor(
-            image_feature_variable.shape[1], dtype=torch.int
-        ).to(device)
+        num_features = image_feature_variable.size(1)
+        max_features = torch.tensor(num_features, dtype=torch.int).to(device)
         image_location_variable = getattr(image_info, "bbox", None)
-        image_location_variable = image_location_variable[:, : max_features.item(), :4]
+        image_location_variable = image_location_variable[:, :num_features, :4]
 
         # aux data
         image_label_variable = getattr(sample_list, "image_labels", None)
         if image_label_variable is not None:
-            image_label_variable = image_label_variable[:, : max_features.item(), None]
+            image_label_variable = image_label_variable[:, :num_features, None]
             image_label_variable = image_label_variable.unsqueeze(-1).to(device)
+        # Padded and batched by the feature readers of the dataset
         cls_prob = getattr(image_info, "cls_prob", None)
         if cls_prob is not None:
-            cls_prob = torch.tensor(cls_prob)[:, : max_features.item(), None].to(device)
+            cls_prob = cls_prob[:, :num_features, None].to(device)
         answers = getattr(sample_list, "targets", None)
         if answers is None:
             answers = getattr(sample_list, "answers", None)
@@ -14,6 +14,7 @@ import torch
 from mmf.common.registry import registry
 from mmf.models.base_model import BaseModel
 from mmf.models.interfaces.mmbt import MMBTGridHMInterface
+from mmf.modules.attention import set_sdpa_attention
 from mmf.modules.encoders import (
     EncoderFactory,
     ImageEncoderFactory,
@@ -27,6 +28,7 @@ from mmf.modules.encoders import (
 from mmf.modules.hf_layers import replace_with_jit
 from mmf.utils.checkpoint import load_pretrained_model
 from mmf.utils.configuration import get_mmf_cache_dir
+from mmf.utils.encoder_cache import ENCODER_OUTPUT_KEY, is_encoder_cached
 from mmf.utils.modeling import get_optimizer_parameters_for_bert
 from omegaconf import II, DictConfig, OmegaConf
 from torch import Tensor, nn
@@ -68,6 +70,8 @@ class ModalEmbeddings(nn.Module):
         self.word_embeddings = embeddings.word_embeddings
         self.LayerNorm = embeddings.LayerNorm
         self.dropout = nn.Dropout(p=config.hidden_dropout_prob)
+        # Set when input_modal are the cached outputs of the frozen encoder
+        self.skip_encoder = False
 
     def forward(
         self,
@@ -77,7 +81,11 @@ class ModalEmbeddings(nn.Module):
         position_ids: Optional[Tensor] = None,
         token_type_ids: Optional[Tensor] = None,
     ):
-        token_embeddings = self.proj_embeddings(self.encoder(input_modal))
+        if self.skip_encoder:
+            modal_features = input_modal
+        else:
+            modal_features = self.encoder(input_modal)
+        token_embeddings = self.proj_embeddings(modal_features)
         seq_length = token_embeddings.size(1)
 
         if start_token is not None:
@@ -362,15 +370,22 @@ class MMBTBase(MultiModalEncoderBase):
 
         return modal_end_token
 
-    def forward(self, sample_list: Dict[str, Tensor]):
-
+    def get_input_modal(self, sample_list: Dict[str, Tensor]) -> Tensor:
         if self._is_direct_features_input:
             if "input_modal" in sample_list:
-                input_modal = sample_list["input_modal"]
+                return sample_list["input_modal"]
             else:
-                input_modal = sample_list["image_feature_0"]
+                return sample_list["image_feature_0"]
+        else:
+            return sample_list["image"]
+
+    def forward(self, sample_list: Dict[str, Tensor]):
+
+        if "encoder_output" in sample_list:
+            # Cached outputs of the frozen modal encoder
+            input_modal = sample_list["encoder_output"]
         else:
-            input_modal = sample_list["image"]
+            input_modal = self.get_input_modal(sample_list)
 
         modal_start_token: Optional[Tensor] = None
         if self.use_modal_start_token:
@@ -581,6 +596,11 @@ class MMBT(BaseModel):
         use_modal_start_token: bool = True
         use_modal_end_token: bool = True
         fused_feature_only: bool = False
+        use_sdpa_attention: bool = False
+        # Folder of the outputs of the frozen modal encoder written by
+        # mmf_cache_encoder, read by the datasets instead of running the encoder
+        encoder_cache_dir: Optional[str] = None
+        encoder_cache_id_key: str = "id"
         output_dim: int = 768
 
     def __init__(self, config: Union[DictConfig, Config], *args, **kwargs):
@@ -600,6 +620,15 @@ class MMBT(BaseModel):
             for p in self.model.bert.mmbt.modal_encoder.parameters():
                 p.requires_grad = False
 
+        if self.config.use_sdpa_attention:
+            set_sdpa_attention(self.model)
+
+        self.use_encoder_cache = is_encoder_cached(
+            self.config, self.config.freeze_complete_base or self.config.freeze_modal
+        )
+        if self.use_encoder_cache:
+            self.model.bert.mmbt.modal_encoder.skip_encoder = True
+
     # Backward compatibility for code from older mmbt
     @classmethod
     def format_state_key(cls, key):
@@ -623,7 +652,20 @@ class MMBT(BaseModel):
         return "configs/models/mmbt/pretrain.yaml"
 
     def forward(self, sample_list: Dict[str, Tensor]):
+        if not torch.jit.is_scripting():
+            if self.use_encoder_cache:
+                # Added by the datasets when encoder_cache_dir is set
+                assert (
+                    ENCODER_OUTPUT_KEY in sample_list
+                ), "Cached encoder outputs are missing from the sample list"
         return self.model(sample_list)
 
+    def compute_encoder_outputs(self, sample_list: Dict[str, Tensor]) -> Tensor:
+        """Outputs of the modal encoder, which are cached by mmf_cache_encoder
+        when it is frozen.
+        """
+        input_modal = self.model.bert.get_input_modal(sample_list)
+        return self.model.bert.mmbt.modal_encoder.encoder(input_modal)
+
     def get_optimizer_parameters(self, config):
         return get_optimizer_parameters_for_bert(self.model, config)
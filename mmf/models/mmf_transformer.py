@@ -10,6 +10,7 @@ from mmf.models.transformers.base import (
     BaseTransformerInput,
 )
 from mmf.utils.build import build_encoder
+from mmf.utils.encoder_cache import is_encoder_cached
 from omegaconf import OmegaConf
 from torch import Tensor, nn
 from transformers.modeling_bert import BertPooler, BertPredictionHeadTransform
@@ -30,6 +31,10 @@ class MMFTransformer(BaseTransformer):
                 self.modality_segments.append(modality.segment_id)
             else:
                 self.modality_segments.append(-1)
+        # Pack the real tokens of the samples into rows of packed_sequence_length
+        # tokens instead of padding every modality
+        self.packed_sequences = self.config.get("packed_sequences", False)
+        self.packed_sequence_length = self.config.get("packed_sequence_length", None)
 
     @classmethod
     def config_path(cls) -> str:
@@ -61,6 +66,12 @@ class MMFTransformer(BaseTransformer):
                 for param in encoder.parameters():
                     param.requires_grad = False
 
+        # Cached outputs of the frozen image encoder, which are added to the
+        # batches by the datasets, are used instead of running it
+        is_encoder_cached(
+            self.config, getattr(self.config, "freeze_image_encoder", False)
+        )
+
     def build_heads(self):
         """Initialize the classifier head. It takes the output of the
         transformer encoder and passes it through a pooler (we use the pooler from BERT
@@ -76,6 +87,12 @@ class MMFTransformer(BaseTransformer):
             nn.Linear(transformer_config.hidden_size, self.config.num_labels),
         )
 
+    def get_image_input(self, sample_list: Dict[str, Tensor]) -> Tensor:
+        if "image" in sample_list:
+            return sample_list["image"]
+        else:
+            return sample_list["image_feature_0"]
+
     def preprocess_sample(self, sample_list: Dict[str, Tensor]) -> BaseTransformerInput:
         """Preprocess the sample list elements and form a BaseTransformerInput
         type object. This object standardizes how we represent multiple modalities.
@@ -86,23 +103,26 @@ class MMFTransformer(BaseTransformer):
         input_ids: Dict[str, Tensor] = {}
         for idx, encoder in enumerate(self.encoders.values()):
             modality = self.modality_keys[idx]
+            skip_encoder = False
             if self.modality_type[idx] == "text":
                 if sample_list["input_ids"].dim() > 2:
                     input_ids[modality] = sample_list["input_ids"][:, idx]
                 else:
                     input_ids[modality] = sample_list["input_ids"]
             elif self.modality_type[idx] == "image":
-                if "image" in sample_list:
-                    input_ids[modality] = sample_list["image"]
+                if "encoder_output" in sample_list:
+                    # Cached outputs of the frozen image encoder
+                    input_ids[modality] = sample_list["encoder_output"]
+                    skip_encoder = True
                 else:
-                    input_ids[modality] = sample_list["image_feature_0"]
+                    input_ids[modality] = self.get_image_input(sample_list)
             else:
                 if modality in sample_list:
                     input_ids[modality] = sample_list[modality]
 
             # In the other case feature will be skipped, as it is not present in
             # the sample list
-            if encoder is not None:
+            if encoder is not None and not skip_encoder:
                 input_ids[modality] = encoder(input_ids[modality])
 
         # Position IDs
@@ -167,9 +187,20 @@ class MMFTransformer(BaseTransformer):
             masks.append(output.masks[modality])
 
         # Call transformer backend
-        sequence_output, _ = self.backend(
-            output.input_ids, output.position_ids, output.segment_ids, masks
-        )
+        if not torch.jit.is_scripting() and self.packed_sequences:
+            # Planned at collate time by the packing_plan processor, if used
+            sequence_output = self.backend.forward_packed(
+                output.input_ids,
+                output.position_ids,
+                output.segment_ids,
+                masks,
+                self.packed_sequence_length,
+                sample_list.get("packing_plan", None),
+            )
+        else:
+            sequence_output, _ = self.backend(
+                output.input_ids, output.position_ids, output.segment_ids, masks
+            )
 
         # Transformer Heads
         pooled_output = self.pooler(sequence_output)
@@ -178,6 +209,15 @@ class MMFTransformer(BaseTransformer):
         # Postprocess outputs
         return self.postprocess_output(head_output)
 
+    def compute_encoder_outputs(self, sample_list: Dict[str, Tensor]) -> Tensor:
+        """Outputs of the encoder of the image modality, which are cached by
+        mmf_cache_encoder when it is frozen.
+        """
+        for idx, encoder in enumerate(self.encoders.values()):
+            if self.modality_type[idx] == "image":
+                return encoder(self.get_image_input(sample_list))
+        raise ValueError("MMFTransformer has no image modality to cache")
+
     def postprocess_output(self, output: Tensor) -> Dict[str, Tensor]:
         """Postprocess the output from the classifier head and reshape it.
         This will be used to calculate losses and metrics in mmf.
@@ -8,6 +8,7 @@ import torch
 from mmf.common.registry import registry
 from mmf.common.typings import DictConfig
 from mmf.models.base_model import BaseModel
+from mmf.modules.attention import set_sdpa_attention
 from mmf.modules.embeddings import (
     PreExtractedEmbedding,
     TextEmbedding,
@@ -40,6 +41,9 @@ class MoVieMcan(BaseModel):
         self._init_classifier(self._get_classifier_input_dim())
         self._init_extras()
 
+        if self.config.get("use_sdpa_attention", False):
+            set_sdpa_attention(self)
+
     def _build_word_embedding(self):
         assert len(self._datasets) > 0
         text_processor = registry.get(self._datasets[0] + "_text_processor")
@@ -9,6 +9,7 @@ from mmf.models.transformers.base import (
     BaseTransformerBackend,
     BaseTransformerConfigType,
 )
+from mmf.modules.attention import set_sdpa_attention
 from mmf.modules.hf_layers import replace_with_jit
 from omegaconf import OmegaConf
 from torch import Tensor, nn
@@ -182,6 +183,8 @@ class HuggingfaceBackend(BaseTransformerBackend):
         self.transformer = AutoModel.from_pretrained(
             self.config.transformer_base, config=self.transformer_config
         )
+        if self.config.get("use_sdpa_attention", False):
+            set_sdpa_attention(self.transformer)
 
     def build_embeddings(self):
         """Build the multimodal embeddings using the transformer base
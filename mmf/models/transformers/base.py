@@ -2,10 +2,12 @@
 
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Any, Dict, List, NamedTuple, Tuple, Type
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Type
 
+import torch
 from mmf.common.registry import registry
 from mmf.models import BaseModel
+from mmf.models.transformers.packing import PackingPlan, pack, pack_sequences, unpack
 from mmf.utils.modeling import get_optimizer_parameters_for_bert
 from torch import Tensor, nn
 
@@ -131,6 +133,34 @@ class BaseTransformerBackend(nn.Module, ABC):
         # Output Tuple(sequence output, all encoded layers)
         return encoded_layers[-1], encoded_layers
 
+    def forward_packed(
+        self,
+        tokens_ids: Dict[str, Tensor],
+        position_ids: Dict[str, Tensor],
+        segment_ids: Dict[str, Tensor],
+        masks: List[Tensor],
+        row_length: Optional[int] = None,
+        plan: Optional[PackingPlan] = None,
+    ) -> Tensor:
+        """Same as forward, but the transformer layers run over the real tokens
+        of the samples packed into rows of ``row_length`` tokens instead of the
+        padded sequences (see ``mmf.models.transformers.packing``). ``plan`` is
+        the packing planned at collate time, if any. Returns the sequence
+        output, which is zero at the padding of the sequences.
+        """
+        attention_mask = self.generate_attention_mask(masks)
+        # Embeddings are computed on the padded sequences for the positions and
+        # segments of the tokens in their modality
+        embedding = self.generate_embeddings(
+            tokens_ids, position_ids, segment_ids, attention_mask
+        )
+
+        packed = pack_sequences(torch.cat(masks, dim=-1), row_length, plan)
+        encoded_layers = self.generate_encoded_layers(
+            pack(embedding, packed), packed.attention_mask.to(embedding.dtype)
+        )
+        return unpack(encoded_layers[-1], packed)
+
 
 class BaseTransformer(BaseModel):
     def __init__(self, config: BaseTransformerConfigType):
@@ -0,0 +1,193 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+"""
+Packing of the tokens of variable length multimodal sequences into rows of a
+fixed length, so that the transformer layers don't run over the padding of
+each modality. The real tokens of a sample (e.g. its question tokens followed
+by its image regions) are kept together in a row, and several samples share
+a row, with a block-diagonal attention mask which keeps them apart. The
+outputs are scattered back to the padded sequences, so that the heads of a
+model are the same with and without packing.
+
+.. code::
+
+    packed = pack_sequences(attention_mask, row_length=256)
+    encoded = encoder(pack(embedding, packed), packed.attention_mask)
+    sequence_output = unpack(encoded, packed)
+
+Assigning the samples to rows needs their lengths on the host. The
+``packing_plan`` collate processor computes this :class:`PackingPlan` in the
+DataLoader workers and adds it to the batch, so that ``pack_sequences`` only
+builds the attention mask on the device. Without it, the packing is planned
+in the forward of the model.
+"""
+from typing import List, NamedTuple, Optional, Tuple
+
+import torch
+from torch import Tensor
+
+
+class PackedSequences(NamedTuple):
+    # Index of the real tokens in the flattened padded sequences
+    token_index: Tensor
+    # Index of the real tokens in the flattened packed rows
+    slot_index: Tensor
+    # Additive block-diagonal mask, num_rows x 1 x row_length x row_length
+    attention_mask: Tensor
+    num_rows: int
+    row_length: int
+    # Batch size and length of the padded sequences
+    padded_size: Tuple[int, int]
+
+
+class PackingPlan(NamedTuple):
+    # Index of the real tokens in the flattened padded sequences
+    token_index: Tensor
+    # Index of the real tokens in the flattened packed rows
+    slot_index: Tensor
+    num_rows: int
+    row_length: int
+    # Batch size and length of the padded sequences
+    padded_size: Tuple[int, int]
+
+    def to(self, device, non_blocking: bool = True) -> "PackingPlan":
+        return self._replace(
+            token_index=self.token_index.to(device, non_blocking=non_blocking),
+            slot_index=self.slot_index.to(device, non_blocking=non_blocking),
+        )
+
+    def pin_memory(self) -> "PackingPlan":
+        return self._replace(
+            token_index=self.token_index.pin_memory(),
+            slot_index=self.slot_index.pin_memory(),
+        )
+
+
+def assign_rows(lengths: List[int], row_length: int) -> Tuple[List[int], List[int]]:
+    """Assigns sequences of ``lengths`` to rows of ``row_length`` tokens, the
+    longest first, each to the first row which it fits in. Returns the row of
+    each sequence and its offset in the row.
+    """
+    rows, offsets = [0] * len(lengths), [0] * len(lengths)
+    row_sizes: List[int] = []
+    for idx in sorted(range(len(lengths)), key=lambda i: -lengths[i]):
+        length = lengths[idx]
+        if length > row_length:
+            raise ValueError(
+                f"Sequence of {length} tokens doesn't fit in packed rows of "
+                + f"{row_length} tokens, increase packed_sequence_length"
+            )
+        row = next(
+            (r for r, size in enumerate(row_sizes) if size + length <= row_length),
+            len(row_sizes),
+        )
+        if row == len(row_sizes):
+            row_sizes.append(0)
+        rows[idx], offsets[idx] = row, row_sizes[row]
+        row_sizes[row] += length
+    return rows, offsets
+
+
+def plan_packing(
+    attention_mask: Tensor, row_length: Optional[int] = None
+) -> PackingPlan:
+    """Plans the packing of the sequences of a batch, given their
+    ``batch_size x length`` mask, which is 1 at their real tokens, into rows of
+    ``row_length`` tokens (by default the length of the padded sequences).
+    The lengths of the sequences are copied to the host to assign them to
+    rows, so this is best called at collate time.
+    """
+    batch_size, length = attention_mask.size()
+    if row_length is None:
+        row_length = length
+    mask = attention_mask.reshape(-1) != 0
+    lengths = mask.view(batch_size, length).sum(1)
+    rows, offsets = assign_rows(lengths.tolist(), row_length)
+    num_rows = max(rows) + 1 if batch_size > 0 else 0
+
+    device = attention_mask.device
+    token_index = mask.nonzero(as_tuple=False).squeeze(1)
+    # Tokens of each sample are contiguous in token_index
+    token_sample = token_index // length
+    starts = torch.cumsum(lengths, 0) - lengths
+    row_starts = torch.tensor(
+        [row * row_length + offset for row, offset in zip(rows, offsets)],
+        dtype=torch.long,
+    ).to(device, non_blocking=True)
+    slot_index = (
+        row_starts[token_sample]
+        + torch.arange(token_index.size(0), device=device)
+        - starts[token_sample]
+    )
+    return PackingPlan(
+        token_index, slot_index, num_rows, row_length, (batch_size, length)
+    )
+
+
+def pack_sequences(
+    attention_mask: Tensor,
+    row_length: Optional[int] = None,
+    plan: Optional[PackingPlan] = None,
+) -> PackedSequences:
+    """Packs the sequences of a batch, given their ``batch_size x length``
+    mask, into rows of ``row_length`` tokens (by default the length of the
+    padded sequences). Uses the ``plan`` computed at collate time if there is
+    one, in which case everything runs on the device of the mask, otherwise
+    the packing is planned with :func:`plan_packing`.
+    """
+    batch_size, length = attention_mask.size()
+    if row_length is None:
+        row_length = length
+    if plan is None:
+        plan = plan_packing(attention_mask, row_length)
+    elif plan.padded_size != (batch_size, length) or plan.row_length != row_length:
+        raise ValueError(
+            f"Packing plan of sequences of size {plan.padded_size} into rows "
+            + f"of {plan.row_length} tokens doesn't match the sequences of "
+            + f"size {(batch_size, length)} and rows of {row_length} tokens"
+        )
+
+    device = attention_mask.device
+    token_index = plan.token_index.to(device, non_blocking=True)
+    slot_index = plan.slot_index.to(device, non_blocking=True)
+    num_rows = plan.num_rows
+
+    # Packed tokens only attend to the tokens of the same sample
+    slot_sample = torch.full(
+        (num_rows * row_length,), -1, dtype=torch.long, device=device
+    )
+    slot_sample[slot_index] = token_index // length
+    slot_sample = slot_sample.view(num_rows, row_length)
+    same_sample = (slot_sample.unsqueeze(2) == slot_sample.unsqueeze(1)) & (
+        slot_sample.unsqueeze(1) >= 0
+    )
+    packed_mask = (1.0 - same_sample.float()) * -10000.0
+
+    return PackedSequences(
+        token_index,
+        slot_index,
+        packed_mask.unsqueeze(1),
+        num_rows,
+        row_length,
+        (batch_size, length),
+    )
+
+
+def pack(sequences: Tensor, packed: PackedSequences) -> Tensor:
+    """batch_size x length x dim -> num_rows x row_length x dim"""
+    dim = sequences.size(-1)
+    tokens = sequences.reshape(-1, dim).index_select(0, packed.token_index)
+    rows = sequences.new_zeros(packed.num_rows * packed.row_length, dim)
+    rows = rows.index_copy(0, packed.slot_index, tokens)
+    return rows.view(packed.num_rows, packed.row_length, dim)
+
+
+def unpack(rows: Tensor, packed: PackedSequences) -> Tensor:
+    """num_rows x row_length x dim -> batch_size x length x dim, zero at the
+    padding of the sequences.
+    """
+    batch_size, length = packed.padded_size
+    dim = rows.size(-1)
+    tokens = rows.reshape(-1, dim).index_select(0, packed.slot_index)
+    sequences = rows.new_zeros(batch_size * length, dim)
+    sequences = sequences.index_copy(0, packed.token_index, tokens)
+    return sequences.view(batch_size, length, dim)
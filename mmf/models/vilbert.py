@@ -1,18 +1,23 @@
 # Copyright (c) Facebook, Inc. and its affiliates.
 
-import math
 import os
 from copy import deepcopy
 from typing import Dict, List, Optional, Tuple
 
-import numpy as np
 import torch
 import torch.nn.functional as F
 from mmf.common.registry import registry
 from mmf.models import BaseModel
+from mmf.modules.attention import scaled_dot_product_attention
 from mmf.modules.hf_layers import replace_with_jit
 from mmf.utils.configuration import get_mmf_cache_dir
-from mmf.utils.modeling import get_optimizer_parameters_for_bert
+from mmf.utils.encoder_cache import get_encoder_output_key, is_encoder_cached
+from mmf.utils.modeling import (
+    checkpoint_forward,
+    get_checkpoint_interval,
+    get_optimizer_parameters_for_bert,
+    should_checkpoint_layer,
+)
 from omegaconf import OmegaConf
 from torch import Tensor, nn
 from torch.nn import CrossEntropyLoss
@@ -42,6 +47,10 @@ class BertSelfAttention(nn.Module):
         self.all_head_size = self.num_attention_heads * self.attention_head_size
 
         self.visualization = config.visualization
+        # The attention probabilities are needed for the visualization
+        self.use_sdpa_attention = (
+            getattr(config, "use_sdpa_attention", False) and not self.visualization
+        )
 
         self.query = nn.Linear(config.hidden_size, self.all_head_size)
         self.key = nn.Linear(config.hidden_size, self.all_head_size)
@@ -68,34 +77,27 @@ class BertSelfAttention(nn.Module):
         key_layer = self.transpose_for_scores(mixed_key_layer)
         value_layer = self.transpose_for_scores(mixed_value_layer)
 
-        # Take the dot product between "query" and "key" to get the raw
-        # attention scores.
-        attention_scores = torch.matmul(query_layer, key_layer.transpose(-1, -2))
-        attention_scores = attention_scores / math.sqrt(self.attention_head_size)
         # Apply the attention mask is (precomputed for all layers in
         # BertModel forward() function)
-        attention_scores = attention_scores + attention_mask
-
-        # Normalize the attention scores to probabilities.
-        attention_probs = nn.functional.softmax(attention_scores, dim=-1)
-
-        # This is actually dropping out entire tokens to attend to, which might
-        # seem a bit unusual, but is taken from the original Transformer paper.
-        attention_probs = self.dropout(attention_probs)
-
-        context_layer = torch.matmul(attention_probs, value_layer)
+        context_layer, attention_probs = scaled_dot_product_attention(
+            query_layer,
+            key_layer,
+            value_layer,
+            attention_mask,
+            dropout_p=self.dropout.p if self.training else 0.0,
+            use_sdpa=self.use_sdpa_attention,
+        )
         context_layer = context_layer.permute(0, 2, 1, 3).contiguous()
         new_context_layer_shape = context_layer.size()[:-2] + (self.all_head_size,)
         context_layer = context_layer.view(new_context_layer_shape)
 
-        if self.visualization:
+        attn_data: Dict[str, Tensor] = {}
+        if self.visualization and attention_probs is not None:
             attn_data = {
                 "attn": attention_probs,
                 "queries": query_layer,
                 "keys": key_layer,
             }
-        else:
-            attn_data = {}
 
         return context_layer, attn_data
 
@@ -151,6 +153,9 @@ class BertImageSelfAttention(nn.Module):
         )
 
         self.visualization = config.visualization
+        self.use_sdpa_attention = (
+            getattr(config, "use_sdpa_attention", False) and not self.visualization
+        )
 
         self.all_head_size = self.num_attention_heads * self.attention_head_size
         self.query = nn.Linear(config.v_hidden_size, self.all_head_size)
@@ -202,34 +207,27 @@ class BertImageSelfAttention(nn.Module):
         key_layer = self.transpose_for_scores(mixed_key_layer)
         value_layer = self.transpose_for_scores(mixed_value_layer)
 
-        # Take the dot product between "query" and "key" to get the
-        # raw attention scores.
-        attention_scores = torch.matmul(query_layer, key_layer.transpose(-1, -2))
-        attention_scores = attention_scores / math.sqrt(self.attention_head_size)
-        # Apply the attention mask is (precomputed for all layers in BertModel
-        # forward() function)
-        attention_scores = attention_scores + attention_mask
-
-        # Normalize the attention scores to probabilities.
-        attention_probs = nn.functional.softmax(attention_scores, dim=-1)
-
-        # This is actually dropping out entire tokens to attend to, which might
-        # seem a bit unusual, but is taken from the original Transformer paper.
-        attention_probs = self.dropout(attention_probs)
-
-        context_layer = torch.matmul(attention_probs, value_layer)
+        # Apply the attention mask is (precomputed for all layers in
+        # BertModel forward() function)
+        context_layer, attention_probs = scaled_dot_product_attention(
+            query_layer,
+            key_layer,
+            value_layer,
+            attention_mask,
+            dropout_p=self.dropout.p if self.training else 0.0,
+            use_sdpa=self.use_sdpa_attention,
+        )
         context_layer = context_layer.permute(0, 2, 1, 3).contiguous()
         new_context_layer_shape = context_layer.size()[:-2] + (self.all_head_size,)
         context_layer = context_layer.view(new_context_layer_shape)
 
-        if self.visualization:
+        attn_data: Dict[str, Tensor] = {}
+        if self.visualization and attention_probs is not None:
             attn_data = {
                 "attn": attention_probs,
                 "queries": query_layer,
                 "keys": key_layer,
             }
-        else:
-            attn_data = {}
 
         return context_layer, attn_data
 
@@ -341,6 +339,9 @@ class BertBiAttention(nn.Module):
             )
 
         self.visualization = config.visualization
+        self.use_sdpa_attention = (
+            getattr(config, "use_sdpa_attention", False) and not self.visualization
+        )
         self.num_attention_heads = config.bi_num_attention_heads
         self.attention_head_size = int(
             config.bi_hidden_size / config.bi_num_attention_heads
@@ -404,53 +405,44 @@ class BertBiAttention(nn.Module):
         value_layer2 = self.transpose_for_scores(mixed_value_layer2)
         # logit_layer2 = self.transpose_for_logits(mixed_logit_layer2)
 
-        # Take the dot product between "query2" and "key1" to get the raw
-        # attention scores for value 1.
-        attention_scores1 = torch.matmul(query_layer2, key_layer1.transpose(-1, -2))
-        attention_scores1 = attention_scores1 / math.sqrt(self.attention_head_size)
-        attention_scores1 = attention_scores1 + attention_mask1
+        # Attention of query2 over key1 for value 1.
         # if use_co_attention_mask:
-        # attention_scores1 = attention_scores1 + co_attention_mask.permute(0,1,3,2)
-
-        # Normalize the attention scores to probabilities.
-        attention_probs1 = nn.functional.softmax(attention_scores1, dim=-1)
-
-        # This is actually dropping out entire tokens to attend to, which might
-        # seem a bit unusual, but is taken from the original Transformer paper.
-        attention_probs1 = self.dropout1(attention_probs1)
-
-        context_layer1 = torch.matmul(attention_probs1, value_layer1)
+        # attention_mask1 = attention_mask1 + co_attention_mask.permute(0,1,3,2)
+        context_layer1, attention_probs1 = scaled_dot_product_attention(
+            query_layer2,
+            key_layer1,
+            value_layer1,
+            attention_mask1,
+            dropout_p=self.dropout1.p if self.training else 0.0,
+            use_sdpa=self.use_sdpa_attention,
+        )
         context_layer1 = context_layer1.permute(0, 2, 1, 3).contiguous()
         new_context_layer_shape1 = context_layer1.size()[:-2] + (self.all_head_size,)
         context_layer1 = context_layer1.view(new_context_layer_shape1)
 
-        # Take the dot product between "query1" and "key2" to get the
-        # raw attention scores for value 2.
-        attention_scores2 = torch.matmul(query_layer1, key_layer2.transpose(-1, -2))
-        attention_scores2 = attention_scores2 / math.sqrt(self.attention_head_size)
+        # Attention of query1 over key2 for value 2.
         # Apply the attention mask is (precomputed for all layers in BertModel
         # forward() function)
-
-        # we can comment this line for single flow.
-        attention_scores2 = attention_scores2 + attention_mask2
         # if use_co_attention_mask:
-        # attention_scores2 = attention_scores2 + co_attention_mask
-
-        # Normalize the attention scores to probabilities.
-        attention_probs2 = nn.functional.softmax(attention_scores2, dim=-1)
-
-        # This is actually dropping out entire tokens to attend to, which might
-        # seem a bit unusual, but is taken from the original Transformer paper.
-        attention_probs2 = self.dropout2(attention_probs2)
-
-        context_layer2 = torch.matmul(attention_probs2, value_layer2)
+        # attention_mask2 = attention_mask2 + co_attention_mask
+        context_layer2, attention_probs2 = scaled_dot_product_attention(
+            query_layer1,
+            key_layer2,
+            value_layer2,
+            attention_mask2,
+            dropout_p=self.dropout2.p if self.training else 0.0,
+            use_sdpa=self.use_sdpa_attention,
+        )
         context_layer2 = context_layer2.permute(0, 2, 1, 3).contiguous()
         new_context_layer_shape2 = context_layer2.size()[:-2] + (self.all_head_size,)
         context_layer2 = context_layer2.view(new_context_layer_shape2)
 
-        attn_data = {}
-
-        if self.visualization:
+        attn_data: Dict[str, Tensor] = {}
+        if (
+            self.visualization
+            and attention_probs1 is not None
+            and attention_probs2 is not None
+        ):
             attn_data = {
                 "attn1": attention_probs1,
                 "queries1": query_layer2,
@@ -576,6 +568,12 @@ class BertEncoder(nn.Module):
         self.c_layer = nn.ModuleList(
             [deepcopy(connect_layer) for _ in range(len(config.v_biattention_id))]
         )
+        # Activation checkpointing of one of every N layers, or of one of every N
+        # co-attention blocks only
+        self.checkpoint_interval = get_checkpoint_interval(config)
+        self.checkpoint_co_attention_only = getattr(
+            config, "checkpoint_co_attention_only", False
+        )
 
     def forward(
         self,
@@ -587,6 +585,7 @@ class BertEncoder(nn.Module):
         co_attention_mask: Tensor,
         output_all_encoded_layers: bool = True,
         output_all_attention_masks: bool = False,
+        frozen_inputs: bool = False,
     ) -> Tuple[
         List[Tensor],
         List[Tensor],
@@ -595,6 +594,11 @@ class BertEncoder(nn.Module):
 
         v_start = 0
         t_start = 0
+        if frozen_inputs:
+            # The inputs are the outputs of the layers below fixed_t_layer and
+            # fixed_v_layer, see forward_frozen_layers
+            t_start = self.fixed_t_layer
+            v_start = self.fixed_v_layer
         count = 0
         all_encoder_layers_t: List[Tensor] = []
         all_encoder_layers_v: List[Tensor] = []
@@ -606,6 +610,14 @@ class BertEncoder(nn.Module):
         batch_size, num_words, t_hidden_size = txt_embedding.size()
         _, num_regions, v_hidden_size = image_embedding.size()
 
+        # The attention probabilities aren't returned by the checkpointed layers
+        checkpoint_interval = 0
+        co_checkpoint_interval = 0
+        if not torch.jit.is_scripting() and not output_all_attention_masks:
+            co_checkpoint_interval = self.checkpoint_interval
+            if not self.checkpoint_co_attention_only:
+                checkpoint_interval = self.checkpoint_interval
+
         use_co_attention_mask = False
         for v_layer_id, t_layer_id in zip(self.v_biattention_id, self.t_biattention_id):
 
@@ -629,11 +641,18 @@ class BertEncoder(nn.Module):
             cur_idx = 0
             for cur_layer in self.layer:
                 if t_start <= cur_idx < t_end:
-                    txt_embedding, txt_attention_probs = cur_layer(
-                        txt_embedding, txt_attention_mask
-                    )
-                    if output_all_attention_masks and "attn" in txt_attention_probs:
-                        all_attention_mask_t.append(txt_attention_probs["attn"])
+                    if not torch.jit.is_scripting() and should_checkpoint_layer(
+                        cur_idx, checkpoint_interval, self.training
+                    ):
+                        txt_embedding = checkpoint_forward(
+                            cur_layer, txt_embedding, txt_attention_mask
+                        )[0]
+                    else:
+                        txt_embedding, txt_attention_probs = cur_layer(
+                            txt_embedding, txt_attention_mask
+                        )
+                        if output_all_attention_masks and "attn" in txt_attention_probs:
+                            all_attention_mask_t.append(txt_attention_probs["attn"])
                 cur_idx += 1
 
             cur_v_idx = 0
@@ -657,14 +676,28 @@ class BertEncoder(nn.Module):
             cur_v_idx = 0
             for cur_v_layer in self.v_layer:
                 if v_start <= cur_v_idx < v_end:
-                    image_embedding, image_attention_probs = cur_v_layer(
-                        image_embedding,
-                        image_attention_mask,
-                        txt_embedding,
-                        txt_attention_mask2,
-                    )
-                    if output_all_attention_masks and "attn" in image_attention_probs:
-                        all_attnetion_mask_v.append(image_attention_probs["attn"])
+                    if not torch.jit.is_scripting() and should_checkpoint_layer(
+                        cur_v_idx, checkpoint_interval, self.training
+                    ):
+                        image_embedding = checkpoint_forward(
+                            cur_v_layer,
+                            image_embedding,
+                            image_attention_mask,
+                            txt_embedding,
+                            txt_attention_mask2,
+                        )[0]
+                    else:
+                        image_embedding, image_attention_probs = cur_v_layer(
+                            image_embedding,
+                            image_attention_mask,
+                            txt_embedding,
+                            txt_attention_mask2,
+                        )
+                        if (
+                            output_all_attention_masks
+                            and "attn" in image_attention_probs
+                        ):
+                            all_attnetion_mask_v.append(image_attention_probs["attn"])
                 cur_v_idx += 1
 
             if count == 0 and self.in_batch_pairs:
@@ -718,31 +751,45 @@ class BertEncoder(nn.Module):
                 cur_c_idx = 0
                 for cur_c_layer in self.c_layer:
                     if cur_c_idx == count:
-                        # do the bi attention.
-                        (
-                            image_embedding,
-                            txt_embedding,
-                            co_attention_probs,
-                        ) = cur_c_layer(
-                            image_embedding,
-                            image_attention_mask,
-                            txt_embedding,
-                            txt_attention_mask,
-                            co_attention_mask,
-                            use_co_attention_mask,
-                        )
-
-                        if (
-                            output_all_attention_masks
-                            and "attn1" in co_attention_probs
-                            and "attn2" in co_attention_probs
+                        if not torch.jit.is_scripting() and should_checkpoint_layer(
+                            cur_c_idx, co_checkpoint_interval, self.training
                         ):
-                            all_attention_mask_c.append(
-                                (
-                                    co_attention_probs["attn1"],
-                                    co_attention_probs["attn2"],
-                                )
+                            image_embedding, txt_embedding = checkpoint_forward(
+                                cur_c_layer,
+                                image_embedding,
+                                image_attention_mask,
+                                txt_embedding,
+                                txt_attention_mask,
+                                co_attention_mask,
+                                num_outputs=2,
+                                use_co_attention_mask=use_co_attention_mask,
                             )
+                        else:
+                            # do the bi attention.
+                            (
+                                image_embedding,
+                                txt_embedding,
+                                co_attention_probs,
+                            ) = cur_c_layer(
+                                image_embedding,
+                                image_attention_mask,
+                                txt_embedding,
+                                txt_attention_mask,
+                                co_attention_mask,
+                                use_co_attention_mask,
+                            )
+
+                            if (
+                                output_all_attention_masks
+                                and "attn1" in co_attention_probs
+                                and "attn2" in co_attention_probs
+                            ):
+                                all_attention_mask_c.append(
+                                    (
+                                        co_attention_probs["attn1"],
+                                        co_attention_probs["attn2"],
+                                    )
+                                )
                     cur_c_idx += 1
 
             v_start = v_end
@@ -756,24 +803,42 @@ class BertEncoder(nn.Module):
         cur_v_idx = 0
         for cur_v_layer in self.v_layer:
             if cur_v_idx >= v_start:
-                image_embedding, image_attention_probs = cur_v_layer(
-                    image_embedding,
-                    image_attention_mask,
-                    txt_embedding,
-                    txt_attention_mask2,
-                )
-                if output_all_attention_masks and "attn" in image_attention_probs:
-                    all_attnetion_mask_v.append(image_attention_probs["attn"])
+                if not torch.jit.is_scripting() and should_checkpoint_layer(
+                    cur_v_idx, checkpoint_interval, self.training
+                ):
+                    image_embedding = checkpoint_forward(
+                        cur_v_layer,
+                        image_embedding,
+                        image_attention_mask,
+                        txt_embedding,
+                        txt_attention_mask2,
+                    )[0]
+                else:
+                    image_embedding, image_attention_probs = cur_v_layer(
+                        image_embedding,
+                        image_attention_mask,
+                        txt_embedding,
+                        txt_attention_mask2,
+                    )
+                    if output_all_attention_masks and "attn" in image_attention_probs:
+                        all_attnetion_mask_v.append(image_attention_probs["attn"])
             cur_v_idx += 1
 
         cur_idx = 0
         for cur_layer in self.layer:
             if cur_idx >= t_start:
-                txt_embedding, txt_attention_probs = cur_layer(
-                    txt_embedding, txt_attention_mask
-                )
-                if output_all_attention_masks and "attn" in txt_attention_probs:
-                    all_attention_mask_t.append(txt_attention_probs["attn"])
+                if not torch.jit.is_scripting() and should_checkpoint_layer(
+                    cur_idx, checkpoint_interval, self.training
+                ):
+                    txt_embedding = checkpoint_forward(
+                        cur_layer, txt_embedding, txt_attention_mask
+                    )[0]
+                else:
+                    txt_embedding, txt_attention_probs = cur_layer(
+                        txt_embedding, txt_attention_mask
+                    )
+                    if output_all_attention_masks and "attn" in txt_attention_probs:
+                        all_attention_mask_t.append(txt_attention_probs["attn"])
             cur_idx += 1
 
         # add the end part to finish.
@@ -787,6 +852,32 @@ class BertEncoder(nn.Module):
             (all_attention_mask_t, all_attnetion_mask_v, all_attention_mask_c),
         )
 
+    @torch.no_grad()
+    def forward_frozen_layers(
+        self,
+        txt_embedding: Tensor,
+        image_embedding: Tensor,
+        txt_attention_mask: Tensor,
+        txt_attention_mask2: Tensor,
+        image_attention_mask: Tensor,
+    ) -> Tuple[Tensor, Tensor]:
+        """Text and image outputs of the layers below fixed_t_layer and
+        fixed_v_layer, which aren't trained and from which ``forward`` starts
+        with ``frozen_inputs``. As in ``forward``, only the first of these
+        layers is run. The image layers only depend on the text with
+        dynamic_attention, which isn't supported.
+        """
+        if self.fixed_t_layer > 0:
+            txt_embedding = self.layer[0](txt_embedding, txt_attention_mask)[0]
+        if self.fixed_v_layer > 0:
+            image_embedding = self.v_layer[0](
+                image_embedding,
+                image_attention_mask,
+                txt_embedding,
+                txt_attention_mask2,
+            )[0]
+        return txt_embedding, image_embedding
+
 
 class BertTextPooler(nn.Module):
     def __init__(self, config):
@@ -926,41 +1017,20 @@ class ViLBERTBase(BertPreTrainedModel):
 
         self.init_weights()
 
-    def forward(
+    def get_extended_attention_masks(
         self,
         input_txt: Tensor,
         image_feature: Tensor,
-        image_location: Tensor,
-        token_type_ids: Optional[Tensor] = None,
         attention_mask: Optional[Tensor] = None,
         image_attention_mask: Optional[Tensor] = None,
-        co_attention_mask: Optional[Tensor] = None,
-        task_ids: Optional[Tensor] = None,
-        output_all_encoded_layers: bool = False,
-        output_all_attention_masks: bool = False,
-    ) -> Tuple[
-        Tensor,
-        Tensor,
-        Tensor,
-        Tensor,
-        Optional[Tuple[List[Tensor], List[Tensor], List[Tuple[Tensor, Tensor]]]],
-        Optional[List[Tensor]],
-        Optional[List[Tensor]],
-    ]:
+    ) -> Tuple[Tensor, Tensor, Tensor]:
         if attention_mask is None:
             attention_mask = torch.ones_like(input_txt)
-        if token_type_ids is None:
-            token_type_ids = torch.zeros_like(input_txt)
         if image_attention_mask is None:
             image_attention_mask = torch.ones(
                 image_feature.size(0), image_feature.size(1)
             ).type_as(input_txt)
 
-        all_attention_mask_output: Optional[
-            Tuple[List[Tensor], List[Tensor], List[Tuple[Tensor, Tensor]]]
-        ] = None
-        encoded_layers_t_output: Optional[List[Tensor]] = None
-        encoded_layers_v_output: Optional[List[Tensor]] = None
         if self.task_specific_tokens:
             # extend the mask
             mask_tokens = torch.ones(input_txt.size(0), 1, device=input_txt.device)
@@ -994,6 +1064,83 @@ class ViLBERTBase(BertPreTrainedModel):
                 dtype=next(self.parameters()).dtype
             )
         extended_image_attention_mask = (1.0 - extended_image_attention_mask) * -10000.0
+        return (
+            extended_attention_mask,
+            extended_attention_mask2,
+            extended_image_attention_mask,
+        )
+
+    def forward_frozen_layers(
+        self,
+        input_txt: Tensor,
+        image_feature: Tensor,
+        image_location: Tensor,
+        token_type_ids: Optional[Tensor] = None,
+        attention_mask: Optional[Tensor] = None,
+        image_attention_mask: Optional[Tensor] = None,
+        task_ids: Optional[Tensor] = None,
+    ) -> Tuple[Tensor, Tensor]:
+        """Text and image outputs of the layers below fixed_t_layer and
+        fixed_v_layer, which can be cached and passed to ``forward`` as
+        ``frozen_txt_output`` and ``frozen_image_output``.
+        """
+        if token_type_ids is None:
+            token_type_ids = torch.zeros_like(input_txt)
+        (
+            extended_attention_mask,
+            extended_attention_mask2,
+            extended_image_attention_mask,
+        ) = self.get_extended_attention_masks(
+            input_txt, image_feature, attention_mask, image_attention_mask
+        )
+        embedding_output = self.embeddings(input_txt, token_type_ids, task_ids)
+        v_embedding_output = self.v_embeddings(image_feature, image_location)
+        return self.encoder.forward_frozen_layers(
+            embedding_output,
+            v_embedding_output,
+            extended_attention_mask,
+            extended_attention_mask2,
+            extended_image_attention_mask,
+        )
+
+    def forward(
+        self,
+        input_txt: Tensor,
+        image_feature: Tensor,
+        image_location: Tensor,
+        token_type_ids: Optional[Tensor] = None,
+        attention_mask: Optional[Tensor] = None,
+        image_attention_mask: Optional[Tensor] = None,
+        co_attention_mask: Optional[Tensor] = None,
+        task_ids: Optional[Tensor] = None,
+        output_all_encoded_layers: bool = False,
+        output_all_attention_masks: bool = False,
+        frozen_txt_output: Optional[Tensor] = None,
+        frozen_image_output: Optional[Tensor] = None,
+    ) -> Tuple[
+        Tensor,
+        Tensor,
+        Tensor,
+        Tensor,
+        Optional[Tuple[List[Tensor], List[Tensor], List[Tuple[Tensor, Tensor]]]],
+        Optional[List[Tensor]],
+        Optional[List[Tensor]],
+    ]:
+        if token_type_ids is None:
+            token_type_ids = torch.zeros_like(input_txt)
+
+        all_attention_mask_output: Optional[
+            Tuple[List[Tensor], List[Tensor], List[Tuple[Tensor, Tensor]]]
+        ] = None
+        encoded_layers_t_output: Optional[List[Tensor]] = None
+        encoded_layers_v_output: Optional[List[Tensor]] = None
+        (
+            extended_attention_mask,
+            extended_attention_mask2,
+            extended_image_attention_mask,
+        ) = self.get_extended_attention_masks(
+            input_txt, image_feature, attention_mask, image_attention_mask
+        )
 
         if co_attention_mask is None:
             co_attention_mask = torch.zeros(
@@ -1008,8 +1155,15 @@ class ViLBERTBase(BertPreTrainedModel):
             extended_co_attention_mask = extended_co_attention_mask.to(
                 dtype=next(self.parameters()).dtype
             )
-        embedding_output = self.embeddings(input_txt, token_type_ids, task_ids)
-        v_embedding_output = self.v_embeddings(image_feature, image_location)
+        if frozen_txt_output is not None and frozen_image_output is not None:
+            # Cached outputs of the layers below fixed_t_layer and fixed_v_layer
+            embedding_output = frozen_txt_output
+            v_embedding_output = frozen_image_output
+            frozen_inputs = True
+        else:
+            embedding_output = self.embeddings(input_txt, token_type_ids, task_ids)
+            v_embedding_output = self.v_embeddings(image_feature, image_location)
+            frozen_inputs = False
         encoded_layers_t, encoded_layers_v, all_attention_mask = self.encoder(
             embedding_output,
             v_embedding_output,
@@ -1019,6 +1173,7 @@ class ViLBERTBase(BertPreTrainedModel):
             extended_co_attention_mask,
             output_all_encoded_layers=output_all_encoded_layers,
             output_all_attention_masks=output_all_attention_masks,
+            frozen_inputs=frozen_inputs,
         )
 
         sequence_output_t = encoded_layers_t[-1]
@@ -1284,6 +1439,8 @@ class ViLBERTForClassification(nn.Module):
         image_target: Optional[Tensor] = None,
         next_sentence_label: Optional[Tensor] = None,
         output_all_attention_masks: bool = False,
+        frozen_txt_output: Optional[Tensor] = None,
+        frozen_image_output: Optional[Tensor] = None,
     ) -> Dict[str, Tensor]:
 
         (
@@ -1303,6 +1460,8 @@ class ViLBERTForClassification(nn.Module):
             image_attention_mask,
             output_all_encoded_layers=False,
             output_all_attention_masks=output_all_attention_masks,
+            frozen_txt_output=frozen_txt_output,
+            frozen_image_output=frozen_image_output,
         )
 
         output = {}
@@ -1355,6 +1514,24 @@ class ViLBERT(BaseModel):
             for p in self.model.bert.parameters():
                 p.requires_grad = False
 
+        # Cached outputs of the layers below fixed_t_layer and fixed_v_layer,
+        # which are added to the batches by the datasets, are used instead of
+        # running them. These layers are never trained.
+        self.use_encoder_cache = is_encoder_cached(self.config, True)
+        if self.use_encoder_cache:
+            # The inputs of pretraining are randomly masked at every step
+            assert self.config.training_head_type not in ("pretraining", "nlvr2"), (
+                "Frozen layer outputs can't be cached for "
+                + f"{self.config.training_head_type}"
+            )
+            assert (
+                not self.config.dynamic_attention
+            ), "Frozen layer outputs can't be cached with dynamic_attention"
+            assert self.config.fixed_t_layer > 0 and self.config.fixed_v_layer > 0, (
+                "Caching frozen layer outputs requires fixed_t_layer and "
+                + "fixed_v_layer to be set"
+            )
+
     def get_image_and_text_features(self, sample_list):
         bert_input_ids = sample_list.input_ids
         bert_input_mask = sample_list.input_mask
@@ -1393,12 +1570,8 @@ class ViLBERT(BaseModel):
             image_feature_variable = getattr(sample_list, "image_feature_0", None)
             image_label_variable = getattr(sample_list, "image_labels", None)
             image_location_variable = getattr(image_info, "bbox", None)
-
-            cls_prob = getattr(image_info, "cls_prob", None)
-            image_target = np.array(cls_prob, dtype=np.float32)
-            image_target_variable = torch.tensor(
-                image_target, dtype=torch.float, device=bert_input_ids.device
-            )
+            # Padded and batched by the feature readers of the dataset
+            image_target_variable = getattr(image_info, "cls_prob", None)
 
         return {
             "input_ids": bert_input_ids,
@@ -1414,7 +1587,7 @@ class ViLBERT(BaseModel):
     def get_optimizer_parameters(self, config):
         return get_optimizer_parameters_for_bert(self.model, config)
 
-    def forward(self, sample_list):
+    def get_model_inputs(self, sample_list):
         params = self.get_image_and_text_features(sample_list)
         # pretraining labels
         params["masked_lm_labels"] = getattr(sample_list, "lm_label_ids", None)
@@ -1435,6 +1608,33 @@ class ViLBERT(BaseModel):
         else:
             params["image_attention_mask"] = None
         params.pop("image_dim")
+        return params
+
+    def compute_encoder_outputs(self, sample_list):
+        """Outputs of the layers below fixed_t_layer and fixed_v_layer, which
+        are cached by mmf_cache_encoder.
+        """
+        params = self.get_model_inputs(sample_list)
+        txt_output, image_output = self.model.bert.forward_frozen_layers(
+            params["input_ids"],
+            params["image_feature"],
+            params["image_location"],
+            params["token_type_ids"],
+            params["attention_mask"],
+            params["image_attention_mask"],
+        )
+        return {"text": txt_output, "image": image_output}
+
+    def forward(self, sample_list):
+        params = self.get_model_inputs(sample_list)
+
+        frozen_outputs = {}
+        if self.use_encoder_cache:
+            for key, name in [
+                ("frozen_txt_output", "text"),
+                ("frozen_image_output", "image"),
+            ]:
+                frozen_outputs[key] = sample_list[get_encoder_output_key(name)]
 
         output_dict = self.model(
             params["input_ids"],
@@ -1446,6 +1646,7 @@ class ViLBERT(BaseModel):
             params["masked_lm_labels"],
             params["image_label"],
             params["image_target"],
+            **frozen_outputs,
         )
 
         if self.config.training_head_type == "pretraining":
@@ -8,6 +8,67 @@ from mmf.modules.layers import GatedTanh, ModalCombineLayer, TransformLayer
 from torch import nn
 
 
+def scaled_dot_product_attention(
+    query: torch.Tensor,
+    key: torch.Tensor,
+    value: torch.Tensor,
+    attention_mask: Optional[torch.Tensor] = None,
+    dropout_p: float = 0.0,
+    head_mask: Optional[torch.Tensor] = None,
+    use_sdpa: bool = False,
+) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
+    """Multi-head attention over ``(batch_size, num_heads, length, head_dim)``
+    queries, keys and values, shared by the transformer layers of MMF.
+
+    ``attention_mask`` is added to the attention scores, e.g. the
+    ``(batch_size, 1, 1, key_length)`` key padding masks with large negative
+    values at the padded positions that the BERT based models build.
+    ``dropout_p`` should be 0 in eval mode.
+
+    With ``use_sdpa``, dispatches to ``torch.nn.functional``'s
+    ``scaled_dot_product_attention`` when it is available (PyTorch 2.0+),
+    which picks the flash or memory efficient kernels when the inputs support
+    them and never materializes the attention probabilities. Otherwise, or
+    with ``head_mask`` or in TorchScript, computes the attention explicitly.
+
+    Returns:
+        Tuple[torch.Tensor, Optional[torch.Tensor]]: The attention output and
+        the attention probabilities, which are None with the fused kernels.
+    """
+    # The fused kernels aren't compiled in TorchScript
+    if not torch.jit.is_scripting():
+        sdpa = getattr(nn.functional, "scaled_dot_product_attention", None)
+        if use_sdpa and head_mask is None and sdpa is not None:
+            output = sdpa(
+                query, key, value, attn_mask=attention_mask, dropout_p=dropout_p
+            )
+            return output, None
+
+    attention_scores = torch.matmul(query, key.transpose(-1, -2))
+    attention_scores = attention_scores / math.sqrt(query.size(-1))
+    if attention_mask is not None:
+        attention_scores = attention_scores + attention_mask
+
+    attention_probs = nn.functional.softmax(attention_scores, dim=-1)
+    if dropout_p > 0:
+        attention_probs = nn.functional.dropout(attention_probs, p=dropout_p)
+    if head_mask is not None:
+        attention_probs = attention_probs * head_mask
+
+    return torch.matmul(attention_probs, value), attention_probs
+
+
+def set_sdpa_attention(module: nn.Module, enabled: bool = True):
+    """Switches the attention layers in ``module`` which support it to
+    :func:`scaled_dot_product_attention` with ``use_sdpa``. Their attention
+    probabilities, used for visualization or ``output_attentions``, are not
+    available when the fused kernels are used.
+    """
+    for submodule in module.modules():
+        if hasattr(submodule, "use_sdpa_attention"):
+            submodule.use_sdpa_attention = enabled
+
+
 class AttentionLayer(nn.Module):
     def __init__(self, image_dim, question_dim, **kwargs):
         super().__init__()
@@ -168,13 +229,20 @@ class MovieMcanMultiHeadAttention(nn.Module):
     used for Movie+MCAN
     """
 
-    def __init__(self, dim: int, num_attn: int, dropout: float = 0.1):
+    def __init__(
+        self,
+        dim: int,
+        num_attn: int,
+        dropout: float = 0.1,
+        use_sdpa_attention: bool = False,
+    ):
         super().__init__()
         self.p_attn = None
         self.h = num_attn
         self.d_k = dim // num_attn
         self.linears = nn.ModuleList([nn.Linear(dim, dim) for _ in range(4)])
         self.dropout = nn.Dropout(p=dropout)
+        self.use_sdpa_attention = use_sdpa_attention
 
     def qkv_attention(
         self,
@@ -183,17 +251,25 @@ class MovieMcanMultiHeadAttention(nn.Module):
         value: torch.Tensor,
         mask: Optional[torch.Tensor] = None,
         dropout: Type[nn.Dropout] = None,
-    ) -> Tuple[torch.Tensor, torch.Tensor]:
-        d_k = query.size(-1)
-        scores = torch.matmul(query, key.transpose(-2, -1)) / math.sqrt(d_k)
+    ) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
+        attention_mask = None
         if mask is not None:
-            scores.data.masked_fill_(mask.unsqueeze(1).unsqueeze(2), -1e9)
-
-        p_attn = nn.functional.softmax(scores, dim=-1)
-        if dropout is not None:
-            p_attn = dropout(p_attn)
-
-        return torch.matmul(p_attn, value), p_attn
+            # mask is True at the padded keys
+            attention_mask = query.new_zeros(mask.size()).masked_fill_(mask, -1e9)
+            attention_mask = attention_mask.unsqueeze(1).unsqueeze(2)
+
+        dropout_p = 0.0
+        if dropout is not None and dropout.training:
+            dropout_p = dropout.p
+
+        return scaled_dot_product_attention(
+            query,
+            key,
+            value,
+            attention_mask,
+            dropout_p=dropout_p,
+            use_sdpa=self.use_sdpa_attention,
+        )
 
     def forward(
         self, q: torch.Tensor, k: torch.Tensor, v: torch.Tensor, mask: torch.Tensor
@@ -31,65 +31,110 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 from mmf.common.registry import registry
-from mmf.utils.general import get_chunks, get_sizes_list
+from mmf.utils.general import get_chunk_indices, get_sizes_list, stack_chunks
 
 
-class CompactBilinearPooling(nn.Module):
+try:
+    # torch.fft is a module from torch 1.7, which replaces torch.rfft/irfft
+    import torch.fft
+
+    _HAS_FFT_MODULE = True
+except ImportError:
+    _HAS_FFT_MODULE = False
+
+
+def count_sketch(x, rand_h, rand_s, output_dim):
+    """Count sketch of the last dimension of ``x``, i.e. ``x`` multiplied by the
+    sparse ``input_dim x output_dim`` matrix with ``rand_s[i]`` at
+    ``(i, rand_h[i])``, computed by scattering instead of a dense matmul.
+    """
+    sketch = x.new_zeros(x.size()[:-1] + (output_dim,))
+    return sketch.index_add(x.dim() - 1, rand_h, x * rand_s)
+
+
+def circular_convolution(x1, x2, output_dim):
+    """Circular convolution of the last dimension of ``x1`` and ``x2``, of size
+    ``output_dim``, computed in the frequency domain.
+    """
+    if _HAS_FFT_MODULE:
+        fft_product = torch.fft.rfft(x1) * torch.fft.rfft(x2)
+        return torch.fft.irfft(fft_product, n=output_dim)
+
+    fft1 = torch.rfft(x1, signal_ndim=1)
+    fft2 = torch.rfft(x2, signal_ndim=1)
+    fft_product = torch.stack(
+        [
+            fft1[..., 0] * fft2[..., 0] - fft1[..., 1] * fft2[..., 1],
+            fft1[..., 0] * fft2[..., 1] + fft1[..., 1] * fft2[..., 0],
+        ],
+        dim=-1,
+    )
+    return torch.irfft(fft_product, signal_ndim=1, signal_sizes=(output_dim,))
+
+
+class ConvertedStateDictMixin:
+    """Mixin of the modules which convert the checkpoints of their previous
+    implementation when these are loaded. ``convert_state_dict`` converts in
+    place the entries of ``state_dict`` under ``prefix`` and returns whether
+    any parameters were converted.
+
+    The optimizer state saved with such a checkpoint is for the previous
+    parameters and can't be loaded. ``has_converted_state_dict`` is set so
+    that the checkpoint loading fails with a clear error, unless it is
+    resumed with ``checkpoint.reset.optimizer=True``.
+    """
+
+    has_converted_state_dict = False
+
+    def convert_state_dict(self, state_dict, prefix):
+        raise NotImplementedError
+
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        self.has_converted_state_dict = self.convert_state_dict(state_dict, prefix)
+        super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
+
+
+class CompactBilinearPooling(ConvertedStateDictMixin, nn.Module):
+    """Compact bilinear pooling of https://arxiv.org/abs/1511.06062.
+
+    The count sketches of the inputs are stored as their hash and sign vectors
+    (``input_dim`` values each) instead of dense ``input_dim x output_dim``
+    matrices. Checkpoints with the dense ``sketch1`` and ``sketch2`` matrices
+    of the previous implementation are converted when loaded.
+    """
+
     def __init__(self, input_dim1, input_dim2, output_dim, sum_pool=True):
         super().__init__()
         self.output_dim = output_dim
         self.sum_pool = sum_pool
-        self.sketch1 = nn.Parameter(
-            self.generate_sketch_matrix(
-                torch.randint(output_dim, size=(input_dim1,)),
-                2 * torch.randint(2, size=(input_dim1,)) - 1,
-                input_dim1,
-                output_dim,
-            ),
-            requires_grad=False,
+        self.register_buffer("rand_h1", torch.randint(output_dim, size=(input_dim1,)))
+        self.register_buffer(
+            "rand_s1", (2 * torch.randint(2, size=(input_dim1,)) - 1).float()
         )
-        self.sketch2 = nn.Parameter(
-            self.generate_sketch_matrix(
-                torch.randint(output_dim, size=(input_dim2,)),
-                2 * torch.randint(2, size=(input_dim2,)) - 1,
-                input_dim2,
-                output_dim,
-            ),
-            requires_grad=False,
+        self.register_buffer("rand_h2", torch.randint(output_dim, size=(input_dim2,)))
+        self.register_buffer(
+            "rand_s2", (2 * torch.randint(2, size=(input_dim2,)) - 1).float()
         )
 
-    def generate_sketch_matrix(self, rand_h, rand_s, input_dim, output_dim):
-        return torch.sparse.FloatTensor(
-            torch.stack(
-                [torch.arange(input_dim, out=torch.LongTensor()), rand_h.long()]
-            ),
-            rand_s.float(),
-            [input_dim, output_dim],
-        ).to_dense()
+    def convert_state_dict(self, state_dict, prefix):
+        for idx in ["1", "2"]:
+            sketch = state_dict.pop(prefix + "sketch" + idx, None)
+            if sketch is None:
+                continue
+            # Each row of the dense sketch matrix has a single nonzero sign
+            state_dict[prefix + "rand_h" + idx] = sketch.abs().argmax(dim=1)
+            state_dict[prefix + "rand_s" + idx] = sketch.sum(dim=1)
+        # The sketches are buffers, which have no optimizer state
+        return False
 
     def forward(self, x1, x2):
         assert len(x1.shape) == len(x2.shape)
         if len(x1.shape) == 4 and len(x2.shape) == 4:
-            fft1 = torch.rfft(
-                x1.permute(0, 2, 3, 1).matmul(self.sketch1), signal_ndim=1
-            )
-            fft2 = torch.rfft(
-                x2.permute(0, 2, 3, 1).matmul(self.sketch2), signal_ndim=1
-            )
-        else:
-            fft1 = torch.rfft(x1.matmul(self.sketch1), signal_ndim=1)
-            fft2 = torch.rfft(x2.matmul(self.sketch2), signal_ndim=1)
-        fft_product = torch.stack(
-            [
-                fft1[..., 0] * fft2[..., 0] - fft1[..., 1] * fft2[..., 1],
-                fft1[..., 0] * fft2[..., 1] + fft1[..., 1] * fft2[..., 0],
-            ],
-            dim=-1,
-        )
-        cbp = (
-            torch.irfft(fft_product, signal_ndim=1, signal_sizes=(self.output_dim,))
-            * self.output_dim
-        )
+            x1 = x1.permute(0, 2, 3, 1)
+            x2 = x2.permute(0, 2, 3, 1)
+        sketch1 = count_sketch(x1, self.rand_h1, self.rand_s1, self.output_dim)
+        sketch2 = count_sketch(x2, self.rand_h2, self.rand_s2, self.output_dim)
+        cbp = circular_convolution(sketch1, sketch2, self.output_dim) * self.output_dim
         if len(x1.shape) == 4 and len(x2.shape) == 4:
             cbp = cbp.sum(dim=[1, 2]) if self.sum_pool else cbp.permute(0, 3, 1, 2)
         return cbp
@@ -116,8 +161,40 @@ class MLP(nn.Module):
         return x
 
 
+class ChunkedFusion(ConvertedStateDictMixin, nn.Module):
+    """Base of the fusions which merge the chunks of the projections of their
+    inputs separately. The chunks are zero padded to the same size, so that all
+    of them are merged at once by batched matmuls.
+    """
+
+    def register_chunks(self, sizes_list):
+        self.sizes_list = sizes_list
+        self.chunk_size = max(sizes_list)
+        # Chunks of the same size are views of the projections
+        self.padded_chunks = min(sizes_list) < self.chunk_size
+        index, mask, unpad_index = get_chunk_indices(sizes_list)
+        self.register_buffer("chunk_index", index, persistent=False)
+        self.register_buffer("chunk_mask", mask, persistent=False)
+        self.register_buffer("chunk_unpad_index", unpad_index, persistent=False)
+
+    def get_chunks(self, x):
+        """bsize x mm_dim -> chunks x bsize x chunk_size"""
+        chunks = x
+        if self.padded_chunks:
+            chunks = x.index_select(1, self.chunk_index) * self.chunk_mask
+        chunks = chunks.view(x.size(0), len(self.sizes_list), self.chunk_size)
+        return chunks.transpose(0, 1)
+
+    def cat_chunks(self, z):
+        """chunks x bsize x chunk_size -> bsize x mm_dim"""
+        z = z.transpose(0, 1).reshape(z.size(1), -1)
+        if self.padded_chunks:
+            z = z.index_select(1, self.chunk_unpad_index)
+        return z
+
+
 @registry.register_fusion("block")
-class Block(nn.Module):
+class Block(ChunkedFusion):
     def __init__(
         self,
         input_dims,
@@ -150,7 +227,7 @@ class Block(nn.Module):
         else:
             self.linear1 = nn.Linear(input_dims[1], mm_dim)
         merge_linears0, merge_linears1 = [], []
-        self.sizes_list = get_sizes_list(mm_dim, chunks)
+        self.register_chunks(get_sizes_list(mm_dim, chunks))
         for size in self.sizes_list:
             ml0 = nn.Linear(size, size * rank)
             merge_linears0.append(ml0)
@@ -159,11 +236,64 @@ class Block(nn.Module):
             else:
                 ml1 = nn.Linear(size, size * rank)
             merge_linears1.append(ml1)
-        self.merge_linears0 = nn.ModuleList(merge_linears0)
-        self.merge_linears1 = nn.ModuleList(merge_linears1)
+        # The linears of the chunks are stacked to be applied at once
+        weight0, bias0 = self.stack_merge_linears(
+            [ml.state_dict() for ml in merge_linears0]
+        )
+        self.merge_weight0 = nn.Parameter(weight0)
+        self.merge_bias0 = nn.Parameter(bias0)
+        if self.shared:
+            self.merge_weight1 = self.merge_weight0
+            self.merge_bias1 = self.merge_bias0
+        else:
+            weight1, bias1 = self.stack_merge_linears(
+                [ml.state_dict() for ml in merge_linears1]
+            )
+            self.merge_weight1 = nn.Parameter(weight1)
+            self.merge_bias1 = nn.Parameter(bias1)
         self.linear_out = nn.Linear(mm_dim, output_dim)
         self.n_params = sum(p.numel() for p in self.parameters() if p.requires_grad)
 
+    def stack_merge_linears(self, linears):
+        """Stacks the weights and biases of the state dicts of the linears of the
+        chunks into chunks x rank * chunk_size x chunk_size weights and
+        chunks x 1 x rank * chunk_size biases.
+        """
+        weights, biases = [], []
+        for linear in linears:
+            weight, bias = linear["weight"].detach(), linear["bias"].detach()
+            # The size * rank outputs of a chunk are rank x size, padded as such
+            size = weight.size(1)
+            weights.append(weight.view(self.rank, size, size))
+            biases.append(bias.view(self.rank, size))
+        weight = stack_chunks(weights, self.chunk_size, (1, 2))
+        bias = stack_chunks(biases, self.chunk_size, (1,))
+        return (
+            weight.view(len(linears), -1, self.chunk_size),
+            bias.view(len(linears), 1, -1),
+        )
+
+    def convert_state_dict(self, state_dict, prefix):
+        # Checkpoints of the previous implementation have a linear per chunk
+        converted = False
+        for idx in ["0", "1"]:
+            old_prefix = prefix + "merge_linears" + idx + "."
+            if old_prefix + "0.weight" not in state_dict:
+                continue
+            converted = True
+            linears = []
+            for chunk_id in range(len(self.sizes_list)):
+                linears.append(
+                    {
+                        name: state_dict.pop(f"{old_prefix}{chunk_id}.{name}")
+                        for name in ["weight", "bias"]
+                    }
+                )
+            weight, bias = self.stack_merge_linears(linears)
+            state_dict[prefix + "merge_weight" + idx] = weight
+            state_dict[prefix + "merge_bias" + idx] = bias
+        return converted
+
     def forward(self, x):
         x0 = self.linear0(x[0])
         x1 = self.linear1(x[1])
@@ -171,22 +301,21 @@ class Block(nn.Module):
         if self.dropout_input > 0:
             x0 = F.dropout(x0, p=self.dropout_input, training=self.training)
             x1 = F.dropout(x1, p=self.dropout_input, training=self.training)
-        x0_chunks = get_chunks(x0, self.sizes_list)
-        x1_chunks = get_chunks(x1, self.sizes_list)
-        zs = []
-        for chunk_id, m0, m1 in zip(
-            range(len(self.sizes_list)), self.merge_linears0, self.merge_linears1
-        ):
-            x0_c = x0_chunks[chunk_id]
-            x1_c = x1_chunks[chunk_id]
-            m = m0(x0_c) * m1(x1_c)  # bsize x split_size*rank
-            m = m.view(bsize, self.rank, -1)
-            z = torch.sum(m, 1)
-            if self.pos_norm == "before_cat":
-                z = torch.sqrt(F.relu(z)) - torch.sqrt(F.relu(-z))
-                z = F.normalize(z, p=2)
-            zs.append(z)
-        z = torch.cat(zs, 1)
+        x0_chunks = self.get_chunks(x0)
+        x1_chunks = self.get_chunks(x1)
+        m0 = torch.baddbmm(
+            self.merge_bias0, x0_chunks, self.merge_weight0.transpose(1, 2)
+        )
+        m1 = torch.baddbmm(
+            self.merge_bias1, x1_chunks, self.merge_weight1.transpose(1, 2)
+        )
+        m = m0 * m1  # chunks x bsize x rank*split_size
+        m = m.view(len(self.sizes_list), bsize, self.rank, -1)
+        z = torch.sum(m, 2)
+        if self.pos_norm == "before_cat":
+            z = torch.sqrt(F.relu(z)) - torch.sqrt(F.relu(-z))
+            z = F.normalize(z, p=2, dim=2)
+        z = self.cat_chunks(z)
         if self.pos_norm == "after_cat":
             z = torch.sqrt(F.relu(z)) - torch.sqrt(F.relu(-z))
             z = F.normalize(z, p=2)
@@ -200,7 +329,7 @@ class Block(nn.Module):
 
 
 @registry.register_fusion("block_tucker")
-class BlockTucker(nn.Module):
+class BlockTucker(ChunkedFusion):
     def __init__(
         self,
         input_dims,
@@ -231,32 +360,74 @@ class BlockTucker(nn.Module):
         else:
             self.linear1 = nn.Linear(input_dims[1], mm_dim)
 
-        self.sizes_list = get_sizes_list(mm_dim, chunks)
+        self.register_chunks(get_sizes_list(mm_dim, chunks))
         bilinears = []
         for size in self.sizes_list:
             bilinears.append(nn.Bilinear(size, size, size))
-        self.bilinears = nn.ModuleList(bilinears)
+        # The bilinears of the chunks are stacked to be applied at once
+        weight, bias = self.stack_bilinears([b.state_dict() for b in bilinears])
+        self.bilinear_weight = nn.Parameter(weight)
+        self.bilinear_bias = nn.Parameter(bias)
         self.linear_out = nn.Linear(self.mm_dim, self.output_dim)
         self.n_params = sum(p.numel() for p in self.parameters() if p.requires_grad)
 
+    def stack_bilinears(self, bilinears):
+        """Stacks the weights and biases of the state dicts of the bilinears of
+        the chunks into chunks x chunk_size x chunk_size x chunk_size
+        weights and chunks x 1 x chunk_size biases.
+        """
+        weight = stack_chunks(
+            [bilinear["weight"].detach() for bilinear in bilinears],
+            self.chunk_size,
+            (0, 1, 2),
+        )
+        bias = stack_chunks(
+            [bilinear["bias"].detach() for bilinear in bilinears],
+            self.chunk_size,
+            (0,),
+        )
+        return weight, bias.unsqueeze(1)
+
+    def convert_state_dict(self, state_dict, prefix):
+        # Checkpoints of the previous implementation have a bilinear per chunk
+        old_prefix = prefix + "bilinears."
+        if old_prefix + "0.weight" not in state_dict:
+            return False
+        bilinears = []
+        for chunk_id in range(len(self.sizes_list)):
+            bilinears.append(
+                {
+                    name: state_dict.pop(f"{old_prefix}{chunk_id}.{name}")
+                    for name in ["weight", "bias"]
+                }
+            )
+        weight, bias = self.stack_bilinears(bilinears)
+        state_dict[prefix + "bilinear_weight"] = weight
+        state_dict[prefix + "bilinear_bias"] = bias
+        return True
+
     def forward(self, x):
         x0 = self.linear0(x[0])
         x1 = self.linear1(x[1])
+        bsize = x1.size(0)
         if self.dropout_input:
             x0 = F.dropout(x0, p=self.dropout_input, training=self.training)
             x1 = F.dropout(x1, p=self.dropout_input, training=self.training)
-        x0_chunks = get_chunks(x0, self.sizes_list)
-        x1_chunks = get_chunks(x1, self.sizes_list)
-        zs = []
-        for chunk_id, bilinear in enumerate(self.bilinears):
-            x0_c = x0_chunks[chunk_id]
-            x1_c = x1_chunks[chunk_id]
-            z = bilinear(x0_c, x1_c)
-            if self.pos_norm == "before_cat":
-                z = torch.sqrt(F.relu(z)) - torch.sqrt(F.relu(-z))
-                z = F.normalize(z, p=2)
-            zs.append(z)
-        z = torch.cat(zs, 1)
+        x0_chunks = self.get_chunks(x0)
+        x1_chunks = self.get_chunks(x1)
+        num_chunks, size = len(self.sizes_list), self.chunk_size
+        # Products of x1 with the chunk_size x chunk_size matrix of each output
+        # of the bilinears, chunks x bsize x chunk_size x chunk_size
+        m = torch.bmm(
+            x1_chunks,
+            self.bilinear_weight.view(num_chunks, size * size, size).transpose(1, 2),
+        )
+        m = m.view(num_chunks, bsize, size, size)
+        z = torch.sum(m * x0_chunks.unsqueeze(2), 3) + self.bilinear_bias
+        if self.pos_norm == "before_cat":
+            z = torch.sqrt(F.relu(z)) - torch.sqrt(F.relu(-z))
+            z = F.normalize(z, p=2, dim=2)
+        z = self.cat_chunks(z)
         if self.pos_norm == "after_cat":
             z = torch.sqrt(F.relu(z)) - torch.sqrt(F.relu(-z))
             z = F.normalize(z, p=2)
@@ -517,7 +688,7 @@ class MFB(nn.Module):
 
 
 @registry.register_fusion("mfh")
-class MFH(nn.Module):
+class MFH(ConvertedStateDictMixin, nn.Module):
     def __init__(
         self,
         input_dims,
@@ -543,16 +714,28 @@ class MFH(nn.Module):
         self.dropout_pre_lin = dropout_pre_lin
         self.dropout_output = dropout_output
         # Modules
-        self.linear0_0 = nn.Linear(input_dims[0], mm_dim * factor)
-        self.linear1_0 = nn.Linear(input_dims[1], mm_dim * factor)
-        self.linear0_1 = nn.Linear(input_dims[0], mm_dim * factor)
-        self.linear1_1 = nn.Linear(input_dims[1], mm_dim * factor)
+        # The linears of both stages of the factorization are applied at once
+        self.linear0 = nn.Linear(input_dims[0], 2 * mm_dim * factor)
+        self.linear1 = nn.Linear(input_dims[1], 2 * mm_dim * factor)
         self.linear_out = nn.Linear(mm_dim * 2, output_dim)
         self.n_params = sum(p.numel() for p in self.parameters() if p.requires_grad)
 
+    def convert_state_dict(self, state_dict, prefix):
+        # Checkpoints of the previous implementation have a linear per stage
+        converted = False
+        for idx in ["0", "1"]:
+            for name in ["weight", "bias"]:
+                old_keys = [f"{prefix}linear{idx}_{stage}.{name}" for stage in "01"]
+                if all(key in state_dict for key in old_keys):
+                    state_dict[f"{prefix}linear{idx}.{name}"] = torch.cat(
+                        [state_dict.pop(key) for key in old_keys]
+                    )
+                    converted = True
+        return converted
+
     def forward(self, x):
-        x0 = self.linear0_0(x[0])
-        x1 = self.linear1_0(x[1])
+        x0 = self.linear0(x[0])
+        x1 = self.linear1(x[1])
 
         if self.activ_input:
             x0 = getattr(F, self.activ_input)(x0)
@@ -562,14 +745,14 @@ class MFH(nn.Module):
             x0 = F.dropout(x0, p=self.dropout_input, training=self.training)
             x1 = F.dropout(x1, p=self.dropout_input, training=self.training)
 
-        z_0_skip = x0 * x1
+        z_0_skip, z_1 = torch.chunk(x0 * x1, 2, dim=-1)
 
         if self.dropout_pre_lin:
             z_0_skip = F.dropout(
                 z_0_skip, p=self.dropout_pre_lin, training=self.training
             )
 
-        z_0 = z_0_skip.view(z_0_skip.size(0), self.mm_dim, self.factor)
+        z_0 = z_0_skip.reshape(z_0_skip.size(0), self.mm_dim, self.factor)
         z_0 = z_0.sum(2)
 
         if self.normalize:
@@ -577,23 +760,12 @@ class MFH(nn.Module):
             z_0 = F.normalize(z_0, p=2)
 
         #
-        x0 = self.linear0_1(x[0])
-        x1 = self.linear1_1(x[1])
-
-        if self.activ_input:
-            x0 = getattr(F, self.activ_input)(x0)
-            x1 = getattr(F, self.activ_input)(x1)
-
-        if self.dropout_input > 0:
-            x0 = F.dropout(x0, p=self.dropout_input, training=self.training)
-            x1 = F.dropout(x1, p=self.dropout_input, training=self.training)
-
-        z_1 = x0 * x1 * z_0_skip
+        z_1 = z_1 * z_0_skip
 
         if self.dropout_pre_lin > 0:
             z_1 = F.dropout(z_1, p=self.dropout_pre_lin, training=self.training)
 
-        z_1 = z_1.view(z_1.size(0), self.mm_dim, self.factor)
+        z_1 = z_1.reshape(z_1.size(0), self.mm_dim, self.factor)
         z_1 = z_1.sum(2)
 
         if self.normalize:
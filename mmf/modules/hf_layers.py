@@ -1,9 +1,14 @@
 # Copyright (c) Facebook, Inc. and its affiliates.
 
-import math
 from typing import List, Optional, Tuple
 
 import torch
+from mmf.modules.attention import scaled_dot_product_attention
+from mmf.utils.modeling import (
+    checkpoint_forward,
+    get_checkpoint_interval,
+    should_checkpoint_layer,
+)
 from torch import Tensor, nn
 from transformers.modeling_bert import (
     BertAttention,
@@ -35,6 +40,7 @@ def replace_with_jit():
     BertLayer.forward = BertLayerJit.forward
     BertAttention.forward = BertAttentionJit.forward
     BertSelfAttention.forward = BertSelfAttentionJit.forward
+    BertSelfAttention.use_sdpa_attention = False
     BertSelfAttention.transpose_for_scores = BertSelfAttentionJit.transpose_for_scores
     BertModel.forward = BertModelJit.forward
     PreTrainedModel.__jit_unused_properties__ = [
@@ -48,6 +54,7 @@ def replace_with_jit():
     RobertaLayer.forward = BertLayerJit.forward
     RobertaAttention.forward = BertAttentionJit.forward
     RobertaSelfAttention.forward = BertSelfAttentionJit.forward
+    RobertaSelfAttention.use_sdpa_attention = False
     RobertaSelfAttention.transpose_for_scores = (
         BertSelfAttentionJit.transpose_for_scores
     )
@@ -108,9 +115,17 @@ class BertSelfAttentionJit(BertSelfAttention):
 
     Changes to `forward` function ::
         Uses scriptable `nn.functional.softmax` and also removes several static size
-        inference which is not supported.
+        inference which is not supported. The attention is computed with
+        `scaled_dot_product_attention`, which uses the fused kernels when
+        `use_sdpa_attention` is set in the config and attentions aren't output.
     """
 
+    def __init__(self, config):
+        super().__init__(config)
+        self.use_sdpa_attention = getattr(
+            config, "use_sdpa_attention", False
+        ) and not getattr(config, "output_attentions", False)
+
     def transpose_for_scores(self, x: Tensor) -> Tensor:
         new_x_shape = x.size()[:-1] + (
             self.num_attention_heads,
@@ -144,33 +159,34 @@ class BertSelfAttentionJit(BertSelfAttention):
         key_layer = self.transpose_for_scores(mixed_key_layer)
         value_layer = self.transpose_for_scores(mixed_value_layer)
 
-        # Take the dot product between "query" and "key" to get the raw attention
-        # scores.
-        attention_scores = torch.matmul(query_layer, key_layer.transpose(-1, -2))
-        attention_scores = attention_scores / math.sqrt(self.attention_head_size)
-        if attention_mask is not None:
-            # Apply the attention mask is (precomputed for all layers in BertModel
-            # forward() function)
-            attention_scores = attention_scores + attention_mask
-
-        # Normalize the attention scores to probabilities.
-        attention_probs = nn.functional.softmax(attention_scores, dim=-1)
-
-        # This is actually dropping out entire tokens to attend to, which might
-        # seem a bit unusual, but is taken from the original Transformer paper.
-        attention_probs = self.dropout(attention_probs)
-
-        # Mask heads if we want to
-        if head_mask is not None:
-            attention_probs = attention_probs * head_mask
-
-        context_layer = torch.matmul(attention_probs, value_layer)
+        use_sdpa = False
+        if not torch.jit.is_scripting():
+            # Modules patched by replace_with_jit use the class default
+            use_sdpa = self.use_sdpa_attention
+
+        # The attention mask is precomputed for all layers in BertModel forward()
+        # function. Dropout on the attention probabilities is actually dropping
+        # out entire tokens to attend to, which might seem a bit unusual, but is
+        # taken from the original Transformer paper.
+        context_layer, attention_probs = scaled_dot_product_attention(
+            query_layer,
+            key_layer,
+            value_layer,
+            attention_mask,
+            dropout_p=self.dropout.p if self.training else 0.0,
+            head_mask=head_mask,
+            use_sdpa=use_sdpa,
+        )
 
         context_layer = context_layer.permute(0, 2, 1, 3).contiguous()
         new_context_layer_shape = context_layer.size()[:-2] + (self.all_head_size,)
         context_layer = context_layer.view(new_context_layer_shape)
 
-        outputs = (context_layer, attention_probs)
+        # The fused kernels don't return the attention probabilities
+        probs = context_layer.new_empty(0)
+        if attention_probs is not None:
+            probs = attention_probs
+        outputs = (context_layer, probs)
         return outputs
 
 
@@ -263,7 +279,9 @@ class BertEncoderJit(BertEncoder):
     Changes to `forward` function::
         Typed inputs and modifies the output to be of Tuple[Tensor] type in scripting
         mode. Due to different possible types when `output_hidden_states` or
-        `output_attentions` are enable, we do not support these in scripting mode
+        `output_attentions` are enable, we do not support these in scripting mode.
+        Supports activation checkpointing with `checkpoint_activations` in the
+        config, except in scripting mode or when attentions are output.
     """
 
     def __init__(self, config):
@@ -287,17 +305,33 @@ class BertEncoderJit(BertEncoder):
     ) -> Tuple[Tensor]:
         all_hidden_states = ()
         all_attentions = ()
+        checkpoint_interval = 0
+        if not torch.jit.is_scripting() and not output_attentions:
+            checkpoint_interval = get_checkpoint_interval(self.config)
+
         for i, layer_module in enumerate(self.layer):
             if not torch.jit.is_scripting() and output_hidden_states:
                 all_hidden_states = all_hidden_states + (hidden_states,)
 
-            layer_outputs = layer_module(
-                hidden_states,
-                attention_mask,
-                None,
-                encoder_hidden_states,
-                encoder_attention_mask,
-            )
+            if not torch.jit.is_scripting() and should_checkpoint_layer(
+                i, checkpoint_interval, self.training
+            ):
+                layer_outputs = checkpoint_forward(
+                    layer_module,
+                    hidden_states,
+                    attention_mask,
+                    None,
+                    encoder_hidden_states,
+                    encoder_attention_mask,
+                )
+            else:
+                layer_outputs = layer_module(
+                    hidden_states,
+                    attention_mask,
+                    None,
+                    encoder_hidden_states,
+                    encoder_attention_mask,
+                )
             hidden_states = layer_outputs[0]
 
             if not torch.jit.is_scripting() and output_attentions:
@@ -301,7 +301,10 @@ class CaptionCrossEntropyLoss(nn.Module):
         targets = sample_list["targets"]
 
         # If no captions(test dataset) then assume decode length to be uniform
-        if hasattr(sample_list, "caption_len"):
+        if "decode_lengths" in sample_list:
+            # Batch sorted by the caption_batch processor
+            decode_lengths = sample_list["decode_lengths"]
+        elif hasattr(sample_list, "caption_len"):
             caption_lengths, _ = sample_list.caption_len.sort(dim=0, descending=True)
             decode_lengths = (caption_lengths - 1).tolist()
         else:
@@ -542,21 +545,43 @@ class CombinedLoss(nn.Module):
 
 @registry.register_loss("m4c_decoding_bce_with_mask")
 class M4CDecodingBCEWithMaskLoss(nn.Module):
+    """Binary cross entropy over the decoding steps of M4C, masked by
+    ``train_loss_mask``. The targets are either dense ``targets`` or, with
+    ``sparse_targets`` in the answer processor, the flattened indices and the
+    values of their non-zeros in ``sparse_targets_indices`` and
+    ``sparse_targets_values``.
+    """
+
     def __init__(self):
         super().__init__()
         self.one = torch.Tensor([1.0])
 
     def forward(self, sample_list, model_output):
         scores = model_output["scores"]
-        targets = sample_list["targets"]
         loss_mask = sample_list["train_loss_mask"]
         assert scores.dim() == 3 and loss_mask.dim() == 2
 
-        losses = F.binary_cross_entropy_with_logits(scores, targets, reduction="none")
-        losses *= loss_mask.unsqueeze(-1)
+        if "targets" in sample_list:
+            targets = sample_list["targets"]
+            losses = F.binary_cross_entropy_with_logits(
+                scores, targets, reduction="none"
+            )
+            losses *= loss_mask.unsqueeze(-1)
+            loss = torch.sum(losses)
+        else:
+            # BCE with logits is softplus(x) - x * y, so only the positives
+            # are needed for the second term
+            mask = loss_mask.unsqueeze(-1)
+            masked_scores = (scores * mask).view(scores.size(0), -1)
+            positive_scores = masked_scores.gather(
+                1, sample_list["sparse_targets_indices"]
+            )
+            loss = torch.sum(F.softplus(scores) * mask) - torch.sum(
+                positive_scores * sample_list["sparse_targets_values"]
+            )
 
-        count = torch.max(torch.sum(loss_mask), self.one.to(losses.device))
-        loss = torch.sum(losses) / count
+        count = torch.max(torch.sum(loss_mask), self.one.to(loss.device))
+        loss = loss / count
         return loss
 
 
@@ -5,7 +5,7 @@ import time
 import torch
 from mmf.trainers.callbacks.base import Callback
 from mmf.utils.configuration import get_mmf_env
-from mmf.utils.distributed import is_master
+from mmf.utils.distributed import gather_tensor, is_master
 from mmf.utils.logger import TensorboardLogger, log_progress, setup_output_folder
 from mmf.utils.timer import Timer
 
@@ -13,6 +13,28 @@ from mmf.utils.timer import Timer
 logger = logging.getLogger(__name__)
 
 
+def get_num_tokens(sample_list):
+    """Number of real (non-padded) text tokens in a batch. Returns a tensor
+    to avoid synchronizing with the GPU.
+    """
+    if "input_mask" in sample_list:
+        return sample_list["input_mask"].sum()
+    if "text_len" in sample_list and torch.is_tensor(sample_list["text_len"]):
+        return sample_list["text_len"].sum()
+    return 0
+
+
+def get_num_regions(sample_list):
+    """Number of real (non-padded) image regions in a batch"""
+    image_info = sample_list.get("image_info_0", None)
+    if image_info is not None and "max_features" in image_info:
+        return image_info["max_features"].sum()
+    image_feature = sample_list.get("image_feature_0", None)
+    if torch.is_tensor(image_feature) and image_feature.dim() == 3:
+        return image_feature.size(0) * image_feature.size(1)
+    return 0
+
+
 class LogisticsCallback(Callback):
     """Callback for handling train/validation logistics, report summarization,
     logging etc.
@@ -43,19 +65,48 @@ class LogisticsCallback(Callback):
             if env_tb_logdir:
                 log_dir = env_tb_logdir
 
-            self.tb_writer = TensorboardLogger(log_dir, self.trainer.current_iteration)
+            self.tb_writer = TensorboardLogger(
+                log_dir,
+                self.trainer.current_iteration,
+                backends=self.training_config.get(
+                    "tensorboard_backends", ["tensorboard"]
+                ),
+            )
+
+        # Peak TFLOPs of a single device, used for model FLOPs utilization
+        self.peak_tflops = self.training_config.get("peak_tflops", None)
+        self._reset_throughput()
 
     def on_train_start(self):
         self.train_timer = Timer()
         self.snapshot_timer = Timer()
+        self._reset_throughput()
+
+    def on_train_end(self, **kwargs):
+        if self.tb_writer is not None:
+            self.tb_writer.flush()
+
+    def on_batch_start(self, **kwargs):
+        now = time.perf_counter()
+        if self._last_batch_end is not None:
+            self._data_wait += now - self._last_batch_end
+
+    def on_batch_end(self, **kwargs):
+        report = kwargs["report"]
+        self._num_samples += report.batch_size
+        self._num_tokens += get_num_tokens(report)
+        self._num_regions += get_num_regions(report)
+        self._last_batch_end = time.perf_counter()
 
     def on_update_end(self, **kwargs):
         if not kwargs["should_log"]:
+            # Time spent in callbacks doesn't count as waiting for data
+            self._last_batch_end = time.perf_counter()
             return
         extra = {}
+        throughput = self._get_throughput()
         if "cuda" in str(self.trainer.device):
-            extra["max mem"] = torch.cuda.max_memory_allocated() / 1024
-            extra["max mem"] //= 1024
+            extra["max mem"] = int(throughput["peak_mem_mb"])
 
         if self.training_config.experiment_name:
             extra["experiment"] = self.training_config.experiment_name
@@ -77,11 +128,25 @@ class LogisticsCallback(Callback):
                 "eta": self._calculate_time_left(),
             }
         )
+        extra.update(
+            {
+                key: f"{value:.2f}"
+                for key, value in throughput.items()
+                if key != "peak_mem_mb"
+            }
+        )
         self.train_timer.reset()
+        if self.tb_writer is not None and is_master():
+            self.tb_writer.add_scalars(
+                {f"train/throughput/{key}": val for key, val in throughput.items()},
+                self.trainer.current_iteration,
+            )
         self._summarize_report(kwargs["meter"], extra=extra)
+        self._reset_throughput()
 
     def on_validation_start(self, **kwargs):
         self.snapshot_timer.reset()
+        self._validation_start = time.perf_counter()
 
     def on_validation_end(self, **kwargs):
         extra = {
@@ -93,6 +158,11 @@ class LogisticsCallback(Callback):
         }
         extra.update(self.trainer.early_stop_callback.early_stopping.get_info())
         self.train_timer.reset()
+        if self._validation_start is not None:
+            # Validation time is excluded from training throughput
+            self._paused_time += time.perf_counter() - self._validation_start
+            self._validation_start = None
+            self._last_batch_end = time.perf_counter()
         self._summarize_report(kwargs["meter"], extra=extra)
 
     def on_test_end(self, **kwargs):
@@ -126,6 +196,67 @@ class LogisticsCallback(Callback):
 
         log_progress(log_dict)
 
+    def _reset_throughput(self):
+        self._interval_start = time.perf_counter()
+        self._paused_time = 0.0
+        self._validation_start = None
+        self._last_batch_end = None
+        self._data_wait = 0.0
+        self._num_samples = 0
+        self._num_tokens = 0
+        self._num_regions = 0
+        if torch.cuda.is_available() and "cuda" in str(self.trainer.device):
+            torch.cuda.reset_peak_memory_stats()
+
+    def _get_throughput(self):
+        """Throughput since the last log aggregated across all processes:
+        samples, tokens and regions are summed while data wait fraction and peak
+        memory are maxed over processes. ``tflops`` is the estimated model
+        TFLOPs achieved per device and ``mfu`` its ratio to ``peak_tflops``.
+        """
+        elapsed = time.perf_counter() - self._interval_start - self._paused_time
+        elapsed = max(elapsed, 1e-6)
+        device = torch.device("cpu")
+        peak_mem = 0
+        if "cuda" in str(self.trainer.device):
+            device = torch.device("cuda", torch.cuda.current_device())
+            peak_mem = torch.cuda.max_memory_allocated() / 1024 / 1024
+
+        stats = torch.tensor(
+            [
+                float(self._num_samples),
+                float(self._num_tokens),
+                float(self._num_regions),
+                self._data_wait / elapsed,
+                peak_mem,
+            ],
+            dtype=torch.float64,
+            device=device,
+        )
+        stats = gather_tensor(stats).view(-1, stats.numel())
+        num_samples, num_tokens, num_regions = stats[:, :3].sum(dim=0).tolist()
+        data_wait, peak_mem = stats[:, 3:].max(dim=0)[0].tolist()
+
+        throughput = {
+            "samples_per_sec": num_samples / elapsed,
+            "tokens_per_sec": num_tokens / elapsed,
+            "regions_per_sec": num_regions / elapsed,
+            "data_wait": data_wait,
+        }
+
+        model = getattr(self.trainer.model, "module", self.trainer.model)
+        if hasattr(model, "estimate_flops"):
+            flops = model.estimate_flops(
+                int(num_samples), int(num_tokens + num_regions)
+            )
+            throughput["tflops"] = flops / elapsed / 1e12 / stats.size(0)
+            if self.peak_tflops:
+                throughput["mfu"] = throughput["tflops"] / self.peak_tflops
+
+        if "cuda" in str(self.trainer.device):
+            throughput["peak_mem_mb"] = peak_mem
+        return throughput
+
     def _calculate_time_left(self):
         time_taken_for_log = time.time() * 1000 - self.train_timer.start
         iterations_left = self.trainer.max_updates - self.trainer.num_updates
@@ -1,5 +1,6 @@
 # Copyright (c) Facebook, Inc. and its affiliates.
 
+import collections
 import logging
 from abc import ABC
 from typing import Any, Dict, Tuple, Type
@@ -15,6 +16,21 @@ from mmf.utils.distributed import is_master
 logger = logging.getLogger(__name__)
 
 
+def record_stream(value, stream):
+    """Calls ``record_stream`` on all of the CUDA tensors in ``value``, including
+    the ones nested in dicts, ``SampleList``s, lists and tuples.
+    """
+    if isinstance(value, torch.Tensor):
+        if value.is_cuda:
+            value.record_stream(stream)
+    elif isinstance(value, collections.abc.Mapping):
+        for item in value.values():
+            record_stream(item, stream)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            record_stream(item, stream)
+
+
 class TrainerEvaluationLoopMixin(ABC):
     def evaluation_loop(
         self, loader, use_tqdm: bool = False, single_batch: bool = False
@@ -25,10 +41,18 @@ class TrainerEvaluationLoopMixin(ABC):
             self.model.eval()
             disable_tqdm = not use_tqdm or not is_master()
             combined_report = None
-
-            for batch in tqdm.tqdm(loader, disable=disable_tqdm):
-                report = self._forward(batch)
-                self.update_meter(report, meter)
+            # Losses are summed on device and only reduced once at the end to
+            # avoid synchronizing with the GPU and other processes on every batch
+            loss_sums = {}
+            sample_counts = {}
+
+            for prepared_batch in tqdm.tqdm(
+                self._prefetch_batches(loader),
+                total=self._get_num_batches(loader),
+                disable=disable_tqdm,
+            ):
+                report = self._forward_prepared_batch(prepared_batch)
+                self.accumulate_loss_sums(report, loss_sums, sample_counts)
 
                 # accumulate necessary params for metric calculation
                 if combined_report is None:
@@ -42,6 +66,9 @@ class TrainerEvaluationLoopMixin(ABC):
                 if single_batch is True:
                     break
 
+            self.update_meter_from_loss_sums(
+                loss_sums, sample_counts, combined_report.dataset_type, meter
+            )
             combined_report.metrics = self.metrics(combined_report, combined_report)
             self.update_meter(combined_report, meter, eval_mode=True)
 
@@ -50,6 +77,51 @@ class TrainerEvaluationLoopMixin(ABC):
 
         return combined_report, meter
 
+    def _get_num_batches(self, loader):
+        try:
+            return len(loader)
+        except TypeError:
+            # Iterable datasets don't necessarily have a length
+            return None
+
+    def _prefetch_batches(self, loader):
+        """Yields prepared batches from ``loader``. On GPU, the next batch is
+        prepared on a side CUDA stream before the current one is yielded, so
+        that its host to device copy overlaps with the current forward pass.
+        """
+        stream = None
+        if torch.cuda.is_available() and "cuda" in str(self.device):
+            stream = torch.cuda.Stream()
+
+        iterator = iter(loader)
+        try:
+            next_batch = self._prepare_batch_on_stream(next(iterator), stream)
+        except StopIteration:
+            return
+
+        for batch in iterator:
+            current_batch = self._wait_for_stream(next_batch, stream)
+            next_batch = self._prepare_batch_on_stream(batch, stream)
+            yield current_batch
+
+        yield self._wait_for_stream(next_batch, stream)
+
+    def _prepare_batch_on_stream(self, batch, stream):
+        if stream is None:
+            return self._prepare_batch(batch)
+        with torch.cuda.stream(stream):
+            return self._prepare_batch(batch)
+
+    def _wait_for_stream(self, prepared_batch, stream):
+        if stream is None:
+            return prepared_batch
+        current_stream = torch.cuda.current_stream()
+        current_stream.wait_stream(stream)
+        # Tensors were allocated on the side stream, make sure their memory
+        # isn't reused before the current stream is done with them
+        record_stream(prepared_batch, current_stream)
+        return prepared_batch
+
     def prediction_loop(self, dataset_type: str) -> None:
         reporter = self.dataset_loader.get_test_reporter(dataset_type)
         with torch.no_grad():
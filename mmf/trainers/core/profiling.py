@@ -1,9 +1,15 @@
 # Copyright (c) Facebook, Inc. and its affiliates.
 
+import contextlib
 import logging
+import os
 from abc import ABC
-from typing import Type
+from typing import Iterable, Optional, Type
 
+from mmf.common.meter import Meter
+from mmf.datasets.processors.processors import processor_stats
+from mmf.utils.configuration import get_mmf_env
+from mmf.utils.profiler import StepProfiler
 from mmf.utils.timer import Timer
 
 
@@ -12,9 +18,63 @@ logger = logging.getLogger(__name__)
 
 class TrainerProfilingMixin(ABC):
     profiler: Type[Timer] = Timer()
+    step_profiler: Optional[StepProfiler] = None
+
+    def configure_profiler(self) -> None:
+        config = self.training_config.get("profiler", None)
+        if config is None:
+            return
+
+        # Dataloader workers inherit this when they are started
+        processor_stats.enabled = config.get("processors", False)
+        if not config.enabled:
+            return
+
+        trace_config = config.trace
+        trace_dir = trace_config.output_dir
+        if trace_dir is None:
+            trace_dir = os.path.join(get_mmf_env(key="save_dir"), "traces")
+
+        self.step_profiler = StepProfiler(
+            cuda_events=config.cuda_events,
+            percentiles=config.percentiles,
+            trace_start_update=(
+                trace_config.start_update if trace_config.enabled else None
+            ),
+            trace_num_updates=trace_config.num_updates,
+            trace_dir=trace_dir,
+            torch_profiler=trace_config.torch_profiler,
+        )
 
     def profile(self, text: str) -> None:
         if self.training_config.logger_level != "debug":
             return
         logging.debug(f"{text}: {self.profiler.get_time_since_start()}")
         self.profiler.reset()
+
+    def profile_phase(self, name: str, record_nested: bool = True):
+        if self.step_profiler is None:
+            return contextlib.ExitStack()
+        return self.step_profiler.phase(name, record_nested=record_nested)
+
+    def profile_iterable(self, iterable: Iterable, name: str = "data_wait"):
+        if self.step_profiler is None:
+            return iterable
+        return self.step_profiler.iterate(iterable, name)
+
+    def profile_step(self) -> None:
+        if self.step_profiler is not None:
+            self.step_profiler.step()
+
+    def update_profiler_meter(self, meter: Type[Meter]) -> None:
+        if processor_stats.enabled:
+            summary = processor_stats.summarize()
+            processor_stats.reset()
+            meter.update(
+                {f"processors/{key}": value for key, value in summary.items()}, 1
+            )
+
+        if self.step_profiler is None:
+            return
+        summary = self.step_profiler.summarize()
+        meter.update({f"profiler/{key}": value for key, value in summary.items()}, 1)
@@ -44,6 +44,65 @@ class TrainerReportingMixin(ABC):
 
             meter.update(meter_update_dict, report.batch_size)
 
+    def accumulate_loss_sums(
+        self,
+        report: Dict[str, Any],
+        loss_sums: Dict[str, torch.Tensor],
+        sample_counts: Dict[str, int],
+    ) -> None:
+        """Adds the losses of ``report`` and their total weighted by its batch
+        size to ``loss_sums``. The sums stay on device so that no
+        synchronization happens until ``update_meter_from_loss_sums`` is called.
+        """
+        with torch.no_grad():
+            batch_sums = {
+                key: loss.detach().mean() * report.batch_size
+                for key, loss in report.losses.items()
+            }
+            if len(batch_sums) == 0:
+                return
+            # The total loss is averaged over all of the samples, as with
+            # ``update_meter``, and not summed over the averages of the keys
+            # which differ between the datasets
+            total_loss_key = report.dataset_type + "/total_loss"
+            batch_sums[total_loss_key] = sum(batch_sums.values())
+
+            for key, loss_sum in batch_sums.items():
+                if key in loss_sums:
+                    loss_sums[key] += loss_sum
+                else:
+                    loss_sums[key] = loss_sum
+                sample_counts[key] = sample_counts.get(key, 0) + report.batch_size
+
+    def update_meter_from_loss_sums(
+        self,
+        loss_sums: Dict[str, torch.Tensor],
+        sample_counts: Dict[str, int],
+        dataset_type: str,
+        meter: Type[Meter] = None,
+    ) -> None:
+        """Reduces the loss sums accumulated by ``accumulate_loss_sums`` across
+        processes with a single collective and adds the average losses to the
+        meter, same as calling ``update_meter`` on each of the reports would.
+        """
+        if meter is None:
+            meter = self.meter
+        if len(loss_sums) == 0:
+            return
+
+        keys = sorted(loss_sums.keys())
+        sums = torch.stack([loss_sums[key].float() for key in keys])
+        counts = torch.tensor(
+            [sample_counts[key] for key in keys], dtype=sums.dtype, device=sums.device
+        )
+        reduced = reduce_dict({"loss_sums": sums, "sample_counts": counts})
+        averages = (reduced["loss_sums"] / reduced["sample_counts"]).tolist()
+
+        meter_update_dict = dict(zip(keys, averages))
+        total_loss_key = dataset_type + "/total_loss"
+        registry.register(total_loss_key, meter_update_dict[total_loss_key])
+        meter.update(meter_update_dict, max(sample_counts.values()))
+
     def update_dict(self, meter_update_dict, values_dict):
         total_val = 0
         for key, val in values_dict.items():
@@ -1,5 +1,6 @@
 # Copyright (c) Facebook, Inc. and its affiliates.
 
+import contextlib
 import gc
 import logging
 import warnings
@@ -9,7 +10,7 @@ from typing import Any, Dict
 import torch
 from mmf.common.registry import registry
 from mmf.common.report import Report
-from mmf.common.sample import to_device
+from mmf.common.sample import SampleList, to_device
 from mmf.utils.general import clip_gradients
 from torch import Tensor
 
@@ -72,24 +73,38 @@ class TrainerTrainingLoopMixin(ABC):
 
             combined_report = None
             num_batches_for_this_update = 1
-            for idx, batch in enumerate(self.train_loader):
+            num_batches_in_update = 0
+            should_log = False
+            update_frequency = self.training_config.update_frequency
+            for batch in self.profile_iterable(self.train_loader, "data_wait"):
 
-                if (idx + 1) % self.training_config.update_frequency == 0:
+                if num_batches_in_update == 0:
                     combined_report = None
-                    num_batches_for_this_update = min(
-                        self.training_config.update_frequency, num_remaining_batches
-                    )
+                    # Last update of an epoch can have fewer batches
+                    num_batches_for_this_update = update_frequency
+                    if num_remaining_batches > 0:
+                        num_batches_for_this_update = min(
+                            update_frequency, num_remaining_batches
+                        )
+                    should_log = (
+                        self.num_updates + 1
+                    ) % self.logistics_callback.log_interval == 0
 
                     self._start_update()
 
                 # batch execution starts here
-                self.on_batch_start()
+                with self.profile_phase("callbacks"):
+                    self.on_batch_start()
                 self.profile("Batch load time")
 
-                report = self.run_training_batch(batch, num_batches_for_this_update)
+                num_batches_in_update += 1
+                is_last_batch = num_batches_in_update == num_batches_for_this_update
+                with self._gradient_sync_context(is_last_batch):
+                    report = self.run_training_batch(batch, num_batches_for_this_update)
 
-                # accumulate necessary params for metric calculation
-                if combined_report is None:
+                # accumulate necessary params for metric calculation, only needed
+                # if this update is going to be logged
+                if combined_report is None or not should_log:
                     combined_report = report
                 else:
                     combined_report.accumulate_tensor_fields(
@@ -98,27 +113,30 @@ class TrainerTrainingLoopMixin(ABC):
                     combined_report.batch_size += report.batch_size
 
                 # batch execution ends here
-                self.on_batch_end(report=combined_report, meter=self.meter)
+                with self.profile_phase("callbacks"):
+                    self.on_batch_end(report=report, meter=self.meter)
 
                 # check if an update has finished, if no continue
-                if (idx + 1) % self.training_config.update_frequency:
+                if not is_last_batch:
                     continue
 
+                num_batches_in_update = 0
                 self._finish_update()
 
-                should_log = False
-                if self.num_updates % self.logistics_callback.log_interval == 0:
-                    should_log = True
+                if should_log:
                     # Calculate metrics every log interval for debugging
                     if self.training_config.evaluate_metrics:
                         combined_report.metrics = self.metrics(
                             combined_report, combined_report
                         )
                     self.update_meter(combined_report, self.meter)
+                    self.update_profiler_meter(self.meter)
 
-                self.on_update_end(
-                    report=combined_report, meter=self.meter, should_log=should_log
-                )
+                with self.profile_phase("callbacks"):
+                    self.on_update_end(
+                        report=combined_report, meter=self.meter, should_log=should_log
+                    )
+                self.profile_step()
 
                 num_remaining_batches -= num_batches_for_this_update
 
@@ -132,7 +150,8 @@ class TrainerTrainingLoopMixin(ABC):
                     logger.info("Evaluation time. Running on full validation set...")
                     # Validation and Early stopping
                     # Create a new meter for this case
-                    report, meter = self.evaluation_loop(self.val_loader)
+                    with self.profile_phase("eval", record_nested=False):
+                        report, meter = self.evaluation_loop(self.val_loader)
 
                     # Validation end callbacks
                     stop = self.early_stop_callback.on_validation_end(
@@ -157,22 +176,32 @@ class TrainerTrainingLoopMixin(ABC):
     def run_training_batch(self, batch: Tensor, loss_divisor: int) -> None:
 
         report = self._forward(batch)
-        loss = self._extract_loss(report)
-        # Since losses are batch averaged in MMF, this makes sure the
-        # scaling is right.
-        loss /= loss_divisor
+        with self.profile_phase("loss"):
+            loss = self._extract_loss(report)
+            # Since losses are batch averaged in MMF, this makes sure the
+            # scaling is right.
+            loss /= loss_divisor
         self._backward(loss)
 
         return report
 
     def _forward(self, batch: Tensor) -> Dict[str, Any]:
-        prepared_batch = self.dataset_loader.prepare_batch(batch)
-        # Move the sample list to device if it isn't as of now.
-        prepared_batch = to_device(prepared_batch, torch.device("cuda"))
+        prepared_batch = self._prepare_batch(batch)
+        return self._forward_prepared_batch(prepared_batch)
+
+    def _prepare_batch(self, batch: Tensor) -> SampleList:
+        with self.profile_phase("host_to_device"):
+            prepared_batch = self.dataset_loader.prepare_batch(batch)
+            # Move the sample list to device if it isn't as of now.
+            prepared_batch = to_device(prepared_batch, torch.device("cuda"))
         self.profile("Batch prepare time")
-        # Arguments should be a dict at this point
+        return prepared_batch
 
-        with torch.cuda.amp.autocast(enabled=self.training_config.fp16):
+    def _forward_prepared_batch(self, prepared_batch: SampleList) -> Dict[str, Any]:
+        # Arguments should be a dict at this point
+        with self.profile_phase("forward"), torch.cuda.amp.autocast(
+            enabled=self.training_config.fp16
+        ):
             model_output = self.model(prepared_batch)
             report = Report(prepared_batch, model_output)
 
@@ -184,24 +213,36 @@ class TrainerTrainingLoopMixin(ABC):
         self.current_iteration += 1
         logger.debug(self.num_updates + 1)
         self.on_update_start()
-        self.optimizer.zero_grad()
+        with self.profile_phase("optimizer"):
+            self.optimizer.zero_grad()
+
+    def _gradient_sync_context(self, is_last_batch: bool):
+        # With gradient accumulation, DistributedDataParallel only needs to
+        # all-reduce gradients during the backward of the last batch of an update
+        if is_last_batch or not isinstance(
+            self.model, torch.nn.parallel.DistributedDataParallel
+        ):
+            return contextlib.ExitStack()
+        return self.model.no_sync()
 
     def _backward(self, loss: Tensor) -> None:
-        self.scaler.scale(loss).backward()
+        with self.profile_phase("backward"):
+            self.scaler.scale(loss).backward()
         self.profile("Backward time")
 
     def _finish_update(self):
-        if self.training_config.clip_gradients:
-            clip_gradients(
-                self.model,
-                self.num_updates,
-                self.logistics_callback.tb_writer,
-                self.config,
-                scale=self.scaler.get_scale(),
-            )
+        with self.profile_phase("optimizer"):
+            if self.training_config.clip_gradients:
+                clip_gradients(
+                    self.model,
+                    self.num_updates,
+                    self.logistics_callback.tb_writer,
+                    self.config,
+                    scale=self.scaler.get_scale(),
+                )
 
-        self.scaler.step(self.optimizer)
-        self.scaler.update()
+            self.scaler.step(self.optimizer)
+            self.scaler.update()
 
         self.num_updates += 1
         self.profile("Finished update")
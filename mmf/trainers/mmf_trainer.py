@@ -41,6 +41,7 @@ class MMFTrainer(
     def load(self):
         super().load()
         self.load_fp16_scaler()
+        self.configure_profiler()
 
         # Callbacks
         self.on_init_start()
@@ -156,7 +156,10 @@ def build_dataloader_and_sampler(
         dataset=dataset_instance,
         pin_memory=pin_memory,
         collate_fn=BatchCollator(
-            dataset_instance.dataset_name, dataset_instance.dataset_type
+            dataset_instance.dataset_name,
+            dataset_instance.dataset_type,
+            processors=getattr(dataset_instance, "collate_processors", None),
+            sample_processors=getattr(dataset_instance, "sample_processors", None),
         ),
         num_workers=num_workers,
         drop_last=False,  # see also MultiDatasetLoader.__len__
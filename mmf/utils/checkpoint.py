@@ -279,6 +279,20 @@ class Checkpoint:
 
     def _load_optimizer(self, ckpt):
         if "optimizer" in ckpt:
+            # Modules which converted a checkpoint of their previous
+            # implementation, see mmf.modules.fusions.ConvertedStateDictMixin
+            converted = [
+                name
+                for name, module in self.trainer.model.named_modules()
+                if getattr(module, "has_converted_state_dict", False)
+            ]
+            if len(converted) != 0:
+                raise RuntimeError(
+                    f"The parameters of {converted} were converted from a "
+                    + "checkpoint of their previous implementation, so its "
+                    + "optimizer state can't be loaded. Load it with "
+                    + "checkpoint.reset.optimizer=True"
+                )
             try:
                 self.trainer.optimizer.load_state_dict(ckpt["optimizer"])
             except ValueError:
@@ -0,0 +1,348 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+"""
+Utilities to benchmark the data pipeline (datasets, processors, collate and
+DataLoader workers) without building a model or a trainer. Used by the
+``mmf_bench_data`` command.
+"""
+import contextlib
+import heapq
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import torch
+from mmf.common.sample import Sample
+from mmf.datasets.base_dataset import BaseDataset
+from mmf.datasets.multi_dataset_loader import MultiDatasetLoader
+from mmf.datasets.processors.processors import processor_stats
+
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (50, 90, 99)
+
+
+class SyntheticDataset(BaseDataset):
+    """Dataset of random samples shaped like the inputs of the vision and
+    language models (token ids, region features and soft answer targets),
+    to benchmark the loader, collate and workers without downloading data.
+
+    Samples are deterministic in ``idx``. If ``config`` specifies
+    ``processors`` and one of them is ``text_processor``, it is applied to a
+    random sentence instead of generating token ids.
+    """
+
+    def __init__(
+        self,
+        dataset_name: str,
+        config=None,
+        dataset_type: str = "train",
+        num_samples: int = 1024,
+        seq_length: int = 128,
+        num_features: int = 100,
+        feature_dim: int = 2048,
+        num_labels: int = 3129,
+        *args,
+        **kwargs,
+    ):
+        super().__init__(dataset_name, config, dataset_type, *args, **kwargs)
+        self.num_samples = num_samples
+        self.seq_length = seq_length
+        self.num_features = num_features
+        self.feature_dim = feature_dim
+        self.num_labels = num_labels
+        self.init_processors()
+
+    def __len__(self):
+        return self.num_samples
+
+    def __getitem__(self, idx):
+        generator = torch.Generator().manual_seed(idx)
+        sample = Sample()
+        sample.id = torch.tensor(idx, dtype=torch.long)
+
+        if hasattr(self, "text_processor"):
+            words = torch.randint(1000, (self.seq_length // 2,), generator=generator)
+            text = " ".join(f"word{word}" for word in words.tolist())
+            sample.update(self.text_processor({"text": text}))
+        else:
+            length = int(
+                torch.randint(1, self.seq_length + 1, (1,), generator=generator)
+            )
+            sample.input_ids = torch.zeros(self.seq_length, dtype=torch.long)
+            sample.input_ids[:length] = torch.randint(
+                1, 30000, (length,), generator=generator
+            )
+            sample.input_mask = (sample.input_ids != 0).long()
+            sample.segment_ids = torch.zeros(self.seq_length, dtype=torch.long)
+
+        sample.image_feature_0 = torch.randn(
+            self.num_features, self.feature_dim, generator=generator
+        )
+        sample.image_info_0 = {"max_features": torch.tensor(self.num_features)}
+
+        answers = torch.randint(self.num_labels, (10,), generator=generator)
+        sample.targets = torch.zeros(self.num_labels).scatter_add_(
+            0, answers, torch.full((10,), 0.3)
+        )
+        sample.targets.clamp_(max=1)
+        return sample
+
+
+class SyntheticMultiDatasetLoader(MultiDatasetLoader):
+    """MultiDatasetLoader which builds a :class:`SyntheticDataset` for each of
+    the datasets in the config instead of the real ones. The datasets get
+    their ``dataset_config`` so that the configured processors are built.
+    """
+
+    def __init__(self, dataset_type="train", **synthetic_kwargs):
+        super().__init__(dataset_type)
+        self.synthetic_kwargs = synthetic_kwargs
+
+    def _build_dataset(self, dataset_key, dataset_config):
+        return SyntheticDataset(
+            dataset_key, dataset_config, self.dataset_type, **self.synthetic_kwargs
+        )
+
+
+def get_rss_mb(pid: Optional[int] = None) -> Optional[float]:
+    """Returns the resident set size in MB of process ``pid`` (current
+    process by default), or None if it can't be read on this platform.
+    """
+    pid = pid or os.getpid()
+    try:
+        import psutil
+
+        return psutil.Process(pid).memory_info().rss / 2**20
+    except ImportError:
+        pass
+
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def get_worker_pids(iterator) -> List[int]:
+    # Only the multiprocessing DataLoader iterators have workers
+    workers = getattr(iterator, "_workers", [])
+    return [worker.pid for worker in workers if worker.pid is not None]
+
+
+@contextlib.contextmanager
+def enable_processor_stats():
+    """Enables :data:`processor_stats` from a clean state and restores its
+    previous state on exit.
+    """
+    enabled = processor_stats.enabled
+    processor_stats.enabled = True
+    processor_stats.reset()
+    try:
+        yield processor_stats
+    finally:
+        processor_stats.enabled = enabled
+        processor_stats.reset()
+
+
+def group_processor_summary(summary: Dict[str, float]) -> Dict[str, Dict]:
+    grouped = defaultdict(dict)
+    for key, value in summary.items():
+        name, stat = key.rsplit("/", 1)
+        grouped[name][stat] = value
+    return dict(grouped)
+
+
+def summarize_durations(durations: List[float]) -> Dict[str, float]:
+    summary = {"count": len(durations), "total_ms": float(np.sum(durations))}
+    if len(durations) == 0:
+        return summary
+    summary["mean_ms"] = float(np.mean(durations))
+    values = np.percentile(durations, PERCENTILES)
+    for percentile, value in zip(PERCENTILES, values):
+        summary[f"p{percentile}_ms"] = float(value)
+    return summary
+
+
+class DataPipelineBenchmark:
+    """Benchmarks each of the datasets of a loaded :class:`MultiDatasetLoader`
+    in two passes:
+
+    1. ``num_samples`` samples are loaded in the main process with
+       ``dataset[idx]``, timing each sample and, with :data:`processor_stats`,
+       each :class:`Processor` call.
+       The samples are then collated in batches with the loader's
+       ``collate_fn``.
+    2. ``num_batches`` batches are loaded with the DataLoader, as in
+       training, to measure the end-to-end throughput, the RSS of the
+       workers and the processor stats per worker.
+
+    Args:
+        loader (MultiDatasetLoader): Loader on which ``load`` has been called.
+        num_samples (int): Number of samples per dataset for the first pass.
+        num_batches (int): Number of batches per dataset for the second pass.
+        top_k (int): Number of slowest samples to report.
+    """
+
+    def __init__(
+        self,
+        loader: MultiDatasetLoader,
+        num_samples: int = 256,
+        num_batches: int = 50,
+        top_k: int = 10,
+    ):
+        self.loader = loader
+        self.num_samples = num_samples
+        self.num_batches = num_batches
+        self.top_k = top_k
+
+    def run(self) -> Dict[str, Any]:
+        report = {"datasets": {}, "slowest_samples": []}
+        slowest = []
+        datasets = list(zip(self.loader.datasets, self.loader.loaders))
+
+        with enable_processor_stats() as stats:
+            for dataset, data_loader in datasets:
+                result = report["datasets"].setdefault(dataset.dataset_name, {})
+                if not isinstance(dataset, torch.utils.data.IterableDataset):
+                    result.update(
+                        self._benchmark_samples(dataset, data_loader, slowest)
+                    )
+            report["processors"] = group_processor_summary(stats.summarize())
+            stats.reset()
+
+            for dataset, data_loader in datasets:
+                result = report["datasets"][dataset.dataset_name]
+                result.update(self._benchmark_loader(data_loader))
+            # Stats sent back by the workers along with the batches
+            report["worker_processors"] = stats.get_stats()
+
+        report["slowest_samples"] = [
+            {"dataset": name, "index": idx, "ms": duration}
+            for duration, name, idx in sorted(slowest, reverse=True)
+        ]
+        return report
+
+    def _benchmark_samples(self, dataset, data_loader, slowest):
+        num_samples = min(self.num_samples, len(dataset))
+        samples = []
+        sample_durations = []
+
+        start = time.perf_counter()
+        for idx in range(num_samples):
+            sample_start = time.perf_counter()
+            samples.append(dataset[idx])
+            duration = (time.perf_counter() - sample_start) * 1000
+            sample_durations.append(duration)
+
+            item = (duration, dataset.dataset_name, idx)
+            if len(slowest) < self.top_k:
+                heapq.heappush(slowest, item)
+            elif self.top_k > 0:
+                heapq.heappushpop(slowest, item)
+        elapsed = time.perf_counter() - start
+
+        batch_size = data_loader.batch_size or 1
+        collate_durations = []
+        for idx in range(0, len(samples), batch_size):
+            batch = samples[idx : idx + batch_size]
+            collate_start = time.perf_counter()
+            data_loader.collate_fn(batch)
+            collate_durations.append((time.perf_counter() - collate_start) * 1000)
+
+        return {
+            "samples_per_sec": num_samples / elapsed if elapsed > 0 else None,
+            "sample": summarize_durations(sample_durations),
+            "collate": summarize_durations(collate_durations),
+        }
+
+    def _benchmark_loader(self, data_loader):
+        num_samples = 0
+        num_batches = 0
+        worker_rss = defaultdict(float)
+
+        iterator = iter(data_loader)
+        start = time.perf_counter()
+        for batch in iterator:
+            processor_stats.collect(batch)
+            num_samples += self._get_batch_size(batch)
+            num_batches += 1
+            for pid in get_worker_pids(iterator):
+                rss = get_rss_mb(pid)
+                if rss is not None:
+                    worker_rss[pid] = max(worker_rss[pid], rss)
+            if num_batches == self.num_batches:
+                break
+        elapsed = time.perf_counter() - start
+        # Shut the workers down before benchmarking the next dataset
+        del iterator
+
+        return {
+            "loader_samples_per_sec": num_samples / elapsed if elapsed > 0 else None,
+            "loader_batches": num_batches,
+            "num_workers": data_loader.num_workers,
+            "worker_rss_mb": list(worker_rss.values()),
+            "main_rss_mb": get_rss_mb(),
+        }
+
+    def _get_batch_size(self, batch):
+        if hasattr(batch, "get_batch_size"):
+            return batch.get_batch_size()
+        if isinstance(batch, dict):
+            for value in batch.values():
+                if isinstance(value, torch.Tensor):
+                    return value.size(0)
+        return 1
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = []
+
+    def format_value(value):
+        return "n/a" if value is None else f"{value:.2f}"
+
+    for name, result in report["datasets"].items():
+        lines.append(f"Dataset {name}:")
+        if "samples_per_sec" in result:
+            sample = result["sample"]
+            lines.append(
+                f"  samples/s (main process): {format_value(result['samples_per_sec'])}"
+                + f", sample p50/p99 ms: {format_value(sample.get('p50_ms'))}"
+                + f"/{format_value(sample.get('p99_ms'))}"
+            )
+            lines.append(
+                "  collate ms/batch: " + format_value(result["collate"].get("mean_ms"))
+            )
+        worker_rss = ", ".join(f"{rss:.1f}" for rss in result["worker_rss_mb"])
+        lines.append(
+            "  samples/s (loader, "
+            + f"{result['num_workers']} workers): "
+            + format_value(result["loader_samples_per_sec"])
+        )
+        lines.append(
+            f"  main RSS MB: {format_value(result['main_rss_mb'])}"
+            + f", worker RSS MB: [{worker_rss}]"
+        )
+
+    if len(report["processors"]) > 0:
+        lines.append("Processors in the main process (inclusive of nested ones):")
+        for name, summary in sorted(
+            report["processors"].items(), key=lambda x: -x[1]["total_ms"]
+        ):
+            lines.append(
+                f"  {name}: calls {summary['calls']}"
+                + f", total ms {format_value(summary['total_ms'])}"
+                + f", p50/p99 ms {format_value(summary.get('p50_ms'))}"
+                + f"/{format_value(summary.get('p99_ms'))}"
+            )
+
+    if len(report["slowest_samples"]) > 0:
+        lines.append("Slowest samples:")
+        for item in report["slowest_samples"]:
+            lines.append(f"  {item['dataset']}[{item['index']}]: {item['ms']:.2f} ms")
+
+    return "\n".join(lines)
@@ -0,0 +1,257 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+"""
+Cache of the outputs of frozen encoders (e.g. the ``ResNet152ImageEncoder``
+of MMBT with ``freeze_modal``), so that they are computed once instead of at
+every epoch. The outputs are written by ``mmf_cache_encoder`` into a
+memory-mapped store keyed by sample id. When the ``encoder_cache_dir`` of the
+model config is set, the datasets add them to their batches as
+``encoder_output`` at collate time, in the DataLoader workers (see
+:class:`EncoderOutputLoader`), and the model skips the encoder.
+
+Models with several cached outputs (e.g. the text and image states of the
+frozen layers of ViLBERT) return them by name from
+``compute_encoder_outputs``. Each of them is written to its own store in a
+subfolder of the cache and added to the batches as ``encoder_output_<name>``.
+"""
+import collections
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import torch
+from mmf.utils.file_io import PathManager
+
+
+logger = logging.getLogger(__name__)
+
+ENCODER_OUTPUT_KEY = "encoder_output"
+
+
+def get_encoder_output_key(name: Optional[str] = None) -> str:
+    """Sample list key of the cached outputs called ``name``."""
+    return ENCODER_OUTPUT_KEY if name is None else f"{ENCODER_OUTPUT_KEY}_{name}"
+
+
+def get_sample_keys(ids: Any) -> List[str]:
+    if isinstance(ids, torch.Tensor):
+        ids = ids.tolist()
+    return [str(x) for x in ids]
+
+
+class EncoderOutputStore:
+    """Encoder outputs of the same shape for a set of samples, stored in the
+    folder ``path`` as ``outputs.npy``, which is memory-mapped, and
+    ``ids.json``, which maps the sample ids to the rows of the outputs.
+
+    Use :meth:`create` and :meth:`write` to build a store.
+    """
+
+    OUTPUTS_FILE = "outputs.npy"
+    IDS_FILE = "ids.json"
+
+    def __init__(self, path: str):
+        self.path = path
+        with PathManager.open(os.path.join(path, self.IDS_FILE)) as f:
+            self.rows = {key: row for row, key in enumerate(json.load(f))}
+        outputs_path = PathManager.get_local_path(os.path.join(path, self.OUTPUTS_FILE))
+        self.outputs = np.load(outputs_path, mmap_mode="r")
+        self._writable = False
+
+    @classmethod
+    def create(cls, path: str, max_samples: int) -> "EncoderOutputStore":
+        """Returns an empty store with room for ``max_samples`` outputs, whose
+        shape and dtype are those of the first ones written.
+        """
+        PathManager.mkdirs(path)
+        store = cls.__new__(cls)
+        store.path = path
+        store.rows = {}
+        store.outputs = None
+        store.max_samples = max_samples
+        store._writable = True
+        return store
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, key):
+        return str(key) in self.rows
+
+    def write(self, ids: Any, outputs: torch.Tensor):
+        assert self._writable, "Store isn't opened with create"
+        outputs = outputs.detach().cpu().numpy()
+        if self.outputs is None:
+            self.outputs = np.lib.format.open_memmap(
+                PathManager.get_local_path(os.path.join(self.path, self.OUTPUTS_FILE)),
+                mode="w+",
+                dtype=outputs.dtype,
+                shape=(self.max_samples,) + outputs.shape[1:],
+            )
+
+        for key, output in zip(get_sample_keys(ids), outputs):
+            # Images shared by several samples or splits are only written once
+            if key in self.rows:
+                continue
+            row = len(self.rows)
+            assert row < self.max_samples, "Store is full"
+            self.outputs[row] = output
+            self.rows[key] = row
+
+    def close(self):
+        if self._writable and self.outputs is not None:
+            self.outputs.flush()
+        keys = sorted(self.rows.keys(), key=self.rows.get)
+        with PathManager.open(os.path.join(self.path, self.IDS_FILE), "w") as f:
+            json.dump(keys, f)
+        logger.info(f"Saved {len(keys)} encoder outputs to {self.path}")
+
+    def get(self, ids: Any) -> torch.Tensor:
+        keys = get_sample_keys(ids)
+        missing = [key for key in keys if key not in self.rows]
+        if len(missing) > 0:
+            raise KeyError(
+                f"Encoder outputs of samples {missing[:5]} aren't in the cache "
+                + f"{self.path}, rebuild it with mmf_cache_encoder"
+            )
+        outputs = torch.from_numpy(self.outputs[[self.rows[key] for key in keys]])
+        # Stores can be written in half precision to save space
+        return outputs.float()
+
+
+def build_encoder_output_store(
+    config, name: Optional[str] = None
+) -> Optional[EncoderOutputStore]:
+    """Opens the store in the ``encoder_cache_dir`` of a model config, if set,
+    or the one of the outputs called ``name`` in it.
+    """
+    cache_dir = config.get("encoder_cache_dir", None)
+    if cache_dir is None:
+        return None
+    if name is not None:
+        cache_dir = os.path.join(cache_dir, name)
+    store = EncoderOutputStore(cache_dir)
+    logger.info(f"Using {len(store)} cached encoder outputs from {cache_dir}")
+    return store
+
+
+def is_encoder_cached(config, frozen: bool) -> bool:
+    """Returns whether the outputs of the encoder of a model are read from the
+    ``encoder_cache_dir`` of its ``config``, in which case the encoder isn't
+    run and should be ``frozen``.
+    """
+    if config.get("encoder_cache_dir", None) is None:
+        return False
+    # The encoder would silently stop being trained, and DDP would fail on its
+    # unused parameters
+    assert frozen, "encoder_cache_dir can only be used with a frozen encoder"
+    return True
+
+
+class EncoderOutputLoader:
+    """Collate time processor of the datasets, which adds the outputs in the
+    cache ``cache_dir`` of the samples of a batch, by their ``id_key``. The
+    stores are opened on the first call, i.e. in each DataLoader worker, so
+    that the reads happen outside of the training process.
+    """
+
+    batch_stage = "collate"
+
+    def __init__(self, cache_dir: str, id_key: str = "id"):
+        self.cache_dir = cache_dir
+        self.id_key = id_key
+        self._stores: Optional[Dict[str, EncoderOutputStore]] = None
+
+    def __getstate__(self):
+        # Memory maps aren't sent to the workers
+        state = self.__dict__.copy()
+        state["_stores"] = None
+        return state
+
+    def _open_stores(self) -> Dict[str, EncoderOutputStore]:
+        ids_path = os.path.join(self.cache_dir, EncoderOutputStore.IDS_FILE)
+        if PathManager.exists(ids_path):
+            return {get_encoder_output_key(): EncoderOutputStore(self.cache_dir)}
+
+        # Stores of the named outputs
+        stores = {}
+        for name in sorted(PathManager.ls(self.cache_dir)):
+            path = os.path.join(self.cache_dir, name)
+            if PathManager.exists(os.path.join(path, EncoderOutputStore.IDS_FILE)):
+                stores[get_encoder_output_key(name)] = EncoderOutputStore(path)
+        if len(stores) == 0:
+            raise FileNotFoundError(
+                f"No encoder outputs in {self.cache_dir}, write them with "
+                + "mmf_cache_encoder"
+            )
+        return stores
+
+    def __call__(self, sample_list: Dict[str, Any]) -> Dict[str, Any]:
+        if self._stores is None:
+            self._stores = self._open_stores()
+        ids = sample_list[self.id_key]
+        for key, store in self._stores.items():
+            sample_list[key] = store.get(ids)
+        return sample_list
+
+
+def build_encoder_output_loader(config) -> Optional[EncoderOutputLoader]:
+    """Returns the loader of the cached encoder outputs of the model of the
+    global ``config``, if its ``encoder_cache_dir`` is set.
+    """
+    if config is None or config.get("model", None) is None:
+        return None
+    model_config = config.get("model_config", {}).get(config.model, None)
+    # Easy way to point to config for other model
+    if isinstance(model_config, str):
+        model_config = config.model_config[model_config]
+    if model_config is None or model_config.get("encoder_cache_dir", None) is None:
+        return None
+    return EncoderOutputLoader(
+        model_config.encoder_cache_dir, model_config.get("encoder_cache_id_key", "id")
+    )
+
+
+def write_encoder_outputs(
+    model: torch.nn.Module,
+    data_loaders: Sequence[torch.utils.data.DataLoader],
+    path: str,
+    id_key: str = "id",
+    fp16: bool = False,
+    device: Optional[torch.device] = None,
+) -> Union[EncoderOutputStore, Dict[str, EncoderOutputStore]]:
+    """Writes the outputs of the frozen encoder of ``model``, computed by its
+    ``compute_encoder_outputs(sample_list)``, for all of the samples of
+    ``data_loaders`` into a store at ``path``. If the model returns a dict of
+    outputs, they are written into the stores ``path/<name>``, which are
+    returned by name.
+    """
+    max_samples = sum(len(loader.dataset) for loader in data_loaders)
+    stores: Dict[Optional[str], EncoderOutputStore] = {}
+    model.eval()
+    with torch.no_grad():
+        for loader in data_loaders:
+            for batch in loader:
+                if device is not None:
+                    batch = batch.to(device)
+                keys = get_sample_keys(batch[id_key])
+                if len(stores) > 0 and all(
+                    key in store for store in stores.values() for key in keys
+                ):
+                    continue
+
+                outputs = model.compute_encoder_outputs(batch)
+                if not isinstance(outputs, collections.abc.Mapping):
+                    outputs = {None: outputs}
+                for name, output in outputs.items():
+                    if name not in stores:
+                        store_path = path if name is None else os.path.join(path, name)
+                        stores[name] = EncoderOutputStore.create(
+                            store_path, max_samples
+                        )
+                    stores[name].write(keys, output.half() if fp16 else output)
+
+    for store in stores.values():
+        store.close()
+    return stores[None] if None in stores else stores
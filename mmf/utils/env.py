@@ -1,12 +1,15 @@
 # Copyright (c) Facebook, Inc. and its affiliates.
 
+import ast
 import glob
 import importlib
+import json
 import logging
 import os
 import random
 import sys
 from datetime import datetime
+from typing import Dict, Optional
 
 import numpy as np
 import torch
@@ -93,12 +96,145 @@ def import_files(file_path: str, module_name: str = None):
                 importlib.import_module(f"{import_name}")
 
 
-def setup_imports():
+REGISTRY_MANIFEST_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "registry_manifest.json"
+)
+
+_registry_manifest = None
+_importing_all = False
+
+
+def _get_module_name(file_path: str, root_folder: str) -> str:
+    relative = os.path.relpath(file_path, root_folder)
+    parts = relative[: -len(".py")].split(os.sep)
+    return ".".join(["mmf"] + parts)
+
+
+def generate_registry_manifest(root_folder: Optional[str] = None):
+    """Statically scans the python files of the mmf package for
+    ``registry.register_<kind>("<name>")`` calls and returns a mapping of
+    ``{kind: {name: module}}``. Only names passed as string literals are
+    collected; anything else is still found by the full import fallback
+    of :func:`setup_imports`.
+
+    Args:
+        root_folder (str): Root of the mmf package. Defaults to the folder
+            containing this installation of mmf.
+
+    Returns:
+        Dict[str, Dict[str, str]]: Module to import for each registered name
+    """
+    if root_folder is None:
+        root_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    root_folder = os.path.realpath(root_folder)
+
+    manifest = {}
+    files = sorted(glob.glob(os.path.join(root_folder, "**", "*.py"), recursive=True))
+    for file_path in files:
+        # Skip folders symlinked from outside of the package, such as projects
+        if not os.path.realpath(file_path).startswith(root_folder + os.sep):
+            continue
+        with open(file_path) as f:
+            try:
+                tree = ast.parse(f.read(), filename=file_path)
+            except SyntaxError:
+                continue
+
+        module_name = _get_module_name(file_path, root_folder)
+        for node in ast.walk(tree):
+            if not isinstance(node, ast.Call) or len(node.args) == 0:
+                continue
+            func = node.func
+            if not (
+                isinstance(func, ast.Attribute)
+                and isinstance(func.value, ast.Name)
+                and func.value.id in ("registry", "Registry")
+                and func.attr.startswith("register_")
+            ):
+                continue
+            try:
+                name = ast.literal_eval(node.args[0])
+            except ValueError:
+                continue
+            if not isinstance(name, str):
+                continue
+            kind = func.attr[len("register_") :]
+            manifest.setdefault(kind, {}).setdefault(name, module_name)
+
+    return {
+        kind: dict(sorted(names.items())) for kind, names in sorted(manifest.items())
+    }
+
+
+def write_registry_manifest(path: str = REGISTRY_MANIFEST_PATH):
+    manifest = generate_registry_manifest()
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write("\n")
+    return manifest
+
+
+def load_registry_manifest() -> Dict[str, Dict[str, str]]:
+    global _registry_manifest
+    if _registry_manifest is None:
+        if os.path.exists(REGISTRY_MANIFEST_PATH):
+            with open(REGISTRY_MANIFEST_PATH) as f:
+                _registry_manifest = json.load(f)
+        else:
+            _registry_manifest = {}
+    return _registry_manifest
+
+
+def import_registered_module(kind: str, name: str) -> bool:
+    """Imports the module which registers ``name`` for registry ``kind``
+    (e.g. ``"model"``) according to the registry manifest. If the name is not
+    in the manifest or importing it didn't register it, falls back to
+    importing everything through :func:`setup_imports`.
+
+    Returns:
+        bool: Whether any module was imported
+    """
+    from mmf.common.registry import registry
+
+    if not isinstance(name, str):
+        return False
+
+    module_name = load_registry_manifest().get(kind, {}).get(name)
+    if module_name is not None:
+        importlib.import_module(module_name)
+        if name in registry.mapping[f"{kind}_name_mapping"]:
+            return True
+
+    if _importing_all or registry.get("imports_setup", no_warning=True):
+        return False
+
+    logging.getLogger(__name__).debug(
+        f"{kind} {name} is not in the registry manifest, importing all modules"
+    )
+    setup_imports()
+    return True
+
+
+def lazy_imports_enabled() -> bool:
+    return os.environ.get("MMF_LAZY_IMPORTS", "1") != "0"
+
+
+def setup_imports(lazy: bool = False):
+    """Imports MMF's datasets, models and trainers so that they register
+    themselves with the registry.
+
+    Args:
+        lazy (bool): Skip importing the modules. Registry lookups will then
+            only import the module which registers the requested name, using
+            the registry manifest generated by ``generate_registry_manifest``.
+            Default: False
+    """
+    global _importing_all
     from mmf.common.registry import registry
 
     # First, check if imports are already setup
     has_already_setup = registry.get("imports_setup", no_warning=True)
-    if has_already_setup:
+    if has_already_setup or _importing_all:
         return
     # Automatically load all of the modules, so that
     # they register with registry
@@ -116,6 +252,12 @@ def setup_imports():
         registry.register("pythia_path", root_folder)
         registry.register("mmf_path", root_folder)
 
+    importlib.import_module("mmf.common.meter")
+
+    if lazy:
+        registry.register("lazy_imports_setup", True)
+        return
+
     trainer_folder = os.path.join(root_folder, "trainers")
     trainer_pattern = os.path.join(trainer_folder, "**", "*.py")
     datasets_folder = os.path.join(root_folder, "datasets")
@@ -123,25 +265,29 @@ def setup_imports():
     model_folder = os.path.join(root_folder, "models")
     model_pattern = os.path.join(model_folder, "**", "*.py")
 
-    importlib.import_module("mmf.common.meter")
-
     files = (
         glob.glob(datasets_pattern, recursive=True)
         + glob.glob(model_pattern, recursive=True)
         + glob.glob(trainer_pattern, recursive=True)
     )
 
-    for f in files:
-        f = os.path.realpath(f)
-        if f.endswith(".py") and not f.endswith("__init__.py"):
-            splits = f.split(os.sep)
-            import_prefix_index = 0
-            for idx, split in enumerate(splits):
-                if split == "mmf":
-                    import_prefix_index = idx + 1
-            file_name = splits[-1]
-            module_name = file_name[: file_name.find(".py")]
-            module = ".".join(["mmf"] + splits[import_prefix_index:-1] + [module_name])
-            importlib.import_module(module)
+    _importing_all = True
+    try:
+        for f in files:
+            f = os.path.realpath(f)
+            if f.endswith(".py") and not f.endswith("__init__.py"):
+                splits = f.split(os.sep)
+                import_prefix_index = 0
+                for idx, split in enumerate(splits):
+                    if split == "mmf":
+                        import_prefix_index = idx + 1
+                file_name = splits[-1]
+                module_name = file_name[: file_name.find(".py")]
+                module = ".".join(
+                    ["mmf"] + splits[import_prefix_index:-1] + [module_name]
+                )
+                importlib.import_module(module)
+    finally:
+        _importing_all = False
 
     registry.register("imports_setup", True)
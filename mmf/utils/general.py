@@ -299,6 +299,37 @@ def get_chunks(x, sizes):
     return out
 
 
+def get_chunk_indices(sizes):
+    """Returns the indices to batch the chunks of ``sizes`` of the dimension 1
+    of a tensor, zero padded to the largest size: the index of the padded
+    chunks in the dimension, the mask of their padding and the index of the
+    dimension in the flattened padded chunks.
+    """
+    max_size = max(sizes)
+    index, mask, unpad_index = [], [], []
+    begin = 0
+    for chunk_id, s in enumerate(sizes):
+        index.extend(range(begin, begin + s))
+        index.extend([begin] * (max_size - s))
+        mask.extend([1.0] * s + [0.0] * (max_size - s))
+        unpad_index.extend(range(chunk_id * max_size, chunk_id * max_size + s))
+        begin += s
+    return torch.tensor(index), torch.tensor(mask), torch.tensor(unpad_index)
+
+
+def stack_chunks(tensors, max_size, dims):
+    """Stacks tensors of chunks of different sizes, zero padded to ``max_size``
+    in the dimensions ``dims``.
+    """
+    stacked = []
+    for tensor in tensors:
+        shape = [max_size if d in dims else s for d, s in enumerate(tensor.size())]
+        padded = tensor.new_zeros(shape)
+        padded[tuple(slice(0, s) for s in tensor.size())] = tensor
+        stacked.append(padded)
+    return torch.stack(stacked)
+
+
 def filter_grads(parameters):
     return [param for param in parameters if param.requires_grad]
 
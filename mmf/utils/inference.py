@@ -0,0 +1,118 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+"""
+Optimizations of models for inference on CPU, e.g. for MMBT or VisualBERT
+classifiers served on CPU-only nodes. Use them through ``from_pretrained``:
+
+.. code::
+
+    model = VisualBERT.from_pretrained(
+        "visual_bert.finetuned.hateful_memes.direct",
+        inference_mode="cpu_int8",
+        inference_options={"num_threads": 4, "samples": held_out_sample_lists},
+    )
+
+or on any model with :func:`optimize_for_inference`.
+"""
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+import torch
+from torch import Tensor, nn
+
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_MODES = ["cpu_fp32", "cpu_int8"]
+
+
+def freeze_dropout(module: nn.Module):
+    """Sets the probability of the dropout layers of ``module`` to zero, so
+    that they stay disabled even if the model is put back in training mode.
+    The layers are kept as layers which read their ``p``, such as the
+    attention ones, expect a dropout module.
+    """
+    for child in module.modules():
+        if isinstance(child, nn.modules.dropout._DropoutNd):
+            child.p = 0.0
+
+
+def get_scores(model: nn.Module, samples: Iterable[Dict[str, Any]]) -> List[Tensor]:
+    with torch.no_grad():
+        return [model(sample_list)["scores"].float() for sample_list in samples]
+
+
+def compute_drift(reference: List[Tensor], scores: List[Tensor]) -> Dict[str, float]:
+    """Returns the largest absolute difference between the ``scores`` of a
+    model and its ``reference`` scores, and the fraction of the samples whose
+    top prediction changed.
+    """
+    reference_scores = torch.cat(reference)
+    scores = torch.cat(scores)
+    mismatch = reference_scores.argmax(dim=-1) != scores.argmax(dim=-1)
+    return {
+        "max_abs_diff": (reference_scores - scores).abs().max().item(),
+        "prediction_mismatch": mismatch.float().mean().item(),
+    }
+
+
+def optimize_for_inference(
+    model: nn.Module,
+    mode: str = "cpu_int8",
+    num_threads: Optional[int] = None,
+    samples: Optional[Iterable[Dict[str, Any]]] = None,
+    max_prediction_mismatch: float = 0.01,
+) -> nn.Module:
+    """Prepares ``model`` for inference on CPU, in place: moves it to the CPU,
+    freezes its parameters and dropout layers and, in ``cpu_int8`` mode,
+    quantizes its ``nn.Linear`` layers to int8 with dynamic quantization.
+
+    Args:
+        model (nn.Module): Model to optimize, whose forward returns ``scores``.
+        mode (str, optional): ``cpu_fp32`` or ``cpu_int8``.
+            Defaults to "cpu_int8".
+        num_threads (Optional[int], optional): Number of threads used by torch
+            for intra-op parallelism. Defaults to None, to keep torch's default.
+        samples (Optional[Iterable[Dict[str, Any]]], optional): Held-out sample
+            lists on the CPU to verify the accuracy drift of the optimized
+            model against the fp32 model on. Defaults to None.
+        max_prediction_mismatch (float, optional): Fraction of ``samples``
+            whose top prediction is allowed to change. Defaults to 0.01.
+
+    Returns:
+        nn.Module: The optimized model.
+    """
+    if mode not in INFERENCE_MODES:
+        raise ValueError(f"Unknown inference mode {mode}, use one of {INFERENCE_MODES}")
+    if num_threads is not None:
+        torch.set_num_threads(num_threads)
+
+    model = model.cpu().eval()
+    freeze_dropout(model)
+    for param in model.parameters():
+        param.requires_grad = False
+
+    reference = None
+    if samples is not None:
+        samples = list(samples)
+        reference = get_scores(model, samples)
+
+    if mode == "cpu_int8":
+        if torch.backends.quantized.engine == "none":
+            raise RuntimeError(
+                "No quantized engine is available in this build of torch, "
+                + "use the cpu_fp32 inference mode"
+            )
+        model = torch.quantization.quantize_dynamic(
+            model, {nn.Linear}, dtype=torch.qint8, inplace=True
+        )
+
+    if reference is not None:
+        drift = compute_drift(reference, get_scores(model, samples))
+        logger.info(f"Drift of the {mode} model from the fp32 model: {drift}")
+        if drift["prediction_mismatch"] > max_prediction_mismatch:
+            raise RuntimeError(
+                f"Predictions of the {mode} model differ from the ones of the "
+                + f"fp32 model for {drift['prediction_mismatch']:.2%} of the "
+                + f"samples, more than {max_prediction_mismatch:.2%}"
+            )
+    return model
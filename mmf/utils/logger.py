@@ -1,13 +1,19 @@
 # Copyright (c) Facebook, Inc. and its affiliates.
 
+import atexit
 import collections
 import functools
 import json
 import logging
+import math
 import os
+import queue
 import sys
-from typing import Any, Dict, Union
+import threading
+from typing import Any, Dict, List, Union
 
+import numpy as np
+import torch
 from mmf.common.registry import registry
 from mmf.utils.configuration import get_mmf_env
 from mmf.utils.distributed import get_rank, is_master
@@ -251,12 +257,223 @@ class ColorfulFormatter(logging.Formatter):
         return prefix + " " + log
 
 
-class TensorboardLogger:
-    def __init__(self, log_folder="./logs", iteration=0):
+class LoggingBackend:
+    """Interface for the destinations of :class:`AsyncMetricsLogger`. Methods
+    are only called from the logger's writer thread.
+    """
+
+    def add_scalars(self, scalar_dict: Dict[str, float], iteration: int):
+        raise NotImplementedError
+
+    def add_histogram(self, name: str, values: np.ndarray, iteration: int):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class TensorboardBackend(LoggingBackend):
+    def __init__(self, log_folder: str):
         # This would handle warning of missing tensorboard
         from torch.utils.tensorboard import SummaryWriter
 
-        self.summary_writer = None
+        self.summary_writer = SummaryWriter(log_folder)
+
+    def add_scalars(self, scalar_dict, iteration):
+        for key, val in scalar_dict.items():
+            self.summary_writer.add_scalar(key, val, iteration)
+
+    def add_histogram(self, name, values, iteration):
+        self.summary_writer.add_histogram(name, values, iteration)
+
+    def flush(self):
+        self.summary_writer.flush()
+
+    def close(self):
+        self.summary_writer.close()
+
+
+class JsonlBackend(LoggingBackend):
+    """Appends one json line per iteration with its scalars to
+    ``log_folder/metrics.jsonl``. Histograms are summarized by their mean,
+    standard deviation, min and max.
+    """
+
+    def __init__(self, log_folder: str):
+        PathManager.mkdirs(log_folder)
+        self.file = PathManager.open(os.path.join(log_folder, "metrics.jsonl"), "a")
+
+    def add_scalars(self, scalar_dict, iteration):
+        self.file.write(json.dumps({"iteration": iteration, **scalar_dict}) + "\n")
+
+    def add_histogram(self, name, values, iteration):
+        summary = {
+            f"{name}/mean": float(values.mean()),
+            f"{name}/std": float(values.std()),
+            f"{name}/min": float(values.min()),
+            f"{name}/max": float(values.max()),
+        }
+        self.add_scalars(summary, iteration)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+LOGGING_BACKENDS = {"tensorboard": TensorboardBackend, "jsonl": JsonlBackend}
+
+
+class AsyncMetricsLogger:
+    """Writes scalars and histograms to a list of :class:`LoggingBackend`
+    from a background thread so that logging doesn't stall training steps.
+
+    Calls only enqueue their values. Tensors are converted to python numbers
+    on the writer thread, so the training thread never waits on the GPU for
+    them. Scalars queued for the same iteration are written together.
+    Histograms are computed from at most ``histogram_sample_size`` evenly
+    strided values of each parameter, copied to the CPU on a side CUDA stream.
+
+    Args:
+        backends (List[LoggingBackend]): Destinations of the logged values
+        max_queue_size (int): Maximum number of pending calls, after which
+            logging blocks. Default: 1024
+        histogram_sample_size (int): Maximum number of values sampled per
+            parameter for histograms. Default: 100000
+    """
+
+    _SENTINEL = object()
+
+    def __init__(
+        self,
+        backends: List[LoggingBackend],
+        max_queue_size: int = 1024,
+        histogram_sample_size: int = 100000,
+    ):
+        self.backends = backends
+        self.histogram_sample_size = histogram_sample_size
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def add_scalars(self, scalar_dict: Dict[str, Any], iteration: int):
+        scalar_dict = {
+            key: val.detach() if torch.is_tensor(val) else val
+            for key, val in scalar_dict.items()
+        }
+        self._put(("scalars", scalar_dict, iteration))
+
+    def add_histogram_for_model(self, model: torch.nn.Module, iteration: int):
+        parameters = list(model.named_parameters())
+        if len(parameters) == 0:
+            return
+
+        use_cuda = parameters[0][1].is_cuda
+        stream = torch.cuda.Stream() if use_cuda else None
+        histograms = []
+        with torch.no_grad(), torch.cuda.stream(stream):
+            if use_cuda:
+                stream.wait_stream(torch.cuda.current_stream())
+            for name, param in parameters:
+                values = param.detach().view(-1)
+                if values.numel() > self.histogram_sample_size:
+                    step = math.ceil(values.numel() / self.histogram_sample_size)
+                    values = values[::step]
+                cpu_values = torch.empty(
+                    values.size(), dtype=values.dtype, pin_memory=use_cuda
+                )
+                cpu_values.copy_(values, non_blocking=use_cuda)
+                histograms.append((name, cpu_values))
+
+        event = None
+        if use_cuda:
+            event = torch.cuda.Event()
+            event.record(stream)
+            # Parameters shouldn't be updated before they have been copied
+            torch.cuda.current_stream().wait_stream(stream)
+        self._put(("histograms", histograms, iteration, event))
+
+    def flush(self):
+        """Blocks until all of the queued values have been written"""
+        if self._closed:
+            return
+        self._queue.join()
+        for backend in self.backends:
+            backend.flush()
+
+    def close(self):
+        if self._closed:
+            return
+        self._queue.put(self._SENTINEL)
+        self._thread.join()
+        self._closed = True
+        for backend in self.backends:
+            backend.close()
+
+    def _put(self, item):
+        if self._closed:
+            raise RuntimeError("Logging to a closed AsyncMetricsLogger")
+        self._queue.put(item)
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            # Batch whatever else is pending to write scalars together
+            while items[-1] is not self._SENTINEL:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self._write([item for item in items if item is not self._SENTINEL])
+            except Exception:
+                logging.getLogger(__name__).exception("Failed to write metrics")
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+
+            if items[-1] is self._SENTINEL:
+                break
+
+    def _write(self, items):
+        scalars = collections.OrderedDict()
+        for item in items:
+            if item[0] == "scalars":
+                _, scalar_dict, iteration = item
+                scalars.setdefault(iteration, {}).update(
+                    {
+                        key: val.item() if torch.is_tensor(val) else val
+                        for key, val in scalar_dict.items()
+                    }
+                )
+            else:
+                _, histograms, iteration, event = item
+                if event is not None:
+                    event.synchronize()
+                for backend in self.backends:
+                    for name, values in histograms:
+                        backend.add_histogram(name, values.numpy(), iteration)
+
+        for iteration, scalar_dict in scalars.items():
+            for backend in self.backends:
+                backend.add_scalars(scalar_dict, iteration)
+
+
+class TensorboardLogger:
+    """Logs scalars and parameter histograms from the master process through an
+    :class:`AsyncMetricsLogger`, to tensorboard and any other of the
+    ``backends`` in ``LOGGING_BACKENDS``.
+    """
+
+    def __init__(self, log_folder="./logs", iteration=0, backends=("tensorboard",)):
+        self.metrics_logger = None
         self._is_master = is_master()
         self.timer = Timer()
         self.log_folder = log_folder
@@ -267,14 +484,16 @@ class TensorboardLogger:
             tensorboard_folder = os.path.join(
                 self.log_folder, f"tensorboard_{current_time}"
             )
-            self.summary_writer = SummaryWriter(tensorboard_folder)
+            self.metrics_logger = AsyncMetricsLogger(
+                [LOGGING_BACKENDS[backend](tensorboard_folder) for backend in backends]
+            )
 
     def __del__(self):
-        if getattr(self, "summary_writer", None) is not None:
-            self.summary_writer.close()
+        if getattr(self, "metrics_logger", None) is not None:
+            self.metrics_logger.close()
 
     def _should_log_tensorboard(self):
-        if self.summary_writer is None or not self._is_master:
+        if self.metrics_logger is None or not self._is_master:
             return False
         else:
             return True
@@ -283,19 +502,20 @@ class TensorboardLogger:
         if not self._should_log_tensorboard():
             return
 
-        self.summary_writer.add_scalar(key, value, iteration)
+        self.metrics_logger.add_scalars({key: value}, iteration)
 
     def add_scalars(self, scalar_dict, iteration):
         if not self._should_log_tensorboard():
             return
 
-        for key, val in scalar_dict.items():
-            self.summary_writer.add_scalar(key, val, iteration)
+        self.metrics_logger.add_scalars(scalar_dict, iteration)
 
     def add_histogram_for_model(self, model, iteration):
         if not self._should_log_tensorboard():
             return
 
-        for name, param in model.named_parameters():
-            np_param = param.clone().cpu().data.numpy()
-            self.summary_writer.add_histogram(name, np_param, iteration)
+        self.metrics_logger.add_histogram_for_model(model, iteration)
+
+    def flush(self):
+        if self._should_log_tensorboard():
+            self.metrics_logger.flush()
@@ -1,8 +1,11 @@
 # Copyright (c) Facebook, Inc. and its affiliates.
 
 import logging
+from typing import Optional, Tuple
 
-from torch import nn
+import torch
+from torch import Tensor, nn
+from torch.utils.checkpoint import checkpoint
 
 
 logger = logging.getLogger(__name__)
@@ -65,3 +68,56 @@ def get_optimizer_parameters_for_bert(module, config):
     parameters += get_bert_configured_parameters(module.classifier)
 
     return parameters
+
+
+def get_checkpoint_interval(config) -> int:
+    """Returns N if ``checkpoint_activations`` is enabled in the transformer
+    ``config``, in which case the activations of one of every N layers of
+    the encoders (``checkpoint_every_n_layers``, 1 by default) are recomputed
+    in the backward pass instead of being kept in memory. Returns 0 otherwise.
+    """
+    if not getattr(config, "checkpoint_activations", False):
+        return 0
+    interval = getattr(config, "checkpoint_every_n_layers", 1)
+    assert interval > 0, "checkpoint_every_n_layers should be positive"
+    return interval
+
+
+@torch.jit.unused
+def should_checkpoint_layer(layer_idx: int, interval: int, training: bool) -> bool:
+    # Checkpointing only saves memory if the backward pass follows. Only called
+    # after a torch.jit.is_scripting() check by the scriptable encoders.
+    return (
+        interval > 0
+        and layer_idx % interval == 0
+        and training
+        and torch.is_grad_enabled()
+    )
+
+
+def checkpoint_forward(
+    layer: nn.Module, *inputs: Optional[Tensor], num_outputs: int = 1, **kwargs
+) -> Tuple[Tensor, ...]:
+    """Calls ``layer(*inputs, **kwargs)`` with activation checkpointing and
+    returns its first ``num_outputs`` outputs, which should be tensors (e.g.
+    the hidden states of a transformer layer). ``inputs`` should be tensors or
+    None, the other arguments are passed in ``kwargs``.
+
+    Falls back to a plain call when none of the ``inputs`` requires grad, e.g.
+    the outputs of the frozen lower layers of ViLBERT. torch.utils.checkpoint
+    would otherwise return outputs that don't require grad, and the parameters
+    of ``layer`` wouldn't get any gradients.
+
+    Not supported in TorchScript, the encoders only call it in eager mode.
+    """
+
+    def forward(*args):
+        return tuple(layer(*args, **kwargs)[:num_outputs])
+
+    if not any(isinstance(x, Tensor) and x.requires_grad for x in inputs):
+        return forward(*inputs)
+
+    outputs = checkpoint(forward, *inputs)
+    if isinstance(outputs, Tensor):
+        outputs = (outputs,)
+    return outputs
@@ -0,0 +1,208 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import torch
+from mmf.utils.distributed import get_rank
+from mmf.utils.file_io import PathManager
+
+
+logger = logging.getLogger(__name__)
+
+
+class StepProfiler:
+    """Measures named phases of training steps (e.g. ``data_wait``,
+    ``forward``, ``backward``) with a monotonic clock and, when training on
+    GPU, with CUDA events. Durations are kept until :meth:`summarize` which
+    returns their percentiles in milliseconds.
+
+    Optionally, a Chrome trace (viewable in chrome://tracing or Perfetto) of
+    the phases, and a torch profiler trace, is exported for a window of
+    ``trace_num_updates`` updates starting after ``trace_start_update``
+    updates.
+
+    Usage::
+
+        profiler = StepProfiler()
+        for batch in profiler.iterate(loader, "data_wait"):
+            with profiler.phase("forward"):
+                output = model(batch)
+            profiler.step()
+
+        meter.update(profiler.summarize(), 1)
+
+    Args:
+        cuda_events (bool): Also time phases with CUDA events if CUDA is
+            available. CUDA timings are reported with a ``_cuda`` suffix.
+            Default: True
+        percentiles (List[int]): Percentiles to report. Default: [50, 90, 99]
+        trace_start_update (int): Number of updates after which the trace
+            window starts. Default: None (no trace)
+        trace_num_updates (int): Number of updates in the trace window.
+        trace_dir (str): Folder where traces are written.
+        torch_profiler (bool): Also run the torch profiler during the trace
+            window and export its Chrome trace. Default: False
+    """
+
+    def __init__(
+        self,
+        cuda_events: bool = True,
+        percentiles: List[int] = (50, 90, 99),
+        trace_start_update: Optional[int] = None,
+        trace_num_updates: int = 1,
+        trace_dir: Optional[str] = None,
+        torch_profiler: bool = False,
+    ):
+        self.use_cuda = cuda_events and torch.cuda.is_available()
+        self.percentiles = list(percentiles)
+        self.trace_start_update = trace_start_update
+        self.trace_num_updates = trace_num_updates
+        self.trace_dir = trace_dir
+        self.use_torch_profiler = torch_profiler
+
+        self.num_updates = 0
+        self._durations = defaultdict(list)
+        self._cuda_events = defaultdict(list)
+        self._suspended = False
+
+        self._origin = time.perf_counter()
+        self._tracing = False
+        self._trace_events = []
+        self._torch_profiler = None
+
+    @contextlib.contextmanager
+    def phase(self, name: str, record_nested: bool = True):
+        """Times the body of the ``with`` statement as phase ``name``. If
+        ``record_nested`` is False, phases inside of the body are ignored,
+        which is useful for e.g. evaluation running inside a training step.
+        """
+        if self._suspended:
+            yield
+            return
+
+        if self.use_cuda:
+            start_event = torch.cuda.Event(enable_timing=True)
+            start_event.record()
+        start = time.perf_counter()
+        self._suspended = not record_nested
+        try:
+            yield
+        finally:
+            self._suspended = False
+            self.record(name, start, time.perf_counter())
+            if self.use_cuda:
+                end_event = torch.cuda.Event(enable_timing=True)
+                end_event.record()
+                self._cuda_events[name].append((start_event, end_event))
+
+    def iterate(self, iterable: Iterable, name: str = "data_wait"):
+        """Yields from ``iterable`` timing each ``next`` call as phase
+        ``name``.
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def record(self, name: str, start: float, end: float):
+        """Records a phase from ``time.perf_counter`` timestamps."""
+        self._durations[name].append((end - start) * 1000)
+        if self._tracing:
+            self._trace_events.append(
+                {
+                    "name": name,
+                    "ph": "X",
+                    "ts": (start - self._origin) * 1e6,
+                    "dur": (end - start) * 1e6,
+                    "pid": get_rank(),
+                    "tid": threading.get_ident(),
+                }
+            )
+
+    def step(self):
+        """Marks the end of an update and starts or stops the trace window."""
+        self.num_updates += 1
+        if self.trace_start_update is None:
+            return
+
+        if self.num_updates == self.trace_start_update:
+            self._start_trace()
+        elif (
+            self._tracing
+            and self.num_updates == self.trace_start_update + self.trace_num_updates
+        ):
+            self._stop_trace()
+
+    def summarize(self) -> Dict[str, float]:
+        """Returns percentiles in milliseconds of all of the phases recorded
+        since the last call, keyed as ``<phase>_p<percentile>``.
+        """
+        summary = {}
+        for name, durations in self._durations.items():
+            summary.update(self._get_percentiles(name, durations))
+
+        if len(self._cuda_events) > 0:
+            # Reading CUDA timings needs the recorded events to be finished
+            torch.cuda.synchronize()
+        for name, events in self._cuda_events.items():
+            durations = [start.elapsed_time(end) for start, end in events]
+            summary.update(self._get_percentiles(f"{name}_cuda", durations))
+
+        self._durations = defaultdict(list)
+        self._cuda_events = defaultdict(list)
+        return summary
+
+    def _get_percentiles(self, name, durations):
+        values = np.percentile(durations, self.percentiles)
+        return {
+            f"{name}_p{percentile}": float(value)
+            for percentile, value in zip(self.percentiles, values)
+        }
+
+    def _start_trace(self):
+        self._tracing = True
+        self._trace_events = []
+        if self.use_torch_profiler:
+            self._torch_profiler = self._build_torch_profiler()
+            self._torch_profiler.__enter__()
+
+    def _stop_trace(self):
+        self._tracing = False
+        PathManager.mkdirs(self.trace_dir)
+        start = self.trace_start_update
+        end = self.num_updates
+        trace_name = f"rank{get_rank()}_updates_{start}_{end}.json"
+
+        trace_path = os.path.join(self.trace_dir, f"phases_{trace_name}")
+        with PathManager.open(trace_path, "w") as f:
+            json.dump({"traceEvents": self._trace_events}, f)
+        self._trace_events = []
+        logger.info(f"Saved step profiler trace to {trace_path}")
+
+        if self._torch_profiler is not None:
+            self._torch_profiler.__exit__(None, None, None)
+            torch_trace_path = os.path.join(self.trace_dir, f"torch_{trace_name}")
+            self._torch_profiler.export_chrome_trace(torch_trace_path)
+            self._torch_profiler = None
+            logger.info(f"Saved torch profiler trace to {torch_trace_path}")
+
+    def _build_torch_profiler(self):
+        # torch.profiler is only available from torch 1.8
+        if hasattr(torch, "profiler") and hasattr(torch.profiler, "profile"):
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if self.use_cuda:
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            return torch.profiler.profile(activities=activities)
+        return torch.autograd.profiler.profile(use_cuda=self.use_cuda)
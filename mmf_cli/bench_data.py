@@ -0,0 +1,133 @@
+#!/usr/bin/env python3 -u
+# Copyright (c) Facebook, Inc. and its affiliates.
+import json
+import logging
+import typing
+
+from mmf.common.registry import registry
+from mmf.datasets.multi_dataset_loader import MultiDatasetLoader
+from mmf.utils.build import build_config
+from mmf.utils.configuration import Configuration
+from mmf.utils.data_bench import (
+    DataPipelineBenchmark,
+    SyntheticMultiDatasetLoader,
+    format_report,
+)
+from mmf.utils.env import lazy_imports_enabled, set_seed, setup_imports
+from mmf.utils.file_io import PathManager
+from mmf.utils.flags import Flags
+from mmf.utils.logger import setup_logger, setup_very_basic_config
+
+
+setup_very_basic_config()
+
+
+def get_parser():
+    parser = Flags().get_parser()
+    parser.description = (
+        "Benchmark the data pipeline of a config without building the model "
+        + "or the trainer. Takes the same config and opts as mmf_run."
+    )
+    parser.add_argument(
+        "--dataset_type",
+        type=str,
+        default="train",
+        choices=["train", "val", "test"],
+        help="Split to benchmark",
+    )
+    parser.add_argument(
+        "--num_samples",
+        type=int,
+        default=256,
+        help="Samples per dataset loaded in the main process to time samples, "
+        + "processors and collate",
+    )
+    parser.add_argument(
+        "--num_batches",
+        type=int,
+        default=50,
+        help="Batches per dataset loaded with the DataLoader and its workers",
+    )
+    parser.add_argument(
+        "--top_k", type=int, default=10, help="Number of slowest samples to report"
+    )
+    parser.add_argument(
+        "--output", type=str, default=None, help="Also write the report as json"
+    )
+    parser.add_argument(
+        "--synthetic",
+        action="store_true",
+        help="Replace the datasets with random samples so that nothing needs "
+        + "to be downloaded",
+    )
+    parser.add_argument("--synthetic_size", type=int, default=1024)
+    parser.add_argument("--synthetic_seq_length", type=int, default=128)
+    parser.add_argument("--synthetic_num_features", type=int, default=100)
+    parser.add_argument("--synthetic_feature_dim", type=int, default=2048)
+    return parser
+
+
+def build_loader(config, args) -> MultiDatasetLoader:
+    if args.synthetic:
+        loader = SyntheticMultiDatasetLoader(
+            args.dataset_type,
+            num_samples=args.synthetic_size,
+            seq_length=args.synthetic_seq_length,
+            num_features=args.synthetic_num_features,
+            feature_dim=args.synthetic_feature_dim,
+        )
+    else:
+        loader = MultiDatasetLoader(args.dataset_type)
+    loader.load(config)
+    return loader
+
+
+def main(opts: typing.Optional[typing.List[str]] = None) -> typing.Dict:
+    """Builds the datasets and dataloaders of the config passed on the command
+    line (or as ``opts``), benchmarks them and logs the report.
+
+    Args:
+        opts (typing.Optional[typing.List[str]], optional): Command line
+            arguments to use instead of ``sys.argv``, for e.g.
+            ``["--synthetic", "config=...", "datasets=vqa2"]``.
+            Defaults to None.
+
+    Returns:
+        Dict: The benchmark report.
+    """
+    setup_imports(lazy=lazy_imports_enabled())
+    args = get_parser().parse_args(opts)
+
+    configuration = Configuration(args)
+    configuration.args = args
+    configuration.import_user_dir()
+    config = configuration.get_config()
+    seed = config.training.seed
+    config.training.seed = set_seed(seed)
+    registry.register("seed", config.training.seed)
+    config = build_config(configuration)
+
+    setup_logger(
+        color=config.training.colored_logs, disable=config.training.should_not_log
+    )
+    logger = logging.getLogger("mmf_cli.bench_data")
+
+    loader = build_loader(config, args)
+    benchmark = DataPipelineBenchmark(
+        loader,
+        num_samples=args.num_samples,
+        num_batches=args.num_batches,
+        top_k=args.top_k,
+    )
+    report = benchmark.run()
+    logger.info("Data pipeline benchmark\n" + format_report(report))
+
+    if args.output is not None:
+        with PathManager.open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Saved report to {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3 -u
+# Copyright (c) Facebook, Inc. and its affiliates.
+import logging
+import typing
+
+import omegaconf
+import torch
+from mmf.common.registry import registry
+from mmf.datasets.multi_dataset_loader import MultiDatasetLoader
+from mmf.utils.build import build_config, build_model
+from mmf.utils.configuration import Configuration
+from mmf.utils.encoder_cache import EncoderOutputStore, write_encoder_outputs
+from mmf.utils.env import lazy_imports_enabled, set_seed, setup_imports
+from mmf.utils.flags import Flags
+from mmf.utils.logger import setup_logger, setup_very_basic_config
+
+
+setup_very_basic_config()
+
+
+def get_parser():
+    parser = Flags().get_parser()
+    parser.description = (
+        "Write the outputs of the frozen encoder of a model (e.g. the image "
+        + "encoder of MMBT with freeze_modal, or the fixed layers of ViLBERT) "
+        + "for the samples of the datasets of a config, so that training can "
+        + "use them with model_config.<model>.encoder_cache_dir=<output_dir> "
+        + "instead of running the encoder. Takes the same config and opts as "
+        + "mmf_run."
+    )
+    parser.add_argument(
+        "--output_dir", type=str, required=True, help="Folder of the cache"
+    )
+    parser.add_argument(
+        "--dataset_type",
+        type=str,
+        nargs="+",
+        default=["train", "val", "test"],
+        choices=["train", "val", "test"],
+        help="Splits whose samples are cached",
+    )
+    parser.add_argument(
+        "--id_key",
+        type=str,
+        default="id",
+        help="Sample list key of the ids by which the outputs are stored. Use "
+        + "an image id for images shared by several samples.",
+    )
+    parser.add_argument(
+        "--fp16", action="store_true", help="Store the outputs in half precision"
+    )
+    return parser
+
+
+def build_cache_model(config):
+    attributes = config.model_config[config.model]
+    # Easy way to point to config for other model
+    if isinstance(attributes, str):
+        attributes = config.model_config[attributes]
+
+    with omegaconf.open_dict(attributes):
+        attributes.model = config.model
+        # The encoder has to be run to fill the cache
+        attributes.encoder_cache_dir = None
+
+    return build_model(attributes)
+
+
+def main(
+    opts: typing.Optional[typing.List[str]] = None,
+) -> typing.Union[EncoderOutputStore, typing.Dict[str, EncoderOutputStore]]:
+    """Builds the model and the datasets of the config passed on the command
+    line (or as ``opts``) and writes the outputs of the frozen encoder of the
+    model for all of their samples to ``--output_dir``.
+
+    Args:
+        opts (typing.Optional[typing.List[str]], optional): Command line
+            arguments to use instead of ``sys.argv``, for e.g.
+            ``["--output_dir", "...", "config=...", "model=mmbt"]``.
+            Defaults to None.
+
+    Returns:
+        Union[EncoderOutputStore, Dict[str, EncoderOutputStore]]: The written
+            cache, or its stores by name for models with several outputs.
+    """
+    setup_imports(lazy=lazy_imports_enabled())
+    args = get_parser().parse_args(opts)
+
+    configuration = Configuration(args)
+    configuration.args = args
+    configuration.import_user_dir()
+    config = configuration.get_config()
+    seed = config.training.seed
+    config.training.seed = set_seed(seed)
+    registry.register("seed", config.training.seed)
+    config = build_config(configuration)
+
+    setup_logger(
+        color=config.training.colored_logs, disable=config.training.should_not_log
+    )
+    logger = logging.getLogger("mmf_cli.cache_encoder")
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model = build_cache_model(config).to(device)
+    if not hasattr(model, "compute_encoder_outputs"):
+        raise TypeError(f"Model {config.model} doesn't support encoder caching")
+
+    data_loaders = []
+    for dataset_type in args.dataset_type:
+        loader = MultiDatasetLoader(dataset_type)
+        loader.load(config)
+        data_loaders.extend(loader.loaders)
+
+    store = write_encoder_outputs(
+        model,
+        data_loaders,
+        args.output_dir,
+        id_key=args.id_key,
+        fp16=args.fp16,
+        device=device,
+    )
+    # Models with several outputs have a store for each of them
+    stores = store if isinstance(store, dict) else {None: store}
+    num_samples = len(next(iter(stores.values())))
+    logger.info(
+        f"Cached {num_samples} encoder outputs, use them with "
+        + f"model_config.{config.model}.encoder_cache_dir={args.output_dir}"
+    )
+    return store
+
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,7 @@ from mmf.common.registry import registry
 from mmf.utils.build import build_config, build_trainer
 from mmf.utils.configuration import Configuration
 from mmf.utils.distributed import distributed_init, get_rank, infer_init_method
-from mmf.utils.env import set_seed, setup_imports
+from mmf.utils.env import lazy_imports_enabled, set_seed, setup_imports
 from mmf.utils.flags import flags
 from mmf.utils.general import log_device_names
 from mmf.utils.logger import setup_logger, setup_very_basic_config
@@ -21,7 +21,7 @@ setup_very_basic_config()
 
 def main(configuration, init_distributed=False, predict=False):
     # A reload might be needed for imports
-    setup_imports()
+    setup_imports(lazy=lazy_imports_enabled())
     configuration.import_user_dir()
     config = configuration.get_config()
 
@@ -78,8 +78,11 @@ def run(opts: typing.Optional[typing.List[str]] = None, predict: bool = False):
             Defaults to None.
         predict (bool, optional): If predict is passed True, then the program runs in
             prediction mode. Defaults to False.
+
+    Models, datasets and trainers are imported on demand when they are looked up
+    in the registry. Set ``MMF_LAZY_IMPORTS=0`` to import all of them upfront.
     """
-    setup_imports()
+    setup_imports(lazy=lazy_imports_enabled())
 
     if opts is None:
         parser = flags.get_parser()
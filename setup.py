@@ -92,6 +92,7 @@ def fetch_package_data():
     data_files += fetch_files_from_folder("tools")
     data_files += fetch_files_from_folder("configs")
     data_files += glob(os.path.join("utils", "phoc", "cphoc.*"))
+    data_files += [os.path.join("utils", "registry_manifest.json")]
     os.chdir(current_dir)
     return data_files
 
@@ -156,6 +157,8 @@ if __name__ == "__main__":
                 "mmf_run = mmf_cli.run:run",
                 "mmf_predict = mmf_cli.predict:predict",
                 "mmf_convert_hm = mmf_cli.hm_convert:main",
+                "mmf_bench_data = mmf_cli.bench_data:main",
+                "mmf_cache_encoder = mmf_cli.cache_encoder:main",
             ]
         },
     )
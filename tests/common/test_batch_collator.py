@@ -33,3 +33,18 @@ class TestBatchCollator(unittest.TestCase):
         sample_list = test_utils.build_random_sample_list()
         new_sample_list = batch_collator([sample_list])
         self.assertEqual(new_sample_list, sample_list)
+
+    def test_processors(self):
+        def add_one(sample_list):
+            sample_list.a = sample_list.a + 1
+            return sample_list
+
+        batch_collator = BatchCollator("vqa2", "train", processors=[add_one])
+        sample = Sample()
+        sample.a = torch.tensor([1, 2], dtype=torch.int)
+        sample_list = batch_collator([sample, sample])
+        self.assertTrue(
+            test_utils.compare_tensors(
+                sample_list.a, torch.tensor([[2, 3], [2, 3]], dtype=torch.int)
+            )
+        )
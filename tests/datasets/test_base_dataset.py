@@ -1,10 +1,14 @@
 # Copyright (c) Facebook, Inc. and its affiliates.
 import os
 import unittest
+from unittest.mock import patch
 
 from mmf.common.registry import registry
 from mmf.datasets.base_dataset import BaseDataset
+from mmf.datasets.mmf_dataset import MMFDataset
 from mmf.utils.configuration import Configuration
+from mmf.utils.encoder_cache import EncoderOutputLoader
+from omegaconf import OmegaConf
 
 from ..test_utils import dummy_args
 
@@ -49,6 +53,48 @@ class TestBaseDataset(unittest.TestCase):
         for processor in expected_processors:
             self.assertIsNotNone(registry.get("{}_{}".format("vqa2", processor)))
 
+    def test_encoder_output_loader(self):
+        config = OmegaConf.create(
+            {"model": "mmbt", "model_config": {"mmbt": {"encoder_cache_dir": None}}}
+        )
+        previous_config = registry.get("config")
+        registry.register("config", config)
+        try:
+            self.assertEqual(BaseDataset("vqa2", {}, "train").collate_processors, [])
+
+            # Cached encoder outputs are read at collate time
+            config.model_config.mmbt.encoder_cache_dir = "cache"
+            collate_processors = BaseDataset("vqa2", {}, "train").collate_processors
+            self.assertEqual(len(collate_processors), 1)
+            self.assertIsInstance(collate_processors[0], EncoderOutputLoader)
+            self.assertEqual(collate_processors[0].cache_dir, "cache")
+        finally:
+            registry.register("config", previous_config)
+
+    @patch.object(MMFDataset, "build_image_db")
+    @patch.object(MMFDataset, "build_annotation_db")
+    def test_encoder_cache_skips_images(self, build_annotation_db, build_image_db):
+        config = OmegaConf.create(
+            {"model": "mmbt", "model_config": {"mmbt": {"encoder_cache_dir": None}}}
+        )
+        dataset_config = OmegaConf.create({"use_images": True})
+        previous_config = registry.get("config")
+        registry.register("config", config)
+        try:
+            dataset = MMFDataset("hateful_memes", dataset_config, "train")
+            self.assertTrue(dataset._use_images)
+            self.assertEqual(build_image_db.call_count, 1)
+
+            # Images are only inputs of the cached encoder
+            config.model_config.mmbt.encoder_cache_dir = "cache"
+            dataset = MMFDataset("hateful_memes", dataset_config, "train")
+            self.assertTrue(dataset.use_encoder_cache)
+            self.assertFalse(dataset._use_images)
+            self.assertFalse(hasattr(dataset, "image_db"))
+            self.assertEqual(build_image_db.call_count, 1)
+        finally:
+            registry.register("config", previous_config)
+
     def _fix_configuration(self, configuration):
         vqa2_config = configuration.config.dataset_config.vqa2
         processors = vqa2_config.processors
@@ -0,0 +1,141 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import torch
+from mmf.datasets.processors.bert_processors import (
+    BertTokenizer,
+    MaskedTokenProcessor,
+    MultiSentenceBertTokenizer,
+)
+from omegaconf import OmegaConf
+
+
+class TestBertProcessors(unittest.TestCase):
+    def setUp(self):
+        # Local tokenizer so that nothing is downloaded
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.tokenizer_dir = os.path.join(self._tmp_dir.name, "tokenizer")
+        os.makedirs(self.tokenizer_dir)
+        vocab_path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "..", "data", "vocab.txt"
+        )
+        with open(vocab_path) as f:
+            words = f.read().split()
+        with open(os.path.join(self.tokenizer_dir, "vocab.txt"), "w") as f:
+            f.write("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + words))
+        with open(os.path.join(self.tokenizer_dir, "config.json"), "w") as f:
+            json.dump({"model_type": "bert"}, f)
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def _get_config(self, **kwargs):
+        config = {
+            "tokenizer_config": {
+                "type": self.tokenizer_dir,
+                "params": {"do_lower_case": True},
+            },
+            "max_seq_length": 8,
+        }
+        config.update(kwargs)
+        return OmegaConf.create(config)
+
+    def test_bert_tokenizer(self):
+        for use_fast in [False, True]:
+            processor = BertTokenizer(self._get_config(use_fast_tokenizer=use_fast))
+            output = processor(
+                {"text": "A man with red helmet on small moped", "text_b": "dirt road"}
+            )
+            self.assertEqual(output["input_ids"].tolist(), [2, 5, 6, 7, 3, 13, 14, 3])
+            self.assertEqual(output["segment_ids"].tolist(), [0] * 5 + [1] * 3)
+            self.assertEqual(output["lm_label_ids"].tolist(), [-1] * 8)
+            self.assertEqual(
+                output["text"],
+                ["[CLS]", "a", "man", "with", "[SEP]", "dirt", "road", "[SEP]"],
+            )
+
+            items = [{"text": "a man"}, {"text": "dirt road riding motor bike the"}]
+            batch = processor.process_batch(items)
+            for idx, item in enumerate(items):
+                output = processor(item)
+                for key in ["input_ids", "input_mask", "segment_ids"]:
+                    self.assertTrue(batch[key][idx].equal(output[key]))
+                self.assertEqual(batch["tokens"][idx], output["tokens"])
+
+    def test_truncate_seq_pair(self):
+        def truncate(tokens_a, tokens_b, max_length):
+            if tokens_b is None:
+                tokens_b = []
+            else:
+                max_length -= 1
+            while len(tokens_a) + len(tokens_b) > max_length:
+                if len(tokens_a) > len(tokens_b):
+                    tokens_a.pop()
+                else:
+                    tokens_b.pop()
+
+        processor = MaskedTokenProcessor.__new__(MaskedTokenProcessor)
+        for len_a in range(8):
+            for len_b in [None] + list(range(8)):
+                for max_length in range(1, 12):
+                    expected_a = list(range(len_a))
+                    expected_b = None if len_b is None else list(range(len_b))
+                    truncate(expected_a, expected_b, max_length)
+
+                    tokens_a = list(range(len_a))
+                    tokens_b = None if len_b is None else list(range(len_b))
+                    processor._truncate_seq_pair(tokens_a, tokens_b, max_length)
+                    self.assertEqual(tokens_a, expected_a)
+                    self.assertEqual(tokens_b, expected_b)
+
+    def test_masking(self):
+        torch.manual_seed(1234)
+        processor = MaskedTokenProcessor(self._get_config(mask_probability=1.0))
+        output = processor({"text_a": "a man with red helmet on", "is_correct": 1})
+
+        # Special tokens are never masked, all of the others are
+        self.assertEqual(output["input_ids"][[0, 7]].tolist(), [2, 3])
+        self.assertEqual(output["lm_label_ids"][[0, 7]].tolist(), [-1, -1])
+        self.assertEqual(output["lm_label_ids"][1:7].tolist(), [5, 6, 7, 8, 9, 10])
+        self.assertGreater((output["input_ids"] == 4).sum().item(), 0)
+        self.assertEqual(output["is_correct"].item(), 1)
+        self.assertFalse(processor.deterministic)
+
+    def test_multi_sentence_bert_tokenizer(self):
+        processor = MultiSentenceBertTokenizer(self._get_config(max_seq_length=5))
+        output = processor({"text": ["a man", "red"]})
+        self.assertEqual(output["input_ids"].tolist(), [2, 5, 6, 3, 0, 2, 8, 3, 0, 0])
+        self.assertEqual(output["segment_ids"].tolist(), [0] * 5 + [1] * 5)
+        self.assertEqual(output["text"][1], ["[CLS]", "red", "[SEP]"])
+
+    def test_token_id_store(self):
+        processor = BertTokenizer(self._get_config())
+        texts = ["a man with red helmet on small moped", "dirt road"]
+        store = processor.build_token_id_store(texts)
+        self.assertEqual(store.get("dirt road"), [13, 14])
+        # Truncated to max_seq_length - 2
+        self.assertEqual(len(store.get(texts[0])), 6)
+
+        store_dir = os.path.join(self._tmp_dir.name, "token_ids")
+        os.makedirs(store_dir)
+        store.save(
+            os.path.join(store_dir, processor.get_token_id_store_file_name("train"))
+        )
+
+        cached = BertTokenizer(self._get_config(token_id_store=store_dir))
+        with patch.object(cached, "tokenize") as tokenize:
+            output = cached({"text": "dirt road"})
+            tokenize.assert_not_called()
+        self.assertTrue(
+            output["input_ids"].equal(processor({"text": "dirt road"})["input_ids"])
+        )
+
+        # Stores of another max_seq_length are ignored
+        other = BertTokenizer(
+            self._get_config(max_seq_length=16, token_id_store=store_dir)
+        )
+        self.assertIsNone(other._token_id_store)
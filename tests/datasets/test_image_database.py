@@ -0,0 +1,126 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import torch
+from mmf.datasets.databases.image_database import (
+    DecodedImageCache,
+    ImageDatabase,
+    ImagePathIndex,
+)
+from omegaconf import OmegaConf
+from PIL import Image
+
+
+class TestImageDatabase(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.image_dir = os.path.join(self._tmp_dir.name, "images")
+        os.makedirs(os.path.join(self.image_dir, "img"))
+        self.cache_path = os.path.join(self._tmp_dir.name, "cache", "index.json")
+
+        for name in ["img/01", "img/02", "03"]:
+            image = Image.fromarray(np.zeros((4, 4, 3), dtype=np.uint8))
+            image.save(os.path.join(self.image_dir, name + ".png"))
+        # .jpg has priority over .png for the same stem
+        image.save(os.path.join(self.image_dir, "03.jpg"))
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def test_image_path_index(self):
+        index = ImagePathIndex(self.image_dir, self.cache_path).build()
+        self.assertTrue(os.path.isfile(self.cache_path))
+        self.assertEqual(
+            index.get(os.path.join(self.image_dir, "img", "01.jpg")),
+            os.path.join(self.image_dir, "img", "01.png"),
+        )
+        self.assertEqual(
+            index.get(os.path.join(self.image_dir, "03")),
+            os.path.join(self.image_dir, "03.jpg"),
+        )
+        self.assertIsNone(index.get(os.path.join(self.image_dir, "04.png")))
+
+        # Loading from cache doesn't rescan the folder
+        with patch("os.walk") as walk:
+            cached = ImagePathIndex(self.image_dir, self.cache_path).build()
+            walk.assert_not_called()
+        self.assertEqual(cached.index, index.index)
+
+        # New files change the directory mtime which invalidates the cache
+        new_image = os.path.join(self.image_dir, "img", "04.png")
+        Image.fromarray(np.zeros((4, 4, 3), dtype=np.uint8)).save(new_image)
+        img_dir = os.path.join(self.image_dir, "img")
+        os.utime(img_dir, (0, os.stat(img_dir).st_mtime + 1))
+        rebuilt = ImagePathIndex(self.image_dir, self.cache_path).build()
+        self.assertEqual(rebuilt.get(os.path.join(img_dir, "04")), new_image)
+
+    def test_from_path_uses_index(self):
+        config = OmegaConf.create({})
+        db = ImageDatabase(config, self.image_dir)
+
+        with patch.object(
+            ImagePathIndex, "default_cache_path", return_value=self.cache_path
+        ), patch("mmf.utils.file_io.PathManager.isfile") as isfile:
+            images = db.from_path(["img/01.jpg", "img/02", "03"])
+            isfile.assert_not_called()
+        self.assertEqual(len(images["images"]), 3)
+        self.assertEqual(images["images"][0].size, (4, 4))
+
+        config = OmegaConf.create({"use_image_index": False})
+        db = ImageDatabase(config, self.image_dir)
+        images = db.from_path(["img/01.jpg"])
+        self.assertEqual(len(images["images"]), 1)
+        # .jpg and .jpeg are probed before .png
+        self.assertEqual(db._fs_calls, 3)
+
+    def test_decoded_image_cache(self):
+        cache_dir = os.path.join(self._tmp_dir.name, "decoded")
+        config = OmegaConf.create(
+            {
+                "use_image_index": False,
+                "decoded_image_cache": {"cache_dir": cache_dir, "size": 2},
+            }
+        )
+        db = ImageDatabase(config, self.image_dir)
+        cache = db._decoded_image_cache
+        self.assertEqual(len(cache), 3)
+
+        with patch.object(db, "open_image") as open_image:
+            images = db.from_path(["img/01.png", "03"])
+            open_image.assert_not_called()
+        self.assertEqual(images["images"][0].dtype, torch.uint8)
+        self.assertEqual(images["images"][0].size(), (3, 2, 2))
+        self.assertNotIn("image_sizes", images)
+
+        # Cache is loaded instead of rebuilt with same parameters
+        with patch.object(DecodedImageCache, "build") as build:
+            ImageDatabase(config, self.image_dir)
+            build.assert_not_called()
+
+        wide_image = os.path.join(self.image_dir, "wide.png")
+        Image.fromarray(np.zeros((4, 8, 3), dtype=np.uint8)).save(wide_image)
+        config.decoded_image_cache.pad = True
+        config.decoded_image_cache.size = 3
+        db = ImageDatabase(config, self.image_dir)
+        images = db.from_path(["wide", "03"])
+        self.assertEqual(images["images"][0].size(), (3, 3, 6))
+        self.assertEqual(images["images"][1].size(), (3, 3, 6))
+        self.assertEqual(images["image_sizes"][1].tolist(), [3, 3])
+
+        # Images of different sizes can't be batched
+        config.decoded_image_cache.pad = False
+        config.processors = {
+            "image_batch_processor": {
+                "type": "batched_image_transforms",
+                "params": {"transforms": []},
+            }
+        }
+        with self.assertRaises(AssertionError):
+            ImageDatabase(config, self.image_dir)
+        config.decoded_image_cache.size = [3, 3]
+        db = ImageDatabase(config, self.image_dir)
+        self.assertEqual(db.from_path(["wide"])["images"][0].size(), (3, 3, 3))
@@ -0,0 +1,233 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+import unittest
+
+import torch
+from mmf.common.batch_collator import BatchCollator
+from mmf.common.sample import Sample, SampleList
+from mmf.datasets.base_dataset import BaseDataset
+from mmf.datasets.processors.image_processors import (
+    BatchedImageTransforms,
+    NormalizeBGR255,
+    ResizeShortest,
+)
+from omegaconf import OmegaConf
+from torchvision import transforms
+
+
+class TestBatchedImageTransforms(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(1234)
+        self.mean = [0.5, 0.4, 0.3]
+        self.std = [0.2, 0.3, 0.4]
+
+    def _build(self, transform_configs, **params):
+        config = OmegaConf.create({"transforms": transform_configs, **params})
+        return BatchedImageTransforms(config)
+
+    def _sample_list(self, images, sizes=None):
+        samples = []
+        for idx, image in enumerate(images):
+            sample = Sample({"image": image})
+            if sizes is not None:
+                sample.image_size = sizes[idx]
+            samples.append(sample)
+        return SampleList(samples)
+
+    def test_crop_and_normalize_matches_torchvision(self):
+        images = [torch.randint(0, 256, (3, 12, 10), dtype=torch.uint8)] * 2
+        processor = self._build(
+            [
+                {"type": "BatchCenterCrop", "params": {"size": [8, 6]}},
+                {
+                    "type": "BatchNormalize",
+                    "params": {"mean": self.mean, "std": self.std},
+                },
+            ]
+        )
+        self.assertEqual(processor.batch_stage, "collate")
+        sample_list = processor(self._sample_list(images))
+
+        expected = transforms.Compose(
+            [
+                transforms.ToPILImage(),
+                transforms.CenterCrop((8, 6)),
+                transforms.ToTensor(),
+                transforms.Normalize(self.mean, self.std),
+            ]
+        )(images[0])
+        self.assertEqual(sample_list.image.size(), (2, 3, 8, 6))
+        self.assertTrue(torch.allclose(sample_list.image[1], expected, atol=1e-5))
+
+    def test_padded_images(self):
+        image = torch.randint(0, 256, (3, 10, 10), dtype=torch.uint8)
+        padded = torch.zeros(3, 16, 16, dtype=torch.uint8)
+        padded[:, :10, :10] = image
+        sizes = [torch.tensor([10, 10]), torch.tensor([16, 16])]
+        processor = self._build(
+            [{"type": "BatchCenterCrop", "params": {"size": [4, 4]}}]
+        )
+        sample_list = processor(self._sample_list([padded, padded], sizes))
+
+        # Crop is centered on the valid region of each image
+        self.assertTrue(torch.equal(sample_list.image[0], image[:, 3:7, 3:7]))
+        self.assertTrue(torch.equal(sample_list.image[1], padded[:, 6:10, 6:10]))
+        self.assertTrue(torch.equal(sample_list.image_size[0], torch.tensor([4, 4])))
+
+        processor = self._build(
+            [{"type": "BatchRandomCrop", "params": {"size": [4, 4]}}]
+        )
+        sample_list = processor(self._sample_list([padded, padded], sizes))
+        self.assertEqual(sample_list.image.size(), (2, 3, 4, 4))
+
+    def test_crop_larger_than_image(self):
+        image = torch.randint(1, 256, (3, 6, 5), dtype=torch.uint8)
+        padded = torch.zeros(3, 10, 10, dtype=torch.uint8)
+        padded[:, :6, :5] = image
+        full = torch.randint(1, 256, (3, 10, 10), dtype=torch.uint8)
+        sizes = [torch.tensor([6, 5]), torch.tensor([10, 10])]
+
+        for crop in ["BatchCenterCrop", "BatchRandomCrop"]:
+            processor = self._build([{"type": crop, "params": {"size": [8, 8]}}])
+            sample_list = processor(self._sample_list([padded, full], sizes))
+
+            # The valid region isn't padded with the last row and column
+            expected = torch.zeros(3, 8, 8, dtype=torch.uint8)
+            expected[:, :6, :5] = image
+            self.assertTrue(torch.equal(sample_list.image[0], expected))
+            self.assertEqual(sample_list.image_size.tolist(), [[6, 5], [8, 8]])
+
+    def test_resize_shortest(self):
+        processor = self._build(
+            [
+                {
+                    "type": "BatchResizeShortest",
+                    "params": {"min_size": 8, "max_size": 20},
+                }
+            ]
+        )
+        resize_shortest = ResizeShortest(min_size=8, max_size=20)
+        image = torch.rand(3, 16, 16)
+        sizes = [torch.tensor([16, 6]), torch.tensor([5, 16])]
+        sample_list = processor(self._sample_list([image, image], sizes))
+
+        for idx, (h, w) in enumerate([(16, 6), (5, 16)]):
+            expected = resize_shortest.get_size((w, h))
+            self.assertEqual(tuple(sample_list.image_size[idx].tolist()), expected)
+        # Padded to max_size, which bounds both sides of the outputs
+        self.assertEqual(sample_list.image.size(), (2, 3, 20, 20))
+        self.assertEqual(sample_list.image[0, :, :, 8:].abs().sum().item(), 0)
+
+        processor = self._build(
+            [{"type": "BatchResizeShortest", "params": {"min_size": 8}}]
+        )
+        sample_list = processor(self._sample_list([image, image], sizes))
+        max_size = sample_list.image_size.max(dim=0)[0].tolist()
+        self.assertEqual(list(sample_list.image.size()[2:]), max_size)
+
+    def test_resize_padded_images(self):
+        image = torch.rand(3, 6, 5)
+        padded = torch.zeros(3, 10, 10)
+        padded[:, :6, :5] = image
+        full = torch.rand(3, 10, 10)
+        processor = self._build([{"type": "BatchResize", "params": {"size": [8, 4]}}])
+        sizes = [torch.tensor([6, 5]), torch.tensor([10, 10])]
+        sample_list = processor(self._sample_list([padded, full], sizes))
+
+        for idx, expected in enumerate([image, full]):
+            expected = torch.nn.functional.interpolate(
+                expected.unsqueeze(0),
+                size=(8, 4),
+                mode="bilinear",
+                align_corners=False,
+            )[0]
+            self.assertTrue(torch.allclose(sample_list.image[idx], expected, atol=1e-5))
+
+    def test_flip_and_color_jitter(self):
+        image = torch.rand(3, 4, 6)
+        padded = torch.zeros(3, 4, 8)
+        padded[:, :, :6] = image
+        sizes = [torch.tensor([4, 6]), torch.tensor([4, 8])]
+        processor = self._build(
+            [{"type": "BatchRandomHorizontalFlip", "params": {"p": 1.0}}]
+        )
+        sample_list = processor(self._sample_list([padded, padded], sizes))
+        self.assertTrue(torch.equal(sample_list.image[0, :, :, :6], image.flip(2)))
+        self.assertTrue(torch.equal(sample_list.image[0, :, :, 6:], padded[:, :, 6:]))
+        self.assertTrue(torch.equal(sample_list.image[1], padded.flip(2)))
+
+        processor = self._build(
+            [
+                {
+                    "type": "BatchColorJitter",
+                    "params": {"brightness": 0.4, "contrast": 0.4, "saturation": 0.4},
+                }
+            ]
+        )
+        images = torch.randint(0, 256, (3, 4, 6), dtype=torch.uint8)
+        sample_list = processor(self._sample_list([images, images]))
+        self.assertEqual(sample_list.image.dtype, torch.uint8)
+        self.assertEqual(sample_list.image.size(), (2, 3, 4, 6))
+
+    def test_padding_stays_zero(self):
+        image = torch.rand(3, 4, 6)
+        padded = torch.zeros(3, 4, 8)
+        padded[:, :, :6] = image
+        sizes = [torch.tensor([4, 6]), torch.tensor([4, 8])]
+        normalize = {"mean": self.mean, "std": self.std}
+        for transform in [
+            {"type": "BatchColorJitter", "params": {"contrast": 0.4}},
+            {"type": "BatchColorJitter", "params": {"saturation": 0.4}},
+            {"type": "BatchNormalize", "params": normalize},
+            {
+                "type": "BatchNormalizeBGR255",
+                "params": {"to_bgr255": True, **normalize},
+            },
+        ]:
+            processor = self._build([transform])
+            sample_list = processor(self._sample_list([padded, padded], sizes))
+            self.assertEqual(sample_list.image[0, :, :, 6:].abs().sum().item(), 0)
+
+    def test_collate_mixed_size_images(self):
+        images = [
+            torch.randint(1, 256, (3, 6, 10), dtype=torch.uint8),
+            torch.randint(1, 256, (3, 8, 4), dtype=torch.uint8),
+        ]
+        for stage in BatchedImageTransforms.STAGES:
+            processor = self._build(
+                [{"type": "BatchCenterCrop", "params": {"size": [4, 4]}}],
+                stage=stage,
+            )
+            collator = BatchCollator(
+                "test", "train", sample_processors=[processor.collate_samples]
+            )
+            sample_list = collator([Sample({"image": image}) for image in images])
+
+            self.assertEqual(sample_list.image.size(), (2, 3, 8, 10))
+            self.assertEqual(sample_list.image_size.tolist(), [[6, 10], [8, 4]])
+            self.assertTrue(torch.equal(sample_list.image[0, :, :6], images[0]))
+            self.assertEqual(sample_list.image[0, :, 6:].sum().item(), 0)
+            self.assertTrue(torch.equal(sample_list.image[1, :, :, :4], images[1]))
+            self.assertEqual(sample_list.image[1, :, :, 4:].sum().item(), 0)
+
+            sample_list = processor(sample_list)
+            self.assertTrue(torch.equal(sample_list.image[0], images[0][:, 1:5, 3:7]))
+            self.assertTrue(torch.equal(sample_list.image[1], images[1][:, 2:6, :]))
+
+    def test_normalize_bgr255(self):
+        params = {"mean": self.mean, "std": self.std, "to_bgr255": True}
+        processor = self._build([{"type": "BatchNormalizeBGR255", "params": params}])
+        image = torch.rand(3, 4, 4)
+        sample_list = processor(self._sample_list([image]))
+        expected = NormalizeBGR255(pad_size=0, **params)(image)
+        self.assertTrue(torch.allclose(sample_list.image[0], expected, atol=1e-4))
+
+    def test_device_stage(self):
+        processor = self._build(
+            [{"type": "BatchResize", "params": {"size": [2, 3]}}], stage="device"
+        )
+        dataset = BaseDataset("test", {})
+        dataset.device_processors.append(processor)
+        sample_list = dataset.prepare_batch(
+            self._sample_list([torch.rand(3, 4, 6), torch.rand(3, 4, 6)])
+        )
+        self.assertEqual(sample_list.image.size(), (2, 3, 2, 3))
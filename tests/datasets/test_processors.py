@@ -1,15 +1,24 @@
 # Copyright (c) Facebook, Inc. and its affiliates.
+import json
 import os
 import tempfile
 import unittest
+from unittest.mock import patch
 
+import numpy as np
 import torch
+from mmf.common.sample import SampleList
 from mmf.datasets.processors.processors import (
+    CaptionBatchProcessor,
     CaptionProcessor,
     EvalAIAnswerProcessor,
+    M4CAnswerProcessor,
     MultiClassFromFile,
     MultiHotAnswerFromVocabProcessor,
+    Processor,
     TransformerBboxProcessor,
+    VQAAnswerProcessor,
+    processor_stats,
 )
 from mmf.utils.configuration import load_yaml
 from omegaconf import OmegaConf
@@ -46,6 +55,30 @@ class TestDatasetProcessors(unittest.TestCase):
         # Test caption is correct
         self.assertEqual(caption["caption"], "a man with a red helmet")
 
+    def test_caption_batch_processor(self):
+        processor = Processor(OmegaConf.create({"type": "caption_batch", "params": {}}))
+        self.assertEqual(processor.batch_stage, "collate")
+
+        batch = SampleList(
+            {
+                "caption_len": torch.tensor([3, 5, 2]),
+                "text": torch.arange(3).unsqueeze(1).expand(3, 4),
+                "image_id": ["a", "b", "c"],
+                "image_info_0": {"max_features": torch.tensor([10, 20, 30])},
+            }
+        )
+        batch = processor(batch)
+        self.assertTrue(compare_tensors(batch.caption_len, torch.tensor([5, 3, 2])))
+        self.assertEqual(batch.text[:, 0].tolist(), [1, 0, 2])
+        self.assertEqual(batch.image_id, ["b", "a", "c"])
+        self.assertEqual(batch.image_info_0.max_features.tolist(), [20, 10, 30])
+        self.assertEqual(batch.decode_lengths, [4, 2, 1])
+        self.assertEqual(batch.decode_batch_sizes, [3, 2, 1, 1])
+
+        # Batches without captions, e.g. of the test set, are left as is
+        batch = SampleList({"image_id": torch.tensor([2, 1])})
+        self.assertEqual(CaptionBatchProcessor()(batch).image_id.tolist(), [2, 1])
+
     def test_multi_hot_answer_from_vocab_processor(self):
         config = self._get_config("../../../mmf/configs/datasets/clevr/defaults.yaml")
         clevr_config = config.dataset_config.clevr
@@ -105,6 +138,150 @@ class TestDatasetProcessors(unittest.TestCase):
         expected_answers_scores[2] = 1.0
         self.assertTrue(compare_tensors(answers_scores, expected_answers_scores))
 
+    def test_vqa_answer_processor(self):
+        def loop_scores(answers_indices, vocab_size, unk_index):
+            # Reference implementation of the VQA accuracy
+            scores = torch.zeros(vocab_size, dtype=torch.float)
+            gt_answers = list(enumerate(answers_indices.tolist()))
+            for answer in set(answers_indices.tolist()):
+                accs = []
+                for gt_answer in gt_answers:
+                    matching = [
+                        item
+                        for item in gt_answers
+                        if item != gt_answer and item[1] == answer
+                    ]
+                    accs.append(min(1, len(matching) / 3))
+                if answer != unk_index:
+                    scores[answer] = sum(accs) / len(accs)
+            return scores
+
+        vocab_path = os.path.join(
+            os.path.abspath(__file__), "..", "..", "data", "vocab.txt"
+        )
+        config = OmegaConf.create(
+            {
+                "vocab_file": os.path.abspath(vocab_path),
+                "num_answers": 10,
+                "preprocessor": {"type": "simple_word", "params": {}},
+            }
+        )
+        processor = VQAAnswerProcessor(config)
+        vocab_size = processor.get_vocab_size()
+        unk_index = processor.answer_vocab.UNK_INDEX
+
+        generator = torch.Generator().manual_seed(0)
+        for _ in range(50):
+            high = int(torch.randint(1, vocab_size, (1,), generator=generator))
+            answers_indices = torch.randint(high, (10,), generator=generator)
+            self.assertTrue(
+                torch.allclose(
+                    processor.compute_answers_scores(answers_indices),
+                    loop_scores(answers_indices, vocab_size, unk_index),
+                )
+            )
+
+        item = {"answers": ["man", "man", "man", "helmet", "red"] + ["foo"] * 5}
+        dense = processor(item)
+        self.assertNotIn("answers_scores_indices", dense)
+
+        config.sparse_targets = True
+        sparse_processor = VQAAnswerProcessor(config)
+        sparse = sparse_processor(item)
+        self.assertNotIn("answers_scores", sparse)
+        self.assertEqual(sparse["answers_scores_indices"].size(), (10,))
+        batch_indices = sparse["answers_scores_indices"].unsqueeze(0).repeat(2, 1)
+        batch_values = sparse["answers_scores_values"].unsqueeze(0).repeat(2, 1)
+        targets = sparse_processor.densify_targets(batch_indices, batch_values)
+        self.assertEqual(targets.size(), (2, vocab_size))
+        self.assertTrue(targets[1].equal(dense["answers_scores"]))
+
+        # Precomputed targets are used instead of processing the answers
+        item["answer_targets"] = processor.build_answer_targets(item)
+        with patch.object(sparse_processor, "preprocessor") as preprocessor:
+            output = sparse_processor(item)
+            preprocessor.assert_not_called()
+        self.assertTrue(
+            output["answers_scores_values"].equal(sparse["answers_scores_values"])
+        )
+
+        # They are ignored if they were built with another vocabulary
+        item["answer_targets"]["vocab"] = "other"
+        with patch.object(
+            sparse_processor, "preprocessor", side_effect=lambda x: x
+        ) as preprocessor:
+            sparse_processor(item)
+            self.assertEqual(preprocessor.call_count, 10)
+
+    def test_m4c_answer_processor(self):
+        with tempfile.NamedTemporaryFile(mode="w", suffix=".txt") as f:
+            f.write("\n".join(["<pad>", "<s>", "</s>", "<unk>", "red", "sign"]))
+            f.flush()
+            config = OmegaConf.create(
+                {
+                    "vocab_file": f.name,
+                    "preprocessor": {"type": "simple_word", "params": {}},
+                    "num_answers": 10,
+                    "max_length": 4,
+                    "max_copy_steps": 3,
+                }
+            )
+            processor = M4CAnswerProcessor(config)
+
+        answers = ["red sign"] * 3 + ["stop"] * 2 + ["red"] + ["foo"] * 4
+        scores = processor.compute_answer_scores(answers)
+        self.assertAlmostEqual(scores["red sign"], 0.9)
+        self.assertAlmostEqual(scores["stop"], 0.6)
+        self.assertAlmostEqual(scores["red"], 0.3)
+
+        item = {"answers": answers, "tokens": ["stop", "red", "<pad>", "<pad>"]}
+        table = processor.build_answer_table(item)
+        # "red" matches the vocab (4) and the second OCR token (6 + 1)
+        self.assertEqual(table["first_step_inds"].tolist(), [4, 7, 6])
+        np.testing.assert_allclose(table["first_step_scores"], [0.9, 0.9, 0.6])
+        self.assertEqual(len(table["seq_offsets"]) - 1, 3 * 2 + 2 + 2)
+
+        np.random.seed(0)
+        output = processor(item)
+        np.random.seed(0)
+        item["answer_table"] = table
+        with patch.object(processor, "build_answer_table") as build_answer_table:
+            cached_output = processor(item)
+            build_answer_table.assert_not_called()
+        for key in ["answers_scores", "train_prev_inds", "train_loss_mask"]:
+            self.assertTrue(output[key].equal(cached_output[key]))
+        self.assertEqual(output["sampled_idx_seq"], cached_output["sampled_idx_seq"])
+
+        # Tables of annotations loaded from .jsonl or .json files hold lists
+        np.random.seed(0)
+        table_json = json.dumps(table, default=lambda array: array.tolist())
+        json_item = dict(item, answer_table=json.loads(table_json))
+        json_output = processor(json_item)
+        self.assertTrue(output["answers_scores"].equal(json_output["answers_scores"]))
+        self.assertEqual(output["sampled_idx_seq"], json_output["sampled_idx_seq"])
+
+        idx_seq = output["sampled_idx_seq"]
+        self.assertEqual(output["train_prev_inds"][: len(idx_seq) + 1].tolist()[0], 1)
+        self.assertEqual(output["answers_scores"][1:].sum().item(), len(idx_seq))
+
+        processor.sparse_targets = True
+        np.random.seed(0)
+        sparse_output = processor(item)
+        self.assertNotIn("answers_scores", sparse_output)
+        indices, values = processor.pad_sparse_targets(
+            [sparse_output["answers_scores_indices"], np.zeros(1, np.int64)],
+            [sparse_output["answers_scores_values"], np.zeros(1, np.float32)],
+        )
+        self.assertEqual(indices.size(0), 2)
+        scores = torch.zeros(2, 3 * processor.get_vocab_size())
+        scores.scatter_add_(1, indices, values)
+        self.assertTrue(scores[0].view(3, -1).equal(output["answers_scores"]))
+        self.assertEqual(scores[1].sum().item(), 0)
+
+        # Tables of other OCR tokens are rebuilt
+        item["tokens"] = ["red", "stop"]
+        self.assertFalse(processor._is_valid_table(table, item["tokens"]))
+
     def test_evalai_answer_processor(self):
         evalai_answer_processor = EvalAIAnswerProcessor()
 
@@ -173,3 +350,64 @@ class TestDatasetProcessors(unittest.TestCase):
 
         self.assertRaises(AssertionError, processor, {"label": "UNK"})
         os.unlink(f.name)
+
+    def test_processor_cache(self):
+        config = OmegaConf.create(
+            {"type": "simple_word", "params": {}, "cache_size": 2}
+        )
+        processor = Processor(config)
+        with patch.object(
+            processor.processor, "tokenizer", side_effect=lambda text: [text]
+        ) as tokenizer:
+            output = processor({"text": "a"})
+            output["text"].append("b")
+            self.assertEqual(processor({"text": "a"}), {"text": ["a"]})
+            self.assertEqual(tokenizer.call_count, 1)
+
+            processor({"text": "b"})
+            processor({"text": "c"})
+            # "a" is evicted as the least recently used input
+            processor({"text": "a"})
+            self.assertEqual(tokenizer.call_count, 4)
+
+        # Processors which aren't deterministic are never cached
+        config = OmegaConf.create(
+            {"type": "copy", "params": {"max_length": 2}, "cache_size": 2}
+        )
+        self.assertIsNone(Processor(config)._cache)
+
+    def test_processor_stats(self):
+        processor = Processor(OmegaConf.create({"type": "simple_word", "params": {}}))
+        processor.name = "vqa2_text_processor"
+        processor_stats.enabled = True
+        processor_stats.reset()
+        try:
+            processor({"text": "a b"})
+            processor({"text": "c"})
+
+            # Stats sent by a dataloader worker along with a batch
+            batch = SampleList(
+                {
+                    "text": torch.zeros(2),
+                    processor_stats.FIELD: [
+                        ("vqa2_text_processor", "worker0", 3, 6.0, 1, [1, 2, 3])
+                    ],
+                }
+            )
+            processor_stats.collect(batch)
+            self.assertNotIn(processor_stats.FIELD, batch)
+
+            stats = processor_stats.get_stats()["vqa2_text_processor"]
+            self.assertEqual(stats["main"]["calls"], 2)
+            self.assertEqual(stats["worker0"]["cache_hits"], 1)
+
+            summary = processor_stats.summarize()
+            self.assertEqual(summary["vqa2_text_processor/calls"], 5)
+            self.assertIn("vqa2_text_processor/p90_ms", summary)
+
+            # Nothing is attached in the main process
+            batch = SampleList({"text": torch.zeros(2)})
+            self.assertNotIn(processor_stats.FIELD, processor_stats.attach(batch))
+        finally:
+            processor_stats.enabled = False
+            processor_stats.reset()
@@ -0,0 +1,227 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+import torch
+from mmf.common.registry import registry
+from mmf.common.sample import Sample, SampleList
+from mmf.datasets.processors.processors import CaptionBatchProcessor
+from mmf.models.butd import BUTD
+from mmf.models.lxmert import LXMERT, LXMERTBase
+from mmf.models.vilbert import ViLBERT, ViLBERTBase
+from mmf.utils.configuration import load_yaml
+from mmf.utils.general import get_mmf_root
+from mmf.utils.vocab import BaseVocab
+from omegaconf import OmegaConf
+
+from ..test_utils import HostSyncChecker
+
+
+class TestHostSyncChecker(unittest.TestCase):
+    def test_checker(self):
+        x = torch.arange(4)
+        with HostSyncChecker() as checker:
+            x.sum().item()
+            np.array(x)
+            torch.tensor(np.ones(3))
+            # Host to device copies of tensors and scalars aren't recorded
+            torch.tensor(1.0)
+            torch.as_tensor(x)
+            x + 1
+        self.assertEqual(len(checker.syncs), 3)
+        self.assertTrue(checker.syncs[0].startswith("Tensor.item"))
+        self.assertTrue(checker.syncs[1].startswith("Tensor.__array__"))
+        self.assertTrue(checker.syncs[2].startswith("torch.tensor"))
+
+        # Restored on exit
+        self.assertEqual(x.sum().item(), 6)
+        with HostSyncChecker() as checker:
+            pass
+        self.assertEqual(checker.syncs, [])
+
+
+class TestModelHostSyncs(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(1234)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        registry.register(
+            "config",
+            OmegaConf.create(
+                {
+                    "datasets": "coco",
+                    "env": {"cache_dir": self.tmpdir.name},
+                    "training": {"device": "cpu"},
+                }
+            ),
+        )
+        vocab = BaseVocab(
+            vocab_file=os.path.join(os.path.dirname(__file__), "../data/vocab.txt"),
+            embedding_dim=6,
+        )
+        vocab.vectors.normal_()
+        registry.register(
+            "coco_text_processor", SimpleNamespace(vocab=vocab, max_length=6)
+        )
+
+    def tearDown(self):
+        registry.unregister("config")
+        registry.unregister("coco_text_processor")
+        self.tmpdir.cleanup()
+
+    def load_model_config(self, name, **kwargs):
+        config = load_yaml(
+            os.path.join(get_mmf_root(), f"configs/models/{name}/defaults.yaml")
+        ).model_config[name]
+        # Small randomly initialized model
+        config.bert_model_name = None
+        config.training_head_type = "classification"
+        config.num_labels = 3
+        config.vocab_size = 10
+        config.hidden_size = 8
+        config.num_hidden_layers = 2
+        config.num_attention_heads = 2
+        config.intermediate_size = 8
+        config.merge_with(kwargs)
+        return config
+
+    def get_caption_sample_list(self):
+        samples = []
+        for caption_len in [3, 5, 2]:
+            sample = Sample()
+            sample.caption_len = torch.tensor(caption_len, dtype=torch.int)
+            sample.text = torch.randint(10, (6,))
+            sample.answers = torch.randint(10, (2, 6))
+            sample.image_feature_0 = torch.randn(4, 8)
+            samples.append(sample)
+        return SampleList(samples)
+
+    def get_vqa_sample_list(self):
+        sample_list = SampleList(
+            {
+                "input_ids": torch.randint(10, (2, 6)),
+                "input_mask": torch.ones(2, 6, dtype=torch.long),
+                "segment_ids": torch.zeros(2, 6, dtype=torch.long),
+                "image_feature_0": torch.randn(2, 4, 8),
+                "image_info_0": {
+                    "max_features": torch.tensor([4, 3]),
+                    "bbox": torch.rand(2, 4, 5),
+                    "cls_prob": torch.rand(2, 4, 7),
+                },
+                "lm_label_ids": torch.full((2, 6), -1, dtype=torch.long),
+                "targets": torch.rand(2, 3),
+            }
+        )
+        sample_list.dataset_name = "vqa2"
+        sample_list.dataset_type = "val"
+        return sample_list
+
+    def test_butd(self):
+        config = OmegaConf.create(
+            {
+                "model_data_dir": "",
+                "embedding_dim": 6,
+                "image_feature_dim": 8,
+                "image_feature_encodings": [{"type": "identity", "params": {}}],
+                "image_feature_embeddings": [
+                    {
+                        "modal_combine": {
+                            "type": "top_down_attention_lstm",
+                            "params": {
+                                "dropout": 0.5,
+                                "hidden_dim": 4,
+                                "attention_dim": 4,
+                            },
+                        },
+                        "normalization": "softmax",
+                        "transform": {"type": "linear", "params": {"out_dim": 1}},
+                    }
+                ],
+                "classifier": {
+                    "type": "language_decoder",
+                    "params": {
+                        "dropout": 0.5,
+                        "hidden_dim": 4,
+                        "feature_dim": 8,
+                        "fc_bias_init": 0,
+                    },
+                },
+                "inference": {"type": "greedy"},
+            }
+        )
+        model = BUTD(config)
+        model.build()
+        model.eval()
+
+        sample_list = CaptionBatchProcessor()(self.get_caption_sample_list())
+        with HostSyncChecker() as checker:
+            output = model(sample_list)
+        self.assertEqual(checker.syncs, [])
+        self.assertEqual(output["scores"].size(), (3, 6, 22))
+        self.assertEqual(sample_list.caption_len.tolist(), [5, 3, 2])
+
+        # Without the processor of the dataset, the batch is sorted in forward
+        with HostSyncChecker() as checker:
+            model(self.get_caption_sample_list())
+        self.assertGreater(len(checker.syncs), 0)
+
+    def test_vilbert(self):
+        config = self.load_model_config(
+            "vilbert",
+            visual_embedding_dim=8,
+            v_feature_size=8,
+            v_target_size=7,
+            v_hidden_size=8,
+            v_num_hidden_layers=2,
+            v_num_attention_heads=2,
+            v_intermediate_size=8,
+            bi_hidden_size=8,
+            bi_num_attention_heads=2,
+            bi_intermediate_size=8,
+            v_biattention_id=[1, 2],
+            t_biattention_id=[1, 2],
+        )
+        model = ViLBERT(config)
+        # No pretrained weights to load
+        with patch.object(
+            ViLBERTBase,
+            "from_pretrained",
+            side_effect=lambda name, config, **kwargs: ViLBERTBase(config),
+        ):
+            model.build()
+        model.eval()
+
+        sample_list = self.get_vqa_sample_list()
+        with HostSyncChecker() as checker:
+            params = model.get_model_inputs(sample_list)
+            output = model(sample_list)
+        self.assertEqual(checker.syncs, [])
+        self.assertEqual(params["image_target"].size(), (2, 4, 7))
+        self.assertEqual(params["image_attention_mask"][1].tolist(), [1, 1, 1, 0])
+        self.assertEqual(output["scores"].size(), (2, 3))
+
+    def test_lxmert(self):
+        config = self.load_model_config(
+            "lxmert",
+            gqa_labels=3,
+            l_layers=1,
+            x_layers=1,
+            r_layers=1,
+            visual_feat_dim=8,
+        )
+        model = LXMERT(config)
+        with patch.object(
+            LXMERTBase,
+            "from_pretrained",
+            side_effect=lambda name, config, **kwargs: LXMERTBase(config),
+        ):
+            model.build()
+        model.eval()
+
+        with HostSyncChecker() as checker:
+            output = model(self.get_vqa_sample_list())
+        self.assertEqual(checker.syncs, [])
+        self.assertEqual(output["scores"].size(), (2, 3))
@@ -3,9 +3,22 @@
 import unittest
 
 import tests.test_utils as test_utils
+import torch
+from mmf.common.sample import SampleList
+from mmf.datasets.processors.processors import PackingPlanProcessor
+from mmf.models.transformers.backends.huggingface import HuggingfaceBackend
+from mmf.models.transformers.packing import (
+    assign_rows,
+    pack,
+    pack_sequences,
+    plan_packing,
+    unpack,
+)
 from mmf.utils.build import build_model
 from mmf.utils.configuration import Configuration
 from mmf.utils.env import setup_imports
+from omegaconf import OmegaConf
+from transformers.modeling_bert import BertConfig, BertModel
 
 
 BERT_VOCAB_SIZE = 30255
@@ -57,3 +70,130 @@ class TestMMFTransformerTorchscript(unittest.TestCase):
                 model, vocab_size=XLM_ROBERTA_VOCAB_SIZE
             )
         )
+
+
+class SmallBertBackend(HuggingfaceBackend):
+    def build_transformer_config(self):
+        self.transformer_config = BertConfig(
+            vocab_size=50,
+            hidden_size=16,
+            num_hidden_layers=2,
+            num_attention_heads=2,
+            intermediate_size=32,
+            max_position_embeddings=20,
+        )
+
+    def build_transformer_base(self):
+        self.transformer = BertModel(self.transformer_config)
+
+
+class TestPackedSequences(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(1234)
+        # Text of up to 6 tokens and 4 image regions, of which some are padding
+        self.masks = [
+            torch.tensor([[1, 1, 1, 0, 0, 0], [1, 1, 1, 1, 1, 1], [1, 1, 0, 0, 0, 0]]),
+            torch.tensor([[1, 1, 1, 1], [1, 1, 0, 0], [1, 1, 1, 0]]),
+        ]
+
+    def test_assign_rows(self):
+        rows, offsets = assign_rows([3, 8, 2, 5], 10)
+        self.assertEqual(rows, [1, 0, 0, 1])
+        self.assertEqual(offsets, [5, 0, 8, 0])
+        with self.assertRaises(ValueError):
+            assign_rows([3, 11], 10)
+
+    def test_pack_unpack(self):
+        mask = torch.cat(self.masks, dim=1)
+        packed = pack_sequences(mask, row_length=12)
+        # Samples of 7, 8 and 5 tokens
+        self.assertEqual(packed.num_rows, 2)
+        self.assertEqual(packed.attention_mask.size(), (2, 1, 12, 12))
+
+        sequences = torch.randn(3, 10, 4)
+        rows = pack(sequences, packed)
+        self.assertEqual(rows.size(), (2, 12, 4))
+        # Second sample alone in the first row, the first one and the last one
+        # share the second row
+        self.assertTrue(torch.equal(rows[0, :6], sequences[1, :6]))
+        self.assertTrue(torch.equal(rows[1, :3], sequences[0, :3]))
+        self.assertTrue(torch.equal(rows[1, 7:9], sequences[2, :2]))
+        attention = packed.attention_mask[1, 0] == 0
+        self.assertTrue(attention[:7, :7].all())
+        self.assertFalse(attention[:7, 7:].any())
+        self.assertTrue(attention[7:12, 7:12].all())
+
+        self.assertTrue(
+            torch.equal(unpack(rows, packed), sequences * mask.unsqueeze(-1))
+        )
+
+    def test_packing_plan_processor(self):
+        sample_list = SampleList()
+        sample_list.input_mask = self.masks[0]
+        sample_list.image_mask = self.masks[1]
+        processor = PackingPlanProcessor(
+            OmegaConf.create({"row_length": 12, "masks": ["input_mask", "image_mask"]})
+        )
+        sample_list = processor(sample_list).to("cpu")
+
+        mask = torch.cat(self.masks, dim=1)
+        expected = pack_sequences(mask, row_length=12)
+        with test_utils.HostSyncChecker() as checker:
+            packed = pack_sequences(mask, 12, sample_list.packing_plan)
+        self.assertEqual(checker.syncs, [])
+        self.assertEqual(packed.num_rows, expected.num_rows)
+        self.assertTrue(torch.equal(packed.token_index, expected.token_index))
+        self.assertTrue(torch.equal(packed.slot_index, expected.slot_index))
+        self.assertTrue(torch.equal(packed.attention_mask, expected.attention_mask))
+
+        # Image regions without padding, rows of the padded length by default
+        processor = PackingPlanProcessor(OmegaConf.create({"masks": ["input_mask", 4]}))
+        plan = processor(sample_list).packing_plan
+        self.assertEqual(plan.padded_size, (3, 10))
+        self.assertEqual(plan.row_length, 10)
+        self.assertEqual(plan.token_index.size(0), 11 + 12)
+        with self.assertRaises(ValueError):
+            pack_sequences(mask, 12, plan)
+
+    def test_backend_forward_packed(self):
+        config = OmegaConf.create(
+            {
+                "token_noise_mean": 0.0,
+                "token_noise_std": 0.01,
+                "modalities": [
+                    {"type": "text", "key": "text", "segment_id": 0},
+                    {
+                        "type": "image",
+                        "key": "image",
+                        "embedding_dim": 8,
+                        "segment_id": 1,
+                    },
+                ],
+            }
+        )
+        backend = SmallBertBackend(config).eval()
+        tokens_ids = {
+            "text": torch.randint(1, 50, (3, 6)) * self.masks[0],
+            "image": torch.randn(3, 4, 8),
+        }
+        position_ids = {
+            "text": torch.arange(6).expand(3, 6),
+            "image": torch.arange(4).expand(3, 4),
+        }
+        segment_ids = {
+            "text": torch.zeros(3, 6, dtype=torch.long),
+            "image": torch.ones(3, 4, dtype=torch.long),
+        }
+
+        with torch.no_grad():
+            expected, _ = backend(tokens_ids, position_ids, segment_ids, self.masks)
+            output = backend.forward_packed(
+                tokens_ids, position_ids, segment_ids, self.masks, row_length=12
+            )
+            plan = plan_packing(torch.cat(self.masks, dim=1), row_length=12)
+            planned_output = backend.forward_packed(
+                tokens_ids, position_ids, segment_ids, self.masks, 12, plan
+            )
+        mask = torch.cat(self.masks, dim=1).unsqueeze(-1)
+        self.assertTrue(torch.allclose(output, expected * mask, atol=1e-5))
+        self.assertTrue(torch.equal(planned_output, output))
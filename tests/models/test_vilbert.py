@@ -1,12 +1,17 @@
 # Copyright (c) Facebook, Inc. and its affiliates.
 
+import os
+import tempfile
 import unittest
 
 import tests.test_utils as test_utils
 import torch
+from mmf.models.vilbert import ViLBERTBase
 from mmf.utils.build import build_model
 from mmf.utils.configuration import Configuration
+from mmf.utils.encoder_cache import EncoderOutputStore
 from mmf.utils.env import setup_imports
+from transformers.modeling_bert import BertConfig
 
 
 BERT_VOCAB_SIZE = 30255
@@ -123,3 +128,79 @@ class TestViLBertTorchscript(unittest.TestCase):
                 image_attention_mask=image_attention_mask,
             )
         self.assertTrue(torch.equal(model_output["scores"], script_output["scores"]))
+
+
+class TestViLBERTFrozenLayerCache(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(1234)
+        config = BertConfig(
+            vocab_size=100,
+            hidden_size=16,
+            num_hidden_layers=4,
+            num_attention_heads=4,
+            intermediate_size=32,
+            v_feature_size=10,
+            v_hidden_size=12,
+            v_num_hidden_layers=3,
+            v_num_attention_heads=3,
+            v_intermediate_size=24,
+            v_hidden_act="gelu",
+            v_attention_probs_dropout_prob=0.1,
+            v_hidden_dropout_prob=0.1,
+            bi_hidden_size=16,
+            bi_num_attention_heads=2,
+            bi_intermediate_size=24,
+            v_biattention_id=[1, 2],
+            t_biattention_id=[2, 3],
+            fast_mode=False,
+            with_coattention=True,
+            dynamic_attention=False,
+            in_batch_pairs=False,
+            fixed_v_layer=1,
+            fixed_t_layer=2,
+            visualization=False,
+            task_specific_tokens=False,
+        )
+        self.model = ViLBERTBase(config)
+        self.model.eval()
+
+        self.input_ids = torch.randint(100, (3, 7))
+        self.attention_mask = torch.ones(3, 7, dtype=torch.long)
+        self.attention_mask[0, 5:] = 0
+        self.image_feature = torch.randn(3, 5, 10)
+        self.image_location = torch.rand(3, 5, 5)
+        self.image_attention_mask = torch.ones(3, 5, dtype=torch.long)
+        self.image_attention_mask[1, 3:] = 0
+
+    def test_frozen_layer_outputs(self):
+        inputs = [
+            self.input_ids,
+            self.image_feature,
+            self.image_location,
+            None,
+            self.attention_mask,
+            self.image_attention_mask,
+        ]
+        with torch.no_grad():
+            expected = self.model(*inputs)
+            txt_output, image_output = self.model.forward_frozen_layers(*inputs)
+
+        # Round trip through the cache, by sample id
+        with tempfile.TemporaryDirectory() as tmpdir:
+            outputs = {"text": txt_output, "image": image_output}
+            for name, output in outputs.items():
+                store = EncoderOutputStore.create(os.path.join(tmpdir, name), 3)
+                store.write([2, 0, 1], output[[2, 0, 1]])
+                store.close()
+                outputs[name] = EncoderOutputStore(os.path.join(tmpdir, name)).get(
+                    [0, 1, 2]
+                )
+
+        with torch.no_grad():
+            output = self.model(
+                *inputs,
+                frozen_txt_output=outputs["text"],
+                frozen_image_output=outputs["image"],
+            )
+        for actual, reference in zip(output[:4], expected[:4]):
+            self.assertTrue(torch.equal(actual, reference))
@@ -4,11 +4,12 @@ import unittest
 
 import tests.test_utils as test_utils
 import torch
-from mmf.common.sample import SampleList
+from mmf.common.sample import Sample, SampleList
 from mmf.modules.hf_layers import replace_with_jit
 from mmf.utils.build import build_model
 from mmf.utils.configuration import Configuration
 from mmf.utils.env import setup_imports
+from mmf.utils.inference import optimize_for_inference
 
 
 BERT_VOCAB_SIZE = 30255
@@ -40,6 +41,22 @@ class TestVisualBertTorchscript(unittest.TestCase):
             )
         )
 
+    def test_optimized_model_in_training_mode(self):
+        model = optimize_for_inference(self.finetune_model, "cpu_fp32")
+        sample = Sample()
+        sample.input_ids = torch.randint(BERT_VOCAB_SIZE, (128,)).long()
+        sample.input_mask = torch.ones(128).long()
+        sample.segment_ids = torch.zeros(128).long()
+        sample.image_feature_0 = torch.rand((100, 2048)).float()
+        sample_list = SampleList([sample])
+
+        with torch.no_grad():
+            expected = model(sample_list)["scores"]
+            # The attention layers read the probability of their dropout
+            model.train()
+            scores = model(sample_list)["scores"]
+        self.assertTrue(torch.allclose(scores, expected, atol=1e-6))
+
 
 class TestVisualBertPretraining(unittest.TestCase):
     def setUp(self):
@@ -0,0 +1,210 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+import math
+import unittest
+from unittest.mock import patch
+
+import torch
+from mmf.models.vilbert import (
+    BertBiAttention,
+    BertImageSelfAttention,
+    BertSelfAttention,
+)
+from mmf.modules.attention import (
+    MovieMcanMultiHeadAttention,
+    scaled_dot_product_attention,
+    set_sdpa_attention,
+)
+from mmf.modules.hf_layers import BertSelfAttentionJit
+from transformers.modeling_bert import BertConfig
+
+
+def reference_attention(query, key, value, attn_mask=None, dropout_p=0.0):
+    scores = query.matmul(key.transpose(-1, -2)) / math.sqrt(query.size(-1))
+    if attn_mask is not None:
+        scores = scores + attn_mask
+    return torch.softmax(scores, dim=-1).matmul(value)
+
+
+def get_padding_mask(batch_size, length):
+    # Additive mask with the last positions of each sample padded
+    lengths = torch.randint(1, length + 1, (batch_size,))
+    padded = torch.arange(length).unsqueeze(0) >= lengths.unsqueeze(1)
+    return padded, (padded.float() * -10000.0).unsqueeze(1).unsqueeze(2)
+
+
+class TestScaledDotProductAttention(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(1234)
+        self.query = torch.randn(2, 3, 5, 4)
+        self.key = torch.randn(2, 3, 7, 4)
+        self.value = torch.randn(2, 3, 7, 4)
+        _, self.mask = get_padding_mask(2, 7)
+
+    def test_math_path(self):
+        output, probs = scaled_dot_product_attention(
+            self.query, self.key, self.value, self.mask
+        )
+        expected = reference_attention(self.query, self.key, self.value, self.mask)
+        self.assertTrue(torch.allclose(output, expected, atol=1e-6))
+        self.assertEqual(probs.size(), (2, 3, 5, 7))
+        self.assertTrue(torch.allclose(probs.sum(-1), torch.ones(2, 3, 5)))
+
+        head_mask = torch.tensor([1.0, 0.0, 1.0]).view(1, 3, 1, 1)
+        output, _ = scaled_dot_product_attention(
+            self.query, self.key, self.value, self.mask, head_mask=head_mask
+        )
+        self.assertTrue(output[:, 1].eq(0).all())
+        self.assertTrue(torch.allclose(output[:, 0], expected[:, 0], atol=1e-6))
+
+    def test_dispatch(self):
+        with patch(
+            "torch.nn.functional.scaled_dot_product_attention",
+            side_effect=reference_attention,
+            create=True,
+        ) as sdpa:
+            output, probs = scaled_dot_product_attention(
+                self.query, self.key, self.value, self.mask, use_sdpa=True
+            )
+            self.assertEqual(sdpa.call_count, 1)
+            self.assertIsNone(probs)
+
+            # Falls back to the math path for head masks or without use_sdpa
+            scaled_dot_product_attention(
+                self.query, self.key, self.value, head_mask=torch.ones(3, 1, 1)
+            )
+            scaled_dot_product_attention(self.query, self.key, self.value)
+            self.assertEqual(sdpa.call_count, 1)
+
+        expected, _ = scaled_dot_product_attention(
+            self.query, self.key, self.value, self.mask
+        )
+        self.assertTrue(torch.allclose(output, expected, atol=1e-6))
+
+    @unittest.skipUnless(
+        hasattr(torch.nn.functional, "scaled_dot_product_attention"),
+        "scaled_dot_product_attention requires PyTorch 2.0",
+    )
+    def test_fused_kernels(self):
+        output, _ = scaled_dot_product_attention(
+            self.query, self.key, self.value, self.mask, use_sdpa=True
+        )
+        expected, _ = scaled_dot_product_attention(
+            self.query, self.key, self.value, self.mask
+        )
+        self.assertTrue(torch.allclose(output, expected, atol=1e-5))
+
+
+class TestSDPAAttentionLayers(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(1234)
+        self.config = BertConfig(
+            hidden_size=16,
+            num_attention_heads=4,
+            v_hidden_size=12,
+            v_num_attention_heads=3,
+            v_attention_probs_dropout_prob=0.1,
+            bi_hidden_size=16,
+            bi_num_attention_heads=2,
+            v_hidden_dropout_prob=0.1,
+            visualization=False,
+            dynamic_attention=False,
+        )
+        self.text = torch.randn(2, 6, 16)
+        self.image = torch.randn(2, 5, 12)
+        _, self.text_mask = get_padding_mask(2, 6)
+        _, self.image_mask = get_padding_mask(2, 5)
+
+    def assert_sdpa_equivalent(self, module, *inputs):
+        module.eval()
+        with patch(
+            "torch.nn.functional.scaled_dot_product_attention",
+            side_effect=reference_attention,
+            create=True,
+        ) as sdpa:
+            set_sdpa_attention(module, False)
+            expected = module(*inputs)
+            self.assertEqual(sdpa.call_count, 0)
+
+            set_sdpa_attention(module)
+            output = module(*inputs)
+            self.assertGreater(sdpa.call_count, 0)
+
+        for actual, reference in zip(output[:-1], expected[:-1]):
+            self.assertTrue(torch.allclose(actual, reference, atol=1e-6))
+        return output
+
+    def test_vilbert_attention(self):
+        self.assert_sdpa_equivalent(
+            BertSelfAttention(self.config), self.text, self.text_mask
+        )
+        self.assert_sdpa_equivalent(
+            BertImageSelfAttention(self.config),
+            self.image,
+            self.image_mask,
+            self.text,
+            self.text_mask,
+        )
+        self.assert_sdpa_equivalent(
+            BertBiAttention(self.config),
+            self.image,
+            self.image_mask,
+            self.text,
+            self.text_mask,
+        )
+
+    def test_vilbert_visualization(self):
+        self.config.use_sdpa_attention = True
+        self.assertTrue(BertSelfAttention(self.config).use_sdpa_attention)
+        self.config.visualization = True
+        module = BertSelfAttention(self.config)
+        self.assertFalse(module.use_sdpa_attention)
+        _, attn_data = module(self.text, self.text_mask)
+        self.assertEqual(attn_data["attn"].size(), (2, 4, 6, 6))
+
+    def test_bert_self_attention_jit(self):
+        module = BertSelfAttentionJit(self.config)
+        self.assertFalse(module.use_sdpa_attention)
+        output = self.assert_sdpa_equivalent(module, self.text, self.text_mask)
+        self.assertEqual(output[1].numel(), 0)
+
+        # Cross-attention as used by LXMERT
+        self.assert_sdpa_equivalent(
+            module,
+            self.text,
+            None,
+            None,
+            torch.randn(2, 5, 16),
+            self.image_mask,
+        )
+
+    def test_movie_mcan_attention(self):
+        padded, _ = get_padding_mask(2, 6)
+        module = MovieMcanMultiHeadAttention(16, 4)
+        module.eval()
+        expected = module(self.text, self.text, self.text, padded)
+        # The layer keeps the attention probabilities
+        self.assertEqual(module.p_attn.size(), (2, 4, 6, 6))
+
+        with patch(
+            "torch.nn.functional.scaled_dot_product_attention",
+            side_effect=reference_attention,
+            create=True,
+        ) as sdpa:
+            set_sdpa_attention(module)
+            output = module(self.text, self.text, self.text, padded)
+            self.assertEqual(sdpa.call_count, 1)
+        self.assertTrue(torch.allclose(output, expected, atol=1e-6))
+
+    def test_torchscript(self):
+        self.config.use_sdpa_attention = True
+        for module_class in [BertSelfAttentionJit, BertSelfAttention]:
+            module = module_class(self.config)
+            module.eval()
+            script_module = torch.jit.script(module)
+            self.assertTrue(
+                torch.allclose(
+                    script_module(self.text, self.text_mask)[0],
+                    module(self.text, self.text_mask)[0],
+                    atol=1e-6,
+                )
+            )
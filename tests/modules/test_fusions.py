@@ -3,7 +3,11 @@
 import unittest
 
 import mmf.modules.fusions as fusions
+import numpy as np
 import torch
+import torch.nn.functional as F
+from mmf.utils.general import get_chunks, get_sizes_list
+from torch import nn
 
 
 class TestModuleFusions(unittest.TestCase):
@@ -77,6 +81,129 @@ class TestModuleFusions(unittest.TestCase):
             out = fusion([self.x[0].cuda(), self.x[1].cuda()])
         assert torch.Size([2, 2]) == out.shape
 
+    def get_chunk_outputs(self, x0, x1, sizes_list, merge):
+        zs = []
+        for x0_c, x1_c, m in zip(
+            get_chunks(x0, sizes_list), get_chunks(x1, sizes_list), merge
+        ):
+            z = m(x0_c, x1_c)
+            z = torch.sqrt(F.relu(z)) - torch.sqrt(F.relu(-z))
+            zs.append(F.normalize(z, p=2))
+        return torch.cat(zs, 1)
+
+    def test_block_chunk_linears_state_dict(self):
+        # Chunks of sizes 5, 5, 5, 4, 4, which are padded to be batched
+        sizes_list = get_sizes_list(23, 5)
+        fusion = fusions.Block(
+            self.input_dims, self.output_dims, mm_dim=23, chunks=5, rank=3
+        )
+        linears = [[nn.Linear(size, size * 3) for size in sizes_list] for _ in range(2)]
+        # State dict of the previous implementation, with a linear per chunk
+        state_dict = {k: v for k, v in fusion.state_dict().items() if "merge_" not in k}
+        for idx, chunk_linears in enumerate(linears):
+            for chunk_id, linear in enumerate(chunk_linears):
+                for name, value in linear.state_dict().items():
+                    state_dict[f"merge_linears{idx}.{chunk_id}.{name}"] = value
+        fusion.load_state_dict(state_dict)
+        self.assertTrue(fusion.has_converted_state_dict)
+
+        def merge(linear0, linear1):
+            def merge_chunk(x0_c, x1_c):
+                m = linear0(x0_c) * linear1(x1_c)
+                return m.view(x0_c.size(0), 3, -1).sum(1)
+
+            return merge_chunk
+
+        x0, x1 = fusion.linear0(self.x[0]), fusion.linear1(self.x[1])
+        expected = self.get_chunk_outputs(
+            x0, x1, sizes_list, [merge(*ms) for ms in zip(*linears)]
+        )
+        out = fusion(self.x)
+        self.assertTrue(torch.allclose(out, fusion.linear_out(expected), atol=1e-6))
+
+        # Checkpoints of the current implementation are loaded as they are
+        fusion.load_state_dict(fusion.state_dict())
+        self.assertFalse(fusion.has_converted_state_dict)
+
+    def test_block_tucker_chunk_bilinears_state_dict(self):
+        sizes_list = get_sizes_list(23, 5)
+        fusion = fusions.BlockTucker(
+            self.input_dims, self.output_dims, mm_dim=23, chunks=5
+        )
+        bilinears = [nn.Bilinear(size, size, size) for size in sizes_list]
+        state_dict = {
+            k: v for k, v in fusion.state_dict().items() if "bilinear_" not in k
+        }
+        for chunk_id, bilinear in enumerate(bilinears):
+            for name, value in bilinear.state_dict().items():
+                state_dict[f"bilinears.{chunk_id}.{name}"] = value
+        fusion.load_state_dict(state_dict)
+        self.assertTrue(fusion.has_converted_state_dict)
+
+        x0, x1 = fusion.linear0(self.x[0]), fusion.linear1(self.x[1])
+        expected = self.get_chunk_outputs(x0, x1, sizes_list, bilinears)
+        out = fusion(self.x)
+        self.assertTrue(torch.allclose(out, fusion.linear_out(expected), atol=1e-6))
+
+    def test_mfh_stage_linears_state_dict(self):
+        fusion = fusions.MFH(self.input_dims, self.output_dims, mm_dim=20)
+        state_dict = {
+            "linear_out." + k: v for k, v in fusion.linear_out.state_dict().items()
+        }
+        stages = {}
+        for idx, input_dim in enumerate(self.input_dims):
+            for stage in range(2):
+                linear = nn.Linear(input_dim, 40)
+                stages[(idx, stage)] = linear
+                for name, value in linear.state_dict().items():
+                    state_dict[f"linear{idx}_{stage}.{name}"] = value
+        fusion.load_state_dict(state_dict)
+        self.assertTrue(fusion.has_converted_state_dict)
+
+        z_0_skip = stages[(0, 0)](self.x[0]).relu() * stages[(1, 0)](self.x[1]).relu()
+        z_1 = stages[(0, 1)](self.x[0]).relu() * stages[(1, 1)](self.x[1]).relu()
+        z_1 = z_1 * z_0_skip
+        z = torch.cat([z_0_skip.view(2, 20, 2).sum(2), z_1.view(2, 20, 2).sum(2)], 1)
+        expected = fusion.linear_out(z).relu()
+        self.assertTrue(torch.allclose(fusion(self.x), expected, atol=1e-6))
+
+    def test_compact_bilinear_pooling(self):
+        input_dims, output_dim = self.input_dims, 16
+        # Dense sketch matrices, as saved in the checkpoints of the previous
+        # implementation
+        sketches = []
+        for input_dim in input_dims:
+            sketch = torch.zeros(input_dim, output_dim)
+            rand_h = torch.randint(output_dim, size=(input_dim,))
+            sketch[torch.arange(input_dim), rand_h] = (
+                2 * torch.randint(2, size=(input_dim,)) - 1
+            ).float()
+            sketches.append(sketch)
+
+        pooling = fusions.CompactBilinearPooling(*input_dims, output_dim)
+        pooling.load_state_dict({"sketch1": sketches[0], "sketch2": sketches[1]})
+        # Only buffers are converted, the optimizer state can be loaded
+        self.assertFalse(pooling.has_converted_state_dict)
+        self.assertEqual(
+            sorted(pooling.state_dict().keys()),
+            ["rand_h1", "rand_h2", "rand_s1", "rand_s2"],
+        )
+
+        # Circular convolution of the dense count sketches
+        x1, x2 = (x @ sketch for x, sketch in zip(self.x, sketches))
+        expected = np.fft.irfft(
+            np.fft.rfft(x1.numpy()) * np.fft.rfft(x2.numpy()), n=output_dim
+        )
+        expected = torch.from_numpy(expected).float() * output_dim
+        out = pooling(*self.x)
+        self.assertTrue(torch.allclose(out, expected, atol=1e-4))
+
+        # Feature maps are pooled over their spatial dimensions
+        maps = [x[:, :, None, None].expand(-1, -1, 2, 3) for x in self.x]
+        self.assertTrue(torch.allclose(pooling(*maps), 6 * expected, atol=1e-3))
+        pooling.sum_pool = False
+        self.assertEqual(pooling(*maps).shape, torch.Size([2, output_dim, 2, 3]))
+
     def test_LinearSum(self):
         fusion = fusions.LinearSum(self.input_dims, self.output_dims, mm_dim=20)
         out = fusion(self.x)
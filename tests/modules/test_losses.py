@@ -88,3 +88,32 @@ class TestModuleLosses(unittest.TestCase):
         predicted["scores"] = torch.rand((5, 10, 9491))
 
         self.assertAlmostEqual(caption_ce_loss(expected, predicted).item(), 9.2507, 4)
+
+    def test_m4c_decoding_bce_with_mask(self):
+        loss = losses.M4CDecodingBCEWithMaskLoss()
+        scores = torch.randn(3, 4, 10) * 5
+        loss_mask = torch.tensor([[1.0, 1, 0, 0], [1, 1, 1, 1], [0, 0, 0, 0]])
+        targets = torch.zeros(3, 4, 10)
+        targets[0, 0, [2, 5]] = torch.tensor([0.3, 1.0])
+        targets[0, 1, 7] = 1
+        # Positives under the mask are ignored
+        targets[0, 3, 1] = 1
+        targets[1, :, 4] = 1
+        dense = loss(
+            {"targets": targets, "train_loss_mask": loss_mask}, {"scores": scores}
+        )
+
+        # Padded with index and value 0
+        indices = torch.zeros(3, 4, dtype=torch.long)
+        values = torch.zeros(3, 4)
+        for idx in range(3):
+            nonzero = targets[idx].view(-1).nonzero().view(-1)
+            indices[idx, : len(nonzero)] = nonzero
+            values[idx, : len(nonzero)] = targets[idx].view(-1)[nonzero]
+        sample_list = {
+            "sparse_targets_indices": indices,
+            "sparse_targets_values": values,
+            "train_loss_mask": loss_mask,
+        }
+        sparse = loss(sample_list, {"scores": scores})
+        self.assertAlmostEqual(sparse.item(), dense.item(), 4)
@@ -7,8 +7,10 @@ import platform
 import random
 import socket
 import tempfile
+import traceback
 import unittest
 
+import numpy as np
 import torch
 from mmf.common.sample import Sample, SampleList
 
@@ -167,3 +169,95 @@ def verify_torchscript_models(model):
         torch.jit.save(script_model, tmp)
         loaded_model = torch.jit.load(tmp.name)
     return assertModulesEqual(script_model, loaded_model)
+
+
+class HostSyncChecker:
+    """Records the calls made inside its context which copy tensors to the host
+    or host data to tensors, such as ``.item()``, ``.tolist()``,
+    ``np.array(tensor)`` or ``torch.tensor(ndarray)``. On GPU these block until
+    the device catches up, so they belong in the dataset or its collate
+    function rather than in a model's forward. Unlike torch's sync debug mode,
+    which is also enabled on CUDA when available, this works on CPU.
+
+    Example::
+
+        with HostSyncChecker() as checker:
+            model(sample_list)
+        self.assertEqual(checker.syncs, [])
+    """
+
+    TENSOR_METHODS = [
+        "item",
+        "tolist",
+        "numpy",
+        "__array__",
+        "__bool__",
+        "__int__",
+        "__float__",
+    ]
+    TENSOR_FACTORIES = ["tensor", "as_tensor", "from_numpy"]
+
+    def __init__(self):
+        self.syncs = []
+        self._patched = []
+        self._recording = False
+        self._sync_debug_mode = None
+
+    def _record(self, name):
+        if self._recording:
+            return
+        location = ""
+        # Innermost caller from MMF, as the call can come from a library
+        for frame in reversed(traceback.extract_stack()[:-2]):
+            if f"{os.sep}mmf{os.sep}" in frame.filename:
+                location = f" in {frame.name} at {frame.filename}:{frame.lineno}"
+                break
+        self.syncs.append(name + location)
+
+    def _wrap(self, name, function, should_record=None):
+        def wrapper(*args, **kwargs):
+            if should_record is None or should_record(*args, **kwargs):
+                self._record(name)
+            # Nested calls, e.g. __array__ calling numpy, are recorded once
+            recording = self._recording
+            self._recording = True
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._recording = recording
+
+        return wrapper
+
+    def _patch(self, owner, attribute, wrapper):
+        self._patched.append((owner, attribute, owner.__dict__.get(attribute)))
+        setattr(owner, attribute, wrapper)
+
+    def __enter__(self):
+        for method in self.TENSOR_METHODS:
+            original = getattr(torch.Tensor, method)
+            self._patch(torch.Tensor, method, self._wrap(f"Tensor.{method}", original))
+
+        def is_host_data(data, *args, **kwargs):
+            return isinstance(data, (np.ndarray, list, tuple))
+
+        for factory in self.TENSOR_FACTORIES:
+            original = getattr(torch, factory)
+            self._patch(
+                torch, factory, self._wrap(f"torch.{factory}", original, is_host_data)
+            )
+
+        if hasattr(torch.cuda, "set_sync_debug_mode") and torch.cuda.is_available():
+            self._sync_debug_mode = torch.cuda.get_sync_debug_mode()
+            torch.cuda.set_sync_debug_mode("error")
+        return self
+
+    def __exit__(self, *args):
+        for owner, attribute, original in reversed(self._patched):
+            if original is None:
+                delattr(owner, attribute)
+            else:
+                setattr(owner, attribute, original)
+        self._patched = []
+
+        if self._sync_debug_mode is not None:
+            torch.cuda.set_sync_debug_mode(self._sync_debug_mode)
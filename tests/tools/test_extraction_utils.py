@@ -0,0 +1,91 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+import numpy as np
+
+from tools.scripts.features.extraction_utils import (
+    AsyncFeatureWriter,
+    FeatureManifest,
+    NpyFeatureWriter,
+    closing_feature_writer,
+    get_image_name,
+    list_image_files,
+    load_exclude_list,
+)
+
+
+class TestExtractionUtils(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_get_image_name(self):
+        self.assertEqual(get_image_name(os.path.join("a.b", "img.jpg")), "img")
+        self.assertEqual(get_image_name("img.v2.jpg"), "img.v2")
+        self.assertEqual(get_image_name("img.v3.jpg"), "img.v3")
+        self.assertEqual(get_image_name("img"), "img")
+
+    def test_list_image_files_and_exclude_list(self):
+        for name in ["b.jpg", "a.v2.png", "a.v3.png", "c.txt"]:
+            open(os.path.join(self.tmpdir.name, name), "w").close()
+        files = list_image_files(self.tmpdir.name, extensions=("png", "jpg", "png"))
+        self.assertEqual(
+            [os.path.basename(f) for f in files], ["a.v2.png", "a.v3.png", "b.jpg"]
+        )
+
+        exclude_path = os.path.join(self.tmpdir.name, "exclude.txt")
+        with open(exclude_path, "w") as f:
+            f.write("a.v2.png\nb.jpg\n")
+        self.assertEqual(load_exclude_list(exclude_path), {"a.v2", "b"})
+        self.assertEqual(load_exclude_list(None), set())
+
+    def test_npy_writer_and_manifest(self):
+        manifest_path = os.path.join(self.tmpdir.name, "manifest.txt")
+        output_folder = os.path.join(self.tmpdir.name, "features")
+        manifest = FeatureManifest(manifest_path)
+        writer = AsyncFeatureWriter(
+            NpyFeatureWriter(output_folder, on_commit=manifest.add)
+        )
+        with closing_feature_writer(writer, manifest):
+            writer.write("img.v2", np.ones((1, 2)), {"num_boxes": 1})
+            writer.write("img.v3", np.zeros((1, 2)))
+
+        feature = np.load(os.path.join(output_folder, "img.v2.npy"))
+        self.assertTrue(np.array_equal(feature, np.ones((1, 2))))
+        self.assertTrue(os.path.exists(os.path.join(output_folder, "img.v2_info.npy")))
+        self.assertFalse(os.path.exists(os.path.join(output_folder, "img.v3_info.npy")))
+
+        # Resumed runs skip the written images
+        manifest = FeatureManifest(manifest_path)
+        self.assertEqual(len(manifest), 2)
+        self.assertIn("img.v3", manifest)
+
+    def test_writer_errors(self):
+        failing_writer = MagicMock()
+        failing_writer.write.side_effect = OSError("disk full")
+        writer = AsyncFeatureWriter(failing_writer)
+        writer.write("img", np.ones(1))
+        with self.assertRaises(RuntimeError) as context:
+            writer.close()
+        self.assertIsInstance(context.exception.__cause__, OSError)
+
+        # An error while closing the writer doesn't mask the original one
+        writer = MagicMock()
+        writer.close.side_effect = RuntimeError("Feature writer failed")
+        manifest = MagicMock()
+        with self.assertRaises(ValueError):
+            with closing_feature_writer(writer, manifest):
+                raise ValueError("bad image")
+        writer.close.assert_called_once()
+        manifest.close.assert_called_once()
+
+        # It is raised otherwise
+        with self.assertRaises(RuntimeError):
+            with closing_feature_writer(writer, manifest):
+                pass
+        self.assertEqual(manifest.close.call_count, 2)
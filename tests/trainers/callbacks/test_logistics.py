@@ -11,8 +11,13 @@ import torch
 from mmf.common.meter import Meter
 from mmf.common.registry import registry
 from mmf.common.report import Report
+from mmf.common.sample import Sample, SampleList
 from mmf.models.base_model import BaseModel
-from mmf.trainers.callbacks.logistics import LogisticsCallback
+from mmf.trainers.callbacks.logistics import (
+    LogisticsCallback,
+    get_num_regions,
+    get_num_tokens,
+)
 from mmf.utils.file_io import PathManager
 from mmf.utils.logger import setup_logger
 from omegaconf import OmegaConf
@@ -120,3 +125,56 @@ class TestLogisticsCallback(unittest.TestCase):
         self.cb.on_test_end(report=self.report, meter=self.trainer.meter)
         f = PathManager.open(os.path.join(self.tmpdir, "train.log"))
         self.assertTrue(any("Finished run in" in line for line in f.readlines()))
+
+    def _get_batch_report(self):
+        samples = []
+        for length in [2, 3]:
+            sample = Sample()
+            sample.input_mask = torch.tensor([1] * length + [0] * (5 - length))
+            sample.image_feature_0 = torch.zeros(4, 2)
+            sample.image_info_0 = {"max_features": torch.tensor(length + 1)}
+            samples.append(sample)
+        return Report(SampleList(samples), {})
+
+    def test_count_tokens_and_regions(self):
+        report = self._get_batch_report()
+        self.assertEqual(get_num_tokens(report).item(), 5)
+        self.assertEqual(get_num_regions(report).item(), 7)
+
+        del report["image_info_0"]
+        del report["input_mask"]
+        self.assertEqual(get_num_tokens(report), 0)
+        self.assertEqual(get_num_regions(report), 8)
+
+    def test_estimate_flops(self):
+        model = SimpleModule()
+        model.embedding = torch.nn.Embedding(100, 5)
+        model.encoder = torch.nn.Conv2d(3, 5, 3)
+        # 24 + 25 parameters in the linears of each of base and classifier
+        self.assertEqual(model.estimate_flops(2, 10), 10 * 6 * 98)
+
+        del model._num_parameters
+        for p in model.base.parameters():
+            p.requires_grad = False
+        self.assertEqual(model.estimate_flops(2, 0), 2 * (2 * 98 + 4 * 49))
+
+    def test_throughput(self):
+        self.cb.on_train_start()
+        for _ in range(2):
+            self.cb.on_batch_start()
+            self.cb.on_batch_end(report=self._get_batch_report())
+
+        throughput = self.cb._get_throughput()
+        self.assertGreater(throughput["samples_per_sec"], 0)
+        self.assertAlmostEqual(
+            throughput["tokens_per_sec"] / throughput["samples_per_sec"], 10 / 4
+        )
+        self.assertGreaterEqual(throughput["data_wait"], 0)
+        self.assertIn("tflops", throughput)
+        self.assertNotIn("mfu", throughput)
+
+        self.cb.on_update_end(meter=self.trainer.meter, should_log=True)
+        f = PathManager.open(os.path.join(self.tmpdir, "train.log"))
+        self.assertTrue(any("samples_per_sec" in line for line in f.readlines()))
+        # Counters are reset after logging
+        self.assertEqual(self.cb._num_samples, 0)
@@ -0,0 +1,135 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import torch
+from mmf.common.meter import Meter
+from mmf.common.sample import SampleList
+from mmf.trainers.core.evaluation_loop import (
+    TrainerEvaluationLoopMixin,
+    record_stream,
+)
+from mmf.trainers.core.reporting import TrainerReportingMixin
+from mmf.utils.distributed import reduce_dict
+from tests.test_utils import skip_if_no_cuda
+from tests.trainers.test_training_loop import TrainerTrainingLoopMock
+
+
+class TrainerEvaluationLoopMock(
+    TrainerTrainingLoopMock, TrainerEvaluationLoopMixin, TrainerReportingMixin
+):
+    def __init__(self, num_data):
+        super().__init__(num_data, 1, None)
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.training_config.fp16 = False
+        self.metrics = MagicMock(return_value={}, required_params=[])
+        self.dataset_loader.prepare_batch = self._prepare_batch_with_type
+
+    def _prepare_batch_with_type(self, batch):
+        batch = SampleList(batch)
+        batch.dataset_type = "val"
+        batch.dataset_name = "numbers"
+        return batch
+
+
+class TestEvaluationLoop(unittest.TestCase):
+    def test_loss_is_reduced_once(self):
+        trainer = TrainerEvaluationLoopMock(10)
+        loader = torch.utils.data.DataLoader(
+            trainer.train_loader.dataset, batch_size=3, shuffle=False
+        )
+
+        with patch(
+            "mmf.trainers.core.reporting.reduce_dict", wraps=reduce_dict
+        ) as reduce:
+            report, meter = trainer.evaluation_loop(loader)
+            # Once for the losses and once for the metrics
+            self.assertEqual(reduce.call_count, 2)
+
+        self.assertEqual(report.batch_size, 10)
+        with torch.no_grad():
+            data = torch.arange(10, dtype=torch.float32).unsqueeze(-1)
+            if torch.cuda.is_available():
+                data = data.cuda()
+            expected = torch.stack(
+                [trainer.model.linear(batch).sum() for batch in data.split(3)]
+            )
+            batch_sizes = torch.tensor([3.0, 3.0, 3.0, 1.0], device=data.device)
+            expected = (expected * batch_sizes).sum() / 10
+
+        loss_key = list(meter.meters.keys())[0]
+        self.assertAlmostEqual(
+            meter.meters[loss_key].global_avg, expected.item(), places=4
+        )
+        self.assertTrue(trainer.model.training)
+
+    def test_single_batch(self):
+        trainer = TrainerEvaluationLoopMock(10)
+        loader = torch.utils.data.DataLoader(
+            trainer.train_loader.dataset, batch_size=3, shuffle=False
+        )
+        report, _ = trainer.evaluation_loop(loader, single_batch=True)
+        self.assertEqual(report.batch_size, 3)
+
+    def test_loss_sums_match_update_meter(self):
+        trainer = TrainerEvaluationLoopMock(10)
+        # Batches of two datasets with different loss keys and batch sizes
+        reports = [
+            SimpleNamespace(
+                losses={"val/a/loss": torch.tensor(1.0)},
+                batch_size=2,
+                dataset_type="val",
+            ),
+            SimpleNamespace(
+                losses={"val/b/loss": torch.tensor(4.0)},
+                batch_size=6,
+                dataset_type="val",
+            ),
+            SimpleNamespace(
+                losses={"val/a/loss": torch.tensor(3.0)},
+                batch_size=4,
+                dataset_type="val",
+            ),
+        ]
+
+        expected_meter = Meter()
+        for report in reports:
+            trainer.update_meter(report, expected_meter)
+
+        meter = Meter()
+        loss_sums = {}
+        sample_counts = {}
+        for report in reports:
+            trainer.accumulate_loss_sums(report, loss_sums, sample_counts)
+        trainer.update_meter_from_loss_sums(loss_sums, sample_counts, "val", meter)
+
+        self.assertEqual(set(meter.meters.keys()), set(expected_meter.meters.keys()))
+        for key, value in expected_meter.meters.items():
+            self.assertAlmostEqual(
+                meter.meters[key].global_avg, value.global_avg, places=5
+            )
+        # Sample weighted mean of the total losses of the batches
+        self.assertAlmostEqual(
+            meter.meters["val/total_loss"].global_avg, 38 / 12, places=5
+        )
+
+    @skip_if_no_cuda
+    def test_record_stream_nested_fields(self):
+        stream = torch.cuda.Stream()
+        with torch.cuda.stream(stream):
+            batch = SampleList(
+                {
+                    "image_feature_0": torch.rand(2, 3, device="cuda"),
+                    "image_info_0": {
+                        "bbox": torch.rand(2, 3, 4, device="cuda"),
+                        "max_features": torch.tensor([3, 2], device="cuda"),
+                    },
+                    "extra": [torch.ones(2, device="cuda"), torch.ones(2)],
+                }
+            )
+        with patch.object(torch.Tensor, "record_stream") as mock:
+            record_stream(batch, torch.cuda.current_stream())
+        # All of the CUDA tensors, the CPU tensor is skipped
+        self.assertEqual(mock.call_count, 4)
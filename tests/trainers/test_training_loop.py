@@ -1,12 +1,14 @@
 # Copyright (c) Facebook, Inc. and its affiliates.
 
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 import torch
+from mmf.common.report import Report
 from mmf.common.sample import SampleList
 from mmf.trainers.core.profiling import TrainerProfilingMixin
 from mmf.trainers.core.training_loop import TrainerTrainingLoopMixin
+from mmf.utils.profiler import StepProfiler
 from omegaconf import OmegaConf
 from tests.test_utils import NumbersDataset, SimpleModel
 
@@ -84,6 +86,62 @@ class TestTrainingLoop(unittest.TestCase):
         trainer.training_loop()
         self.check_values(trainer, 2, 1, 2)
 
+    def test_update_frequency(self):
+        trainer = TrainerTrainingLoopMock(10, 3, None)
+        trainer.training_config.update_frequency = 4
+        trainer.logistics_callback.log_interval = 3
+        trainer.metrics = MagicMock(required_params=["x"])
+        trainer.update_meter = MagicMock(return_value=None)
+        trainer.run_training_batch = MagicMock(wraps=trainer.run_training_batch)
+
+        with patch.object(Report, "accumulate_tensor_fields") as accumulate:
+            trainer.training_loop()
+            # Only the batches of the logged (third) update are accumulated
+            self.assertEqual(accumulate.call_count, 1)
+
+        self.check_values(trainer, 3, 1, 3)
+        self.assertEqual(trainer.optimizer.zero_grad.call_count, 3)
+        self.assertEqual(trainer.scaler.step.call_count, 3)
+        self.assertEqual(trainer.update_meter.call_count, 1)
+        # Last update of the epoch only has two batches left
+        loss_divisors = [
+            call[0][1] for call in trainer.run_training_batch.call_args_list
+        ]
+        self.assertEqual(loss_divisors, [4] * 8 + [2] * 2)
+
+    def test_gradient_sync_context(self):
+        trainer = TrainerTrainingLoopMock(10, 1, None)
+        with trainer._gradient_sync_context(is_last_batch=False):
+            pass
+
+        trainer.model = MagicMock(spec=torch.nn.parallel.DistributedDataParallel)
+        with trainer._gradient_sync_context(is_last_batch=True):
+            pass
+        trainer.model.no_sync.assert_not_called()
+        trainer._gradient_sync_context(is_last_batch=False)
+        trainer.model.no_sync.assert_called_once()
+
+    def test_step_profiler(self):
+        trainer = TrainerTrainingLoopMock(10, 4, None)
+        trainer.logistics_callback.log_interval = 2
+        trainer.update_meter = MagicMock(return_value=None)
+        trainer.step_profiler = StepProfiler(cuda_events=False, percentiles=[50])
+        trainer.training_loop()
+
+        self.assertEqual(trainer.step_profiler.num_updates, 4)
+        self.assertEqual(trainer.meter.update.call_count, 2)
+        profiler_stats = trainer.meter.update.call_args[0][0]
+        for phase in [
+            "data_wait",
+            "host_to_device",
+            "forward",
+            "loss",
+            "backward",
+            "optimizer",
+            "callbacks",
+        ]:
+            self.assertIn(f"profiler/{phase}_p50", profiler_stats)
+
     def check_values(self, trainer, current_iteration, current_epoch, num_updates):
         self.assertEqual(trainer.current_iteration, current_iteration)
         self.assertEqual(trainer.current_epoch, current_epoch)
@@ -404,6 +404,23 @@ class TestUtilsCheckpoint(unittest.TestCase):
             self.assertEqual(self.trainer.current_epoch, 3)
 
     @skip_if_no_cuda
+    def test_load_converted_state_dict(self):
+        with mock_env_with_temp():
+            checkpoint = Checkpoint(self.trainer)
+            self._init_early_stopping(checkpoint)
+            self._do_a_pass()
+            checkpoint.save(1000)
+
+            # As after loading a checkpoint of a previous implementation
+            self.trainer.model.base.has_converted_state_dict = True
+            self.trainer.config.checkpoint.resume = True
+            with self.assertRaises(RuntimeError):
+                checkpoint.load_state_dict()
+
+            self._init_early_stopping(checkpoint)
+            self.trainer.config.checkpoint.reset.optimizer = True
+            checkpoint.load_state_dict()
+
     def test_checkpoint_scaler_loading(self):
         with mock_env_with_temp():
             original_scaler = deepcopy(self.trainer.scaler)
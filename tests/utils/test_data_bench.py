@@ -0,0 +1,107 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+import unittest
+
+from mmf.common.registry import registry
+from mmf_cli.bench_data import build_loader, get_parser
+from mmf.datasets.processors.processors import processor_stats
+from mmf.utils.data_bench import (
+    DataPipelineBenchmark,
+    SyntheticDataset,
+    SyntheticMultiDatasetLoader,
+    format_report,
+)
+from omegaconf import OmegaConf
+from torch.utils.data import DataLoader
+
+
+class TestDataBench(unittest.TestCase):
+    def setUp(self):
+        self.config = OmegaConf.create(
+            {
+                "datasets": "synthetic_a,synthetic_b",
+                "dataset_config": {"synthetic_a": {}, "synthetic_b": {}},
+                "training": {"batch_size": 4, "num_workers": 0, "pin_memory": False},
+            }
+        )
+        self._global_config = registry.get("config")
+        registry.register("config", self.config)
+        self.synthetic_kwargs = {
+            "num_samples": 10,
+            "seq_length": 8,
+            "num_features": 3,
+            "feature_dim": 5,
+            "num_labels": 7,
+        }
+
+    def tearDown(self):
+        registry.register("config", self._global_config)
+
+    def test_synthetic_dataset(self):
+        dataset = SyntheticDataset("synthetic", None, "train", **self.synthetic_kwargs)
+        self.assertEqual(len(dataset), 10)
+        sample = dataset[3]
+        self.assertEqual(sample.input_ids.size(), (8,))
+        self.assertEqual(sample.image_feature_0.size(), (3, 5))
+        self.assertEqual(sample.targets.size(), (7,))
+        self.assertTrue(sample.input_ids.equal(dataset[3].input_ids))
+
+    def test_benchmark(self):
+        loader = SyntheticMultiDatasetLoader("train", **self.synthetic_kwargs)
+        loader.load(self.config)
+
+        processor_config = OmegaConf.create(
+            {"text_processor": {"type": "simple_sentence", "params": {}}}
+        )
+        dataset = SyntheticDataset(
+            "synthetic_c",
+            OmegaConf.create({"processors": processor_config, "data_dir": ""}),
+            "train",
+            **self.synthetic_kwargs,
+        )
+        loader.datasets.append(dataset)
+        loader.loaders.append(DataLoader(dataset, batch_size=4))
+
+        report = DataPipelineBenchmark(
+            loader, num_samples=6, num_batches=2, top_k=3
+        ).run()
+        self.assertFalse(processor_stats.enabled)
+
+        self.assertEqual(
+            list(report["datasets"].keys()),
+            ["synthetic_a", "synthetic_b", "synthetic_c"],
+        )
+        result = report["datasets"]["synthetic_a"]
+        self.assertEqual(result["sample"]["count"], 6)
+        # 6 samples collated in batches of 4
+        self.assertEqual(result["collate"]["count"], 2)
+        self.assertEqual(result["loader_batches"], 2)
+        self.assertGreater(result["loader_samples_per_sec"], 0)
+
+        self.assertEqual(report["processors"]["synthetic_c_text_processor"]["calls"], 6)
+        # 2 batches of 4 samples loaded in the main process by the DataLoader
+        self.assertEqual(
+            report["worker_processors"]["synthetic_c_text_processor"]["main"]["calls"],
+            8,
+        )
+        self.assertEqual(len(report["slowest_samples"]), 3)
+        durations = [item["ms"] for item in report["slowest_samples"]]
+        self.assertEqual(durations, sorted(durations, reverse=True))
+        self.assertIn("synthetic_c_text_processor", format_report(report))
+
+    def test_synthetic_cli_loader(self):
+        self.config.dataset_config.synthetic_a = {
+            "data_dir": "",
+            "processors": {
+                "text_processor": {"type": "simple_sentence", "params": {}}
+            },
+        }
+        args = get_parser().parse_args(
+            ["--synthetic", "--synthetic_size", "10", "--synthetic_seq_length", "8"]
+        )
+        loader = build_loader(self.config, args)
+        self.assertEqual(len(loader.datasets), 2)
+        self.assertTrue(hasattr(loader.datasets[0], "text_processor"))
+
+        report = DataPipelineBenchmark(loader, num_samples=4, num_batches=1).run()
+        self.assertEqual(report["processors"]["synthetic_a_text_processor"]["calls"], 4)
+        self.assertNotIn("synthetic_b_text_processor", report["processors"])
@@ -0,0 +1,173 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+import os
+import pickle
+import tempfile
+import unittest
+
+import torch
+from mmf.common.sample import SampleList
+from mmf.utils.encoder_cache import (
+    EncoderOutputLoader,
+    EncoderOutputStore,
+    build_encoder_output_loader,
+    build_encoder_output_store,
+    is_encoder_cached,
+    write_encoder_outputs,
+)
+from omegaconf import OmegaConf
+from torch import nn
+
+
+class EncoderModel(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.encoder = nn.Linear(4, 3)
+        self.num_calls = 0
+
+    def compute_encoder_outputs(self, sample_list):
+        self.num_calls += 1
+        return self.encoder(sample_list["image"]).unsqueeze(1)
+
+
+class NamedOutputsModel(EncoderModel):
+    def compute_encoder_outputs(self, sample_list):
+        outputs = super().compute_encoder_outputs(sample_list)
+        return {"first": outputs, "second": outputs.sum(-1)}
+
+
+class ImageDataset(torch.utils.data.Dataset):
+    def __init__(self, ids, images):
+        self.ids = ids
+        self.images = images
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, idx):
+        return {"id": torch.tensor(self.ids[idx]), "image": self.images[idx]}
+
+
+def collate(samples):
+    return SampleList(
+        {
+            "id": torch.stack([sample["id"] for sample in samples]),
+            "image": torch.stack([sample["image"] for sample in samples]),
+        }
+    )
+
+
+class TestEncoderOutputStore(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(1234)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "cache")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_write_and_get(self):
+        outputs = torch.randn(4, 2, 3)
+        store = EncoderOutputStore.create(self.path, 5)
+        store.write(torch.tensor([3, 7]), outputs[:2])
+        # Already written ids are skipped
+        store.write(["7", "1", "2"], torch.cat([outputs[:1], outputs[2:]]))
+        store.close()
+
+        store = EncoderOutputStore(self.path)
+        self.assertEqual(len(store), 4)
+        self.assertIn(7, store)
+        self.assertNotIn(4, store)
+        self.assertTrue(torch.equal(store.get([7, 3]), outputs[[1, 0]]))
+        self.assertTrue(torch.equal(store.get(torch.tensor([2, 1])), outputs[[3, 2]]))
+        with self.assertRaises(KeyError):
+            store.get([3, 4])
+
+    def test_fp16(self):
+        outputs = torch.randn(2, 3)
+        store = EncoderOutputStore.create(self.path, 2)
+        store.write([0, 1], outputs.half())
+        store.close()
+
+        output = EncoderOutputStore(self.path).get([1])
+        self.assertEqual(output.dtype, torch.float32)
+        self.assertTrue(torch.allclose(output, outputs[1:], atol=1e-2))
+
+    def test_write_encoder_outputs(self):
+        model = EncoderModel()
+        images = torch.randn(6, 4)
+        # Images 0 and 1 are also in the second split
+        loaders = [
+            torch.utils.data.DataLoader(
+                ImageDataset(ids, images[ids]), batch_size=2, collate_fn=collate
+            )
+            for ids in [[0, 1, 2, 3], [0, 1, 4, 5]]
+        ]
+        write_encoder_outputs(model, loaders, self.path)
+        self.assertEqual(model.num_calls, 3)
+
+        config = OmegaConf.create({"encoder_cache_dir": self.path})
+        store = build_encoder_output_store(config)
+        self.assertEqual(len(store), 6)
+        self.assertIsNone(build_encoder_output_store(OmegaConf.create({})))
+
+        # Run by the DataLoader workers, which get a pickled copy
+        loader = pickle.loads(pickle.dumps(EncoderOutputLoader(self.path)))
+        sample_list = loader(SampleList({"id": torch.tensor([5, 2])}))
+        with torch.no_grad():
+            expected = model.encoder(images[[5, 2]]).unsqueeze(1)
+        self.assertTrue(torch.allclose(sample_list.encoder_output, expected))
+
+    def test_write_named_outputs(self):
+        images = torch.randn(4, 4)
+        loader = torch.utils.data.DataLoader(
+            ImageDataset([0, 1, 2, 3], images), batch_size=3, collate_fn=collate
+        )
+        model = NamedOutputsModel()
+        stores = write_encoder_outputs(model, [loader], self.path, fp16=True)
+        self.assertEqual(sorted(stores.keys()), ["first", "second"])
+
+        config = OmegaConf.create({"encoder_cache_dir": self.path})
+        first = build_encoder_output_store(config, "first")
+        second = build_encoder_output_store(config, "second")
+        self.assertEqual(first.get([1, 3]).size(), (2, 1, 3))
+        self.assertTrue(
+            torch.allclose(first.get([1, 3]).sum(-1), second.get([1, 3]), atol=1e-2)
+        )
+
+        loader = EncoderOutputLoader(self.path)
+        sample_list = loader(SampleList({"id": torch.tensor([3, 1])}))
+        self.assertTrue(
+            torch.equal(sample_list.encoder_output_first, first.get([3, 1]))
+        )
+        self.assertTrue(
+            torch.equal(sample_list.encoder_output_second, second.get([3, 1]))
+        )
+
+    def test_build_encoder_output_loader(self):
+        config = OmegaConf.create(
+            {
+                "model": "mmbt",
+                "model_config": {
+                    "mmbt": {"encoder_cache_dir": self.path},
+                    "other": "mmbt",
+                    "visual_bert": {"encoder_cache_dir": None},
+                },
+            }
+        )
+        loader = build_encoder_output_loader(config)
+        self.assertEqual(loader.cache_dir, self.path)
+        self.assertEqual(loader.batch_stage, "collate")
+
+        config.model = "other"
+        self.assertEqual(build_encoder_output_loader(config).cache_dir, self.path)
+        config.model = "visual_bert"
+        self.assertIsNone(build_encoder_output_loader(config))
+        self.assertIsNone(build_encoder_output_loader(None))
+
+    def test_is_encoder_cached(self):
+        config = OmegaConf.create({"encoder_cache_dir": self.path})
+        self.assertTrue(is_encoder_cached(config, True))
+        self.assertFalse(is_encoder_cached(OmegaConf.create({}), False))
+        # The encoder wouldn't be trained anymore
+        with self.assertRaises(AssertionError):
+            is_encoder_cached(config, False)
@@ -0,0 +1,54 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+import json
+import subprocess
+import sys
+import unittest
+
+from mmf.utils.env import (
+    REGISTRY_MANIFEST_PATH,
+    generate_registry_manifest,
+    load_registry_manifest,
+)
+
+
+class TestRegistryManifest(unittest.TestCase):
+    def test_manifest_is_up_to_date(self):
+        with open(REGISTRY_MANIFEST_PATH) as f:
+            manifest = json.load(f)
+        self.assertEqual(
+            manifest,
+            generate_registry_manifest(),
+            "Registry manifest is outdated, regenerate it with "
+            + "tools/scripts/registry/update_manifest.py",
+        )
+
+    def test_manifest_contents(self):
+        manifest = load_registry_manifest()
+        self.assertEqual(manifest["model"]["visual_bert"], "mmf.models.visual_bert")
+        self.assertEqual(
+            manifest["builder"]["textvqa"], "mmf.datasets.builders.textvqa.builder"
+        )
+        self.assertEqual(manifest["trainer"]["mmf"], "mmf.trainers.mmf_trainer")
+
+    def test_lazy_setup_imports(self):
+        # Needs a fresh process as other tests import everything
+        snippet = "\n".join(
+            [
+                "import sys",
+                "from mmf.common.registry import registry",
+                "from mmf.utils.env import setup_imports",
+                "setup_imports(lazy=True)",
+                "assert 'mmf.models.visual_bert' not in sys.modules",
+                "assert 'mmf.datasets.builders.textvqa.builder' not in sys.modules",
+                "assert registry.get_model_class('visual_bert') is not None",
+                "assert registry.get_builder_class('textvqa') is not None",
+                "assert 'mmf.models.visual_bert' in sys.modules",
+                "assert 'mmf.models.vilbert' not in sys.modules",
+                "assert not registry.get('imports_setup', no_warning=True)",
+                # Names missing from the manifest fall back to importing all
+                "assert registry.get_model_class('not_a_model') is None",
+                "assert registry.get('imports_setup', no_warning=True)",
+                "assert 'mmf.models.vilbert' in sys.modules",
+            ]
+        )
+        subprocess.run([sys.executable, "-c", snippet], check=True)
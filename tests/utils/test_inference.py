@@ -0,0 +1,59 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+import unittest
+
+import torch
+from mmf.common.sample import SampleList
+from mmf.utils.inference import compute_drift, optimize_for_inference
+from torch import nn
+
+
+class ClassifierModel(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.encoder = nn.Sequential(
+            nn.Linear(16, 32), nn.LayerNorm(32), nn.GELU(), nn.Dropout(0.5)
+        )
+        self.classifier = nn.Linear(32, 4)
+
+    def forward(self, sample_list):
+        return {"scores": self.classifier(self.encoder(sample_list["text"]))}
+
+
+class TestOptimizeForInference(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(1234)
+        self.model = ClassifierModel()
+        self.samples = [SampleList({"text": torch.randn(8, 16)}) for _ in range(4)]
+        self.model.eval()
+        with torch.no_grad():
+            self.expected = [self.model(s)["scores"] for s in self.samples]
+
+    def test_cpu_fp32(self):
+        model = optimize_for_inference(self.model, "cpu_fp32")
+        # Dropout stays disabled in training mode
+        model.train()
+        self.assertEqual(model.encoder[3].p, 0)
+        self.assertFalse(any(p.requires_grad for p in model.parameters()))
+        with torch.no_grad():
+            scores = model(self.samples[0])["scores"]
+        self.assertTrue(torch.equal(scores, self.expected[0]))
+
+    def test_cpu_int8(self):
+        model = optimize_for_inference(
+            self.model, "cpu_int8", samples=self.samples, max_prediction_mismatch=0.1
+        )
+        self.assertIsInstance(model.classifier, torch.nn.quantized.dynamic.Linear)
+        self.assertIsInstance(model.encoder[0], torch.nn.quantized.dynamic.Linear)
+        with torch.no_grad():
+            scores = model(self.samples[1])["scores"]
+        self.assertTrue(torch.allclose(scores, self.expected[1], atol=0.1))
+
+    def test_drift(self):
+        reference = [torch.tensor([[0.1, 0.9], [0.8, 0.2]]), torch.tensor([[1.0, 0.0]])]
+        scores = [torch.tensor([[0.6, 0.4], [0.7, 0.2]]), torch.tensor([[1.0, 0.0]])]
+        drift = compute_drift(reference, scores)
+        self.assertAlmostEqual(drift["max_abs_diff"], 0.5, places=5)
+        self.assertAlmostEqual(drift["prediction_mismatch"], 1 / 3, places=5)
+
+        with self.assertRaises(ValueError):
+            optimize_for_inference(self.model, "gpu_fp16")
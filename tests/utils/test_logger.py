@@ -2,16 +2,24 @@
 
 import argparse
 import glob
+import json
 import os
 import shutil
 import tempfile
 import unittest
 from typing import Optional
 
+import torch
 from mmf.common.registry import registry
 from mmf.utils.configuration import Configuration
 from mmf.utils.file_io import PathManager
-from mmf.utils.logger import setup_logger, setup_output_folder
+from mmf.utils.logger import (
+    AsyncMetricsLogger,
+    JsonlBackend,
+    LoggingBackend,
+    setup_logger,
+    setup_output_folder,
+)
 
 
 class TestLogger(unittest.TestCase):
@@ -61,3 +69,62 @@ class TestLogger(unittest.TestCase):
         self.assertTrue(
             any(self._tmpfile_write_contents in line for line in f.readlines())
         )
+
+
+class RecordingBackend(LoggingBackend):
+    def __init__(self):
+        self.scalars = []
+        self.histograms = []
+        self.closed = False
+
+    def add_scalars(self, scalar_dict, iteration):
+        self.scalars.append((iteration, scalar_dict))
+
+    def add_histogram(self, name, values, iteration):
+        self.histograms.append((name, values, iteration))
+
+    def close(self):
+        self.closed = True
+
+
+class TestAsyncMetricsLogger(unittest.TestCase):
+    def test_scalars_and_histograms(self):
+        backend = RecordingBackend()
+        metrics_logger = AsyncMetricsLogger([backend], histogram_sample_size=10)
+        metrics_logger.add_scalars({"a": torch.tensor(1.0), "b": 2}, 1)
+        metrics_logger.add_scalars({"c": 3.0}, 1)
+        model = torch.nn.Linear(10, 3)
+        metrics_logger.add_histogram_for_model(model, 1)
+        metrics_logger.flush()
+
+        scalars = {}
+        for iteration, scalar_dict in backend.scalars:
+            self.assertEqual(iteration, 1)
+            scalars.update(scalar_dict)
+        self.assertEqual(scalars, {"a": 1.0, "b": 2, "c": 3.0})
+
+        self.assertEqual(
+            [name for name, _, _ in backend.histograms], ["weight", "bias"]
+        )
+        # 30 weights are sampled with a stride of 3
+        weight = backend.histograms[0][1]
+        self.assertEqual(weight.shape, (10,))
+        self.assertTrue((weight == model.weight.detach().view(-1)[::3].numpy()).all())
+
+        metrics_logger.close()
+        self.assertTrue(backend.closed)
+        with self.assertRaises(RuntimeError):
+            metrics_logger.add_scalars({"a": 1}, 2)
+
+    def test_jsonl_backend(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            metrics_logger = AsyncMetricsLogger([JsonlBackend(tmp_dir)])
+            metrics_logger.add_scalars({"loss": 0.5}, 10)
+            metrics_logger.add_scalars({"loss": 0.25}, 20)
+            metrics_logger.close()
+
+            with open(os.path.join(tmp_dir, "metrics.jsonl")) as f:
+                lines = [json.loads(line) for line in f]
+        self.assertEqual(
+            lines, [{"iteration": 10, "loss": 0.5}, {"iteration": 20, "loss": 0.25}]
+        )
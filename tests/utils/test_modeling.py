@@ -0,0 +1,189 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+import unittest
+from unittest.mock import patch
+
+import mmf.utils.modeling as modeling
+import torch
+from mmf.models.lxmert import LXMERTEncoder
+from mmf.models.vilbert import BertEncoder
+from mmf.modules.hf_layers import BertEncoderJit
+from transformers.modeling_bert import BertConfig
+
+
+class TestCheckpointActivations(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(1234)
+        self.config = BertConfig(
+            hidden_size=16,
+            num_hidden_layers=4,
+            num_attention_heads=4,
+            intermediate_size=32,
+            # ViLBERT
+            v_hidden_size=12,
+            v_num_hidden_layers=4,
+            v_num_attention_heads=3,
+            v_intermediate_size=24,
+            v_hidden_act="gelu",
+            v_attention_probs_dropout_prob=0.1,
+            v_hidden_dropout_prob=0.1,
+            bi_hidden_size=16,
+            bi_num_attention_heads=2,
+            bi_intermediate_size=24,
+            v_biattention_id=[2, 4],
+            t_biattention_id=[2, 4],
+            fast_mode=False,
+            with_coattention=True,
+            dynamic_attention=False,
+            in_batch_pairs=False,
+            fixed_v_layer=0,
+            fixed_t_layer=0,
+            visualization=False,
+            # LXMERT
+            l_layers=2,
+            x_layers=2,
+            r_layers=1,
+            visual_feat_dim=10,
+            visual_pos_dim=4,
+        )
+        self.text = torch.randn(2, 6, 16)
+        self.image = torch.randn(2, 5, 12)
+        self.text_mask = torch.zeros(2, 1, 1, 6)
+        self.text_mask[0, ..., 4:] = -10000.0
+        self.image_mask = torch.zeros(2, 1, 1, 5)
+
+    def check_checkpointing(
+        self, encoder, inputs, enable_checkpointing, input_requires_grad=True
+    ):
+        """Runs a forward and backward pass of ``encoder`` in training mode
+        before and after ``enable_checkpointing(encoder)`` and checks that the
+        outputs and gradients match. Returns the number of checkpointed calls.
+        """
+        encoder.train()
+
+        def run():
+            # Same dropout masks in both runs
+            torch.manual_seed(1)
+            encoder.zero_grad()
+            hidden_states = inputs[0].clone()
+            if input_requires_grad:
+                hidden_states.requires_grad_()
+            output = encoder(hidden_states, *inputs[1:])[0]
+            if isinstance(output, list):
+                output = output[-1]
+            output.sum().backward()
+            grads = [
+                torch.zeros_like(p) if p.grad is None else p.grad.clone()
+                for p in encoder.parameters()
+            ]
+            if input_requires_grad:
+                grads.insert(0, hidden_states.grad)
+            return output.detach(), grads
+
+        expected, expected_grads = run()
+        enable_checkpointing(encoder)
+        with patch.object(modeling, "checkpoint", wraps=modeling.checkpoint) as mock:
+            output, grads = run()
+
+        self.assertTrue(torch.allclose(output, expected, atol=1e-6))
+        for grad, expected_grad in zip(grads, expected_grads):
+            self.assertTrue(torch.allclose(grad, expected_grad, atol=1e-5))
+        return mock.call_count
+
+    def test_get_checkpoint_interval(self):
+        self.assertEqual(modeling.get_checkpoint_interval(self.config), 0)
+        self.config.checkpoint_activations = True
+        self.assertEqual(modeling.get_checkpoint_interval(self.config), 1)
+        self.config.checkpoint_every_n_layers = 3
+        self.assertEqual(modeling.get_checkpoint_interval(self.config), 3)
+
+    def test_bert_encoder_jit(self):
+        def enable(encoder):
+            encoder.config.checkpoint_activations = True
+            encoder.config.checkpoint_every_n_layers = 2
+
+        encoder = BertEncoderJit(self.config)
+        inputs = [self.text, self.text_mask]
+        # Layers 0 and 2 out of 4
+        self.assertEqual(self.check_checkpointing(encoder, inputs, enable), 2)
+
+        # Not in eval mode or when the attentions are output
+        with patch.object(modeling, "checkpoint") as mock:
+            encoder(self.text, self.text_mask, output_attentions=True)
+            encoder.eval()
+            encoder(self.text, self.text_mask)
+            mock.assert_not_called()
+
+        script_encoder = torch.jit.script(encoder)
+        self.assertTrue(
+            torch.allclose(
+                script_encoder(self.text, self.text_mask)[0],
+                encoder(self.text, self.text_mask)[0],
+                atol=1e-6,
+            )
+        )
+
+    def test_vilbert_encoder(self):
+        def enable(encoder):
+            encoder.checkpoint_interval = 1
+
+        inputs = [
+            self.text,
+            self.image,
+            self.text_mask,
+            self.image_mask.squeeze(1),
+            self.image_mask,
+            torch.zeros(2, 1, 5, 6),
+        ]
+        # 4 text, 4 image and 2 co-attention layers
+        encoder = BertEncoder(self.config)
+        self.assertEqual(self.check_checkpointing(encoder, inputs, enable), 10)
+
+        self.config.checkpoint_co_attention_only = True
+        encoder = BertEncoder(self.config)
+        self.assertEqual(self.check_checkpointing(encoder, inputs, enable), 2)
+
+    def test_vilbert_encoder_fixed_layers(self):
+        def enable(encoder):
+            encoder.checkpoint_interval = 1
+
+        # The inputs of the first trainable layers don't require grad
+        self.config.fixed_t_layer = 1
+        self.config.fixed_v_layer = 1
+        inputs = [
+            self.text,
+            self.image,
+            self.text_mask,
+            self.image_mask.squeeze(1),
+            self.image_mask,
+            torch.zeros(2, 1, 5, 6),
+        ]
+        encoder = BertEncoder(self.config)
+        # 3 image and 2 co-attention layers, and 2 of the 3 trainable text
+        # layers, as none of the inputs of the first one requires grad
+        self.assertEqual(
+            self.check_checkpointing(
+                encoder, inputs, enable, input_requires_grad=False
+            ),
+            7,
+        )
+
+        trainable_layers = (
+            list(encoder.layer[1:]) + list(encoder.v_layer[1:]) + list(encoder.c_layer)
+        )
+        for layer in trainable_layers:
+            grads = [p.grad for p in layer.parameters() if p.requires_grad]
+            self.assertTrue(any(g is not None and g.abs().sum() > 0 for g in grads))
+
+    def test_lxmert_encoder(self):
+        def enable(encoder):
+            encoder.checkpoint_interval = 2
+
+        inputs = [
+            self.text,
+            self.text_mask,
+            (torch.randn(2, 5, 10), torch.rand(2, 5, 4)),
+            self.image_mask,
+        ]
+        encoder = LXMERTEncoder(self.config)
+        # First of the 2 language, of the relational and of the 2 cross layers
+        self.assertEqual(self.check_checkpointing(encoder, inputs, enable), 3)
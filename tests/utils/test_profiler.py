@@ -0,0 +1,58 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+import json
+import os
+import tempfile
+import unittest
+
+from mmf.utils.profiler import StepProfiler
+
+
+class TestStepProfiler(unittest.TestCase):
+    def test_phases(self):
+        profiler = StepProfiler(cuda_events=False, percentiles=[50, 100])
+        for item in profiler.iterate(range(3), "data_wait"):
+            with profiler.phase("forward"):
+                with profiler.phase("inner"):
+                    pass
+            with profiler.phase("eval", record_nested=False):
+                with profiler.phase("forward"):
+                    pass
+            profiler.step()
+
+        self.assertEqual(len(profiler._durations["data_wait"]), 4)
+        self.assertEqual(len(profiler._durations["forward"]), 3)
+        self.assertEqual(len(profiler._durations["eval"]), 3)
+
+        summary = profiler.summarize()
+        self.assertEqual(
+            set(summary.keys()),
+            {
+                f"{name}_p{percentile}"
+                for name in ["data_wait", "forward", "inner", "eval"]
+                for percentile in [50, 100]
+            },
+        )
+        self.assertLessEqual(summary["forward_p50"], summary["forward_p100"])
+        self.assertEqual(profiler.summarize(), {})
+
+    def test_trace(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            profiler = StepProfiler(
+                cuda_events=False,
+                trace_start_update=2,
+                trace_num_updates=2,
+                trace_dir=tmp_dir,
+            )
+            for _ in range(6):
+                with profiler.phase("forward"):
+                    pass
+                profiler.step()
+
+            self.assertEqual(os.listdir(tmp_dir), ["phases_rank0_updates_2_4.json"])
+            with open(os.path.join(tmp_dir, "phases_rank0_updates_2_4.json")) as f:
+                trace = json.load(f)
+            events = trace["traceEvents"]
+            self.assertEqual(len(events), 2)
+            self.assertEqual(events[0]["name"], "forward")
+            self.assertEqual(events[0]["ph"], "X")
+            self.assertLess(events[0]["ts"], events[1]["ts"])
@@ -0,0 +1,78 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+
+# Tokenizes the texts of annotation files (imdb .npy, .jsonl or .json) offline
+# into token id stores which are loaded by the bert processors when their
+# ``token_id_store`` option points to the output folder, for e.g.
+#
+#   python tools/scripts/bert/tokenize_annotations.py \
+#     --annotations vqa2/defaults/annotations/imdb_train2014.npy \
+#     --output_dir vqa2/defaults/token_ids --max_seq_length 128
+#
+# Stores are keyed by the hash of the tokenizer vocabulary and by
+# max_seq_length, so processors with another tokenizer ignore them.
+import argparse
+import os
+
+from mmf.datasets.databases.annotation_database import AnnotationDatabase
+from mmf.datasets.processors.bert_processors import MaskedTokenProcessor
+from mmf.utils.file_io import PathManager
+from omegaconf import OmegaConf
+
+
+def get_texts(annotation_path, text_keys):
+    db = AnnotationDatabase(None, annotation_path)
+    texts = []
+    for item in db.data[db.start_idx :]:
+        for key in text_keys:
+            if key in item:
+                text = item[key]
+                if isinstance(text, list):
+                    text = " ".join(text)
+                texts.append(text)
+                break
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--annotations", type=str, nargs="+", required=True)
+    parser.add_argument("--output_dir", type=str, required=True)
+    parser.add_argument(
+        "--text_keys",
+        type=str,
+        nargs="+",
+        default=["question_str", "text", "question", "caption_str"],
+        help="Keys of the text in the annotations, the first one found is used",
+    )
+    parser.add_argument("--tokenizer", type=str, default="bert-base-uncased")
+    parser.add_argument("--cased", action="store_true")
+    parser.add_argument("--max_seq_length", type=int, default=128)
+    parser.add_argument("--batch_size", type=int, default=4096)
+    args = parser.parse_args()
+
+    config = OmegaConf.create(
+        {
+            "tokenizer_config": {
+                "type": args.tokenizer,
+                "params": {"do_lower_case": not args.cased},
+            },
+            "max_seq_length": args.max_seq_length,
+            "mask_probability": 0,
+            "use_fast_tokenizer": True,
+        }
+    )
+    processor = MaskedTokenProcessor(config)
+    PathManager.mkdirs(args.output_dir)
+
+    for annotation_path in args.annotations:
+        texts = get_texts(annotation_path, args.text_keys)
+        store = processor.build_token_id_store(texts, batch_size=args.batch_size)
+
+        name = os.path.splitext(os.path.basename(annotation_path))[0]
+        file_name = processor.get_token_id_store_file_name(name)
+        store.save(os.path.join(args.output_dir, file_name))
+        print(f"Saved token ids of {len(store)} texts to {file_name}")
+
+
+if __name__ == "__main__":
+    main()
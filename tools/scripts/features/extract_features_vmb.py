@@ -9,7 +9,6 @@
 # index saved with key "objects" in info list will match the Visual Genome
 # category mapping.
 import argparse
-import glob
 import os
 
 import cv2
@@ -23,6 +22,18 @@ from maskrcnn_benchmark.utils.model_serialization import load_state_dict
 from mmf.utils.download import download
 from PIL import Image
 
+from tools.scripts.features.extraction_utils import (
+    FeatureManifest,
+    add_pipeline_args,
+    build_feature_writer,
+    build_image_loader,
+    closing_feature_writer,
+    get_image_name,
+    get_manifest_path,
+    list_image_files,
+    load_exclude_list,
+)
+
 
 class FeatureExtractor:
     MODEL_URL = {
@@ -38,6 +49,7 @@ class FeatureExtractor:
 
     def __init__(self):
         self.args = self.get_parser().parse_args()
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self._try_downloading_necessities(self.args.model_name)
         self.detection_model = self._build_detection_model()
 
@@ -111,6 +123,7 @@ class FeatureExtractor:
             action="store_true",
             help="The model will output predictions for the background class when set",
         )
+        add_pipeline_args(parser)
         return parser
 
     def _build_detection_model(self):
@@ -122,7 +135,7 @@ class FeatureExtractor:
 
         load_state_dict(model, checkpoint.pop("model"))
 
-        model.to("cuda")
+        model.to(self.device)
         model.eval()
         return model
 
@@ -226,10 +239,15 @@ class FeatureExtractor:
             im_scales.append(im_scale)
             im_infos.append(im_info)
 
+        return self._get_detectron_features_from_tensors(
+            img_tensor, im_scales, im_infos
+        )
+
+    def _get_detectron_features_from_tensors(self, img_tensor, im_scales, im_infos):
         # Image dimensions should be divisible by 32, to allow convolutions
         # in detector to work
         current_img_list = to_image_list(img_tensor, size_divisible=32)
-        current_img_list = current_img_list.to("cuda")
+        current_img_list = current_img_list.to(self.device, non_blocking=True)
 
         with torch.no_grad():
             output = self.detection_model(current_img_list)
@@ -244,71 +262,66 @@ class FeatureExtractor:
 
         return feat_list
 
-    def _chunks(self, array, chunk_size):
-        for i in range(0, len(array), chunk_size):
-            yield array[i : i + chunk_size]
+    def _get_files_to_extract(self, manifest):
+        image_dir = self.args.image_dir
+        if os.path.isfile(image_dir):
+            return [image_dir]
 
-    def _save_feature(self, file_name, feature, info):
-        file_base_name = os.path.basename(file_name)
-        file_base_name = file_base_name.split(".")[0]
-        info_file_base_name = file_base_name + "_info.npy"
-        file_base_name = file_base_name + ".npy"
+        exclude = load_exclude_list(self.args.exclude_list)
+        files = [
+            f for f in list_image_files(image_dir) if get_image_name(f) not in exclude
+        ]
 
-        np.save(
-            os.path.join(self.args.output_folder, file_base_name), feature.cpu().numpy()
-        )
-        np.save(os.path.join(self.args.output_folder, info_file_base_name), info)
+        end_index = self.args.end_index
+        if end_index is None:
+            end_index = len(files)
+        start_index = self.args.start_index
+
+        # Slice before skipping finished images so that a resumed shard
+        # covers the same images as the original run
+        return [
+            f for f in files[start_index:end_index] if get_image_name(f) not in manifest
+        ]
 
     def extract_features(self):
-        image_dir = self.args.image_dir
-        if os.path.isfile(image_dir):
-            features, infos = self.get_detectron_features([image_dir])
-            self._save_feature(image_dir, features[0], infos[0])
-        else:
-            files = glob.glob(os.path.join(image_dir, "*.png"))
-            files.extend(glob.glob(os.path.join(image_dir, "*.jpg")))
-            files.extend(glob.glob(os.path.join(image_dir, "*.jpeg")))
-            files = {f: 1 for f in files}
-            exclude = {}
-
-            if os.path.exists(self.args.exclude_list):
-                with open(self.args.exclude_list) as f:
-                    lines = f.readlines()
-                    for line in lines:
-                        exclude[
-                            line.strip("\n").split(os.path.sep)[-1].split(".")[0]
-                        ] = 1
-            output_files = glob.glob(os.path.join(self.args.output_folder, "*.npy"))
-            output_dict = {}
-            for f in output_files:
-                file_name = f.split(os.path.sep)[-1].split(".")[0]
-                output_dict[file_name] = 1
-
-            for f in list(files.keys()):
-                file_name = f.split(os.path.sep)[-1].split(".")[0]
-                if file_name in output_dict or file_name in exclude:
-                    files.pop(f)
-
-            files = list(files.keys())
-
-            finished = 0
-
-            end_index = self.args.end_index
-            if end_index is None:
-                end_index = len(files)
-            start_index = self.args.start_index
-
-            total = len(files[start_index:end_index])
-
-            for chunk in self._chunks(
-                files[start_index:end_index], self.args.batch_size
-            ):
-                features, infos = self.get_detectron_features(chunk)
-                for idx, file_name in enumerate(chunk):
-                    self._save_feature(file_name, features[idx], infos[idx])
-                finished += len(chunk)
+        manifest = FeatureManifest(get_manifest_path(self.args))
+        files = self._get_files_to_extract(manifest)
+        total = len(files)
+        print(f"Extracting features for {total} images, {len(manifest)} already done")
+
+        writer = build_feature_writer(
+            self.args.output_format,
+            self.args.output_folder,
+            manifest,
+            async_write=not self.args.sync_write,
+        )
+        loader = build_image_loader(
+            files, self._image_transform, self.args.batch_size, self.args.num_workers
+        )
 
-                if finished % 200 == 0:
+        finished = 0
+        with closing_feature_writer(writer, manifest):
+            for paths, outputs, failed in loader:
+                for path in failed:
+                    print(f"Skipping {path} as it couldn't be loaded")
+                finished += len(failed)
+                if len(paths) == 0:
+                    continue
+
+                img_tensor, im_scales, im_infos = zip(*outputs)
+                features, infos = self._get_detectron_features_from_tensors(
+                    img_tensor, im_scales, im_infos
+                )
+                for idx, file_name in enumerate(paths):
+                    writer.write(
+                        get_image_name(file_name),
+                        features[idx].cpu().numpy(),
+                        infos[idx],
+                    )
+
+                previous = finished
+                finished += len(paths)
+                if finished // 200 > previous // 200:
                     print(f"Processed {finished}/{total}")
 
 
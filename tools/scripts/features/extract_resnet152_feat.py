@@ -4,7 +4,6 @@ import argparse
 import os
 from glob import glob
 
-import numpy as np
 import torch
 import torch.nn as nn
 import torchvision.models as models
@@ -12,6 +11,16 @@ import torchvision.transforms as transforms
 from PIL import Image
 from torch.autograd import Variable
 
+from tools.scripts.features.extraction_utils import (
+    FeatureManifest,
+    add_pipeline_args,
+    build_feature_writer,
+    build_image_loader,
+    closing_feature_writer,
+    get_image_name,
+    load_exclude_list,
+)
+
 
 TARGET_IMAGE_SIZE = [448, 448]
 CHANNEL_MEAN = [0.485, 0.456, 0.406]
@@ -49,13 +58,17 @@ if use_cuda:
     _resnet_module = _resnet_module.cuda()
 
 
-def extract_image_feat(img_file):
+def load_image(img_file):
     img = Image.open(img_file).convert("RGB")
     img_transform = data_transforms(img)
     # make sure grey scale image is processed correctly
     if img_transform.shape[0] == 1:
         img_transform = img_transform.expand(3, -1, -1)
-    img_var = Variable(img_transform.unsqueeze(0))
+    return img_transform
+
+
+def extract_image_feat(img_file):
+    img_var = Variable(load_image(img_file).unsqueeze(0))
     if use_cuda:
         img_var = img_var.cuda()
 
@@ -63,61 +76,74 @@ def extract_image_feat(img_file):
     return img_feat
 
 
+def extract_batch_feat(images):
+    # All images are resized to TARGET_IMAGE_SIZE so they can be stacked
+    batch = torch.stack(images)
+    if use_cuda:
+        batch = batch.cuda(non_blocking=True)
+
+    with torch.no_grad():
+        return _resnet_module(batch)
+
+
 def get_image_id(image_name):
-    image_id = int(image_name.split(".")[0].split("_")[-1])
+    image_id = int(get_image_name(image_name).split("_")[-1])
     return image_id
 
 
-def extract_dataset_pool5(image_dir, save_dir, total_group, group_id, ext_filter):
-    image_list = glob(image_dir + "/*." + ext_filter)
-    image_list = {f: 1 for f in image_list}
-    exclude = {}
-    with open("./list") as f:
-        lines = f.readlines()
-        for line in lines:
-            exclude[line.strip("\n").split(os.path.sep)[-1].split(".")[0]] = 1
-    output_files = glob(os.path.join(save_dir, "*.npy"))
-    output_dict = {}
-    for f in output_files:
-        file_name = f.split(os.path.sep)[-1].split(".")[0]
-        output_dict[file_name] = 1
-
-    for f in list(image_list.keys()):
-        file_name = f.split(os.path.sep)[-1].split(".")[0]
-        if file_name in output_dict or file_name in exclude:
-            image_list.pop(f)
-
-    image_list = list(image_list.keys())
-    if not os.path.exists(save_dir):
-        os.makedirs(save_dir)
-
-    for n_im, impath in enumerate(image_list):
-        if (n_im + 1) % 100 == 0:
-            print("processing %d / %d" % (n_im + 1, len(image_list)))
-        image_name = os.path.basename(impath)
-        image_id = get_image_id(image_name)
-        if image_id % total_group != group_id:
+def extract_dataset_pool5(
+    image_dir,
+    save_dir,
+    total_group,
+    group_id,
+    ext_filter,
+    batch_size=1,
+    num_workers=0,
+    output_format="npy",
+    async_write=True,
+    manifest_path=None,
+    exclude_list="./list",
+):
+    image_list = sorted(glob(image_dir + "/*." + ext_filter))
+    exclude = load_exclude_list(exclude_list)
+
+    if manifest_path is None:
+        manifest_path = os.path.join(save_dir, f"manifest_{group_id}.txt")
+    os.makedirs(save_dir, exist_ok=True)
+    manifest = FeatureManifest(manifest_path)
+
+    files = []
+    for impath in image_list:
+        image_name = get_image_name(impath)
+        if image_name in exclude or image_name in manifest:
             continue
+        if get_image_id(os.path.basename(impath)) % total_group != group_id:
+            continue
+        files.append(impath)
 
-        feat_name = image_name.replace(ext_filter, "npy")
-        save_path = os.path.join(save_dir, feat_name)
-        tmp_lock = save_path + ".lock"
+    writer = build_feature_writer(
+        output_format, save_dir, manifest, async_write=async_write
+    )
+    loader = build_image_loader(files, load_image, batch_size, num_workers)
 
-        if os.path.exists(save_path) and not os.path.exists(tmp_lock):
-            continue
-        if not os.path.exists(tmp_lock):
-            os.makedirs(tmp_lock)
-
-        # pool5_val = extract_image_feat(impath).permute(0, 2, 3, 1)
-        try:
-            pool5_val = extract_image_feat(impath).permute(0, 2, 3, 1)
-        except Exception:
-            print("error for" + image_name)
-            continue
+    n_im = 0
+    with closing_feature_writer(writer, manifest):
+        for paths, images, failed in loader:
+            for impath in failed:
+                print("error for" + os.path.basename(impath))
+            if len(paths) == 0:
+                continue
+
+            pool5_val = extract_batch_feat(images).permute(0, 2, 3, 1)
+            feat = pool5_val.cpu().numpy()
+            for idx, impath in enumerate(paths):
+                # Keep the leading batch dimension of 1 in the saved features
+                writer.write(get_image_name(impath), feat[idx : idx + 1])
 
-        feat = pool5_val.data.cpu().numpy()
-        np.save(save_path, feat)
-        os.rmdir(tmp_lock)
+            previous = n_im
+            n_im += len(paths) + len(failed)
+            if n_im // 100 > previous // 100:
+                print("processing %d / %d" % (n_im, len(files)))
 
 
 if __name__ == "__main__":
@@ -127,9 +153,22 @@ if __name__ == "__main__":
     parser.add_argument("--data_dir", type=str, required=True)
     parser.add_argument("--out_dir", type=str, required=True)
     parser.add_argument("--image_ext", type=str, default="jpg")
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--exclude_list", type=str, default="./list")
+    add_pipeline_args(parser)
 
     args = parser.parse_args()
 
     extract_dataset_pool5(
-        args.data_dir, args.out_dir, args.total_group, args.group_id, args.image_ext
+        args.data_dir,
+        args.out_dir,
+        args.total_group,
+        args.group_id,
+        args.image_ext,
+        batch_size=args.batch_size,
+        num_workers=args.num_workers,
+        output_format=args.output_format,
+        async_write=not args.sync_write,
+        manifest_path=args.manifest,
+        exclude_list=args.exclude_list,
     )
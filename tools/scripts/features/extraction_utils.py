@@ -0,0 +1,340 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+
+# Shared building blocks for the feature extraction scripts in this folder:
+#
+# - ImageFileDataset decodes and resizes images inside DataLoader workers so
+#   that the main process only runs batched forward passes.
+# - FeatureManifest keeps track of already extracted images so that interrupted
+#   runs can be resumed without globbing the output folder.
+# - NpyFeatureWriter / LMDBFeatureWriter write features in the formats read by
+#   mmf's FeatureReader, and AsyncFeatureWriter moves the writes off the main
+#   thread.
+import contextlib
+import glob
+import logging
+import os
+import pickle
+import queue
+import threading
+
+import lmdb
+import numpy as np
+import torch
+
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ("png", "jpg", "jpeg")
+
+
+def get_image_name(path):
+    # Only the extension is removed, img.v2.jpg and img.v3.jpg are different
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def list_image_files(image_dir, extensions=IMAGE_EXTENSIONS):
+    files = []
+    for extension in extensions:
+        files.extend(glob.glob(os.path.join(image_dir, "*." + extension)))
+    # Remove duplicates while preserving order so that start/end index based
+    # sharding stays stable across runs
+    return list(dict.fromkeys(sorted(files)))
+
+
+def load_exclude_list(path):
+    exclude = set()
+    if path is None or not os.path.exists(path):
+        return exclude
+
+    with open(path) as f:
+        for line in f.readlines():
+            exclude.add(get_image_name(line.strip("\n")))
+    return exclude
+
+
+class ImageFileDataset(torch.utils.data.Dataset):
+    """Dataset over a list of image files which applies ``transform`` to each
+    path. Meant to be used with a DataLoader with ``num_workers > 0`` so that
+    decoding and resizing happen in parallel with the forward pass. Images
+    which fail to load are returned as ``None`` and dropped by
+    ``collate_images``.
+    """
+
+    def __init__(self, files, transform):
+        self.files = files
+        self.transform = transform
+
+    def __len__(self):
+        return len(self.files)
+
+    def __getitem__(self, idx):
+        path = self.files[idx]
+        try:
+            return path, self.transform(path)
+        except Exception as e:
+            logger.warning(f"Failed to load {path}: {e}")
+            return path, None
+
+
+def collate_images(batch):
+    """Keep images as lists as they can have different sizes. Returns
+    a tuple of (paths, transformed outputs, failed paths).
+    """
+    paths, outputs, failed = [], [], []
+    for path, output in batch:
+        if output is None:
+            failed.append(path)
+            continue
+        paths.append(path)
+        outputs.append(output)
+    return paths, outputs, failed
+
+
+def build_image_loader(files, transform, batch_size, num_workers):
+    dataset = ImageFileDataset(files, transform)
+    return torch.utils.data.DataLoader(
+        dataset,
+        batch_size=batch_size,
+        shuffle=False,
+        num_workers=num_workers,
+        collate_fn=collate_images,
+        pin_memory=torch.cuda.is_available(),
+    )
+
+
+class FeatureManifest:
+    """Append-only record of the image names whose features have been
+    written. Names are only added after the writer has persisted them, so
+    a crashed run never marks an image as done that is missing from the output.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.done = {line.strip() for line in f if line.strip()}
+        self._file = None
+
+    def __contains__(self, name):
+        return name in self.done
+
+    def __len__(self):
+        return len(self.done)
+
+    def add(self, names):
+        if self._file is None:
+            self._file = open(self.path, "a")
+        for name in names:
+            if name not in self.done:
+                self.done.add(name)
+                self._file.write(name + "\n")
+        # Only flushed, a sync per image throttles the writer thread
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+
+class NpyFeatureWriter:
+    """Writes ``<name>.npy`` and ``<name>_info.npy`` files, the layout
+    expected by mmf's FeatureReader for folders of features.
+    """
+
+    def __init__(self, output_folder, on_commit=None):
+        self.output_folder = output_folder
+        self.on_commit = on_commit
+        os.makedirs(self.output_folder, exist_ok=True)
+
+    def write(self, name, feature, info=None):
+        np.save(os.path.join(self.output_folder, name + ".npy"), feature)
+        if info is not None:
+            np.save(os.path.join(self.output_folder, name + "_info.npy"), info)
+        if self.on_commit is not None:
+            self.on_commit([name])
+
+    def close(self):
+        pass
+
+
+class LMDBFeatureWriter:
+    """Writes features directly into an LMDB file in the same format as
+    ``lmdb_conversion.py --mode convert``, which is read by mmf's
+    LMDBFeatureReader. Writes are batched into a transaction every
+    ``commit_interval`` items. The ``keys`` entry is only written on
+    ``close``, and rebuilt from the database when a crashed run is resumed.
+    """
+
+    def __init__(self, lmdb_path, on_commit=None, commit_interval=256):
+        self.lmdb_path = lmdb_path
+        self.on_commit = on_commit
+        self.commit_interval = commit_interval
+        os.makedirs(self.lmdb_path, exist_ok=True)
+        self.env = lmdb.open(self.lmdb_path, map_size=1099511627776)
+
+        with self.env.begin(write=False) as txn:
+            # Also has the items committed after the last ``keys`` entry
+            self.keys = [
+                key for key in txn.cursor().iternext(values=False) if key != b"keys"
+            ]
+        self._key_set = set(self.keys)
+        self._pending = []
+
+    def write(self, name, feature, info=None):
+        item = {"feature_path": name, "features": feature}
+        if info is not None:
+            item["image_height"] = info.get("image_height")
+            item["image_width"] = info.get("image_width")
+            item["num_boxes"] = info.get("num_boxes")
+            item["objects"] = info.get("objects")
+            item["cls_prob"] = info.get("cls_prob", None)
+            item["bbox"] = info.get("bbox")
+
+        self._pending.append((name, item))
+        if len(self._pending) >= self.commit_interval:
+            self.flush()
+
+    def flush(self):
+        if len(self._pending) == 0:
+            return
+
+        with self.env.begin(write=True) as txn:
+            for name, item in self._pending:
+                key = name.encode()
+                txn.put(key, pickle.dumps(item))
+                if key not in self._key_set:
+                    self._key_set.add(key)
+                    self.keys.append(key)
+
+        names = [name for name, _ in self._pending]
+        self._pending = []
+        if self.on_commit is not None:
+            self.on_commit(names)
+
+    def close(self):
+        self.flush()
+        with self.env.begin(write=True) as txn:
+            txn.put(b"keys", pickle.dumps(self.keys))
+        self.env.close()
+
+
+class AsyncFeatureWriter:
+    """Runs ``writer.write`` on a background thread so that serialization
+    and disk I/O overlap with feature extraction. ``max_pending`` bounds the
+    number of queued items to keep memory in check. Errors raised by the
+    writer are re-raised in the main thread on the next ``write`` or on
+    ``close``.
+    """
+
+    _SENTINEL = object()
+
+    def __init__(self, writer, max_pending=64):
+        self.writer = writer
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is self._SENTINEL:
+                break
+            if self._error is not None:
+                # Drain the queue so that the producer never blocks
+                continue
+            try:
+                self.writer.write(*item)
+            except Exception as e:
+                self._error = e
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise RuntimeError("Feature writer failed") from self._error
+
+    def write(self, name, feature, info=None):
+        self._raise_if_failed()
+        self._queue.put((name, feature, info))
+
+    def close(self):
+        self._queue.put(self._SENTINEL)
+        self._thread.join()
+        self._raise_if_failed()
+        self.writer.close()
+
+
+@contextlib.contextmanager
+def closing_feature_writer(writer, manifest):
+    """Closes ``writer`` and then ``manifest`` on exit. If the extraction
+    failed, an error raised while closing the writer is only logged so that
+    it doesn't mask the original exception.
+    """
+    try:
+        yield writer
+    except BaseException:
+        try:
+            writer.close()
+        except Exception:
+            logger.exception("Failed to close the feature writer")
+        raise
+    else:
+        writer.close()
+    finally:
+        manifest.close()
+
+
+def build_feature_writer(
+    output_format, output_folder, manifest, async_write=True, commit_interval=256
+):
+    if output_format == "npy":
+        writer = NpyFeatureWriter(output_folder, on_commit=manifest.add)
+    elif output_format == "lmdb":
+        writer = LMDBFeatureWriter(
+            output_folder, on_commit=manifest.add, commit_interval=commit_interval
+        )
+    else:
+        raise ValueError("output_format must be either `npy` or `lmdb`")
+
+    if async_write:
+        writer = AsyncFeatureWriter(writer)
+    return writer
+
+
+def add_pipeline_args(parser):
+    parser.add_argument(
+        "--num_workers",
+        type=int,
+        default=4,
+        help="Number of DataLoader workers used to decode and resize images",
+    )
+    parser.add_argument(
+        "--output_format",
+        type=str,
+        default="npy",
+        choices=["npy", "lmdb"],
+        help="`npy` writes a feature and an info file per image to "
+        + "output_folder, `lmdb` writes all features into an LMDB file "
+        + "at output_folder (which should end with .lmdb)",
+    )
+    parser.add_argument(
+        "--sync_write",
+        action="store_true",
+        help="Write features synchronously instead of on a background thread",
+    )
+    parser.add_argument(
+        "--manifest",
+        type=str,
+        default=None,
+        help="File recording extracted images, used to resume interrupted "
+        + "runs. Defaults to a manifest file inside the output folder",
+    )
+    return parser
+
+
+def get_manifest_path(args, default_name="manifest.txt"):
+    if args.manifest is not None:
+        return args.manifest
+    return os.path.join(args.output_folder, default_name)
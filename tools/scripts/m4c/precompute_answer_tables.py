@@ -0,0 +1,114 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+
+# Precomputes the answer tables of the M4C answer processors (the matches of
+# the answers to the fixed vocabulary and to the OCR tokens) into an imdb so
+# that only the decoding sequence is sampled while loading, for e.g.
+#
+#   python tools/scripts/m4c/precompute_answer_tables.py \
+#     --imdb textvqa/defaults/annotations/imdb_train_ocr_en.npy \
+#     --vocab_file textvqa/defaults/extras/vocabs/fixed_answer_vocab_textvqa_5k.txt \
+#     --output textvqa/defaults/annotations/imdb_train_ocr_en_tables.npy \
+#     --benchmark 5000
+#
+# The OCR tokens are processed as by the TextVQA dataset with the default
+# ocr_token_processor (simple_word) and truncated to --max_length. Tables are
+# keyed by the hashes of the answer vocabulary and of the OCR tokens, so the
+# processor rebuilds the ones which don't match its inputs.
+import argparse
+import time
+
+import numpy as np
+from mmf.common.registry import registry
+from mmf.datasets.databases.annotation_database import AnnotationDatabase
+from mmf.datasets.processors import processors  # noqa: F401
+from mmf.utils.file_io import PathManager
+from omegaconf import OmegaConf
+
+
+def get_processor_args(item, processor, token_processor):
+    if "caption_str" in item and "answers" not in item:
+        answers = [item["caption_str"]]
+    else:
+        answers = item.get("answers", [])
+    tokens = [token_processor({"text": token})["text"] for token in item["ocr_tokens"]]
+    return {"answers": answers, "tokens": tokens[: processor.max_length]}
+
+
+def benchmark(processor, items):
+    start = time.perf_counter()
+    for item in items:
+        processor(item)
+    return (time.perf_counter() - start) / len(items) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--imdb", type=str, required=True)
+    parser.add_argument("--vocab_file", type=str, required=True)
+    parser.add_argument("--output", type=str, required=True)
+    parser.add_argument(
+        "--processor",
+        type=str,
+        default="m4c_answer",
+        choices=["m4c_answer", "m4c_caption"],
+    )
+    parser.add_argument("--num_answers", type=int, default=10)
+    parser.add_argument("--max_length", type=int, default=50)
+    parser.add_argument("--max_copy_steps", type=int, default=12)
+    parser.add_argument(
+        "--benchmark",
+        type=int,
+        default=0,
+        help="Number of items on which to time the processor with and without "
+        + "the tables",
+    )
+    args = parser.parse_args()
+
+    word_config = OmegaConf.create({"type": "simple_word", "params": {}})
+    config = OmegaConf.create(
+        {
+            "vocab_file": args.vocab_file,
+            "preprocessor": word_config,
+            "num_answers": args.num_answers,
+            "max_length": args.max_length,
+            "max_copy_steps": args.max_copy_steps,
+        }
+    )
+    processor = registry.get_processor_class(args.processor)(config)
+    token_processor = processors.Processor(word_config)
+
+    db = AnnotationDatabase(None, args.imdb)
+    processed = []
+    start = time.perf_counter()
+    # Items are updated in place in db.db which keeps the original format
+    for item in db.data[db.start_idx :]:
+        processor_args = get_processor_args(item, processor, token_processor)
+        if len(processor_args["answers"]) == 0:
+            continue
+        item["answer_table"] = processor.build_answer_table(processor_args)
+        processed.append((processor_args, item["answer_table"]))
+    print(
+        f"Built answer tables of {len(processed)} items "
+        + f"in {time.perf_counter() - start:.1f}s"
+    )
+
+    with PathManager.open(args.output, "wb") as f:
+        np.save(f, db.db)
+    print(f"Saved answer tables to {args.output}")
+
+    if args.benchmark > 0 and len(processed) > 0:
+        items = [processor_args for processor_args, _ in processed[: args.benchmark]]
+        online_ms = benchmark(processor, items)
+        items = [
+            {"answer_table": table, **processor_args}
+            for processor_args, table in processed[: args.benchmark]
+        ]
+        table_ms = benchmark(processor, items)
+        print(
+            f"ms/item on {len(items)} items: {online_ms:.3f} online, "
+            + f"{table_ms:.3f} with tables ({online_ms / table_ms:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+
+# Measures the peak memory and the time of a training step (forward and
+# backward) of the transformer encoders of VisualBERT/MMFTransformer, ViLBERT
+# and LXMERT with and without activation checkpointing, to estimate the batch
+# size headroom that checkpointing buys. The encoders are randomly initialized
+# with the base model sizes, so nothing is downloaded. Peak memory is only
+# measured on GPU.
+#
+#   python tools/scripts/models/benchmark_checkpoint_activations.py \
+#       --model vilbert --batch-sizes 16 32 64 --every-n-layers 1 2
+#
+# With --find-max-batch-size, the batch size is doubled until the step runs out
+# of memory, for each setting.
+import argparse
+import json
+import time
+
+import torch
+from mmf.models.lxmert import LXMERTEncoder
+from mmf.models.vilbert import BertEncoder
+from mmf.modules.hf_layers import BertEncoderJit
+from transformers.modeling_bert import BertConfig
+
+
+BASE_CONFIG = {
+    "hidden_size": 768,
+    "num_hidden_layers": 12,
+    "num_attention_heads": 12,
+    "intermediate_size": 3072,
+    "hidden_act": "gelu",
+}
+
+# ViLBERT base sizes, see mmf/configs/models/vilbert/defaults.yaml
+VILBERT_CONFIG = {
+    "v_hidden_size": 1024,
+    "v_num_hidden_layers": 6,
+    "v_num_attention_heads": 8,
+    "v_intermediate_size": 1024,
+    "v_hidden_act": "gelu",
+    "v_attention_probs_dropout_prob": 0.1,
+    "v_hidden_dropout_prob": 0.1,
+    "bi_hidden_size": 1024,
+    "bi_num_attention_heads": 8,
+    "bi_intermediate_size": 1024,
+    "v_biattention_id": [0, 1, 2, 3, 4, 5],
+    "t_biattention_id": [6, 7, 8, 9, 10, 11],
+    "fast_mode": False,
+    "with_coattention": True,
+    "dynamic_attention": False,
+    "in_batch_pairs": False,
+    "fixed_v_layer": 0,
+    "fixed_t_layer": 0,
+    "visualization": False,
+}
+
+# LXMERT sizes, see mmf/configs/models/lxmert/defaults.yaml
+LXMERT_CONFIG = {
+    "l_layers": 9,
+    "x_layers": 5,
+    "r_layers": 5,
+    "visual_feat_dim": 2048,
+    "visual_pos_dim": 4,
+}
+
+
+def build_encoder(args, checkpoint_config):
+    config = BertConfig(**BASE_CONFIG, **VILBERT_CONFIG, **LXMERT_CONFIG)
+    for key, value in checkpoint_config.items():
+        setattr(config, key, value)
+
+    if args.model == "vilbert":
+        return BertEncoder(config)
+    elif args.model == "lxmert":
+        return LXMERTEncoder(config)
+    return BertEncoderJit(config)
+
+
+def build_inputs(args, batch_size, device):
+    num_tokens = args.seq_length
+    if args.model in ("visual_bert", "mmf_transformer"):
+        # Text and image regions are encoded together
+        num_tokens += args.num_regions
+    text = torch.randn(batch_size, num_tokens, BASE_CONFIG["hidden_size"])
+    text_mask = torch.zeros(batch_size, 1, 1, num_tokens)
+    image_mask = torch.zeros(batch_size, 1, 1, args.num_regions)
+
+    if args.model == "vilbert":
+        image = torch.randn(
+            batch_size, args.num_regions, VILBERT_CONFIG["v_hidden_size"]
+        )
+        co_attention_mask = torch.zeros(
+            batch_size, 1, args.num_regions, args.seq_length
+        )
+        inputs = [text, image, text_mask, text_mask, image_mask, co_attention_mask]
+    elif args.model == "lxmert":
+        features = torch.randn(
+            batch_size, args.num_regions, LXMERT_CONFIG["visual_feat_dim"]
+        )
+        boxes = torch.rand(batch_size, args.num_regions, 4)
+        inputs = [text, text_mask, (features.to(device), boxes.to(device)), image_mask]
+    else:
+        inputs = [text, text_mask]
+
+    inputs = [x.to(device) if isinstance(x, torch.Tensor) else x for x in inputs]
+    inputs[0].requires_grad_()
+    return inputs
+
+
+def get_output(outputs):
+    output = outputs[0]
+    # ViLBERT returns the outputs of all of the layers
+    return output[-1] if isinstance(output, list) else output
+
+
+def run_steps(encoder, inputs, num_steps, device):
+    times = []
+    for _ in range(num_steps + 1):
+        if device.type == "cuda":
+            torch.cuda.synchronize(device)
+        start = time.perf_counter()
+        encoder.zero_grad()
+        get_output(encoder(*inputs)).float().mean().backward()
+        if device.type == "cuda":
+            torch.cuda.synchronize(device)
+        times.append(time.perf_counter() - start)
+    # The first step is a warmup
+    return sum(times[1:]) / num_steps
+
+
+def benchmark(args, checkpoint_config, batch_size, device):
+    encoder = build_encoder(args, checkpoint_config).to(device)
+    encoder.train()
+    inputs = build_inputs(args, batch_size, device)
+
+    result = {"batch_size": batch_size}
+    if device.type == "cuda":
+        torch.cuda.empty_cache()
+        torch.cuda.reset_peak_memory_stats(device)
+    try:
+        step_time = run_steps(encoder, inputs, args.num_steps, device)
+    except RuntimeError as e:
+        if "out of memory" not in str(e):
+            raise
+        result["oom"] = True
+        return result
+    finally:
+        del encoder, inputs
+
+    result["step_ms"] = step_time * 1000
+    result["samples_per_sec"] = batch_size / step_time
+    if device.type == "cuda":
+        result["peak_memory_mb"] = torch.cuda.max_memory_allocated(device) / 2**20
+    return result
+
+
+def find_max_batch_size(args, checkpoint_config, device):
+    batch_size = args.batch_sizes[0]
+    largest = None
+    while batch_size <= args.max_batch_size:
+        result = benchmark(args, checkpoint_config, batch_size, device)
+        if result.get("oom", False):
+            break
+        largest = result
+        batch_size *= 2
+    return largest
+
+
+def get_settings(args):
+    settings = [("none", {"checkpoint_activations": False})]
+    for every_n_layers in args.every_n_layers:
+        settings.append(
+            (
+                f"every_{every_n_layers}_layers",
+                {
+                    "checkpoint_activations": True,
+                    "checkpoint_every_n_layers": every_n_layers,
+                },
+            )
+        )
+    if args.model == "vilbert":
+        settings.append(
+            (
+                "co_attention_only",
+                {
+                    "checkpoint_activations": True,
+                    "checkpoint_co_attention_only": True,
+                },
+            )
+        )
+    return settings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--model",
+        choices=["visual_bert", "mmf_transformer", "vilbert", "lxmert"],
+        default="visual_bert",
+    )
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[32])
+    parser.add_argument("--every-n-layers", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--seq-length", type=int, default=128)
+    parser.add_argument("--num-regions", type=int, default=100)
+    parser.add_argument("--num-steps", type=int, default=5)
+    parser.add_argument("--find-max-batch-size", action="store_true")
+    parser.add_argument("--max-batch-size", type=int, default=4096)
+    parser.add_argument(
+        "--device", default="cuda" if torch.cuda.is_available() else "cpu"
+    )
+    args = parser.parse_args()
+    device = torch.device(args.device)
+
+    report = {}
+    for name, checkpoint_config in get_settings(args):
+        if args.find_max_batch_size:
+            report[name] = find_max_batch_size(args, checkpoint_config, device)
+        else:
+            report[name] = [
+                benchmark(args, checkpoint_config, batch_size, device)
+                for batch_size in args.batch_sizes
+            ]
+        print(name, json.dumps(report[name]))
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+
+# Compares the Block, BlockTucker and MFH fusions, which merge the chunks (or
+# stages) of their inputs with batched matmuls, against their previous
+# implementations, which looped over the chunks with a linear or bilinear per
+# chunk. Reports the time of a training step (forward and backward) for each
+# number of chunks.
+#
+#   python tools/scripts/models/benchmark_chunked_fusions.py \
+#       --fusions block block_tucker mfh --chunks 10 20 40 --batch-size 256
+import argparse
+import json
+import time
+
+import torch
+import torch.nn.functional as F
+from mmf.modules.fusions import MFH, Block, BlockTucker
+from mmf.utils.general import get_chunks
+from torch import nn
+
+
+class LoopedBlock(Block):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.merge_linears0 = nn.ModuleList(
+            [nn.Linear(size, size * self.rank) for size in self.sizes_list]
+        )
+        self.merge_linears1 = nn.ModuleList(
+            [nn.Linear(size, size * self.rank) for size in self.sizes_list]
+        )
+
+    def forward(self, x):
+        x0 = self.linear0(x[0])
+        x1 = self.linear1(x[1])
+        zs = []
+        for x0_c, x1_c, m0, m1 in zip(
+            get_chunks(x0, self.sizes_list),
+            get_chunks(x1, self.sizes_list),
+            self.merge_linears0,
+            self.merge_linears1,
+        ):
+            m = m0(x0_c) * m1(x1_c)
+            z = torch.sum(m.view(x0.size(0), self.rank, -1), 1)
+            z = torch.sqrt(F.relu(z)) - torch.sqrt(F.relu(-z))
+            zs.append(F.normalize(z, p=2))
+        return self.linear_out(torch.cat(zs, 1))
+
+
+class LoopedBlockTucker(BlockTucker):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bilinears = nn.ModuleList(
+            [nn.Bilinear(size, size, size) for size in self.sizes_list]
+        )
+
+    def forward(self, x):
+        x0 = self.linear0(x[0])
+        x1 = self.linear1(x[1])
+        zs = []
+        for x0_c, x1_c, bilinear in zip(
+            get_chunks(x0, self.sizes_list),
+            get_chunks(x1, self.sizes_list),
+            self.bilinears,
+        ):
+            z = bilinear(x0_c, x1_c)
+            z = torch.sqrt(F.relu(z)) - torch.sqrt(F.relu(-z))
+            zs.append(F.normalize(z, p=2))
+        return self.linear_out(torch.cat(zs, 1))
+
+
+class LoopedMFH(MFH):
+    def __init__(self, input_dims, output_dim, mm_dim=1200, factor=2, **kwargs):
+        super().__init__(input_dims, output_dim, mm_dim, factor, **kwargs)
+        self.linear0_0 = nn.Linear(input_dims[0], mm_dim * factor)
+        self.linear1_0 = nn.Linear(input_dims[1], mm_dim * factor)
+        self.linear0_1 = nn.Linear(input_dims[0], mm_dim * factor)
+        self.linear1_1 = nn.Linear(input_dims[1], mm_dim * factor)
+
+    def forward(self, x):
+        z_0_skip = F.relu(self.linear0_0(x[0])) * F.relu(self.linear1_0(x[1]))
+        z_0 = z_0_skip.view(z_0_skip.size(0), self.mm_dim, self.factor).sum(2)
+        z_1 = F.relu(self.linear0_1(x[0])) * F.relu(self.linear1_1(x[1]))
+        z_1 = (z_1 * z_0_skip).view(z_1.size(0), self.mm_dim, self.factor).sum(2)
+        return F.relu(self.linear_out(torch.cat([z_0, z_1], 1)))
+
+
+FUSIONS = {
+    "block": (Block, LoopedBlock),
+    "block_tucker": (BlockTucker, LoopedBlockTucker),
+    "mfh": (MFH, LoopedMFH),
+}
+
+
+def run_steps(fusion, inputs, num_steps, device):
+    times = []
+    for _ in range(num_steps + 1):
+        if device.type == "cuda":
+            torch.cuda.synchronize(device)
+        start = time.perf_counter()
+        fusion.zero_grad()
+        fusion(inputs).mean().backward()
+        if device.type == "cuda":
+            torch.cuda.synchronize(device)
+        times.append(time.perf_counter() - start)
+    # The first step is a warmup
+    return sum(times[1:]) / num_steps
+
+
+def benchmark(fusion_cls, args, kwargs, device):
+    fusion = fusion_cls(args.input_dims, args.output_dim, **kwargs).to(device)
+    fusion.train()
+    inputs = [
+        torch.randn(args.batch_size, dim, device=device) for dim in args.input_dims
+    ]
+    step_time = run_steps(fusion, inputs, args.num_steps, device)
+    return {"step_ms": step_time * 1000, "samples_per_sec": args.batch_size / step_time}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--fusions", nargs="+", choices=list(FUSIONS.keys()), default=["block"]
+    )
+    parser.add_argument("--input-dims", type=int, nargs=2, default=[2048, 2400])
+    parser.add_argument("--output-dim", type=int, default=3000)
+    parser.add_argument("--mm-dim", type=int, default=1600)
+    parser.add_argument("--chunks", type=int, nargs="+", default=[10, 20, 40])
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--num-steps", type=int, default=5)
+    parser.add_argument(
+        "--device", default="cuda" if torch.cuda.is_available() else "cpu"
+    )
+    args = parser.parse_args()
+    device = torch.device(args.device)
+
+    report = {}
+    for name in args.fusions:
+        batched_cls, looped_cls = FUSIONS[name]
+        # MFH has two stages instead of chunks
+        settings = [None] if name == "mfh" else args.chunks
+        report[name] = []
+        for chunks in settings:
+            kwargs = {"mm_dim": args.mm_dim}
+            if chunks is not None:
+                kwargs["chunks"] = chunks
+            result = {
+                "chunks": chunks,
+                "looped": benchmark(looped_cls, args, kwargs, device),
+                "batched": benchmark(batched_cls, args, kwargs, device),
+            }
+            report[name].append(result)
+            print(name, json.dumps(result))
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
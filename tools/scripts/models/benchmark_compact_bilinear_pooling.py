@@ -0,0 +1,115 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+
+# Compares the count sketch of CompactBilinearPooling (used by the MCB fusion),
+# which scatters the inputs with its hash and sign vectors, against the dense
+# input_dim x output_dim sketch matrices it used before. Reports the time of a
+# training step (forward and backward) of the pooling, the size of its state
+# and, on GPU, the peak memory.
+#
+#   python tools/scripts/models/benchmark_compact_bilinear_pooling.py \
+#       --input-dims 2048 2048 --output-dim 16000 --batch-sizes 32 128
+import argparse
+import json
+import time
+
+import torch
+from mmf.modules.fusions import CompactBilinearPooling, circular_convolution
+
+
+def get_dense_sketch(rand_h, rand_s, output_dim):
+    sketch = rand_s.new_zeros(rand_h.size(0), output_dim)
+    sketch[torch.arange(rand_h.size(0), device=rand_h.device), rand_h] = rand_s
+    return sketch
+
+
+class DenseCompactBilinearPooling(torch.nn.Module):
+    def __init__(self, pooling):
+        super().__init__()
+        self.output_dim = pooling.output_dim
+        self.sketch1 = torch.nn.Parameter(
+            get_dense_sketch(pooling.rand_h1, pooling.rand_s1, self.output_dim),
+            requires_grad=False,
+        )
+        self.sketch2 = torch.nn.Parameter(
+            get_dense_sketch(pooling.rand_h2, pooling.rand_s2, self.output_dim),
+            requires_grad=False,
+        )
+
+    def forward(self, x1, x2):
+        cbp = circular_convolution(
+            x1.matmul(self.sketch1), x2.matmul(self.sketch2), self.output_dim
+        )
+        return cbp * self.output_dim
+
+
+def get_state_mb(module):
+    return sum(x.numel() * x.element_size() for x in module.state_dict().values()) / (
+        2 ** 20
+    )
+
+
+def run_steps(pooling, inputs, num_steps, device):
+    times = []
+    for _ in range(num_steps + 1):
+        if device.type == "cuda":
+            torch.cuda.synchronize(device)
+        start = time.perf_counter()
+        pooling(*inputs).mean().backward()
+        if device.type == "cuda":
+            torch.cuda.synchronize(device)
+        times.append(time.perf_counter() - start)
+    # The first step is a warmup
+    return sum(times[1:]) / num_steps
+
+
+def benchmark(pooling, args, batch_size, device):
+    inputs = [
+        torch.randn(batch_size, dim, device=device, requires_grad=True)
+        for dim in args.input_dims
+    ]
+    if device.type == "cuda":
+        torch.cuda.empty_cache()
+        torch.cuda.reset_peak_memory_stats(device)
+
+    step_time = run_steps(pooling, inputs, args.num_steps, device)
+    result = {
+        "batch_size": batch_size,
+        "step_ms": step_time * 1000,
+        "samples_per_sec": batch_size / step_time,
+    }
+    if device.type == "cuda":
+        result["peak_memory_mb"] = torch.cuda.max_memory_allocated(device) / 2**20
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input-dims", type=int, nargs=2, default=[2048, 2048])
+    parser.add_argument("--output-dim", type=int, default=16000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[32, 128])
+    parser.add_argument("--num-steps", type=int, default=10)
+    parser.add_argument(
+        "--device", default="cuda" if torch.cuda.is_available() else "cpu"
+    )
+    args = parser.parse_args()
+    device = torch.device(args.device)
+
+    sparse = CompactBilinearPooling(*args.input_dims, args.output_dim).to(device)
+    dense = DenseCompactBilinearPooling(sparse).to(device)
+
+    report = {}
+    for name, pooling in [("dense", dense), ("sparse", sparse)]:
+        report[name] = {
+            "state_mb": get_state_mb(pooling),
+            "steps": [
+                benchmark(pooling, args, batch_size, device)
+                for batch_size in args.batch_sizes
+            ],
+        }
+        print(name, json.dumps(report[name]))
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
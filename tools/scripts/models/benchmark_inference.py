@@ -0,0 +1,109 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+
+# Measures the CPU inference latency of a pretrained model of the zoo loaded
+# with from_pretrained in each inference mode of mmf.utils.inference (and
+# unoptimized), and the drift of its scores from the fp32 model. The inputs
+# are random BERT tokens with 100 region features or an image, as in the
+# TorchScript tests, so the drift isn't the one on a real held-out set.
+#
+#   python tools/scripts/models/benchmark_inference.py \
+#       --model visual_bert.finetuned.hateful_memes.direct \
+#       --batch-sizes 1 8 32 --num-threads 4
+import argparse
+import json
+import time
+
+import torch
+from mmf.common.registry import registry
+from mmf.common.sample import Sample, SampleList
+from mmf.utils.env import setup_imports
+from mmf.utils.inference import compute_drift, get_scores
+
+
+BERT_VOCAB_SIZE = 30255
+
+
+def build_sample_list(batch_size, seq_length):
+    samples = []
+    for _ in range(batch_size):
+        sample = Sample()
+        sample.input_ids = torch.randint(BERT_VOCAB_SIZE, (seq_length,)).long()
+        sample.input_mask = torch.ones(seq_length).long()
+        sample.segment_ids = torch.zeros(seq_length).long()
+        sample.image_feature_0 = torch.rand((100, 2048)).float()
+        sample.image = torch.rand((3, 224, 224)).float()
+        samples.append(sample)
+    return SampleList(samples)
+
+
+def load_model(args, mode):
+    model_cls = registry.get_model_class(args.model.split(".")[0])
+    if mode == "none":
+        return model_cls.from_pretrained(args.model).cpu()
+    return model_cls.from_pretrained(
+        args.model,
+        inference_mode=mode,
+        inference_options={"num_threads": args.num_threads},
+    )
+
+
+def run_steps(model, sample_list, num_steps):
+    times = []
+    with torch.no_grad():
+        for _ in range(num_steps + 1):
+            start = time.perf_counter()
+            model(sample_list)
+            times.append(time.perf_counter() - start)
+    # The first step is a warmup
+    return sum(times[1:]) / num_steps
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="visual_bert.finetuned.hateful_memes.direct")
+    parser.add_argument("--modes", nargs="+", default=["none", "cpu_fp32", "cpu_int8"])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--seq-length", type=int, default=128)
+    parser.add_argument("--num-steps", type=int, default=10)
+    parser.add_argument("--num-threads", type=int, default=None)
+    parser.add_argument(
+        "--num-drift-samples",
+        type=int,
+        default=64,
+        help="Random samples on which the drift from the fp32 model is measured",
+    )
+    args = parser.parse_args()
+    setup_imports()
+    if args.num_threads is not None:
+        torch.set_num_threads(args.num_threads)
+
+    drift_samples = [
+        build_sample_list(8, args.seq_length)
+        for _ in range(max(args.num_drift_samples // 8, 1))
+    ]
+    reference = get_scores(load_model(args, "none"), drift_samples)
+    report = {}
+    for mode in args.modes:
+        model = load_model(args, mode)
+        report[mode] = {
+            "drift": compute_drift(reference, get_scores(model, drift_samples))
+        }
+        report[mode]["steps"] = [
+            {
+                "batch_size": batch_size,
+                "latency_ms": 1000
+                * run_steps(
+                    model,
+                    build_sample_list(batch_size, args.seq_length),
+                    args.num_steps,
+                ),
+            }
+            for batch_size in args.batch_sizes
+        ]
+        print(mode, json.dumps(report[mode]))
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
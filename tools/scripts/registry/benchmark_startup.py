@@ -0,0 +1,83 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+
+# Measures the time spent before a run can start building its model and
+# dataset: importing mmf, setting up the registry imports and looking up the
+# requested model and dataset builder. Each measurement runs in a fresh python
+# process so that nothing is cached in sys.modules.
+#
+#   python tools/scripts/registry/benchmark_startup.py --model visual_bert \
+#       --dataset hateful_memes --runs 5
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+
+SNIPPET = """
+import json
+import sys
+import time
+
+start = time.perf_counter()
+import mmf
+from mmf.common.registry import registry
+from mmf.utils.env import setup_imports
+
+imported = time.perf_counter()
+setup_imports(lazy={lazy})
+setup = time.perf_counter()
+assert registry.get_model_class({model!r}) is not None
+assert registry.get_builder_class({dataset!r}) is not None
+assert registry.get_trainer_class({trainer!r}) is not None
+lookup = time.perf_counter()
+
+print(json.dumps({{
+    "import_mmf": imported - start,
+    "setup_imports": setup - imported,
+    "registry_lookup": lookup - setup,
+    "num_modules": len(sys.modules),
+}}))
+"""
+
+
+def run_once(lazy, args):
+    snippet = SNIPPET.format(
+        lazy=lazy, model=args.model, dataset=args.dataset, trainer=args.trainer
+    )
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", snippet],
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout
+    timings = json.loads(output.strip().split("\n")[-1])
+    timings["process"] = time.perf_counter() - start
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", type=str, default="visual_bert")
+    parser.add_argument("--dataset", type=str, default="hateful_memes")
+    parser.add_argument("--trainer", type=str, default="mmf")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    keys = ["import_mmf", "setup_imports", "registry_lookup", "process"]
+    print(f"{'mode':<8}" + "".join(f"{key:>18}" for key in keys) + f"{'modules':>10}")
+    for mode, lazy in [("eager", False), ("lazy", True)]:
+        runs = [run_once(lazy, args) for _ in range(args.runs)]
+        medians = {key: statistics.median(run[key] for run in runs) for key in keys}
+        num_modules = runs[-1]["num_modules"]
+        print(
+            f"{mode:<8}"
+            + "".join(f"{medians[key]:>17.3f}s" for key in keys)
+            + f"{num_modules:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
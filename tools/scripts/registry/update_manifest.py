@@ -0,0 +1,25 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+
+# Regenerates mmf/utils/registry_manifest.json, which maps registered names to
+# the modules registering them so that the registry can import them on demand.
+# Run from the root of the repository after adding or renaming a registered
+# class:
+#
+#   python tools/scripts/registry/update_manifest.py
+import argparse
+
+from mmf.utils.env import REGISTRY_MANIFEST_PATH, write_registry_manifest
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output_path", type=str, default=REGISTRY_MANIFEST_PATH)
+    args = parser.parse_args()
+
+    manifest = write_registry_manifest(args.output_path)
+    total = sum(len(names) for names in manifest.values())
+    print(f"Wrote {total} registered names to {args.output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+
+# Precomputes the sparse answer targets of imdb annotation files so that the
+# answer processor doesn't need to process the answers and compute the VQA
+# scores of each sample while loading, for e.g.
+#
+#   python tools/scripts/vqa2/precompute_answer_targets.py \
+#     --imdb vqa2/defaults/annotations/imdb_train2014.npy \
+#     --vocab_file vqa2/defaults/extras/vocabs/answers_vqa.txt \
+#     --output vqa2/defaults/annotations/imdb_train2014_targets.npy
+#
+# Targets are stored under ``answer_targets`` in each of the items along with
+# the hash of the answer vocabulary; processors with another vocabulary
+# ignore them. Set ``sparse_targets: true`` in the answer processor's params
+# to also densify them on device instead of in the workers.
+import argparse
+
+import numpy as np
+from mmf.common.registry import registry
+from mmf.datasets.databases.annotation_database import AnnotationDatabase
+from mmf.datasets.processors import processors  # noqa: F401
+from mmf.utils.file_io import PathManager
+from omegaconf import OmegaConf
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--imdb", type=str, required=True)
+    parser.add_argument("--vocab_file", type=str, required=True)
+    parser.add_argument("--output", type=str, required=True)
+    parser.add_argument(
+        "--processor",
+        type=str,
+        default="vqa_answer",
+        choices=["vqa_answer", "multi_hot_answer_from_vocab"],
+    )
+    parser.add_argument("--num_answers", type=int, default=10)
+    args = parser.parse_args()
+
+    config = OmegaConf.create(
+        {
+            "vocab_file": args.vocab_file,
+            "num_answers": args.num_answers,
+            "preprocessor": {"type": "simple_word", "params": {}},
+        }
+    )
+    processor = registry.get_processor_class(args.processor)(config)
+
+    db = AnnotationDatabase(None, args.imdb)
+    count = 0
+    # Items are updated in place in db.db which keeps the original format
+    for item in db.data[db.start_idx :]:
+        if "answers" in item:
+            item["answer_targets"] = processor.build_answer_targets(
+                {"answers": item["answers"]}
+            )
+            count += 1
+
+    with PathManager.open(args.output, "wb") as f:
+        np.save(f, db.db)
+    print(f"Saved answer targets of {count} items to {args.output}")
+
+
+if __name__ == "__main__":
+    main()